@@ -2,6 +2,7 @@ from .aggregates_access import (
     AggregatesAccess,
     AggregatesAccessInterface,
     AggregatesDatabaseInterface,
+    SnapshotAggregatesAccess,
     create_aggregates_interface,
     Aggregates,
 )
@@ -1,5 +1,10 @@
 import abc
-from typing import Optional, Dict
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from observability import record_snapshot_refresh, traced, track_snapshot_age
 
 
 class AggregatesDatabaseInterface(abc.ABC):
@@ -13,6 +18,18 @@ class AggregatesDatabaseInterface(abc.ABC):
         Get information about a aggregate.
         """
 
+    @abc.abstractmethod
+    def get_all_aggregates(self):
+        """
+        Get all the aggregates, the most recent years of each place first.
+        """
+
+    @abc.abstractmethod
+    def wait_for_notification(self, channel: str, timeout: float) -> bool:
+        """
+        Wait up to timeout seconds for a change notification on the channel.
+        """
+
 
 class AggregatesAccessInterface(abc.ABC):
     """
@@ -32,16 +49,153 @@ class AggregatesAccess(AggregatesAccessInterface):
     def __init__(self, database_gateway=None):
         self._database_gateway = database_gateway
 
+    @traced
     def get_aggregates(self, territory_id: Optional[str] = None, state_code: str = ""):
         aggregate_info = self._database_gateway.get_aggregates(territory_id, state_code)
         return aggregate_info
 
 
+class SnapshotAggregatesAccess(AggregatesAccess):
+    """
+    Aggregates access serving the lookups from an in-memory snapshot of the
+    whole aggregates table, keyed by state code and territory ID (None for
+    the aggregates of the whole state).
+
+    The table only changes when the pipeline publishes new files, so the
+    snapshot is reloaded in the background by start(): every
+    refresh_interval seconds and, with a notification_channel, as soon as a
+    NOTIFY is received on it. Each refresh replaces the snapshot at once, so
+    lookups never wait for it. Until the first refresh succeeds the lookups
+    go to the database.
+    """
+
+    def __init__(
+        self,
+        database_gateway,
+        refresh_interval: float,
+        notification_channel: str = "",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        super().__init__(database_gateway)
+        self._refresh_interval = refresh_interval
+        self._notification_channel = notification_channel
+        self._clock = clock
+        self._snapshot: Optional[Dict[Tuple[str, Optional[str]], List]] = None
+        self._refreshed_at = None
+        self._stopped = threading.Event()
+        self._thread = None
+        track_snapshot_age("aggregates", self.age)
+
+    @traced
+    def get_aggregates(self, territory_id: Optional[str] = None, state_code: str = ""):
+        snapshot = self._snapshot
+        if snapshot is None:
+            return super().get_aggregates(territory_id, state_code)
+        return list(snapshot.get((state_code, territory_id), ()))
+
+    def refresh(self) -> bool:
+        """
+        Reloads the snapshot, returning whether it succeeded (a failure keeps
+        the previous snapshot)
+        """
+        try:
+            aggregates = self._database_gateway.get_all_aggregates()
+        except Exception as error:
+            logging.warning(f"Could not refresh the aggregates snapshot: {error}")
+            record_snapshot_refresh("aggregates", None)
+            return False
+        snapshot = {}
+        for aggregate in aggregates:
+            key = (aggregate.state_code, aggregate.territory_id)
+            snapshot.setdefault(key, []).append(aggregate)
+        self._snapshot = snapshot
+        self._refreshed_at = self._clock()
+        record_snapshot_refresh("aggregates", len(aggregates))
+        return True
+
+    def age(self) -> float:
+        """
+        Seconds since the last successful refresh (infinite before it)
+        """
+        refreshed_at = self._refreshed_at
+        if refreshed_at is None:
+            return float("inf")
+        return self._clock() - refreshed_at
+
+    def start(self) -> None:
+        """
+        Starts refreshing the snapshot in a background thread
+        """
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._refresh_forever, name="aggregates-snapshot", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _refresh_forever(self) -> None:
+        if self._notification_channel:
+            # listens before the first refresh, so no change is missed
+            self._wait_for_notification(0)
+        while not self._stopped.is_set():
+            self.refresh()
+            self._wait_for_change()
+
+    def _wait_for_change(self) -> None:
+        """
+        Returns on a notification or after refresh_interval seconds,
+        whichever comes first
+        """
+        if not self._notification_channel:
+            self._stopped.wait(self._refresh_interval)
+            return
+        deadline = self._clock() + self._refresh_interval
+        while not self._stopped.is_set():
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                return
+            # waits in short steps, so stop() does not hang on the socket
+            notified = self._wait_for_notification(min(remaining, 1.0))
+            if notified is None:
+                self._stopped.wait(remaining)
+            if notified is not False:
+                return
+
+    def _wait_for_notification(self, timeout: float) -> Optional[bool]:
+        """
+        Whether a notification arrived, or None when the channel could not
+        be listened to
+        """
+        try:
+            return self._database_gateway.wait_for_notification(
+                self._notification_channel, timeout
+            )
+        except Exception as error:
+            logging.warning(f"Could not listen for changes of the aggregates: {error}")
+            return None
+
+
 class Aggregates:
     """
     Item to represente a aggregate in memory inside the module
     """
 
+    __slots__ = (
+        "territory_id",
+        "state_code",
+        "file_path",
+        "year",
+        "last_updated",
+        "hash_info",
+        "file_size_mb",
+    )
+
     def __init__(
         self,
         territory_id,
@@ -66,9 +220,21 @@ class Aggregates:
 
 def create_aggregates_interface(
     database_gateway: AggregatesDatabaseInterface,
+    snapshot_refresh_interval: float = 0,
+    notification_channel: str = "",
 ) -> AggregatesAccessInterface:
+    """
+    Aggregates access, served from a snapshot refreshed in the background
+    when snapshot_refresh_interval is positive
+    """
     if not isinstance(database_gateway, AggregatesDatabaseInterface):
         raise Exception(
             "Database gateway should implement the AggregatesDatabaseInterface interface"
         )
-    return AggregatesAccess(database_gateway)
+    if snapshot_refresh_interval <= 0:
+        return AggregatesAccess(database_gateway)
+    aggregates = SnapshotAggregatesAccess(
+        database_gateway, snapshot_refresh_interval, notification_channel
+    )
+    aggregates.start()
+    return aggregates
@@ -1,23 +1,47 @@
+import asyncio
+import logging
 from enum import Enum, unique
 from datetime import date, datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 
-from fastapi import FastAPI, Query, Path, Response, Security, status
+from fastapi import FastAPI, Query, Path, Request, Response, Security, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 from gazettes import GazetteAccessInterface, GazetteRequest
 from cities import CityAccessInterface
 from suggestions import Suggestion, SuggestionServiceInterface
-from companies import InvalidCNPJException, CompaniesAccessInterface
+from companies import (
+    InvalidCNPJException,
+    CompaniesAccessInterface,
+    PartnerCompaniesLookup,
+)
 from config.config import load_configuration
 from themed_excerpts import ThemedExcerptAccessInterface, ThemedExcerptAccessInterface
 from themed_excerpts.themed_excerpt_access import ThemedExcerptRequest
 from aggregates import AggregatesAccessInterface
 from scraper import InvalidTerritoryIDException, ScraperAccessInterface
 
-from api.auth import validate_api_key
+from api.auth import is_admin_key, validate_admin_key, validate_api_key
+from observability import (
+    MetricsMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    ProfilingMiddleware,
+    ServerTimingMiddleware,
+    TracingMiddleware,
+    current_server_timing,
+    profiled,
+    registry,
+)
+from observability.metrics import CLIENT_DISCONNECTS, route_name
+from utils.cancellation import (
+    CancellationScope,
+    OperationCancelledException,
+    cancellation_scope,
+)
+from utils.cursor import InvalidCursorException
+from utils.deadline import Deadline, DeadlineExceededException, request_deadline
 
 config = load_configuration()
 
@@ -34,6 +58,76 @@ app.add_middleware(
     allow_methods=config.cors_allow_methods,
     allow_headers=config.cors_allow_headers,
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
+if config.server_timing_enabled:
+    app.add_middleware(ServerTimingMiddleware)
+if any(config.admin_api_keys):
+    app.add_middleware(
+        ProfilingMiddleware,
+        is_admin_key=is_admin_key,
+        output_dir=config.profiling_output_dir,
+        interval=config.profiling_sample_interval,
+    )
+
+
+# How often a request waiting for its backends checks if the client is gone
+DISCONNECT_POLL_INTERVAL = 0.1
+
+# Non-standard status code (from nginx) for requests closed by the client
+CLIENT_CLOSED_REQUEST = 499
+
+# Largest page of the searches of companies (by name and by partner)
+COMPANY_SEARCH_MAX_LIMIT = 100
+
+# Largest page of the partners of a company
+PARTNERS_PAGE_MAX_LIMIT = 1000
+
+
+class ClientDisconnectedException(Exception):
+    """Exception for when the client closes the connection before the response"""
+
+
+@app.exception_handler(ClientDisconnectedException)
+async def client_disconnected_handler(
+    request: Request, exc: ClientDisconnectedException
+):
+    return Response(status_code=CLIENT_CLOSED_REQUEST)
+
+
+@app.exception_handler(DeadlineExceededException)
+async def deadline_exceeded_handler(request: Request, exc: DeadlineExceededException):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT, content={"detail": str(exc)}
+    )
+
+
+async def run_until_disconnected(request: Request, function: Callable, *args):
+    """
+    Runs the blocking backend call in a worker thread while watching the client
+    connection. When the client disconnects, the backend operations still in
+    flight are cancelled instead of running to completion.
+    """
+    scope = CancellationScope()
+    with cancellation_scope(scope):
+        work = asyncio.ensure_future(asyncio.to_thread(profiled(function), *args))
+
+    while True:
+        done, _ = await asyncio.wait({work}, timeout=DISCONNECT_POLL_INTERVAL)
+        if done:
+            timing = current_server_timing()
+            if timing is not None:
+                timing.mark_backend_done()
+            return work.result()
+        if await request.is_disconnected():
+            # the backend call fails once cancelled, nobody is waiting for it
+            work.add_done_callback(lambda task: task.exception())
+            cancelled = await asyncio.to_thread(scope.cancel)
+            CLIENT_DISCONNECTS.labels(route_name(request.scope)).inc()
+            logging.info(
+                f"Client disconnected from {request.url.path}, {cancelled} backend operation(s) cancelled"
+            )
+            raise ClientDisconnectedException()
 
 
 @app.get("/health", tags=["Health"])
@@ -53,7 +147,30 @@ async def health_check():
     )
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """
+    Metrics of the API and of its backends in the Prometheus text format.
+    """
+    return Response(content=registry.expose(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+
+class MentionedCompany(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    cnpj_completo: str
+    cnpj_completo_apenas_numeros: str
+    razao_social: Optional[str]
+    nome_fantasia: Optional[str]
+    situacao_cadastral: Optional[str]
+    uf: Optional[str]
+    municipio: Optional[str]
+    cnae: Optional[str]
+
+
 class GazetteItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     territory_id: str
     date: date
     scraped_at: datetime
@@ -64,14 +181,19 @@ class GazetteItem(BaseModel):
     edition: Optional[str]
     is_extra_edition: Optional[bool]
     txt_url: Optional[str]
+    companies: Optional[List[MentionedCompany]] = None
 
 
 class GazetteSearchResponse(BaseModel):
     total_gazettes: int
     gazettes: List[GazetteItem]
+    timed_out: Optional[bool] = None
+    partial: Optional[bool] = None
 
 
 class ThemedExcerptItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     territory_id: str
     date: date
     scraped_at: datetime
@@ -84,11 +206,14 @@ class ThemedExcerptItem(BaseModel):
     edition: Optional[str]
     is_extra_edition: Optional[bool]
     txt_url: Optional[str]
+    companies: Optional[List[MentionedCompany]] = None
 
 
 class ThemedExcerptSearchResponse(BaseModel):
     total_excerpts: int
     excerpts: List[ThemedExcerptItem]
+    timed_out: Optional[bool] = None
+    partial: Optional[bool] = None
 
 
 class ThemesSearchResponse(BaseModel):
@@ -110,6 +235,8 @@ class EntitiesSearchResponse(BaseModel):
 
 
 class Aggregates(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     territory_id: str
     state_code: str
     file_path: str
@@ -133,6 +260,8 @@ class CityLevel(str, Enum):
 
 
 class City(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     territory_id: str
     territory_name: str
     state_code: str
@@ -179,6 +308,8 @@ class CreatedSuggestionResponse(BaseModel):
 
 
 class Company(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     cnpj_basico: str
     cnpj_ordem: str
     cnpj_dv: str
@@ -222,11 +353,9 @@ class Company(BaseModel):
     cnae: Optional[str]
 
 
-class CompanySearchResponse(BaseModel):
-    cnpj_info: Company
-
-
 class Partner(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     cnpj_basico: str
     cnpj_ordem: str
     cnpj_dv: str
@@ -244,9 +373,157 @@ class Partner(BaseModel):
     faixa_etaria: Optional[str]
 
 
+class CompanySearchResponse(BaseModel):
+    cnpj_info: Company
+    total_partners: Optional[int] = None
+    partners: Optional[List[Partner]] = None
+
+
+@unique
+class CompanyInclude(str, Enum):
+    PARTNERS = "partners"
+
+
 class PartnersSearchResponse(BaseModel):
     total_partners: int
     partners: List[Partner]
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page, absent on the last page."
+    )
+
+
+class CompaniesBatchBody(BaseModel):
+    cnpjs: List[str] = Field(
+        title="CNPJs",
+        description="CNPJ numbers (may include non-digit characters). Repeated CNPJs are looked up once.",
+        min_length=1,
+        max_length=config.companies_batch_max_size,
+    )
+
+
+class CompanyLookup(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    cnpj: str
+    cnpj_info: Optional[Company]
+    error: Optional[str]
+
+
+class CompaniesBatchResponse(BaseModel):
+    companies: List[CompanyLookup]
+
+
+class PartnersLookup(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    cnpj: str
+    total_partners: int
+    partners: List[Partner]
+    error: Optional[str]
+
+
+class PartnersBatchResponse(BaseModel):
+    companies: List[PartnersLookup]
+
+
+class CompanyNameSearchItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    cnpj: str
+    cnpj_completo: str
+    razao_social: Optional[str]
+    nome_fantasia: Optional[str]
+    uf: Optional[str]
+    municipio: Optional[str]
+    score: float
+
+
+class CompanyNameSearchResponse(BaseModel):
+    companies: List[CompanyNameSearchItem]
+    next_cursor: Optional[str] = Field(
+        description="Cursor of the next page, absent on the last page."
+    )
+
+
+class PartnerCompanyItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    cnpj_basico: str
+    razao_social: Optional[str]
+    cnpj_cpf_socio: Optional[str]
+    identificador_socio: Optional[str]
+    qualificacao_socio: Optional[str]
+    data_entrada_sociedade: Optional[str]
+
+
+class PartnerCompaniesResponse(BaseModel):
+    companies: List[PartnerCompanyItem]
+    next_cursor: Optional[str] = Field(
+        description="Cursor of the next page, absent on the last page."
+    )
+
+
+class PartnerQuery(BaseModel):
+    name: Optional[str] = Field(
+        None, description="Whole name of the partner (in any case)."
+    )
+    document: Optional[str] = Field(
+        None,
+        description="Document of the partner as published: masked CPF (e.g. ***123456**) or CNPJ.",
+    )
+    cursor: Optional[str] = Field(
+        None, description="next_cursor returned with the previous page."
+    )
+
+
+class PartnersCompaniesBatchBody(BaseModel):
+    partners: List[PartnerQuery] = Field(
+        title="Partners",
+        description="Partners, each given by its name or by its document.",
+        min_length=1,
+        max_length=config.companies_batch_max_size,
+    )
+    limit: int = Field(
+        20,
+        ge=1,
+        le=COMPANY_SEARCH_MAX_LIMIT,
+        description="Number of companies to return for each partner.",
+    )
+
+
+class PartnerCompaniesLookupItem(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+    name: Optional[str]
+    document: Optional[str]
+    companies: List[PartnerCompanyItem]
+    next_cursor: Optional[str]
+    error: Optional[str]
+
+
+class PartnersCompaniesBatchResponse(BaseModel):
+    partners: List[PartnerCompaniesLookupItem]
+
+
+class CompaniesCacheInvalidationBody(BaseModel):
+    cnpjs: Optional[List[str]] = Field(
+        None,
+        title="CNPJs",
+        description="CNPJ numbers whose cached data is dropped. Without them, the whole cache is dropped.",
+    )
+
+
+class CompaniesCacheInvalidationResponse(BaseModel):
+    invalidated: int
+
+
+class CompaniesCacheStatsResponse(BaseModel):
+    enabled: bool
+    size: int = 0
+    max_size: int = 0
+    hits: int = 0
+    misses: int = 0
+    hit_ratio: Optional[float] = None
 
 
 class SpiderItem(BaseModel):
@@ -351,6 +628,46 @@ class SpiderSyncResponse(BaseModel):
     synced: int
 
 
+def _record_content(record) -> Dict:
+    """
+    Fields of a record returned by the access layers, to be encoded by
+    responses which bypass the response models
+    """
+    if isinstance(record, dict):
+        return record
+    return {field: getattr(record, field) for field in record.__slots__}
+
+
+async def _with_mentioned_companies(
+    request: Request, records: List, text: Callable[[Dict], str]
+) -> List[Dict]:
+    """
+    Content of the search results with the companies whose CNPJs are written
+    in their text, all of them looked up by a single batch
+    """
+    contents = [_record_content(record) for record in records]
+    with request_deadline(config.companies_request_timeout):
+        companies = await run_until_disconnected(
+            request,
+            app.companies.get_mentioned_companies,
+            [text(content) for content in contents],
+        )
+    return [
+        {**content, "companies": content_companies}
+        for content, content_companies in zip(contents, companies)
+    ]
+
+
+def _partial_search_fields(deadline: Deadline) -> Dict:
+    """
+    Fields flagging a search response whose results are incomplete. They are
+    left out of complete responses.
+    """
+    if not deadline.partial:
+        return {}
+    return {"timed_out": deadline.timed_out, "partial": True}
+
+
 @app.get(
     "/gazettes",
     response_model=GazetteSearchResponse,
@@ -360,6 +677,7 @@ class SpiderSyncResponse(BaseModel):
     response_model_exclude_none=True,
 )
 async def get_gazettes(
+    request: Request,
     territory_ids: List[str] = Query(
         [],
         description="Search in gazettes published by cities with the given 7-digit IBGE IDs (an empty field searches in all available cities).",
@@ -412,6 +730,10 @@ async def get_gazettes(
         SortBy.RELEVANCE,
         description="How to sort the search results.",
     ),
+    extract_cnpjs: bool = Query(
+        False,
+        description="Return with each result the companies whose CNPJs are written in its excerpts.",
+    ),
 ):
     gazette_request = GazetteRequest(
         territory_ids=territory_ids,
@@ -428,10 +750,18 @@ async def get_gazettes(
         offset=offset,
         sort_by=sort_by.value,
     )
-    gazettes_count, gazettes = app.gazettes.get_gazettes(gazette_request)
+    with request_deadline(config.gazettes_request_timeout) as deadline:
+        gazettes_count, gazettes = await run_until_disconnected(
+            request, app.gazettes.get_gazettes, gazette_request
+        )
+    if extract_cnpjs:
+        gazettes = await _with_mentioned_companies(
+            request, gazettes, lambda gazette: "\n".join(gazette["excerpts"])
+        )
     return {
         "total_gazettes": gazettes_count,
         "gazettes": gazettes,
+        **_partial_search_fields(deadline),
     }
 
 
@@ -447,6 +777,7 @@ async def get_gazettes(
     },
 )
 async def get_themed_excerpts(
+    request: Request,
     theme: str = Path(
         ...,
         description="Search in excerpts from gazettes that are associated to the given theme.",
@@ -503,6 +834,10 @@ async def get_themed_excerpts(
         SortBy.RELEVANCE,
         description="How to sort the search results.",
     ),
+    extract_cnpjs: bool = Query(
+        False,
+        description="Return with each result the companies whose CNPJs are written in its excerpt.",
+    ),
 ):
     themed_excerpt_request = ThemedExcerptRequest(
         theme=theme,
@@ -521,15 +856,27 @@ async def get_themed_excerpts(
         sort_by=sort_by.value,
     )
     try:
-        excerpts_count, excerpts = app.themed_excerpts.get_themed_excerpts(
-            themed_excerpt_request
-        )
+        with request_deadline(config.themed_excerpts_request_timeout) as deadline:
+            excerpts_count, excerpts = await run_until_disconnected(
+                request, app.themed_excerpts.get_themed_excerpts, themed_excerpt_request
+            )
+    except (
+        ClientDisconnectedException,
+        DeadlineExceededException,
+        OperationCancelledException,
+    ):
+        raise
     except Exception as exc:
         return JSONResponse(status_code=404, content={"detail": str(exc)})
 
+    if extract_cnpjs:
+        excerpts = await _with_mentioned_companies(
+            request, excerpts, lambda excerpt: excerpt["excerpt"]
+        )
     return {
         "total_excerpts": excerpts_count,
         "excerpts": excerpts,
+        **_partial_search_fields(deadline),
     }
 
 
@@ -653,52 +1000,274 @@ async def add_suggestion(response: Response, body: CreateSuggestionBody):
     return {"status": suggestion_sent.status}
 
 
+@app.get(
+    "/company/search",
+    response_model=CompanyNameSearchResponse,
+    name="Search companies by name",
+    description="Search companies whose razao_social or nome_fantasia contains words similar to the given name, most similar first (score from 0 to 1). Pages are requested with the next_cursor of the previous page.",
+    responses={
+        400: {"model": HTTPExceptionMessage, "description": "Cursor is not valid."},
+    },
+)
+async def search_companies(
+    request: Request,
+    name: str = Query(
+        ...,
+        min_length=3,
+        max_length=200,
+        description="Name (or part of the name) of the company.",
+    ),
+    uf: Optional[str] = Query(
+        None,
+        min_length=2,
+        max_length=2,
+        description="Only return companies of the given state code.",
+    ),
+    municipio: Optional[str] = Query(
+        None, description="Only return companies of the given city name."
+    ),
+    limit: int = Query(
+        20,
+        ge=1,
+        le=COMPANY_SEARCH_MAX_LIMIT,
+        description="Number of companies to return.",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page."
+    ),
+):
+    try:
+        with request_deadline(config.companies_request_timeout):
+            companies, next_cursor = await run_until_disconnected(
+                request,
+                app.companies.search_companies,
+                name,
+                uf,
+                municipio,
+                limit,
+                cursor,
+            )
+    except InvalidCursorException as exc:
+        return JSONResponse(status_code=400, content={"detail": str(exc)})
+    return {"companies": companies, "next_cursor": next_cursor}
+
+
+@app.get(
+    "/company/by_partner",
+    response_model=PartnerCompaniesResponse,
+    name="Get the companies of a partner",
+    description="Get the companies a partner is part of, given by the whole name or by the document (masked CPF or CNPJ) of the partner. Pages are requested with the next_cursor of the previous page.",
+    responses={
+        400: {
+            "model": HTTPExceptionMessage,
+            "description": "Neither or both of name and document given, or cursor is not valid.",
+        },
+    },
+)
+async def get_companies_by_partner(
+    request: Request,
+    name: Optional[str] = Query(
+        None, max_length=200, description="Whole name of the partner (in any case)."
+    ),
+    document: Optional[str] = Query(
+        None,
+        max_length=20,
+        description="Document of the partner as published: masked CPF (e.g. ***123456**) or CNPJ.",
+    ),
+    limit: int = Query(
+        20,
+        ge=1,
+        le=COMPANY_SEARCH_MAX_LIMIT,
+        description="Number of companies to return.",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page."
+    ),
+):
+    lookup = PartnerCompaniesLookup(name, document, cursor)
+    with request_deadline(config.companies_request_timeout):
+        await run_until_disconnected(
+            request, app.companies.get_companies_by_partners, [lookup], limit
+        )
+    if lookup.error is not None:
+        return JSONResponse(status_code=400, content={"detail": lookup.error})
+    return {"companies": lookup.companies, "next_cursor": lookup.next_cursor}
+
+
+@app.post(
+    "/company/by_partner/batch",
+    response_model=PartnersCompaniesBatchResponse,
+    name="Get the companies of many partners",
+    description="Get the companies of many partners at once, by a single query. Each partner gets an item with a page of its companies and the cursor of its next page, or the reason why they were not returned.",
+)
+async def get_companies_by_partners(request: Request, body: PartnersCompaniesBatchBody):
+    lookups = [
+        PartnerCompaniesLookup(partner.name, partner.document, partner.cursor)
+        for partner in body.partners
+    ]
+    with request_deadline(config.companies_request_timeout):
+        await run_until_disconnected(
+            request, app.companies.get_companies_by_partners, lookups, body.limit
+        )
+    return {"partners": lookups}
+
+
+@app.post(
+    "/company/info/batch",
+    response_model=CompaniesBatchResponse,
+    name="Get companies info by many CNPJ numbers",
+    description="Get info from many companies at once. Each distinct CNPJ gets an item with the company info or the reason why it was not returned (invalid CNPJ or company not found).",
+)
+async def get_companies(request: Request, body: CompaniesBatchBody):
+    with request_deadline(config.companies_request_timeout):
+        companies = await run_until_disconnected(
+            request, app.companies.get_companies, body.cnpjs
+        )
+    return {"companies": companies}
+
+
+@app.post(
+    "/company/partners/batch",
+    response_model=PartnersBatchResponse,
+    name="Get companies partners infos by many CNPJ numbers",
+    description="Get info of the partners of many companies at once. Each distinct CNPJ gets an item with its partners or the reason why they were not returned (invalid CNPJ).",
+)
+async def get_companies_partners(request: Request, body: CompaniesBatchBody):
+    with request_deadline(config.companies_request_timeout):
+        companies = await run_until_disconnected(
+            request, app.companies.get_companies_partners, body.cnpjs
+        )
+    return {"companies": companies}
+
+
 @app.get(
     "/company/info/{cnpj:path}",
     response_model=CompanySearchResponse,
+    response_model_exclude_unset=True,
     name="Get company info by CNPJ number",
-    description="Get info from specific company by its CNPJ number.",
+    description="Get info from specific company by its CNPJ number. With include=partners, the partners of the company are returned too, fetched by the same query.",
     responses={
         404: {"model": HTTPExceptionMessage, "description": "Company not found."},
         400: {"model": HTTPExceptionMessage, "description": "CNPJ is not valid."},
     },
 )
 async def get_company(
+    request: Request,
     cnpj: str = Path(
         ..., description="Company's CNPJ number (may include non-digit characters)."
-    )
+    ),
+    include: List[CompanyInclude] = Query(
+        [], description="Related data to be returned with the company."
+    ),
 ):
+    partners = None
     try:
-        company_info = app.companies.get_company(cnpj)
+        with request_deadline(config.companies_request_timeout):
+            if CompanyInclude.PARTNERS in include:
+                company_info, partners = await run_until_disconnected(
+                    request, app.companies.get_company_with_partners, cnpj
+                )
+            else:
+                company_info = await run_until_disconnected(
+                    request, app.companies.get_company, cnpj
+                )
     except InvalidCNPJException as exc:
         return JSONResponse(status_code=400, content={"detail": str(exc)})
 
     if company_info is None:
         return JSONResponse(status_code=404, content={"detail": "Company not found."})
 
-    return {"cnpj_info": company_info}
+    if partners is None:
+        return {"cnpj_info": company_info}
+    return {
+        "cnpj_info": company_info,
+        "total_partners": len(partners),
+        "partners": partners,
+    }
 
 
 @app.get(
     "/company/partners/{cnpj:path}",
     response_model=PartnersSearchResponse,
     name="Get company partners infos by CNPJ number",
-    description="Get info of partners of a company by its CNPJ number.",
+    description="Get info of partners of a company by its CNPJ number, a page at a time, with the total number of partners. Pages are requested with the next_cursor of the previous page.",
     responses={
-        400: {"model": HTTPExceptionMessage, "description": "CNPJ is not valid."},
+        400: {
+            "model": HTTPExceptionMessage,
+            "description": "CNPJ or cursor is not valid.",
+        },
     },
 )
 async def get_partners(
+    request: Request,
     cnpj: str = Path(
         ..., description="Company's CNPJ number (may include non-digit characters)."
-    )
+    ),
+    limit: int = Query(
+        100,
+        ge=1,
+        le=PARTNERS_PAGE_MAX_LIMIT,
+        description="Number of partners to return.",
+    ),
+    cursor: Optional[str] = Query(
+        None, description="next_cursor returned with the previous page."
+    ),
 ):
     try:
-        total_partners, partners = app.companies.get_partners(cnpj)
-    except InvalidCNPJException as exc:
+        with request_deadline(config.companies_request_timeout):
+            total_partners, partners, next_cursor = await run_until_disconnected(
+                request, app.companies.get_partners_page, cnpj, limit, cursor
+            )
+    except (InvalidCNPJException, InvalidCursorException) as exc:
         return JSONResponse(status_code=400, content={"detail": str(exc)})
 
-    return {"total_partners": total_partners, "partners": partners}
+    return {
+        "total_partners": total_partners,
+        "partners": partners,
+        "next_cursor": next_cursor,
+    }
+
+
+ADMIN_RESPONSES = {
+    401: {"model": HTTPExceptionMessage, "description": "Missing API Key."},
+    403: {"model": HTTPExceptionMessage, "description": "Invalid API Key."},
+    503: {
+        "model": HTTPExceptionMessage,
+        "description": "Admin API is not configured.",
+    },
+}
+
+
+@app.get(
+    "/company/cache",
+    response_model=CompaniesCacheStatsResponse,
+    name="Get the companies cache stats",
+    description="Get the size and hit ratio of the cache of companies and partners.",
+    dependencies=[Security(validate_admin_key)],
+    tags=["Admin"],
+    responses=ADMIN_RESPONSES,
+)
+async def get_companies_cache_stats():
+    stats = app.companies.get_cache_stats()
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+
+@app.post(
+    "/company/cache/invalidate",
+    response_model=CompaniesCacheInvalidationResponse,
+    name="Invalidate the companies cache",
+    description="Drop the cached companies and partners of the given CNPJs, or the whole cache (e.g. after loading a new dump).",
+    dependencies=[Security(validate_admin_key)],
+    tags=["Admin"],
+    responses=ADMIN_RESPONSES,
+)
+async def invalidate_companies_cache(
+    body: Optional[CompaniesCacheInvalidationBody] = None,
+):
+    cnpjs = body.cnpjs if body is not None else None
+    return {"invalidated": app.companies.invalidate_cache(cnpjs)}
 
 
 @app.get(
@@ -718,7 +1287,8 @@ async def get_aggregates(
     state_code: str = Path(..., description="City's state code."),
 ):
 
-    aggregates = app.aggregates.get_aggregates(territory_id, state_code.upper())
+    with request_deadline(config.aggregates_request_timeout):
+        aggregates = app.aggregates.get_aggregates(territory_id, state_code.upper())
 
     if not aggregates:
         return JSONResponse(
@@ -731,7 +1301,7 @@ async def get_aggregates(
         content={
             "state_code": state_code.upper(),
             "territory_id": territory_id,
-            "aggregates": aggregates,
+            "aggregates": [_record_content(aggregate) for aggregate in aggregates],
         },
     )
 
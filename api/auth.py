@@ -35,3 +35,38 @@ async def validate_api_key(api_key: str = Security(api_key_header)) -> str:
         status_code=status.HTTP_403_FORBIDDEN,
         detail="Invalid API Key.",
     )
+
+
+def is_admin_key(api_key: str) -> bool:
+    """
+    Check the given key against the keys configured in the
+    QUERIDO_DIARIO_ADMIN_API_KEYS environment variable (comma-separated list).
+    Like the scraper keys, they are loaded on every call.
+    """
+    configured_keys = [key for key in load_configuration().admin_api_keys if key]
+    if not api_key:
+        return False
+    return any(secrets.compare_digest(api_key, key) for key in configured_keys)
+
+
+async def validate_admin_key(api_key: str = Security(api_key_header)) -> str:
+    """
+    Validate the API Key sent in the X-API-Key header against the admin keys
+    (see is_admin_key).
+    """
+    if not any(load_configuration().admin_api_keys):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Admin API is not configured.",
+        )
+    if not api_key:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Missing API Key.",
+        )
+    if not is_admin_key(api_key):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid API Key.",
+        )
+    return api_key
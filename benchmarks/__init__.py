@@ -0,0 +1,3 @@
+"""
+Benchmarks of the API, runnable offline with in-memory backends.
+"""
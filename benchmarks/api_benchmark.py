@@ -0,0 +1,398 @@
+"""
+In-process benchmark of the API overhead.
+
+The app is configured through `configure_api_app` with the real access,
+gateway and query building code on top of the in-memory backends from
+`benchmarks.fakes`, and every route is driven through the ASGI interface
+(no network) at the requested concurrency. For each route it reports the
+latency percentiles, the throughput and the memory allocated per request
+(peak traced by tracemalloc while running the requests one at a time).
+
+Usage:
+
+    python -m benchmarks.api_benchmark --requests 500 --concurrency 8 --hits 10
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+import httpx
+
+from aggregates import SnapshotAggregatesAccess
+from cities import create_cities_interface
+from companies import create_companies_interface
+from gazettes import (
+    create_gazettes_data_gateway,
+    create_gazettes_interface,
+    create_gazettes_query_builder,
+)
+from scraper import create_scraper_interface
+from suggestions.service import MailjetSuggestionService
+from themed_excerpts import (
+    create_themed_excerpts_data_gateway,
+    create_themed_excerpts_interface,
+    create_themed_excerpts_query_builder,
+)
+
+from .fakes import (
+    BENCHMARK_CNPJ,
+    GAZETTES_INDEX,
+    THEME,
+    FakeAggregatesDatabase,
+    FakeCityDataGateway,
+    FakeCompaniesDatabase,
+    FakeMailjetClient,
+    FakeScraperDatabase,
+    FakeSearchEngine,
+    FakeThemesDatabaseGateway,
+)
+from .stats import LatencyRecorder, format_table
+
+BENCHMARK_API_KEY = "benchmark-api-key"
+
+
+class BenchmarkRoute:
+    def __init__(
+        self,
+        name: str,
+        method: str,
+        url: str,
+        json: Optional[Dict] = None,
+        authenticated: bool = False,
+    ):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.json = json
+        self.authenticated = authenticated
+
+    def request_kwargs(self) -> Dict:
+        kwargs = {}
+        if self.json is not None:
+            kwargs["json"] = self.json
+        if self.authenticated:
+            kwargs["headers"] = {"X-API-Key": BENCHMARK_API_KEY}
+        return kwargs
+
+
+def build_routes(territory_id: str) -> List[BenchmarkRoute]:
+    return [
+        BenchmarkRoute("health", "GET", "/health"),
+        BenchmarkRoute(
+            "gazettes",
+            "GET",
+            "/gazettes?querystring=licitação&size=10&excerpt_size=500",
+        ),
+        BenchmarkRoute(
+            "gazettes_by_theme",
+            "GET",
+            f"/gazettes/by_theme/{THEME}?querystring=resíduos&size=10",
+        ),
+        BenchmarkRoute("themes", "GET", "/gazettes/by_theme/themes/"),
+        BenchmarkRoute("subthemes", "GET", f"/gazettes/by_theme/subthemes/{THEME}"),
+        BenchmarkRoute("entities", "GET", f"/gazettes/by_theme/entities/{THEME}"),
+        BenchmarkRoute("cities", "GET", "/cities?city_name=munic"),
+        BenchmarkRoute("city", "GET", f"/cities/{territory_id}"),
+        BenchmarkRoute(
+            "suggestions",
+            "POST",
+            "/suggestions",
+            json={
+                "email_address": "benchmark@example.com",
+                "name": "Benchmark",
+                "content": "Sugestão enviada pelo benchmark",
+            },
+        ),
+        BenchmarkRoute("company_info", "GET", f"/company/info/{BENCHMARK_CNPJ}"),
+        BenchmarkRoute(
+            "company_partners", "GET", f"/company/partners/{BENCHMARK_CNPJ}"
+        ),
+        BenchmarkRoute(
+            "company_info_with_partners",
+            "GET",
+            f"/company/info/{BENCHMARK_CNPJ}?include=partners",
+        ),
+        BenchmarkRoute(
+            "company_info_batch",
+            "POST",
+            "/company/info/batch",
+            json={"cnpjs": FakeCompaniesDatabase().build_cnpjs(100)},
+        ),
+        BenchmarkRoute(
+            "company_partners_batch",
+            "POST",
+            "/company/partners/batch",
+            json={"cnpjs": FakeCompaniesDatabase().build_cnpjs(100)},
+        ),
+        BenchmarkRoute(
+            "company_search", "GET", "/company/search?name=benchmark&limit=20"
+        ),
+        BenchmarkRoute(
+            "companies_by_partners",
+            "POST",
+            "/company/by_partner/batch",
+            json={
+                "partners": [{"name": f"SOCIO {number}"} for number in range(50)]
+                + [{"document": "***123456**"}],
+                "limit": 20,
+            },
+        ),
+        BenchmarkRoute("aggregates", "GET", "/aggregates/BA?territory_id=2927408"),
+        BenchmarkRoute(
+            "scraper_spiders", "GET", "/scraper/spiders", authenticated=True
+        ),
+        BenchmarkRoute(
+            "scraper_gazettes",
+            "POST",
+            "/scraper/gazettes",
+            json={
+                "territory_id": territory_id,
+                "date": "2024-01-02",
+                "scraped_at": "2024-01-03T10:00:00",
+                "file_path": f"{territory_id}/2024-01-02/checksum.pdf",
+                "file_url": "https://example.gov.br/diario.pdf",
+                "file_checksum": "checksum",
+            },
+            authenticated=True,
+        ),
+        BenchmarkRoute(
+            "scraper_job_stats_create",
+            "POST",
+            "/scraper/job-stats",
+            json={"spider_name": "spider_1", "job_id": "job", "stats": {"items": 1}},
+            authenticated=True,
+        ),
+        BenchmarkRoute(
+            "scraper_job_stats", "GET", "/scraper/job-stats", authenticated=True
+        ),
+        BenchmarkRoute(
+            "scraper_spiders_sync",
+            "POST",
+            "/scraper/spiders/sync",
+            json={
+                "spiders": [
+                    {
+                        "spider_name": "spider_1",
+                        "territory_id": territory_id,
+                        "date_from": "2010-01-01",
+                    }
+                ]
+            },
+            authenticated=True,
+        ),
+    ]
+
+
+def build_benchmark_app(
+    hits: int = 10,
+    excerpt_size: int = 500,
+    number_of_excerpts: int = 1,
+    partners: int = 10,
+    cities: int = 5570,
+):
+    """
+    Configures the API app with the in-memory backends. Returns the app and
+    a territory id known by the cities gateway.
+    """
+    from api import app, configure_api_app
+
+    os.environ["QUERIDO_DIARIO_SCRAPER_API_KEYS"] = BENCHMARK_API_KEY
+
+    search_engine = FakeSearchEngine(hits, excerpt_size, number_of_excerpts)
+    gazettes_query_builder = create_gazettes_query_builder(
+        "source_text", ".exact", "date", "scraped_at", "territory_id"
+    )
+    themed_excerpts_query_builder = create_themed_excerpts_query_builder(
+        "excerpt",
+        ".exact",
+        "source_date",
+        "source_scraped_at",
+        "source_territory_id",
+        "excerpt_entities",
+        "excerpt_subthemes",
+        "excerpt_embedding_score",
+        "excerpt_tfidf_score",
+        excerpt_size,
+        number_of_excerpts,
+    )
+    cities_gateway = FakeCityDataGateway(cities)
+    configure_api_app(
+        create_gazettes_interface(
+            create_gazettes_data_gateway(
+                search_engine, gazettes_query_builder, GAZETTES_INDEX
+            )
+        ),
+        create_themed_excerpts_interface(
+            create_themed_excerpts_data_gateway(
+                search_engine, themed_excerpts_query_builder
+            ),
+            FakeThemesDatabaseGateway(),
+        ),
+        create_cities_interface(cities_gateway),
+        MailjetSuggestionService(
+            FakeMailjetClient(),
+            "Querido Diário",
+            "sender@example.com",
+            "Querido Diário",
+            "recipient@example.com",
+            "benchmark",
+        ),
+        create_companies_interface(FakeCompaniesDatabase(partners)),
+        _aggregates_snapshot(FakeAggregatesDatabase()),
+        create_scraper_interface(FakeScraperDatabase()),
+    )
+    return app, cities_gateway.any_territory_id()
+
+
+def _aggregates_snapshot(database: FakeAggregatesDatabase) -> SnapshotAggregatesAccess:
+    """
+    Aggregates served from a snapshot, as configured by default, loaded once
+    instead of by a background thread
+    """
+    aggregates = SnapshotAggregatesAccess(database, refresh_interval=300)
+    aggregates.refresh()
+    return aggregates
+
+
+async def _send(client: httpx.AsyncClient, route: BenchmarkRoute) -> int:
+    response = await client.request(route.method, route.url, **route.request_kwargs())
+    return response.status_code
+
+
+async def run_route(
+    client: httpx.AsyncClient,
+    route: BenchmarkRoute,
+    requests: int,
+    concurrency: int,
+) -> Dict:
+    recorder = LatencyRecorder()
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            start = time.perf_counter()
+            try:
+                status_code = await _send(client, route)
+            except Exception:
+                status_code = 0
+            recorder.record(time.perf_counter() - start, status_code)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder.summary(time.perf_counter() - start)
+
+
+async def measure_allocations(
+    client: httpx.AsyncClient, route: BenchmarkRoute, requests: int
+) -> float:
+    """
+    Mean peak of memory (in KiB) allocated while serving one request
+    """
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(requests):
+            baseline, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await _send(client, route)
+            _, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - baseline)
+    finally:
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks) / 1024 if peaks else 0.0
+
+
+async def run_benchmark(
+    app,
+    routes: List[BenchmarkRoute],
+    requests: int = 200,
+    concurrency: int = 8,
+    warmup: int = 10,
+    allocation_requests: int = 20,
+) -> List[Dict]:
+    transport = httpx.ASGITransport(app=app)
+    results = []
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://benchmark"
+    ) as client:
+        for route in routes:
+            for _ in range(warmup):
+                await _send(client, route)
+            summary = await run_route(client, route, requests, concurrency)
+            summary["alloc_kib"] = await measure_allocations(
+                client, route, allocation_requests
+            )
+            results.append({"route": route.name, **summary})
+    return results
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--requests", type=int, default=200, help="per route")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10, help="per route")
+    parser.add_argument(
+        "--allocation-requests",
+        type=int,
+        default=20,
+        help="requests per route traced to measure allocations",
+    )
+    parser.add_argument("--hits", type=int, default=10, help="hits per search")
+    parser.add_argument("--excerpt-size", type=int, default=500)
+    parser.add_argument("--number-of-excerpts", type=int, default=1)
+    parser.add_argument("--partners", type=int, default=10)
+    parser.add_argument(
+        "--routes", nargs="*", default=None, help="only run the given routes"
+    )
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    app, territory_id = build_benchmark_app(
+        args.hits, args.excerpt_size, args.number_of_excerpts, args.partners
+    )
+    routes = build_routes(territory_id)
+    if args.routes:
+        routes = [route for route in routes if route.name in args.routes]
+    results = asyncio.run(
+        run_benchmark(
+            app,
+            routes,
+            args.requests,
+            args.concurrency,
+            args.warmup,
+            args.allocation_requests,
+        )
+    )
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(
+            format_table(
+                results,
+                [
+                    "route",
+                    "requests",
+                    "errors",
+                    "throughput",
+                    "p50_ms",
+                    "p95_ms",
+                    "p99_ms",
+                    "alloc_kib",
+                ],
+            )
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,481 @@
+"""
+Deterministic in-memory backends used to measure the API without OpenSearch
+and PostgreSQL.
+
+The search engine answers with hits shaped like the real indexes, serialized
+and decoded again on every search like the OpenSearch client does. The
+PostgreSQL gateways keep their real row formatting and only replace the
+statements by canned rows, chosen by the statement name.
+"""
+
+import json
+import random
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from cities.city_access import CityDataGateway, CitySearchResult, OpennessLevel
+from companies.cnpj import check_digits
+from database.postgresql import (
+    COMPANY_FIELDS,
+    PARTNER_FIELDS,
+    PARTNER_ID_COLUMN,
+    PostgreSQLDatabaseAggregates,
+    PostgreSQLDatabaseCompanies,
+)
+from database.postgresql_scraper import PostgreSQLDatabaseScraper
+from index import SearchEngineInterface
+from index.opensearch import create_serializer
+from themed_excerpts.themed_excerpt_access import ThemesDatabaseGateway
+
+GAZETTES_INDEX = "querido-diario"
+THEME = "ambiental"
+THEME_INDEX = "querido-diario-ambiental"
+SUBTHEMES = [
+    "Área de preservação",
+    "Licenciamento ambiental",
+    "Queimadas",
+    "Resíduos sólidos",
+]
+
+WORDS = (
+    "prefeitura municipal decreto portaria licitação contrato aditivo "
+    "secretaria saúde educação obras pregão eletrônico empresa valor global "
+    "nomeação exoneração servidor cargo comissão extrato dispensa inexigibilidade "
+    "meio ambiente licença ambiental resíduos sólidos coleta limpeza urbana "
+    "convênio termo fomento câmara vereadores lei orçamentária diário oficial"
+).split()
+
+STATES = ["BA", "MG", "RJ", "SC", "SP", "RS", "PE", "CE", "PA", "GO"]
+
+BENCHMARK_CNPJ = "00.000.000/0001-91"
+
+
+def _text(rng: random.Random, size: int) -> str:
+    words = []
+    length = 0
+    while length < size:
+        word = rng.choice(WORDS)
+        words.append(word)
+        length += len(word) + 1
+    return " ".join(words)[:size]
+
+
+def _territory(rng: random.Random) -> Tuple[str, str, str]:
+    state_code = rng.choice(STATES)
+    territory_id = f"{STATES.index(state_code) + 21}{rng.randrange(10000, 99999)}"
+    return territory_id, f"Município {territory_id[-4:]}", state_code
+
+
+def _dates(rng: random.Random) -> Tuple[str, str]:
+    published = date(2015, 1, 1) + timedelta(days=rng.randrange(3650))
+    scraped = datetime.combine(published, datetime.min.time()) + timedelta(
+        days=rng.randrange(1, 30), seconds=rng.randrange(86400)
+    )
+    return published.isoformat(), scraped.isoformat()
+
+
+def build_gazette_hits(
+    count: int, excerpt_size: int, number_of_excerpts: int, seed: int = 0
+) -> List[Dict]:
+    rng = random.Random(seed)
+    hits = []
+    for position in range(count):
+        territory_id, territory_name, state_code = _territory(rng)
+        published, scraped = _dates(rng)
+        checksum = f"{rng.getrandbits(128):032x}"
+        path = f"{territory_id}/{published}/{checksum}"
+        hits.append(
+            {
+                "_index": GAZETTES_INDEX,
+                "_id": checksum,
+                "_score": 10.0 - position / count,
+                "_source": {
+                    "territory_id": territory_id,
+                    "territory_name": territory_name,
+                    "state_code": state_code,
+                    "date": published,
+                    "scraped_at": scraped,
+                    "url": f"{path}.pdf",
+                    "file_raw_txt": f"{path}.txt",
+                    "file_checksum": checksum,
+                    "edition_number": str(rng.randrange(1, 5000)),
+                    "is_extra_edition": rng.random() < 0.1,
+                },
+                "highlight": {
+                    "source_text": [
+                        _text(rng, excerpt_size) for _ in range(number_of_excerpts)
+                    ]
+                },
+            }
+        )
+    return hits
+
+
+def build_themed_excerpt_hits(
+    count: int, excerpt_size: int, seed: int = 0
+) -> List[Dict]:
+    rng = random.Random(seed)
+    hits = []
+    for position in range(count):
+        territory_id, territory_name, state_code = _territory(rng)
+        published, scraped = _dates(rng)
+        checksum = f"{rng.getrandbits(128):032x}"
+        path = f"{territory_id}/{published}/{checksum}"
+        excerpt = _text(rng, excerpt_size)
+        hits.append(
+            {
+                "_index": THEME_INDEX,
+                "_id": f"{checksum}-{position}",
+                "_score": 10.0 - position / count,
+                "_source": {
+                    "excerpt_id": f"{checksum}-{position}",
+                    "excerpt": excerpt,
+                    "excerpt_subthemes": rng.sample(SUBTHEMES, 2),
+                    "excerpt_entities": [],
+                    "source_territory_id": territory_id,
+                    "source_territory_name": territory_name,
+                    "source_state_code": state_code,
+                    "source_date": published,
+                    "source_scraped_at": scraped,
+                    "source_url": f"{path}.pdf",
+                    "source_file_raw_txt": f"{path}.txt",
+                    "source_edition_number": str(rng.randrange(1, 5000)),
+                    "source_is_extra_edition": False,
+                },
+                "highlight": {"excerpt": [excerpt]},
+            }
+        )
+    return hits
+
+
+class FakeSearchEngine(SearchEngineInterface):
+    """
+    Search engine answering every search with the same hits: gazettes for the
+    gazettes index and themed excerpts for any other index
+    """
+
+    def __init__(
+        self,
+        hits: int = 10,
+        excerpt_size: int = 500,
+        number_of_excerpts: int = 1,
+        total: int = 12345,
+        serializer: str = "auto",
+    ):
+        self._serializer = create_serializer(serializer)
+        self._gazettes_response = self._serialize(
+            build_gazette_hits(hits, excerpt_size, number_of_excerpts), total
+        )
+        self._excerpts_response = self._serialize(
+            build_themed_excerpt_hits(hits, excerpt_size), total
+        )
+
+    def search(self, query: Dict, index: str = "", timeout: int = 30) -> Dict:
+        if index == GAZETTES_INDEX:
+            return self._serializer.loads(self._gazettes_response)
+        return self._serializer.loads(self._excerpts_response)
+
+    def index_exists(self, index: str) -> bool:
+        return True
+
+    def _serialize(self, hits: List[Dict], total: int) -> str:
+        return json.dumps(
+            {
+                "took": 5,
+                "timed_out": False,
+                "_shards": {"total": 1, "successful": 1, "skipped": 0, "failed": 0},
+                "hits": {
+                    "total": {"value": total, "relation": "eq"},
+                    "max_score": 10.0,
+                    "hits": hits,
+                },
+            }
+        )
+
+
+class FakeCityDataGateway(CityDataGateway):
+    def __init__(self, cities: int = 5570, seed: int = 0):
+        rng = random.Random(seed)
+        self._cities = []
+        for _ in range(cities):
+            territory_id, territory_name, state_code = _territory(rng)
+            self._cities.append(
+                CitySearchResult(
+                    territory_name,
+                    territory_id,
+                    state_code,
+                    OpennessLevel(str(rng.randrange(4))),
+                    [f"https://{territory_id}.example.gov.br/diario"],
+                    _dates(rng)[0],
+                )
+            )
+        self._by_id = {city.territory_id: city for city in self._cities}
+
+    def get_cities(self, city_name: str, levels: List[str]):
+        return [
+            city
+            for city in self._cities
+            if city_name.lower() in city.territory_name.lower()
+            and (levels == [""] or levels == [] or city.level in levels)
+        ]
+
+    def get_city(self, territory_id: str):
+        return self._by_id.get(territory_id)
+
+    def any_territory_id(self) -> str:
+        return self._cities[0].territory_id
+
+
+class FakeThemesDatabaseGateway(ThemesDatabaseGateway):
+    def get_available_themes(self):
+        return [THEME]
+
+    def get_theme_index(self, theme: str):
+        return THEME_INDEX if theme == THEME else None
+
+    def get_available_subthemes(self, theme: str):
+        return SUBTHEMES if theme == THEME else None
+
+    def get_available_entities(self, theme: str):
+        if theme != THEME:
+            return None
+        return [
+            {
+                "entity_type": "orgaos",
+                "entity_type_description": "Órgãos públicos",
+                "entities": ["Secretaria de Meio Ambiente", "IBAMA"],
+            }
+        ]
+
+
+def _company_row(rng: random.Random) -> Tuple:
+    values = [
+        "00000000",
+        "0001",
+        "91",
+        None,
+        "1",
+        "EMPRESA BENCHMARK",
+        "2",
+        "2005-11-03",
+        "0",
+        None,
+        "1966-08-01",
+        "6422100,6499999",
+        "SETOR",
+        "BANCARIO SUL QUADRA 1 BLOCO C",
+        "1",
+        None,
+        "ASA SUL",
+        "70073901",
+        "DF",
+        "6134939002",
+        None,
+        None,
+        "contato@empresa.example.com",
+        None,
+        None,
+        "BANCO BENCHMARK S.A.",
+        "2038",
+        "10",
+        f"{rng.randrange(10**6, 10**9)}.00",
+        "5",
+        None,
+        "N",
+        None,
+        None,
+        "N",
+        None,
+        None,
+        "6422100",
+        None,
+        "BRASILIA",
+    ]
+    return tuple(values)
+
+
+def _partner_row(rng: random.Random, position: int) -> Tuple:
+    return (
+        position,
+        "00000000",
+        "2",
+        f"SOCIO BENCHMARK {position}",
+        f"***{rng.randrange(100000, 999999)}**",
+        "10",
+        "2010-01-01",
+        None,
+        "***000000**",
+        None,
+        "00",
+        "5",
+    )
+
+
+class FakeCompaniesDatabase(PostgreSQLDatabaseCompanies):
+    # the views start with the CNPJ columns, followed by a column per field
+    # in the order of the fields, so the statements select the rows without
+    # their leading CNPJ columns
+    COLUMNS = {
+        "resposta_cnpj": [
+            "estabelecimento_cnpj_basico",
+            "estabelecimento_cnpj_ordem",
+            "estabelecimento_cnpj_dv",
+            "empresa_cnpj_basico",
+        ]
+        + [column for _, column in COMPANY_FIELDS],
+        "resposta_socios": [PARTNER_ID_COLUMN, "cnpj_basico"]
+        + [column for _, column in PARTNER_FIELDS],
+    }
+
+    def __init__(self, partners: int = 10, seed: int = 0):
+        super().__init__("localhost", "benchmark", "benchmark", "benchmark", 5432)
+        rng = random.Random(seed)
+        self._rows = {
+            "get_company": [_company_row(rng)[4:]],
+            "get_partners": [_partner_row(rng, i)[2:] for i in range(partners)],
+        }
+
+    def _describe(self, relation: str) -> List[str]:
+        return self.COLUMNS[relation]
+
+    def _select(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> Iterable[Tuple]:
+        if statement_name == "get_company_with_partners":
+            (company,) = self._rows["get_company"]
+            partners = [list(partner) for partner in self._rows["get_partners"]]
+            return iter([company + (partners,)])
+        # the batch statements answer every requested CNPJ with the same rows
+        if statement_name == "get_companies":
+            (company,) = self._rows["get_company"]
+            return iter([(cnpj,) + company for cnpj in data["cnpj"]])
+        if statement_name == "search_companies":
+            cnpjs = self.build_cnpjs(data["limit"])
+            return iter(
+                [
+                    (cnpj, f"EMPRESA BENCHMARK {cnpj}", None, "DF", "BRASILIA", 0.9)
+                    for cnpj in cnpjs
+                ]
+            )
+        if statement_name in ("get_partners_page", "get_partners_page_after"):
+            partners = self._rows["get_partners"]
+            return iter(
+                [
+                    (len(partners),)
+                    + tuple(str(value or "") for value in partner[1:5])
+                    + (str(position),)
+                    + partner
+                    for position, partner in enumerate(partners[: data["limit"]])
+                ]
+            )
+        if statement_name == "get_companies_by_partners":
+            return iter(
+                [
+                    (
+                        kind,
+                        position,
+                        f"{number:08d}",
+                        value,
+                        "***123456**",
+                        "2",
+                        "49",
+                        None,
+                    )
+                    for kind in ("name", "document")
+                    for position, value in enumerate(data[kind], 1)
+                    for number in range(data["limit"])
+                ]
+            )
+        if statement_name == "get_companies_partners":
+            return iter(
+                [
+                    (cnpj_basico,) + partner
+                    for cnpj_basico in data["cnpj_basico"]
+                    for partner in self._rows["get_partners"]
+                ]
+            )
+        return iter(self._rows.get(statement_name, []))
+
+    def build_cnpjs(self, count: int) -> List[str]:
+        """
+        Distinct valid CNPJs, as the batch endpoints receive them
+        """
+        cnpjs = []
+        for number in range(count):
+            cnpj_without_dv = f"{number:08d}0001"
+            cnpjs.append(cnpj_without_dv + check_digits(cnpj_without_dv))
+        return cnpjs
+
+
+class FakeAggregatesDatabase(PostgreSQLDatabaseAggregates):
+    def __init__(self, years: int = 5):
+        super().__init__("localhost", "benchmark", "benchmark", "benchmark", 5432)
+        self._rows = [
+            (
+                position,
+                "2927408",
+                "BA",
+                str(2024 - position),
+                f"aggregates/BA/2927408_{2024 - position}.zip",
+                "12.5",
+                f"{position:064x}",
+                "2024-12-31 00:00:00",
+            )
+            for position in range(years)
+        ]
+
+    def _select(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> Iterable[Tuple]:
+        return iter(self._rows)
+
+
+class FakeScraperDatabase(PostgreSQLDatabaseScraper):
+    def __init__(self, spiders: int = 50, job_stats: int = 100):
+        super().__init__("localhost", "benchmark", "benchmark", "benchmark", 5432)
+        self._job_stats_table_ready = True
+        created_at = datetime(2024, 1, 1, 12, 0, 0)
+        self._rows = {
+            "get_enabled_spiders": [
+                (f"spider_{position}", date(2010, 1, 1), None)
+                for position in range(spiders)
+            ],
+            "get_job_stats": [
+                (
+                    position,
+                    f"spider_{position % spiders}",
+                    f"job-{position}",
+                    {"item_scraped_count": position, "finish_reason": "finished"},
+                    created_at,
+                )
+                for position in range(job_stats)
+            ],
+        }
+
+    def _select(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> Iterable[Tuple]:
+        return iter(self._rows.get(statement_name, []))
+
+    def _execute(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> List[Tuple]:
+        return [(1,)]
+
+
+class FakeMailjetClient:
+    """
+    Mailjet client accepting every message without sending it
+    """
+
+    class _Result:
+        status_code = 200
+
+        def json(self):
+            return {"Messages": [{"Status": "success"}]}
+
+    class _Send:
+        def create(self, data):
+            return FakeMailjetClient._Result()
+
+    send = _Send()
@@ -0,0 +1,395 @@
+"""
+Micro-benchmarks of the pure-Python work done per request and per hit, with
+a regression gate against stored baselines.
+
+Each benchmark is timed with timeit (best of several repeats), interleaved
+with a fixed calibration workload. Timings are stored relative to the
+calibration measured next to them, so baselines recorded on one machine can
+be compared on another and a noisy neighbour slows both sides of the ratio:
+the gate compares the relative timings and fails when any benchmark got
+slower than the threshold allows.
+
+Usage:
+
+    python -m benchmarks.micro             # compare with the stored baselines
+    python -m benchmarks.micro --save      # record new baselines
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import tempfile
+import timeit
+from datetime import date
+from typing import Callable, Dict, List, Optional, Tuple
+
+from cities.city_access import CitiesCSVDatabaseGateway
+from companies import create_companies_interface
+from companies import cnpj
+from gazettes.gazette_access import GazetteSearchEngineGateway
+from gazettes import create_gazettes_query_builder
+from index.opensearch import create_serializer
+from themed_excerpts import create_themed_excerpts_query_builder
+from themed_excerpts.themed_excerpt_access import ThemedExcerptSearchEngineGateway
+from utils import FileUrlBuilder, build_file_url
+
+from .fakes import (
+    GAZETTES_INDEX,
+    THEME,
+    FakeCityDataGateway,
+    FakeCompaniesDatabase,
+    FakeSearchEngine,
+    build_gazette_hits,
+    build_themed_excerpt_hits,
+)
+from .stats import format_table
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), "baselines.json")
+DEFAULT_THRESHOLD = 0.25
+
+MICRO_BENCHMARKS: Dict[str, Callable[[], Callable[[], object]]] = {}
+
+
+def micro_benchmark(setup: Callable[[], Callable[[], object]]):
+    """
+    Registers a benchmark. The decorated function prepares the data and
+    returns the function to be timed.
+    """
+    MICRO_BENCHMARKS[setup.__name__] = setup
+    return setup
+
+
+def _calibration():
+    total = 0
+    values = {}
+    for number in range(1000):
+        total += number * 2
+        values[number % 64] = str(total)
+    return values
+
+
+def _gazette_query_builder():
+    return create_gazettes_query_builder(
+        "source_text", ".exact", "date", "scraped_at", "territory_id"
+    )
+
+
+@micro_benchmark
+def gazette_build_query():
+    builder = _gazette_query_builder()
+    return lambda: builder.build_query(
+        territory_ids=["3304557", "4205902"],
+        published_since=date(2020, 1, 1),
+        published_until=date(2024, 12, 31),
+        scraped_since=None,
+        scraped_until=None,
+        querystring='"licitação" + obras -"dispensa"',
+        excerpt_size=500,
+        number_of_excerpts=1,
+        pre_tags=["<b>"],
+        post_tags=["</b>"],
+        size=10,
+        offset=0,
+        sort_by="relevance",
+    )
+
+
+@micro_benchmark
+def themed_excerpt_build_query():
+    builder = create_themed_excerpts_query_builder(
+        "excerpt",
+        ".exact",
+        "source_date",
+        "source_scraped_at",
+        "source_territory_id",
+        "excerpt_entities",
+        "excerpt_subthemes",
+        "excerpt_embedding_score",
+        "excerpt_tfidf_score",
+        500,
+        1,
+    )
+    return lambda: builder.build_query(
+        entities=["IBAMA"],
+        subthemes=["Queimadas"],
+        territory_ids=["3304557"],
+        published_since=date(2020, 1, 1),
+        published_until=None,
+        scraped_since=None,
+        scraped_until=None,
+        querystring="queimada",
+        pre_tags=["<b>"],
+        post_tags=["</b>"],
+        size=10,
+        offset=0,
+        sort_by="relevance",
+    )
+
+
+@micro_benchmark
+def assemble_gazette_object():
+    gateway = GazetteSearchEngineGateway(
+        FakeSearchEngine(hits=1), _gazette_query_builder(), GAZETTES_INDEX
+    )
+    (hit,) = build_gazette_hits(1, 500, 1)
+    return lambda: gateway._assemble_gazette_object(hit)
+
+
+def _search_response_body(hits: int = 100) -> str:
+    # the size=100 responses with big highlights whose decoding dominates
+    return FakeSearchEngine(hits, 500, 3)._gazettes_response
+
+
+@micro_benchmark
+def decode_search_response_json():
+    serializer = create_serializer("json")
+    body = _search_response_body()
+    return lambda: serializer.loads(body)
+
+
+@micro_benchmark
+def decode_search_response_orjson():
+    serializer = create_serializer("orjson")
+    body = _search_response_body()
+    return lambda: serializer.loads(body)
+
+
+@micro_benchmark
+def create_gazette_objects_100_hits():
+    gateway = GazetteSearchEngineGateway(
+        FakeSearchEngine(hits=1),
+        _gazette_query_builder(),
+        GAZETTES_INDEX,
+        FileUrlBuilder("https://data.queridodiario.ok.org.br", True),
+    )
+    hits = build_gazette_hits(100, 500, 3)
+    return lambda: gateway.create_list_with_gazette_objects(hits)
+
+
+@micro_benchmark
+def assemble_themed_excerpt_object():
+    gateway = ThemedExcerptSearchEngineGateway(FakeSearchEngine(hits=1), None)
+    (hit,) = build_themed_excerpt_hits(1, 500)
+    return lambda: gateway._assemble_themed_excerpt_object(hit, THEME)
+
+
+def _configure_files_endpoint():
+    os.environ["QUERIDO_DIARIO_FILES_ENDPOINT"] = "https://data.queridodiario.ok.org.br"
+    os.environ["REPLACE_FILE_URL_BASE"] = "true"
+
+
+@micro_benchmark
+def build_file_url_relative_path():
+    _configure_files_endpoint()
+    return lambda: build_file_url("3304557/2024-01-02/checksum.pdf")
+
+
+@micro_benchmark
+def build_file_url_legacy_url():
+    _configure_files_endpoint()
+    return lambda: build_file_url(
+        "https://querido-diario.nyc3.cdn.digitaloceanspaces.com/3304557/file.pdf"
+    )
+
+
+@micro_benchmark
+def file_url_builder_hit_urls():
+    builder = FileUrlBuilder("https://data.queridodiario.ok.org.br", True)
+    hits = build_gazette_hits(10, 500, 1)
+    return lambda: builder.build_hit_urls(hits, "url", "file_raw_txt")
+
+
+@micro_benchmark
+def is_valid_cnpj():
+    return lambda: cnpj.is_valid_cnpj("00.000.000/0001-91")
+
+
+@micro_benchmark
+def format_full_cnpj():
+    return lambda: cnpj.format_cnpj("191")
+
+
+@micro_benchmark
+def parse_cnpjs_batch_1000():
+    cnpjs = FakeCompaniesDatabase().build_cnpjs(1000)
+    return lambda: cnpj.parse_cnpjs(cnpjs)
+
+
+@micro_benchmark
+def find_cnpjs_in_excerpt():
+    excerpt = "x" * 400 + " CNPJ 00.000.000/0001-91, processo 12345678901234567 "
+    return lambda: cnpj.find_cnpjs(excerpt)
+
+
+@micro_benchmark
+def format_company_row():
+    database = FakeCompaniesDatabase()
+    (row,) = database._rows["get_company"]
+    return lambda: database._format_company_data(row, "00000000000191")
+
+
+@micro_benchmark
+def cached_company_lookup():
+    companies = create_companies_interface(
+        FakeCompaniesDatabase(), cache_size=100, cache_ttl=3600
+    )
+    companies.get_company("00000000000191")
+    return lambda: companies.get_company("00.000.000/0001-91")
+
+
+@micro_benchmark
+def format_partners_10_rows():
+    database = FakeCompaniesDatabase(partners=10)
+    rows = database._rows["get_partners"]
+    return lambda: database._format_partners(rows, "00000000000191")
+
+
+def _write_cities_csv(path: str) -> str:
+    cities = FakeCityDataGateway(cities=5570)._cities
+    with open(path, "w", newline="") as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(
+            [
+                "city_name",
+                "ibge_id",
+                "uf",
+                "openness_level",
+                "gazettes_urls",
+                "availability_date",
+            ]
+        )
+        for city in cities:
+            writer.writerow(
+                [
+                    city.territory_name,
+                    city.territory_id,
+                    city.state_code,
+                    city.level.value,
+                    ",".join(city.publication_urls),
+                    city.availability_date,
+                ]
+            )
+    return cities[-1].territory_id
+
+
+@micro_benchmark
+def city_csv_scan():
+    path = os.path.join(tempfile.mkdtemp(), "censo.csv")
+    last_territory_id = _write_cities_csv(path)
+    gateway = CitiesCSVDatabaseGateway(path)
+    return lambda: gateway.get_city(last_territory_id)
+
+
+def time_function(
+    function: Callable[[], object], repeat: int = 5
+) -> Tuple[float, float]:
+    """
+    Best time (in nanoseconds) of one call of the function and of the
+    calibration workload, timed alternately
+    """
+    timer = timeit.Timer(function)
+    calibration_timer = timeit.Timer(_calibration)
+    number, _ = timer.autorange()
+    calibration_number, _ = calibration_timer.autorange()
+    best = best_calibration = float("inf")
+    for _ in range(repeat):
+        best = min(best, timer.timeit(number) / number)
+        best_calibration = min(
+            best_calibration,
+            calibration_timer.timeit(calibration_number) / calibration_number,
+        )
+    return best * 1e9, best_calibration * 1e9
+
+
+def run_micro_benchmarks(names: Optional[List[str]] = None, repeat: int = 7) -> Dict:
+    results = {}
+    for name, setup in MICRO_BENCHMARKS.items():
+        if names and name not in names:
+            continue
+        ns_per_call, calibration_ns = time_function(setup(), repeat)
+        results[name] = {
+            "ns_per_call": ns_per_call,
+            "relative": ns_per_call / calibration_ns,
+        }
+    return {"benchmarks": results}
+
+
+def compare(
+    results: Dict, baselines: Dict, threshold: float = DEFAULT_THRESHOLD
+) -> Tuple[List[Dict], List[str]]:
+    """
+    Compares the relative timings with the baselines. Returns a row per
+    benchmark and the names of the ones which regressed beyond the threshold.
+    """
+    rows = []
+    regressions = []
+    for name, result in results["benchmarks"].items():
+        baseline = baselines.get("benchmarks", {}).get(name)
+        row = {"benchmark": name, "ns_per_call": result["ns_per_call"]}
+        if baseline is None:
+            row["change"] = "new"
+        else:
+            change = result["relative"] / baseline["relative"] - 1
+            row["change"] = f"{change:+.1%}"
+            if change > threshold:
+                regressions.append(name)
+                row["change"] += " REGRESSION"
+        rows.append(row)
+    return rows, regressions
+
+
+def load_baselines(path: str = BASELINES_FILE) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as baselines_file:
+        return json.load(baselines_file)
+
+
+def save_baselines(results: Dict, path: str = BASELINES_FILE) -> None:
+    with open(path, "w") as baselines_file:
+        json.dump(results, baselines_file, indent=2, sort_keys=True)
+        baselines_file.write("\n")
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--save", action="store_true", help="record new baselines")
+    parser.add_argument("--baselines", default=BASELINES_FILE)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="maximum slowdown allowed (0.25 means 25%%)",
+    )
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--only", nargs="*", default=None)
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None) -> int:
+    args = parse_arguments(arguments)
+    results = run_micro_benchmarks(args.only, args.repeat)
+    if args.save:
+        save_baselines(results, args.baselines)
+        print(f"Baselines saved to {args.baselines}")
+        return 0
+
+    baselines = load_baselines(args.baselines)
+    rows, regressions = compare(results, baselines, args.threshold)
+    if regressions:
+        # A single noisy measurement should not fail the gate: the
+        # regressions are confirmed by timing them again
+        rerun = run_micro_benchmarks(regressions, args.repeat)
+        results["benchmarks"].update(rerun["benchmarks"])
+        rows, regressions = compare(results, baselines, args.threshold)
+    print(format_table(rows, ["benchmark", "ns_per_call", "change"]))
+    if regressions:
+        print(f"\nRegressions beyond {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
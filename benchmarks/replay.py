@@ -0,0 +1,332 @@
+"""
+Replays the gazettes, themed excerpts, cities and companies requests found in
+access logs against an API instance.
+
+Two log formats are read, one request per line:
+
+- uvicorn access logs, optionally prefixed by a timestamp
+  (`2024-01-02 10:00:00,123 INFO: 10.0.0.1:4242 - "GET /gazettes?... HTTP/1.1" 200`);
+- NDJSON request logs with the `method`, `path` (or `url`), `query_string`,
+  `status` and `timestamp` (ISO 8601 or seconds since the epoch) keys.
+
+The requests are sent at the original rate (the intervals between them in
+the log), scaled by a speed factor or as fast as the concurrency allows. By
+default they are served in-process by the app with the in-memory backends of
+`benchmarks.fakes`; `--target` sends them to a running instance instead (see
+`python -m benchmarks.serve` to start one with the same backends).
+
+Usage:
+
+    python -m benchmarks.replay access.log --mode scaled --speed 10 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import httpx
+
+from .api_benchmark import build_benchmark_app
+from .stats import LatencyRecorder, format_table, percentile
+
+REPLAY_MODES = ["original", "scaled", "max"]
+REPLAYED_METHODS = {"GET", "HEAD"}
+
+REPLAY_ROUTES = [
+    ("themes", re.compile(r"^/gazettes/by_theme/themes/?$")),
+    ("subthemes", re.compile(r"^/gazettes/by_theme/subthemes/[^/]+/?$")),
+    ("entities", re.compile(r"^/gazettes/by_theme/entities/[^/]+/?$")),
+    ("gazettes_by_theme", re.compile(r"^/gazettes/by_theme/[^/]+/?$")),
+    ("gazettes", re.compile(r"^/gazettes/?$")),
+    ("cities", re.compile(r"^/cities/?$")),
+    ("city", re.compile(r"^/cities/[^/]+/?$")),
+    ("company_info", re.compile(r"^/company/info/.+$")),
+    ("company_partners", re.compile(r"^/company/partners/.+$")),
+    ("company", re.compile(r"^/company/.+$")),
+]
+
+ACCESS_LOG_LINE = re.compile(
+    r"^(?:(?P<timestamp>\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?)\S*\s+)?"
+    r'.*?"(?P<method>[A-Z]+) (?P<target>\S+) HTTP/[\d.]+"\s+(?P<status>\d{3})'
+)
+
+
+class ReplayRequest:
+    def __init__(
+        self,
+        method: str,
+        target: str,
+        route: str,
+        timestamp: Optional[float] = None,
+        status_code: Optional[int] = None,
+    ):
+        self.method = method
+        self.target = target
+        self.route = route
+        self.timestamp = timestamp
+        self.status_code = status_code
+
+
+def route_for(target: str) -> Optional[str]:
+    """
+    Name of the replayed route matching the request target, or None if the
+    request does not belong to a replayed route
+    """
+    path = target.split("?", 1)[0]
+    for name, pattern in REPLAY_ROUTES:
+        if pattern.match(path):
+            return name
+    return None
+
+
+def _parse_timestamp(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = value.replace(",", ".")
+    if value.endswith("Z"):
+        value = value[:-1] + "+00:00"
+    return datetime.fromisoformat(value).timestamp()
+
+
+def parse_access_log_line(line: str) -> Optional[Tuple]:
+    match = ACCESS_LOG_LINE.match(line)
+    if match is None:
+        return None
+    return (
+        match.group("method"),
+        match.group("target"),
+        _parse_timestamp(match.group("timestamp")),
+        int(match.group("status")),
+    )
+
+
+def parse_ndjson_line(line: str) -> Optional[Tuple]:
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(record, dict):
+        return None
+    target = record.get("path") or record.get("url")
+    if not target:
+        return None
+    if "://" in target:
+        target = "/" + target.split("://", 1)[1].split("/", 1)[-1]
+    query_string = record.get("query_string") or record.get("query")
+    if query_string and "?" not in target:
+        target = f"{target}?{query_string}"
+    status_code = record.get("status") or record.get("status_code")
+    return (
+        record.get("method", "GET").upper(),
+        target,
+        _parse_timestamp(
+            record.get("timestamp") or record.get("time") or record.get("ts")
+        ),
+        int(status_code) if status_code else None,
+    )
+
+
+def read_requests(lines: Iterable[str]) -> Iterator[ReplayRequest]:
+    """
+    Requests to replayed routes found in the log lines. Each line is read as
+    NDJSON if it starts with `{` and as an access log line otherwise, and the
+    lines which are not requests are skipped.
+    """
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("{"):
+            parsed = parse_ndjson_line(line)
+        else:
+            parsed = parse_access_log_line(line)
+        if parsed is None:
+            continue
+        method, target, timestamp, status_code = parsed
+        if method not in REPLAYED_METHODS:
+            continue
+        route = route_for(target)
+        if route is None:
+            continue
+        yield ReplayRequest(method, target, route, timestamp, status_code)
+
+
+def schedule(
+    requests: List[ReplayRequest], mode: str = "original", speed: float = 1.0
+) -> List[float]:
+    """
+    Offset (in seconds since the start of the replay) at which each request
+    is due
+    """
+    if mode not in REPLAY_MODES:
+        raise ValueError(f"Unknown replay mode: {mode}")
+    if mode == "max":
+        return [0.0] * len(requests)
+    if speed <= 0:
+        raise ValueError("The replay speed must be positive")
+    if mode == "original":
+        speed = 1.0
+    if any(request.timestamp is None for request in requests):
+        raise ValueError(
+            f"The {mode} rate requires timestamps in every log line, use --mode max"
+        )
+    if not requests:
+        return []
+    first = min(request.timestamp for request in requests)
+    return [(request.timestamp - first) / speed for request in requests]
+
+
+async def replay(
+    client: httpx.AsyncClient,
+    requests: List[ReplayRequest],
+    offsets: List[float],
+    concurrency: int = 8,
+) -> Dict:
+    """
+    Sends the requests when they are due, with at most `concurrency` of
+    them in flight. A request is sent late when all the slots are busy, the
+    delay is reported as the dispatch lag.
+    """
+    recorders: Dict[str, LatencyRecorder] = {}
+    mismatches: Dict[str, int] = {}
+    lags = []
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+
+    async def send(request: ReplayRequest):
+        start = time.perf_counter()
+        try:
+            response = await client.request(request.method, request.target)
+            status_code = response.status_code
+        except Exception:
+            status_code = 0
+        finally:
+            slots.release()
+        recorders.setdefault(request.route, LatencyRecorder()).record(
+            time.perf_counter() - start, status_code
+        )
+        if request.status_code is not None and request.status_code != status_code:
+            mismatches[request.route] = mismatches.get(request.route, 0) + 1
+
+    start = time.perf_counter()
+    for request, offset in sorted(
+        zip(requests, offsets), key=lambda scheduled: scheduled[1]
+    ):
+        delay = start + offset - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        await slots.acquire()
+        lags.append(max(time.perf_counter() - start - offset, 0.0))
+        task = asyncio.create_task(send(request))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - start
+
+    routes = []
+    for route, recorder in sorted(recorders.items()):
+        summary = recorder.summary(elapsed)
+        summary["status_mismatches"] = mismatches.get(route, 0)
+        routes.append({"route": route, **summary})
+    lags.sort()
+    return {
+        "elapsed": elapsed,
+        "requests": len(requests),
+        "dispatch_lag_p95_ms": percentile(lags, 0.95) * 1000,
+        "dispatch_lag_max_ms": lags[-1] * 1000 if lags else 0.0,
+        "routes": routes,
+    }
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("logs", nargs="+", help="access log or NDJSON files")
+    parser.add_argument("--mode", choices=REPLAY_MODES, default="original")
+    parser.add_argument(
+        "--speed", type=float, default=1.0, help="rate multiplier of --mode scaled"
+    )
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=None, help="replay N requests")
+    parser.add_argument(
+        "--target",
+        default=None,
+        help="base URL of the instance (default: in-process app with fake backends)",
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--hits", type=int, default=10, help="hits per fake search")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(arguments)
+
+
+def _load_requests(paths: List[str], limit: Optional[int]) -> List[ReplayRequest]:
+    requests = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as log_file:
+            for request in read_requests(log_file):
+                requests.append(request)
+                if limit is not None and len(requests) >= limit:
+                    return requests
+    return requests
+
+
+async def _run(args, requests: List[ReplayRequest], offsets: List[float]) -> Dict:
+    if args.target:
+        client = httpx.AsyncClient(base_url=args.target, timeout=args.timeout)
+    else:
+        app, _ = build_benchmark_app(hits=args.hits)
+        client = httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app),
+            base_url="http://replay",
+            timeout=args.timeout,
+        )
+    async with client:
+        return await replay(client, requests, offsets, args.concurrency)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    requests = _load_requests(args.logs, args.limit)
+    if not requests:
+        sys.exit("No replayable requests found in the logs")
+    try:
+        offsets = schedule(requests, args.mode, args.speed)
+    except ValueError as error:
+        sys.exit(str(error))
+
+    results = asyncio.run(_run(args, requests, offsets))
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(
+            format_table(
+                results["routes"],
+                [
+                    "route",
+                    "requests",
+                    "errors",
+                    "error_rate",
+                    "status_mismatches",
+                    "p50_ms",
+                    "p95_ms",
+                    "p99_ms",
+                    "max_ms",
+                ],
+            )
+        )
+        print(
+            f"\n{results['requests']} requests in {results['elapsed']:.2f}s, "
+            f"dispatch lag p95 {results['dispatch_lag_p95_ms']:.2f}ms "
+            f"(max {results['dispatch_lag_max_ms']:.2f}ms)"
+        )
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""
+Starts the API with the in-memory backends of `benchmarks.fakes`, so load
+tools (like `benchmarks.replay --target`) can be pointed at a local instance
+without OpenSearch and PostgreSQL.
+
+Usage:
+
+    python -m benchmarks.serve --port 8080 --hits 10
+"""
+
+import argparse
+
+import uvicorn
+
+from .api_benchmark import build_benchmark_app
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--hits", type=int, default=10, help="hits per search")
+    parser.add_argument("--excerpt-size", type=int, default=500)
+    parser.add_argument("--number-of-excerpts", type=int, default=1)
+    parser.add_argument("--partners", type=int, default=10)
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    args = parse_arguments(arguments)
+    app, _ = build_benchmark_app(
+        args.hits, args.excerpt_size, args.number_of_excerpts, args.partners
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
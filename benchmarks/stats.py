@@ -0,0 +1,71 @@
+"""
+Latency statistics shared by the benchmark and replay tools.
+"""
+
+import math
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Value below which the given fraction of the (sorted) values fall, using
+    the nearest-rank method
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(fraction * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+class LatencyRecorder:
+    """
+    Latencies (in seconds) and outcomes of the requests sent to a route
+    """
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors = 0
+        self.status_codes: Dict[int, int] = {}
+
+    def record(self, latency: float, status_code: int) -> None:
+        self.latencies.append(latency)
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        if status_code >= 500 or status_code == 0:
+            self.errors += 1
+
+    def summary(self, elapsed: float) -> Dict:
+        latencies = sorted(self.latencies)
+        requests = len(latencies)
+        return {
+            "requests": requests,
+            "errors": self.errors,
+            "error_rate": self.errors / requests if requests else 0.0,
+            "throughput": requests / elapsed if elapsed > 0 else 0.0,
+            "mean_ms": sum(latencies) / requests * 1000 if requests else 0.0,
+            "p50_ms": percentile(latencies, 0.50) * 1000,
+            "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000,
+            "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+            "status_codes": dict(sorted(self.status_codes.items())),
+        }
+
+
+def format_table(rows: List[Dict], columns: List[str]) -> str:
+    """
+    Plain text table with one line per row and the given columns
+    """
+
+    def format_cell(value) -> str:
+        if isinstance(value, float):
+            return f"{value:.2f}"
+        return str(value)
+
+    cells = [[format_cell(row.get(column, "")) for column in columns] for row in rows]
+    widths = [
+        max([len(column)] + [len(line[position]) for line in cells])
+        for position, column in enumerate(columns)
+    ]
+    lines = ["  ".join(column.rjust(width) for column, width in zip(columns, widths))]
+    for line in cells:
+        lines.append("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+    return "\n".join(lines)
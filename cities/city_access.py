@@ -14,6 +14,15 @@ class OpennessLevel(str, Enum):
 
 
 class CitySearchResult:
+    __slots__ = (
+        "publication_urls",
+        "territory_id",
+        "territory_name",
+        "level",
+        "state_code",
+        "availability_date",
+    )
+
     def __init__(
         self,
         name: str,
@@ -150,11 +159,10 @@ class CityAccess(CityAccessInterface):
         self._data_gateway = data_gateway
 
     def get_cities(self, city_name: str, levels: List[str]):
-        return [vars(city) for city in self._data_gateway.get_cities(city_name, levels)]
+        return self._data_gateway.get_cities(city_name, levels)
 
     def get_city(self, territory_id: str):
-        city = self._data_gateway.get_city(territory_id)
-        return vars(city) if city is not None else None
+        return self._data_gateway.get_city(territory_id)
 
 
 def create_cities_data_gateway(city_database_file: str) -> CityDataGateway:
@@ -1,7 +1,15 @@
 from .companies_access import (
+    COMPANY_NOT_FOUND,
+    CachedCompaniesAccess,
+    CompaniesAccess,
     Company,
+    CompanyLookup,
+    CompanySearchResult,
     InvalidCNPJException,
     Partner,
+    PartnerCompaniesLookup,
+    PartnerCompany,
+    PartnersLookup,
     CompaniesAccessInterface,
     CompaniesDatabaseInterface,
     create_companies_interface,
@@ -0,0 +1,166 @@
+"""
+CNPJ numbers: validation, formatting and scanning of free text.
+
+A CNPJ is given by its 14 digits, masked (00.000.000/0001-91) or not, and its
+leading zeros may be left out. Any other character is ignored, as is done by
+the lookups since the first version of the API. The last two digits are
+check digits, computed from the others with the weights below (modulo 11).
+
+parse_cnpj validates one CNPJ and returns its digits, which is all the
+lookups need: the digits are extracted once and then only sliced. The
+batches are validated by parse_cnpjs, whose check digits are computed on
+arrays when numpy is installed (millions of CNPJs per second), and one CNPJ
+at a time without it.
+
+The gazettes write CNPJs masked or as 14 digits, so the scanner of free text
+(find_cnpjs) accepts both, and any mix of them, but not digits glued to a
+longer number (a CPF or a process number is not split into a CNPJ). The
+matches are not validated by the scanner: their check digits are verified by
+the companies lookup.
+"""
+
+import operator
+import re
+from typing import List, Optional, Sequence
+
+try:
+    import numpy
+except ImportError:  # optional, the batches are validated one by one without it
+    numpy = None
+
+CNPJ_LENGTH = 14
+
+FIRST_CHECK_DIGIT_WEIGHTS = (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+SECOND_CHECK_DIGIT_WEIGHTS = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
+
+# The weighted sums are computed on the ASCII codes of the digits, whose
+# excess over the values of the digits is taken off once
+_ZERO_CODE = ord("0")
+_FIRST_CHECK_DIGIT_EXCESS = _ZERO_CODE * sum(FIRST_CHECK_DIGIT_WEIGHTS)
+_SECOND_CHECK_DIGIT_EXCESS = _ZERO_CODE * sum(SECOND_CHECK_DIGIT_WEIGHTS)
+
+# Below this size, building the arrays costs more than it saves
+VECTORIZED_BATCH_MIN_SIZE = 64
+
+# Starts with a digit, so the scanner skips straight to the digits of the
+# text, and only then looks behind it for the end of a longer number
+CNPJ_PATTERN = re.compile(r"\d(?<![\d./-]\d)\d\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}(?!\d)")
+
+_NON_DIGITS = re.compile(r"[^0-9]")
+
+
+def cnpj_digits(cnpj: str) -> str:
+    """
+    Digits of the CNPJ, padded with zeros to 14 digits, or an empty string
+    when it has no digits
+    """
+    if len(cnpj) == CNPJ_LENGTH and cnpj.isascii() and cnpj.isdigit():
+        return cnpj
+    digits = _NON_DIGITS.sub("", cnpj)
+    return digits.zfill(CNPJ_LENGTH) if digits else digits
+
+
+def check_digits(cnpj_without_check_digits: str) -> str:
+    """
+    Check digits of the first 12 digits of a CNPJ
+    """
+    codes = cnpj_without_check_digits[:12].encode("ascii")
+    first = _check_digit(codes, FIRST_CHECK_DIGIT_WEIGHTS, _FIRST_CHECK_DIGIT_EXCESS)
+    codes += str(first).encode("ascii")
+    second = _check_digit(codes, SECOND_CHECK_DIGIT_WEIGHTS, _SECOND_CHECK_DIGIT_EXCESS)
+    return f"{first}{second}"
+
+
+def parse_cnpj(cnpj: str) -> Optional[str]:
+    """
+    The 14 digits of the CNPJ, or None when it is not valid
+    """
+    digits = cnpj_digits(cnpj)
+    if len(digits) != CNPJ_LENGTH:
+        return None
+    codes = digits.encode("ascii")
+    first = _check_digit(codes, FIRST_CHECK_DIGIT_WEIGHTS, _FIRST_CHECK_DIGIT_EXCESS)
+    if codes[12] - _ZERO_CODE != first:
+        return None
+    second = _check_digit(codes, SECOND_CHECK_DIGIT_WEIGHTS, _SECOND_CHECK_DIGIT_EXCESS)
+    if codes[13] - _ZERO_CODE != second:
+        return None
+    return digits
+
+
+def is_valid_cnpj(cnpj: str) -> bool:
+    return parse_cnpj(cnpj) is not None
+
+
+def parse_cnpjs(cnpjs: Sequence[str]) -> List[Optional[str]]:
+    """
+    The 14 digits of each CNPJ, or None for the ones which are not valid
+    """
+    if numpy is None or len(cnpjs) < VECTORIZED_BATCH_MIN_SIZE:
+        return [parse_cnpj(cnpj) for cnpj in cnpjs]
+
+    # batches of bare 14-digit CNPJs (as loaded by an ingest) are checked in
+    # one pass over their concatenation, without looking at each of them
+    text = "".join(cnpjs)
+    if (
+        all(len(cnpj) == CNPJ_LENGTH for cnpj in cnpjs)
+        and text.isascii()
+        and text.isdigit()
+    ):
+        all_digits = cnpjs
+        fits = True
+    else:
+        all_digits = [cnpj_digits(cnpj) for cnpj in cnpjs]
+        fits = numpy.fromiter(
+            (len(digits) == CNPJ_LENGTH for digits in all_digits),
+            dtype=bool,
+            count=len(all_digits),
+        )
+        padding = "0" * CNPJ_LENGTH
+        text = "".join(
+            digits if len(digits) == CNPJ_LENGTH else padding for digits in all_digits
+        )
+    values = numpy.frombuffer(text.encode("ascii"), dtype=numpy.uint8) - _ZERO_CODE
+    values = values.reshape(-1, CNPJ_LENGTH).astype(numpy.int32)
+    first = _check_digits_array(values, FIRST_CHECK_DIGIT_WEIGHTS)
+    second = _check_digits_array(values, SECOND_CHECK_DIGIT_WEIGHTS)
+    valid = fits & (values[:, 12] == first) & (values[:, 13] == second)
+    return [
+        digits if is_valid else None
+        for digits, is_valid in zip(all_digits, valid.tolist())
+    ]
+
+
+def format_cnpj(cnpj: str) -> str:
+    """
+    CNPJ masked as 00.000.000/0000-00
+    """
+    digits = cnpj_digits(cnpj)
+    return f"{digits[:2]}.{digits[2:5]}.{digits[5:8]}/{digits[8:12]}-{digits[12:]}"
+
+
+def find_cnpjs(text: str) -> List[str]:
+    """
+    Digits of the distinct CNPJs written in the text, in the order they first
+    appear
+    """
+    cnpjs = {}
+    for match in CNPJ_PATTERN.finditer(text):
+        cnpjs.setdefault(_NON_DIGITS.sub("", match.group()), None)
+    return list(cnpjs)
+
+
+def _check_digit(codes: bytes, weights: Sequence[int], excess: int) -> int:
+    remainder = (sum(map(operator.mul, codes, weights)) - excess) % 11
+    return 0 if remainder < 2 else 11 - remainder
+
+
+def _check_digits_array(values, weights: Sequence[int]):
+    """
+    Check digit of each row of digits, weighting its first len(weights)
+    digits (the weights are padded with zeros to a whole row)
+    """
+    padded = numpy.zeros(CNPJ_LENGTH, dtype=numpy.int32)
+    padded[: len(weights)] = weights
+    remainders = values @ padded % 11
+    return numpy.where(remainders < 2, 0, 11 - remainders)
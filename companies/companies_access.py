@@ -1,4 +1,15 @@
 import abc
+import logging
+import threading
+from typing import List, Optional, Union
+
+from observability import traced
+from utils.ttl_cache import MISSING, TTLCache
+
+from .cnpj import CNPJ_LENGTH, cnpj_digits, find_cnpjs
+
+# Error of the batch lookups of CNPJs without a company
+COMPANY_NOT_FOUND = "Company not found."
 
 
 class InvalidCNPJException(Exception):
@@ -22,6 +33,63 @@ class CompaniesDatabaseInterface(abc.ABC):
         Get information about the partners of a company by the company's CNPJ.
         """
 
+    @abc.abstractmethod
+    def get_partners_page(
+        self, cnpj: str, limit: int = 100, cursor: Optional[str] = None
+    ):
+        """
+        Get a page of the partners of a company by the company's CNPJ, with
+        the total number of partners and the cursor of the next page.
+        """
+
+    @abc.abstractmethod
+    def get_company_with_partners(self, cnpj: str = ""):
+        """
+        Get information about a company and its partners by its CNPJ.
+        """
+
+    @abc.abstractmethod
+    def get_companies(self, cnpjs: List[str]):
+        """
+        Get information about the companies of many CNPJs at once.
+        """
+
+    @abc.abstractmethod
+    def get_companies_partners(self, cnpjs: List[str]):
+        """
+        Get information about the partners of the companies of many CNPJs at
+        once.
+        """
+
+    @abc.abstractmethod
+    def search_companies(
+        self,
+        name: str,
+        uf: Optional[str] = None,
+        municipio: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        """
+        Get the companies whose name is similar to the given one, most
+        similar first, a page at a time.
+        """
+
+    @abc.abstractmethod
+    def get_companies_by_partners(
+        self, lookups: List["PartnerCompaniesLookup"], limit: int = 20
+    ):
+        """
+        Fill the lookups of many partners at once with a page of the
+        companies each of them is a partner of.
+        """
+
+    @abc.abstractmethod
+    def get_data_version(self):
+        """
+        Get a value which changes whenever the data is reloaded.
+        """
+
 
 class CompaniesAccessInterface(abc.ABC):
     """
@@ -40,6 +108,72 @@ class CompaniesAccessInterface(abc.ABC):
         Method to get information about the partners of a company.
         """
 
+    @abc.abstractmethod
+    def get_partners_page(
+        self, cnpj: str, limit: int = 100, cursor: Optional[str] = None
+    ):
+        """
+        Method to get a page of the partners of a company.
+        """
+
+    @abc.abstractmethod
+    def get_company_with_partners(self, cnpj: str = ""):
+        """
+        Method to get information about a company and its partners.
+        """
+
+    @abc.abstractmethod
+    def get_companies(self, cnpjs: List[str]):
+        """
+        Method to get information about the companies of many CNPJs.
+        """
+
+    @abc.abstractmethod
+    def get_companies_partners(self, cnpjs: List[str]):
+        """
+        Method to get information about the partners of the companies of many
+        CNPJs.
+        """
+
+    @abc.abstractmethod
+    def search_companies(
+        self,
+        name: str,
+        uf: Optional[str] = None,
+        municipio: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        """
+        Method to search companies by name.
+        """
+
+    @abc.abstractmethod
+    def get_companies_by_partners(
+        self, lookups: List["PartnerCompaniesLookup"], limit: int = 20
+    ):
+        """
+        Method to get the companies of many partners, by name or document.
+        """
+
+    @abc.abstractmethod
+    def get_mentioned_companies(self, texts: List[str]):
+        """
+        Method to get the companies whose CNPJs are written in each text.
+        """
+
+    @abc.abstractmethod
+    def invalidate_cache(self, cnpjs: Optional[List[str]] = None):
+        """
+        Method to drop the cached data of the given CNPJs (or of all of them).
+        """
+
+    @abc.abstractmethod
+    def get_cache_stats(self):
+        """
+        Method to get the size and hit ratio of the cache (if any).
+        """
+
 
 class CompaniesAccess(CompaniesAccessInterface):
     _database_gateway = None
@@ -47,13 +181,278 @@ class CompaniesAccess(CompaniesAccessInterface):
     def __init__(self, database_gateway=None):
         self._database_gateway = database_gateway
 
+    @traced
+    def get_company(self, cnpj: str = ""):
+        return self._database_gateway.get_company(cnpj)
+
+    @traced
+    def get_partners(self, cnpj: str = ""):
+        return self._database_gateway.get_partners(cnpj)
+
+    @traced
+    def get_partners_page(
+        self, cnpj: str, limit: int = 100, cursor: Optional[str] = None
+    ):
+        return self._database_gateway.get_partners_page(cnpj, limit, cursor)
+
+    @traced
+    def get_company_with_partners(self, cnpj: str = ""):
+        return self._database_gateway.get_company_with_partners(cnpj)
+
+    @traced
+    def get_companies(self, cnpjs: List[str]):
+        return self._database_gateway.get_companies(cnpjs)
+
+    @traced
+    def get_companies_partners(self, cnpjs: List[str]):
+        return self._database_gateway.get_companies_partners(cnpjs)
+
+    @traced
+    def search_companies(
+        self,
+        name: str,
+        uf: Optional[str] = None,
+        municipio: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ):
+        return self._database_gateway.search_companies(
+            name, uf, municipio, limit, cursor
+        )
+
+    @traced
+    def get_companies_by_partners(
+        self, lookups: List["PartnerCompaniesLookup"], limit: int = 20
+    ):
+        return self._database_gateway.get_companies_by_partners(lookups, limit)
+
+    @traced
+    def get_mentioned_companies(self, texts: List[str]) -> List[List["Company"]]:
+        """
+        Companies found for the CNPJs written in each text, in the order they
+        appear. The CNPJs of all the texts are looked up at once, so a search
+        response is enriched by a single query. Invalid CNPJs and CNPJs
+        without a company are left out.
+        """
+        mentioned = [find_cnpjs(text) for text in texts]
+        cnpjs = list(dict.fromkeys(cnpj for cnpjs in mentioned for cnpj in cnpjs))
+        companies = {}
+        if cnpjs:
+            companies = {
+                lookup.cnpj: lookup.cnpj_info
+                for lookup in self.get_companies(cnpjs)
+                if lookup.cnpj_info is not None
+            }
+        return [
+            [companies[cnpj] for cnpj in cnpjs if cnpj in companies]
+            for cnpjs in mentioned
+        ]
+
+    def invalidate_cache(self, cnpjs: Optional[List[str]] = None) -> int:
+        return 0
+
+    def get_cache_stats(self) -> Union[dict, None]:
+        return None
+
+
+class CachedCompaniesAccess(CompaniesAccess):
+    """
+    Companies access keeping the companies and partners found in a TTL cache,
+    keyed by the digits of the CNPJ. CNPJs without a company are cached too
+    (as None), usually with a shorter time to live.
+
+    The data only changes when it is reloaded from a new dump. Besides being
+    invalidated on demand, the whole cache is dropped when the data version
+    reported by the database changes. start() checks it in the background
+    every version_check_interval seconds, so no request waits for (or has
+    its deadline spent by) the check.
+    """
+
+    def __init__(
+        self,
+        database_gateway,
+        cache: TTLCache,
+        version_check_interval: float = 0,
+    ):
+        super().__init__(database_gateway)
+        self._cache = cache
+        self._version_check_interval = version_check_interval
+        self._data_version = None
+        self._stopped = threading.Event()
+        self._thread = None
+        # limits of the first pages of partners cached, which key them too
+        self._partner_page_limits = set()
+        self._partner_page_limits_lock = threading.Lock()
+
     def get_company(self, cnpj: str = ""):
-        cnpj_info = self._database_gateway.get_company(cnpj)
-        return vars(cnpj_info) if cnpj_info is not None else None
+        key = self._cache_key(cnpj)
+        company = self._cached("company", key)
+        if company is MISSING:
+            # invalid CNPJs raise InvalidCNPJException, so are never cached
+            company = super().get_company(cnpj)
+            self._cache.set(("company", key), company)
+        return company
 
     def get_partners(self, cnpj: str = ""):
-        total_partners, partners = self._database_gateway.get_partners(cnpj)
-        return (total_partners, [vars(partner) for partner in partners])
+        key = self._cache_key(cnpj)
+        partners = self._cached("partners", key)
+        if partners is MISSING:
+            _, partners = super().get_partners(cnpj)
+            self._cache.set(("partners", key), partners)
+        return len(partners), partners
+
+    def get_partners_page(
+        self, cnpj: str, limit: int = 100, cursor: Optional[str] = None
+    ):
+        # only the first page is cached, which is all most companies have
+        if cursor is not None:
+            return super().get_partners_page(cnpj, limit, cursor)
+        key = self._cache_key(cnpj)
+        page = (
+            MISSING if key is None else self._cache.get(("partners_page", key, limit))
+        )
+        if page is MISSING:
+            page = super().get_partners_page(cnpj, limit)
+            with self._partner_page_limits_lock:
+                self._partner_page_limits.add(limit)
+            self._cache.set(("partners_page", key, limit), page)
+        return page
+
+    def get_company_with_partners(self, cnpj: str = ""):
+        key = self._cache_key(cnpj)
+        company = self._cached("company", key)
+        if company is None:
+            return None, []
+        partners = self._cached("partners", key)
+        if company is not MISSING and partners is not MISSING:
+            return company, partners
+
+        company, partners = super().get_company_with_partners(cnpj)
+        self._cache.set(("company", key), company)
+        if company is not None:
+            self._cache.set(("partners", key), partners)
+        return company, partners
+
+    def get_companies(self, cnpjs: List[str]):
+        return self._batch(
+            cnpjs,
+            "company",
+            super().get_companies,
+            lambda cnpj, company: CompanyLookup(
+                cnpj,
+                cnpj_info=company,
+                error=COMPANY_NOT_FOUND if company is None else None,
+            ),
+            lambda lookup: lookup.error in (None, COMPANY_NOT_FOUND),
+            lambda lookup: lookup.cnpj_info,
+        )
+
+    def get_companies_partners(self, cnpjs: List[str]):
+        return self._batch(
+            cnpjs,
+            "partners",
+            super().get_companies_partners,
+            lambda cnpj, partners: PartnersLookup(cnpj, partners=partners),
+            lambda lookup: lookup.error is None,
+            lambda lookup: lookup.partners,
+        )
+
+    def _batch(
+        self, cnpjs, kind, lookup_missing, from_cache, is_cacheable, to_cache
+    ) -> List:
+        """
+        Lookups of a batch, in the order of the CNPJs, taken from the cache
+        when possible. The CNPJs missing from the cache are looked up in a
+        single batch, whose results are cached unless they are errors.
+        """
+        lookups = {}
+        missing = []
+        for cnpj in cnpjs:
+            # values which cannot be a CNPJ are keyed as given
+            key = self._cache_key(cnpj) or cnpj
+            if key in lookups:
+                continue
+            cached = self._cached(kind, self._cache_key(cnpj))
+            if cached is MISSING:
+                lookups[key] = None
+                missing.append(cnpj)
+            else:
+                lookups[key] = from_cache(cnpj, cached)
+        if missing:
+            for lookup in lookup_missing(missing):
+                key = self._cache_key(lookup.cnpj) or lookup.cnpj
+                lookups[key] = lookup
+                if is_cacheable(lookup):
+                    self._cache.set((kind, key), to_cache(lookup))
+        return [lookup for lookup in lookups.values() if lookup is not None]
+
+    def invalidate_cache(self, cnpjs: Optional[List[str]] = None) -> int:
+        if cnpjs is None:
+            return self._cache.invalidate()
+        keys = [key for key in map(self._cache_key, cnpjs) if key]
+        with self._partner_page_limits_lock:
+            limits = list(self._partner_page_limits)
+        return self._cache.invalidate(
+            [(kind, key) for key in keys for kind in ("company", "partners")]
+            + [("partners_page", key, limit) for key in keys for limit in limits]
+        )
+
+    def get_cache_stats(self) -> dict:
+        return self._cache.stats()
+
+    def _cached(self, kind: str, key: Union[str, None]):
+        return MISSING if key is None else self._cache.get((kind, key))
+
+    def check_data_version(self) -> bool:
+        """
+        Drops the whole cache when the data version changed since the last
+        check, returning whether the check succeeded
+        """
+        try:
+            version = self._database_gateway.get_data_version()
+        except Exception as error:
+            logging.warning(f"Could not check the companies data version: {error}")
+            return False
+        if version != self._data_version:
+            if self._data_version is not None:
+                dropped = self._cache.invalidate()
+                logging.info(
+                    f"Companies data version changed, dropped {dropped} cached entries"
+                )
+            self._data_version = version
+        return True
+
+    def start(self) -> None:
+        """
+        Starts checking the data version in a background thread
+        """
+        if self._thread is not None or self._version_check_interval <= 0:
+            return
+        self._thread = threading.Thread(
+            target=self._check_data_version_forever,
+            name="companies-data-version",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _check_data_version_forever(self) -> None:
+        while not self._stopped.is_set():
+            self.check_data_version()
+            self._stopped.wait(self._version_check_interval)
+
+    def _cache_key(self, cnpj: str) -> Union[str, None]:
+        """
+        Digits of the CNPJ, padded to 14 digits, or None for values which
+        cannot be a CNPJ
+        """
+        digits = cnpj_digits(cnpj)
+        return digits if len(digits) == CNPJ_LENGTH else None
 
 
 class Company:
@@ -61,6 +460,50 @@ class Company:
     Item to represent a company in memory inside the module
     """
 
+    __slots__ = (
+        "cnpj_basico",
+        "cnpj_ordem",
+        "cnpj_dv",
+        "cnpj_completo",
+        "cnpj_completo_apenas_numeros",
+        "identificador_matriz_filial",
+        "nome_fantasia",
+        "situacao_cadastral",
+        "data_situacao_cadastral",
+        "motivo_situacao_cadastral",
+        "nome_cidade_exterior",
+        "data_inicio_atividade",
+        "cnae_fiscal_secundario",
+        "tipo_logradouro",
+        "logradouro",
+        "numero",
+        "complemento",
+        "bairro",
+        "cep",
+        "uf",
+        "ddd_telefone_1",
+        "ddd_telefone_2",
+        "ddd_telefone_fax",
+        "correio_eletronico",
+        "situacao_especial",
+        "data_situacao_especial",
+        "pais",
+        "municipio",
+        "razao_social",
+        "natureza_juridica",
+        "qualificacao_do_responsavel",
+        "capital_social",
+        "porte",
+        "ente_federativo_responsavel",
+        "opcao_pelo_simples",
+        "data_opcao_pelo_simples",
+        "data_exclusao_pelo_simples",
+        "opcao_pelo_mei",
+        "data_opcao_pelo_mei",
+        "data_exclusao_pelo_mei",
+        "cnae",
+    )
+
     def __init__(
         self,
         cnpj_basico,
@@ -164,6 +607,24 @@ class Partner:
     Item to represent a company in memory inside the module
     """
 
+    __slots__ = (
+        "cnpj_basico",
+        "cnpj_ordem",
+        "cnpj_dv",
+        "cnpj_completo",
+        "cnpj_completo_apenas_numeros",
+        "identificador_socio",
+        "razao_social",
+        "cnpj_cpf_socio",
+        "qualificacao_socio",
+        "data_entrada_sociedade",
+        "pais_socio_estrangeiro",
+        "numero_cpf_representante_legal",
+        "nome_representante_legal",
+        "qualificacao_representante_legal",
+        "faixa_etaria",
+    )
+
     def __init__(
         self,
         cnpj_basico,
@@ -208,9 +669,165 @@ class Partner:
         return f"Partner({self.cnpj_completo}, {self.cnpj_cpf_socio}, {self.numero_cpf_representante_legal}, {self.razao_social})"
 
 
-def create_companies_interface(database_gateway: CompaniesDatabaseInterface):
+class CompanySearchResult:
+    """
+    Company found by a search by name, with how similar its name is to the
+    searched one (from 0 to 1)
+    """
+
+    __slots__ = (
+        "cnpj",
+        "cnpj_completo",
+        "razao_social",
+        "nome_fantasia",
+        "uf",
+        "municipio",
+        "score",
+    )
+
+    def __init__(
+        self, cnpj, cnpj_completo, razao_social, nome_fantasia, uf, municipio, score
+    ):
+        self.cnpj = cnpj
+        self.cnpj_completo = cnpj_completo
+        self.razao_social = razao_social
+        self.nome_fantasia = nome_fantasia
+        self.uf = uf
+        self.municipio = municipio
+        self.score = score
+
+    def __eq__(self, other):
+        return self.cnpj == other.cnpj and self.score == other.score
+
+    def __repr__(self):
+        return f"CompanySearchResult({self.cnpj_completo}, {self.razao_social}, {self.score})"
+
+
+class CompanyLookup:
+    """
+    Result of the lookup of one of the CNPJs of a batch: the company, or the
+    reason why it could not be returned
+    """
+
+    __slots__ = ("cnpj", "cnpj_info", "error")
+
+    def __init__(self, cnpj, cnpj_info=None, error=None):
+        self.cnpj = cnpj
+        self.cnpj_info = cnpj_info
+        self.error = error
+
+    def __eq__(self, other):
+        return (
+            self.cnpj == other.cnpj
+            and self.cnpj_info == other.cnpj_info
+            and self.error == other.error
+        )
+
+    def __repr__(self):
+        return f"CompanyLookup({self.cnpj}, {self.cnpj_info}, {self.error})"
+
+
+class PartnersLookup:
+    """
+    Result of the lookup of the partners of one of the CNPJs of a batch
+    """
+
+    __slots__ = ("cnpj", "total_partners", "partners", "error")
+
+    def __init__(self, cnpj, partners=None, error=None):
+        self.cnpj = cnpj
+        self.partners = partners if partners is not None else []
+        self.total_partners = len(self.partners)
+        self.error = error
+
+    def __eq__(self, other):
+        return (
+            self.cnpj == other.cnpj
+            and self.partners == other.partners
+            and self.error == other.error
+        )
+
+    def __repr__(self):
+        return f"PartnersLookup({self.cnpj}, {self.total_partners}, {self.error})"
+
+
+class PartnerCompany:
+    """
+    Company a partner is part of, found by a reverse lookup
+    """
+
+    __slots__ = (
+        "cnpj_basico",
+        "razao_social",
+        "cnpj_cpf_socio",
+        "identificador_socio",
+        "qualificacao_socio",
+        "data_entrada_sociedade",
+    )
+
+    def __init__(
+        self,
+        cnpj_basico,
+        razao_social,
+        cnpj_cpf_socio,
+        identificador_socio,
+        qualificacao_socio,
+        data_entrada_sociedade,
+    ):
+        self.cnpj_basico = cnpj_basico
+        self.razao_social = razao_social
+        self.cnpj_cpf_socio = cnpj_cpf_socio
+        self.identificador_socio = identificador_socio
+        self.qualificacao_socio = qualificacao_socio
+        self.data_entrada_sociedade = data_entrada_sociedade
+
+    def __eq__(self, other):
+        return (
+            self.cnpj_basico == other.cnpj_basico
+            and self.razao_social == other.razao_social
+            and self.cnpj_cpf_socio == other.cnpj_cpf_socio
+        )
+
+    def __repr__(self):
+        return f"PartnerCompany({self.cnpj_basico}, {self.razao_social}, {self.cnpj_cpf_socio})"
+
+
+class PartnerCompaniesLookup:
+    """
+    Reverse lookup of the companies of a partner, given by its name or by its
+    document (masked CPF or CNPJ): a page of companies, starting after the
+    given cursor, and the cursor of the next page (if any), or the reason
+    why they could not be returned
+    """
+
+    __slots__ = ("name", "document", "cursor", "companies", "next_cursor", "error")
+
+    def __init__(self, name=None, document=None, cursor=None):
+        self.name = name
+        self.document = document
+        self.cursor = cursor
+        self.companies = []
+        self.next_cursor = None
+        self.error = None
+
+    def __repr__(self):
+        return f"PartnerCompaniesLookup({self.name}, {self.document}, {len(self.companies)}, {self.error})"
+
+
+def create_companies_interface(
+    database_gateway: CompaniesDatabaseInterface,
+    cache_size: int = 0,
+    cache_ttl: float = 0,
+    cache_negative_ttl: Optional[float] = None,
+    version_check_interval: float = 0,
+):
     if not isinstance(database_gateway, CompaniesDatabaseInterface):
         raise Exception(
             "Database gateway should implement the CompaniesDatabaseInterface interface"
         )
-    return CompaniesAccess(database_gateway)
+    if cache_size <= 0 or cache_ttl <= 0:
+        return CompaniesAccess(database_gateway)
+    cache = TTLCache("companies", cache_size, cache_ttl, cache_negative_ttl)
+    companies = CachedCompaniesAccess(database_gateway, cache, version_check_interval)
+    companies.start()
+    return companies
@@ -1,5 +1,6 @@
 import os
 
+from utils.url_builder import DEFAULT_LEGACY_FILE_HOSTS
 
 VALID_BOOLEAN_TRUE_VALUES = [True, "True", "TRUE"]
 VALID_BOOLEAN_FALSE_VALUES = [False, "False", "FALSE"]
@@ -44,6 +45,13 @@ class Configuration:
         self.suggestion_mailjet_custom_id = os.environ.get(
             "QUERIDO_DIARIO_SUGGESTION_MAILJET_CUSTOM_ID", ""
         )
+        self.files_endpoint = os.environ.get("QUERIDO_DIARIO_FILES_ENDPOINT", "")
+        self.replace_file_url_base = (
+            os.environ.get("REPLACE_FILE_URL_BASE", "false").lower() == "true"
+        )
+        self.legacy_file_hosts = Configuration._load_list(
+            "QUERIDO_DIARIO_LEGACY_FILE_HOSTS", DEFAULT_LEGACY_FILE_HOSTS
+        )
         self.city_database_file = os.environ["CITY_DATABASE_CSV"]
         self.gazette_index = os.environ.get("GAZETTE_OPENSEARCH_INDEX", "")
         self.gazette_content_field = os.environ.get("GAZETTE_CONTENT_FIELD", "")
@@ -57,6 +65,7 @@ class Configuration:
         self.gazette_territory_id_field = os.environ.get(
             "GAZETTE_TERRITORY_ID_FIELD", ""
         )
+        self.gazette_highlight_type = os.environ.get("GAZETTE_HIGHLIGHT_TYPE", "fvh")
         self.themes_database_file = os.environ["THEMES_DATABASE_JSON"]
         self.themed_excerpt_content_field = os.environ.get(
             "THEMED_EXCERPT_CONTENT_FIELD", ""
@@ -91,13 +100,22 @@ class Configuration:
         self.themed_excerpt_number_of_fragments = int(
             os.environ.get("THEMED_EXCERPT_NUMBER_OF_FRAGMENTS", 1)
         )
+        self.themed_excerpt_highlight_type = os.environ.get(
+            "THEMED_EXCERPT_HIGHLIGHT_TYPE", "fvh"
+        )
         self.companies_database_host = os.environ.get("POSTGRES_COMPANIES_HOST", "")
         self.companies_database_db = os.environ.get("POSTGRES_COMPANIES_DB", "")
         self.companies_database_user = os.environ.get("POSTGRES_COMPANIES_USER", "")
         self.companies_database_pass = os.environ.get("POSTGRES_COMPANIES_PASSWORD", "")
         self.companies_database_port = os.environ.get("POSTGRES_COMPANIES_PORT", "")
+        self.companies_database_pool_size = int(
+            os.environ.get("POSTGRES_COMPANIES_POOL_SIZE", 10)
+        )
         self.opensearch_user = os.environ.get("QUERIDO_DIARIO_OPENSEARCH_USER", "")
         self.opensearch_pswd = os.environ.get("QUERIDO_DIARIO_OPENSEARCH_PASSWORD", "")
+        self.opensearch_serializer = os.environ.get(
+            "QUERIDO_DIARIO_OPENSEARCH_SERIALIZER", "auto"
+        )
         self.aggregates_database_host = os.environ.get("POSTGRES_AGGREGATES_HOST", "")
         self.aggregates_database_db = os.environ.get("POSTGRES_AGGREGATES_DB", "")
         self.aggregates_database_user = os.environ.get("POSTGRES_AGGREGATES_USER", "")
@@ -108,6 +126,76 @@ class Configuration:
         self.scraper_api_keys = Configuration._load_list(
             "QUERIDO_DIARIO_SCRAPER_API_KEYS", []
         )
+        self.gazettes_request_timeout = float(
+            os.environ.get("QUERIDO_DIARIO_GAZETTES_REQUEST_TIMEOUT", 10)
+        )
+        self.themed_excerpts_request_timeout = float(
+            os.environ.get("QUERIDO_DIARIO_THEMED_EXCERPTS_REQUEST_TIMEOUT", 10)
+        )
+        self.companies_request_timeout = float(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_REQUEST_TIMEOUT", 5)
+        )
+        self.companies_batch_max_size = int(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_BATCH_MAX_SIZE", 500)
+        )
+        self.companies_cache_size = int(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_CACHE_SIZE", 10000)
+        )
+        self.companies_cache_ttl = float(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_CACHE_TTL", 86400)
+        )
+        self.companies_cache_negative_ttl = float(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_CACHE_NEGATIVE_TTL", 3600)
+        )
+        self.companies_cache_version_check_interval = float(
+            os.environ.get("QUERIDO_DIARIO_COMPANIES_CACHE_VERSION_CHECK_INTERVAL", 300)
+        )
+        self.aggregates_request_timeout = float(
+            os.environ.get("QUERIDO_DIARIO_AGGREGATES_REQUEST_TIMEOUT", 5)
+        )
+        self.aggregates_snapshot_refresh_interval = float(
+            os.environ.get("QUERIDO_DIARIO_AGGREGATES_SNAPSHOT_REFRESH_INTERVAL", 300)
+        )
+        self.aggregates_notification_channel = os.environ.get(
+            "QUERIDO_DIARIO_AGGREGATES_NOTIFICATION_CHANNEL", ""
+        )
+        self.server_timing_enabled = Configuration._load_boolean(
+            "QUERIDO_DIARIO_SERVER_TIMING_ENABLED", False
+        )
+        self.admin_api_keys = Configuration._load_list(
+            "QUERIDO_DIARIO_ADMIN_API_KEYS", []
+        )
+        self.profiling_output_dir = os.environ.get(
+            "QUERIDO_DIARIO_PROFILING_OUTPUT_DIR", ""
+        )
+        self.profiling_sample_interval = float(
+            os.environ.get("QUERIDO_DIARIO_PROFILING_SAMPLE_INTERVAL", 0.005)
+        )
+        self.slow_query_log_file = os.environ.get(
+            "QUERIDO_DIARIO_SLOW_QUERY_LOG_FILE", ""
+        )
+        self.slow_query_threshold = float(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_THRESHOLD", 1.0)
+        )
+        self.slow_query_log_max_bytes = int(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_LOG_MAX_BYTES", 10485760)
+        )
+        self.slow_query_log_backup_count = int(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_LOG_BACKUP_COUNT", 5)
+        )
+        self.slow_query_explain_sample_rate = float(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1)
+        )
+        self.slow_query_explain_timeout = float(
+            os.environ.get("QUERIDO_DIARIO_SLOW_QUERY_EXPLAIN_TIMEOUT", 10.0)
+        )
+        self.tracing_exporter = os.environ.get("QUERIDO_DIARIO_TRACING_EXPORTER", "")
+        self.tracing_exporter_target = os.environ.get(
+            "QUERIDO_DIARIO_TRACING_EXPORTER_TARGET", ""
+        )
+        self.tracing_service_name = os.environ.get(
+            "QUERIDO_DIARIO_TRACING_SERVICE_NAME", "querido-diario-api"
+        )
 
     @classmethod
     def _load_list(cls, key, default=[]):
@@ -7,15 +7,19 @@ from .postgresql_scraper import PostgreSQLDatabaseScraper
 
 
 def create_companies_database_interface(
-    db_host, db_name, db_user, db_pass, db_port
+    db_host, db_name, db_user, db_pass, db_port, pool_size=0
 ) -> CompaniesDatabaseInterface:
-    return PostgreSQLDatabaseCompanies(db_host, db_name, db_user, db_pass, db_port)
+    return PostgreSQLDatabaseCompanies(
+        db_host, db_name, db_user, db_pass, db_port, pool_size
+    )
 
 
 def create_aggregates_database_interface(
-    db_host, db_name, db_user, db_pass, db_port
+    db_host, db_name, db_user, db_pass, db_port, url_builder=None
 ) -> AggregatesDatabaseInterface:
-    return PostgreSQLDatabaseAggregates(db_host, db_name, db_user, db_pass, db_port)
+    return PostgreSQLDatabaseAggregates(
+        db_host, db_name, db_user, db_pass, db_port, url_builder
+    )
 
 
 def create_scraper_database_interface(
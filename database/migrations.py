@@ -0,0 +1,241 @@
+"""
+Migrations of the companies database.
+
+The Receita Federal data is loaded by an external process, so the API only
+adds what its queries need on top of it: the busca_empresas materialized
+view, with a row per establishment and its names in upper case, and the
+trigram indexes (pg_trgm) which make the search by name fast on the ~60M
+establishments; and the busca_socios materialized view, with a row per
+partner of a company, indexed by the name and by the document of the
+partner for the reverse lookups. Each migration runs once and is recorded in the
+api_migrations table. The indexes are created concurrently, so the lookups
+keep working while they are built; a migration building one is only
+recorded once the index is valid, and the invalid index a failed build left
+behind is dropped before the next attempt.
+
+The views are snapshots: they have to be refreshed after a new dump is loaded
+(see refresh_company_search), which is done concurrently too.
+
+    python scripts/migrate_companies_database.py [--refresh]
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+
+from .postgresql import COMPANY_FIELDS, PARTNER_FIELDS, PostgreSQLDatabaseCompanies
+
+# Fields of resposta_cnpj copied to the search view
+COMPANY_SEARCH_FIELDS = tuple(
+    (field, column)
+    for field, column in COMPANY_FIELDS
+    if field in ("razao_social", "nome_fantasia", "uf", "municipio")
+)
+
+# Fields of resposta_socios copied to the partners view
+PARTNER_SEARCH_FIELDS = tuple(
+    (field, column)
+    for field, column in PARTNER_FIELDS
+    if field
+    in (
+        "identificador_socio",
+        "razao_social",
+        "cnpj_cpf_socio",
+        "qualificacao_socio",
+        "data_entrada_sociedade",
+    )
+)
+
+CREATE_MIGRATIONS_TABLE_COMMAND = """
+CREATE TABLE IF NOT EXISTS api_migrations (
+    name TEXT PRIMARY KEY,
+    applied_at TIMESTAMPTZ DEFAULT NOW()
+);
+"""
+
+CREATE_COMPANY_SEARCH_VIEW_COMMAND = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS busca_empresas AS
+SELECT
+    lpad(estabelecimento_cnpj_basico::text, 8, '0')
+        || lpad(estabelecimento_cnpj_ordem::text, 4, '0')
+        || lpad(estabelecimento_cnpj_dv::text, 2, '0') AS cnpj,
+    upper("{razao_social}") AS razao_social,
+    nullif(upper("{nome_fantasia}"), '') AS nome_fantasia,
+    upper("{uf}") AS uf,
+    upper("{municipio}") AS municipio
+FROM
+    resposta_cnpj
+;
+"""
+
+# The name and the document are never null, so that they can be compared as
+# keys of the pagination. DISTINCT ON drops the duplicated rows of the dump,
+# which would break the unique index.
+CREATE_PARTNER_SEARCH_VIEW_COMMAND = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS busca_socios AS
+SELECT DISTINCT ON (documento, nome, cnpj_basico)
+    lpad(cnpj_basico::text, 8, '0') AS cnpj_basico,
+    coalesce(upper("{socio_razao_social}"), '') AS nome,
+    coalesce("{socio_cnpj_cpf_socio}"::text, '') AS documento,
+    "{socio_identificador_socio}" AS identificador_socio,
+    "{socio_qualificacao_socio}" AS qualificacao_socio,
+    "{socio_data_entrada_sociedade}" AS data_entrada_sociedade
+FROM
+    resposta_socios
+ORDER BY
+    documento,
+    nome,
+    cnpj_basico
+;
+"""
+
+MIGRATIONS: Tuple[Tuple[str, str], ...] = (
+    ("0001_pg_trgm", "CREATE EXTENSION IF NOT EXISTS pg_trgm;"),
+    ("0002_busca_empresas", CREATE_COMPANY_SEARCH_VIEW_COMMAND),
+    (
+        "0003_busca_empresas_cnpj",
+        """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS busca_empresas_cnpj
+            ON busca_empresas (cnpj);
+        """,
+    ),
+    (
+        "0004_busca_empresas_razao_social_trgm",
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS busca_empresas_razao_social_trgm
+            ON busca_empresas USING gin (razao_social gin_trgm_ops);
+        """,
+    ),
+    (
+        "0005_busca_empresas_nome_fantasia_trgm",
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS busca_empresas_nome_fantasia_trgm
+            ON busca_empresas USING gin (nome_fantasia gin_trgm_ops);
+        """,
+    ),
+    (
+        "0006_busca_empresas_uf_municipio",
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS busca_empresas_uf_municipio
+            ON busca_empresas (uf, municipio);
+        """,
+    ),
+    ("0007_busca_socios", CREATE_PARTNER_SEARCH_VIEW_COMMAND),
+    (
+        "0008_busca_socios_documento",
+        """
+        CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS busca_socios_documento
+            ON busca_socios (documento, nome, cnpj_basico);
+        """,
+    ),
+    (
+        "0009_busca_socios_nome",
+        """
+        CREATE INDEX CONCURRENTLY IF NOT EXISTS busca_socios_nome
+            ON busca_socios (nome, documento, cnpj_basico);
+        """,
+    ),
+)
+
+# Indexes built concurrently by the migrations, by migration name. A failed or
+# interrupted build leaves an INVALID index behind, which IF NOT EXISTS would
+# skip, so it is dropped before the build and the index is checked after it.
+CONCURRENT_INDEXES = {
+    "0003_busca_empresas_cnpj": "busca_empresas_cnpj",
+    "0004_busca_empresas_razao_social_trgm": "busca_empresas_razao_social_trgm",
+    "0005_busca_empresas_nome_fantasia_trgm": "busca_empresas_nome_fantasia_trgm",
+    "0006_busca_empresas_uf_municipio": "busca_empresas_uf_municipio",
+    "0008_busca_socios_documento": "busca_socios_documento",
+    "0009_busca_socios_nome": "busca_socios_nome",
+}
+
+INDEX_IS_VALID_COMMAND = """
+SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%(index)s);
+"""
+
+DROP_INDEX_COMMAND = "DROP INDEX CONCURRENTLY IF EXISTS {index};"
+
+# Views refreshed by refresh_company_search, one statement each
+SEARCH_VIEWS = ("busca_empresas", "busca_socios")
+
+REFRESH_SEARCH_VIEW_COMMAND = "REFRESH MATERIALIZED VIEW CONCURRENTLY {view};"
+
+
+def run_migrations(database: PostgreSQLDatabaseCompanies) -> List[str]:
+    """
+    Applies the migrations not applied yet, in order, and returns their names
+    """
+    columns = _search_columns(database)
+    connection = database._connect()
+    applied_now = []
+    try:
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            cursor.execute(CREATE_MIGRATIONS_TABLE_COMMAND)
+            cursor.execute("SELECT name FROM api_migrations;")
+            applied = {name for (name,) in cursor.fetchall()}
+            for name, command in MIGRATIONS:
+                if name in applied:
+                    continue
+                logging.info(f"Applying migration {name}")
+                index = CONCURRENT_INDEXES.get(name)
+                if index is not None and _index_is_valid(cursor, index) is False:
+                    logging.warning(f"Dropping the invalid index {index}")
+                    cursor.execute(DROP_INDEX_COMMAND.format(index=index))
+                cursor.execute(command.format(**columns))
+                if index is not None and not _index_is_valid(cursor, index):
+                    raise Exception(
+                        f"Index {index} of migration {name} was not built or is not valid"
+                    )
+                cursor.execute(
+                    "INSERT INTO api_migrations (name) VALUES (%(name)s);",
+                    {"name": name},
+                )
+                applied_now.append(name)
+    finally:
+        connection.autocommit = False
+        database._release(connection)
+    return applied_now
+
+
+def refresh_company_search(database: PostgreSQLDatabaseCompanies) -> None:
+    """
+    Refreshes the search views (busca_empresas and busca_socios), failing
+    with the name of the view whose refresh failed
+    """
+    connection = database._connect()
+    try:
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+            for view in SEARCH_VIEWS:
+                logging.info(f"Refreshing {view}")
+                try:
+                    cursor.execute(REFRESH_SEARCH_VIEW_COMMAND.format(view=view))
+                except psycopg2.Error as error:
+                    raise Exception(f"Could not refresh {view}: {error}") from error
+    finally:
+        connection.autocommit = False
+        database._release(connection)
+
+
+def _index_is_valid(cursor, index: str) -> Optional[bool]:
+    """
+    Whether the index is valid, or None when there is no index with its name
+    """
+    cursor.execute(INDEX_IS_VALID_COMMAND, {"index": index})
+    row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def _search_columns(database: PostgreSQLDatabaseCompanies) -> Dict[str, str]:
+    """
+    Columns of resposta_cnpj and resposta_socios holding the fields copied to
+    the search views (the latter prefixed by "socio_")
+    """
+    fields = [field for field, _ in COMPANY_SEARCH_FIELDS]
+    columns = database._field_columns("resposta_cnpj", COMPANY_SEARCH_FIELDS)
+    partner_fields = [f"socio_{field}" for field, _ in PARTNER_SEARCH_FIELDS]
+    partner_columns = database._field_columns("resposta_socios", PARTNER_SEARCH_FIELDS)
+    return {**dict(zip(fields, columns)), **dict(zip(partner_fields, partner_columns))}
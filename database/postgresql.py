@@ -1,40 +1,304 @@
 import logging
 import re
-import os
+import select
+import threading
+import time
+import weakref
 from typing import Any, Dict, Iterable, List, Tuple, Union, Optional
 
 import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import psycopg2.sql
 
-from companies import Company, InvalidCNPJException, Partner, CompaniesDatabaseInterface
+from companies.cnpj import cnpj_digits, format_cnpj, parse_cnpj, parse_cnpjs
+from companies import (
+    COMPANY_NOT_FOUND,
+    Company,
+    CompanyLookup,
+    CompanySearchResult,
+    InvalidCNPJException,
+    Partner,
+    PartnerCompaniesLookup,
+    PartnerCompany,
+    PartnersLookup,
+    CompaniesDatabaseInterface,
+)
 from aggregates import AggregatesDatabaseInterface, Aggregates
+from observability import slow_query_log, traced
+from observability.metrics import track_backend_call
+from utils.cancellation import cancel_on
+from utils.cursor import InvalidCursorException, decode_cursor, encode_cursor
+from utils.deadline import check_deadline, current_deadline
+from utils.url_builder import FileUrlBuilder
 
 
 class PostgreSQLDatabase:
-    def __init__(self, host, database, user, password, port):
+    # statements run as server-side prepared statements on pooled connections
+    PREPARED_STATEMENTS = frozenset()
+
+    def __init__(self, host, database, user, password, port, pool_size: int = 0):
         self.host = host
         self.database = database
         self.user = user
         self.password = password
         self.port = port
+        self._pool_size = pool_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._pool_slots = threading.BoundedSemaphore(max(pool_size, 1))
+        self._prepared = weakref.WeakKeyDictionary()
+        self._select_lists = {}
+
+    def _connect(self):
+        """
+        Connection used by one statement. Without a pool (pool_size 0) a new
+        connection is opened every time. With a pool, pool_size connections
+        are opened on first use and kept open, and a caller waits for a free
+        one.
+        """
+        if self._pool_size <= 0:
+            return self._open_connection()
+        self._pool_slots.acquire()
+        try:
+            return self._connection_pool().getconn()
+        except Exception:
+            self._pool_slots.release()
+            raise
 
-    def _select(self, command: str, data: Dict = {}) -> Iterable[Tuple]:
-        connection = psycopg2.connect(
+    def _open_connection(self):
+        return psycopg2.connect(
             dbname=self.database,
             user=self.user,
             password=self.password,
             host=self.host,
             port=self.port,
         )
-        with connection.cursor() as cursor:
+
+    def _release(self, connection) -> None:
+        if self._pool_size <= 0:
+            connection.close()
+            return
+        try:
+            # ends the transaction, so the settings made with SET LOCAL (the
+            # statement timeout) do not reach the next user of the connection
+            if not connection.closed:
+                connection.rollback()
+        except psycopg2.Error:
+            pass
+        finally:
+            self._pool.putconn(connection, close=bool(connection.closed))
+            self._pool_slots.release()
+
+    def _connection_pool(self) -> psycopg2.pool.ThreadedConnectionPool:
+        with self._pool_lock:
+            if self._pool is None:
+                # psycopg2 only keeps up to minconn idle connections
+                self._pool = psycopg2.pool.ThreadedConnectionPool(
+                    self._pool_size,
+                    self._pool_size,
+                    dbname=self.database,
+                    user=self.user,
+                    password=self.password,
+                    host=self.host,
+                    port=self.port,
+                )
+            return self._pool
+
+    def _select(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> Iterable[Tuple]:
+        """
+        Rows of the query. They are all fetched (and the connection released)
+        before the first one is yielded, so the time measured for the backend
+        call does not include the work the caller does between rows.
+        """
+        check_deadline()
+        connection = self._connect()
+        try:
+            start = time.perf_counter()
+            with track_backend_call("postgresql", "select") as span, cancel_on(
+                connection.cancel, "postgresql"
+            ):
+                with connection.cursor() as cursor:
+                    self._apply_statement_timeout(cursor)
+                    self._execute_statement(
+                        connection, cursor, command, data, statement_name
+                    )
+                    logging.debug(f"Starting query: {cursor.query}")
+                    rows = cursor.fetchall()
+                    logging.debug(f"Finished query: {cursor.query}")
+                    statement, row_count = cursor.query, cursor.rowcount
+                span.set_attributes(
+                    self._span_attributes(statement_name, command, row_count)
+                )
+            self._log_if_slow(
+                "select",
+                statement_name,
+                command,
+                data,
+                statement,
+                row_count,
+                time.perf_counter() - start,
+                analyze=True,
+            )
+        finally:
+            self._release(connection)
+        for entry in rows:
+            logging.debug(entry)
+            yield entry
+
+    def _execute_statement(
+        self, connection, cursor, command: str, data: Dict, statement_name: str
+    ) -> None:
+        """
+        Runs the statements in PREPARED_STATEMENTS as prepared statements when
+        the connections are pooled, so PostgreSQL parses and plans them once
+        per connection instead of once per call. The statement is prepared the
+        first time it runs on a connection, with a positional parameter per
+        key of data, and executed with the values in the same order.
+        """
+        if self._pool_size <= 0 or statement_name not in self.PREPARED_STATEMENTS:
             cursor.execute(command, data)
-            logging.debug(f"Starting query: {cursor.query}")
-            for entry in cursor:
-                logging.debug(entry)
-                yield entry
-            logging.debug(f"Finished query: {cursor.query}")
+            return
+        prepared = self._prepared.setdefault(connection, set())
+        if statement_name not in prepared:
+            positions = {name: position for position, name in enumerate(data, 1)}
+            statement = re.sub(
+                r"%\((\w+)\)s",
+                lambda match: f"${positions[match.group(1)]}",
+                command.strip().rstrip(";"),
+            )
+            cursor.execute(f"PREPARE {statement_name} AS {statement}")
+            prepared.add(statement_name)
+        parameters = ", ".join(f"%({name})s" for name in data)
+        cursor.execute(f"EXECUTE {statement_name} ({parameters})", data)
+
+    def _describe(self, relation: str) -> List[str]:
+        """
+        Names of the columns of the relation, in their order
+        """
+        connection = self._connect()
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"SELECT * FROM {relation} LIMIT 0")
+                return [column.name for column in cursor.description]
+        finally:
+            self._release(connection)
+
+    def _select_list(self, relation: str, fields: Tuple[Tuple[str, str], ...]) -> str:
+        """
+        Columns of the relation holding the given fields, in the order of the
+        fields, to be used in the SELECT list. Built once per relation.
+        """
+        if relation not in self._select_lists:
+            self._select_lists[relation] = ", ".join(
+                f'{relation}."{column}"'
+                for column in self._field_columns(relation, fields)
+            )
+        return self._select_lists[relation]
+
+    def _field_columns(
+        self, relation: str, fields: Tuple[Tuple[str, str], ...]
+    ) -> List[str]:
+        """
+        Columns of the relation holding the given (field, column) pairs, in
+        their order, checked against the columns the relation has
+        """
+        names = set(self._describe(relation))
+        missing = [
+            f'"{column}" ({field})' for field, column in fields if column not in names
+        ]
+        if missing:
+            raise Exception(f"Columns not found in {relation}: {', '.join(missing)}")
+        return [column for _, column in fields]
+
+    def _span_attributes(
+        self, statement_name: str, command: str, row_count: int
+    ) -> Dict:
+        return {
+            "db.system": "postgresql",
+            "db.name": self.database,
+            "db.statement.name": statement_name,
+            "db.statement": " ".join(command.split()),
+            "db.response.returned_rows": row_count,
+        }
+
+    def _log_if_slow(
+        self,
+        operation: str,
+        statement_name: str,
+        command: str,
+        data: Dict,
+        statement: bytes,
+        row_count: int,
+        duration: float,
+        analyze: bool,
+    ) -> None:
+        """
+        Records the statement in the slow query log when it took longer than
+        the threshold, with its plan for a sample of them. Writes are only
+        explained (not analyzed), as analyzing runs the statement again.
+        """
+        log = slow_query_log()
+        if log is None or not log.is_slow(duration):
+            return
+        details = {
+            "statement_name": statement_name,
+            "statement": statement.decode("utf-8", "replace") if statement else None,
+            "params": data,
+            "rows": row_count,
+        }
+        if not log.should_explain():
+            log.record("postgresql", operation, duration, **details)
+            return
+        log.record_with_plan(
+            lambda timeout: self._explain(command, data, analyze, timeout),
+            "postgresql",
+            operation,
+            duration,
+            **details,
+        )
+
+    def _explain(self, command: str, data: Dict, analyze: bool, timeout: float):
+        """
+        Plan of the statement, captured on a connection of its own (outside
+        the pool) limited to the given timeout (in seconds) instead of what is
+        left of the deadline of the request that ran it
+        """
+        options = "ANALYZE, BUFFERS, FORMAT JSON" if analyze else "FORMAT JSON"
+        connection = None
+        try:
+            connection = self._open_connection()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SET statement_timeout = %s", (max(int(timeout * 1000), 1),)
+                )
+                cursor.execute(f"EXPLAIN ({options}) {command}", data)
+                return cursor.fetchone()[0]
+        except psycopg2.Error as error:
+            logging.warning(f"Could not explain slow query: {error}")
+            return None
+        finally:
+            if connection is not None:
+                connection.rollback()
+                connection.close()
+
+    def _apply_statement_timeout(self, cursor) -> None:
+        """
+        Limits the statements of the current transaction to the time left in
+        the request deadline, so PostgreSQL stops working on a query nobody is
+        going to wait for. Fails without sending anything when no time is left.
+        """
+        deadline = current_deadline()
+        if deadline is None:
+            return
+        deadline.check()
+        statement_timeout = max(int(deadline.remaining() * 1000), 1)
+        cursor.execute("SET LOCAL statement_timeout = %s", (statement_timeout,))
 
     def _always_str_or_none(self, data: Any) -> Union[str, None]:
-        if data == "None" or data == "" or data is None:
+        if data is None or data == "" or data == "None":
             return None
         elif not isinstance(data, str):
             return str(data)
@@ -42,11 +306,103 @@ class PostgreSQLDatabase:
             return data
 
 
+# Fields of the Company and Partner records, with the column of the
+# resposta_cnpj and resposta_socios views holding each of them. The columns of
+# resposta_cnpj are prefixed by the table of the CNPJ dataset they come from
+# (as its key, estabelecimento_cnpj_basico), and cnae, pais and municipio are
+# the descriptions of their codes. The columns are checked once per view (see
+# check_columns).
+COMPANY_FIELDS = (
+    ("identificador_matriz_filial", "estabelecimento_identificador_matriz_filial"),
+    ("nome_fantasia", "estabelecimento_nome_fantasia"),
+    ("situacao_cadastral", "estabelecimento_situacao_cadastral"),
+    ("data_situacao_cadastral", "estabelecimento_data_situacao_cadastral"),
+    ("motivo_situacao_cadastral", "estabelecimento_motivo_situacao_cadastral"),
+    ("nome_cidade_exterior", "estabelecimento_nome_cidade_exterior"),
+    ("data_inicio_atividade", "estabelecimento_data_inicio_atividade"),
+    ("cnae_fiscal_secundario", "estabelecimento_cnae_fiscal_secundario"),
+    ("tipo_logradouro", "estabelecimento_tipo_logradouro"),
+    ("logradouro", "estabelecimento_logradouro"),
+    ("numero", "estabelecimento_numero"),
+    ("complemento", "estabelecimento_complemento"),
+    ("bairro", "estabelecimento_bairro"),
+    ("cep", "estabelecimento_cep"),
+    ("uf", "estabelecimento_uf"),
+    ("ddd_telefone_1", "estabelecimento_ddd_telefone_1"),
+    ("ddd_telefone_2", "estabelecimento_ddd_telefone_2"),
+    ("ddd_telefone_fax", "estabelecimento_ddd_telefone_fax"),
+    ("correio_eletronico", "estabelecimento_correio_eletronico"),
+    ("situacao_especial", "estabelecimento_situacao_especial"),
+    ("data_situacao_especial", "estabelecimento_data_situacao_especial"),
+    ("razao_social", "empresa_razao_social"),
+    ("natureza_juridica", "empresa_natureza_juridica"),
+    ("qualificacao_do_responsavel", "empresa_qualificacao_do_responsavel"),
+    ("capital_social", "empresa_capital_social"),
+    ("porte", "empresa_porte"),
+    ("ente_federativo_responsavel", "empresa_ente_federativo_responsavel"),
+    ("opcao_pelo_simples", "simples_opcao_pelo_simples"),
+    ("data_opcao_pelo_simples", "simples_data_opcao_pelo_simples"),
+    ("data_exclusao_pelo_simples", "simples_data_exclusao_pelo_simples"),
+    ("opcao_pelo_mei", "simples_opcao_pelo_mei"),
+    ("data_opcao_pelo_mei", "simples_data_opcao_pelo_mei"),
+    ("data_exclusao_pelo_mei", "simples_data_exclusao_pelo_mei"),
+    ("cnae", "cnae_descricao"),
+    ("pais", "pais_descricao"),
+    ("municipio", "municipio_descricao"),
+)
+PARTNER_FIELDS = (
+    ("identificador_socio", "identificador_socio"),
+    ("razao_social", "razao_social"),
+    ("cnpj_cpf_socio", "cnpj_cpf_socio"),
+    ("qualificacao_socio", "qualificacao_socio"),
+    ("data_entrada_sociedade", "data_entrada_sociedade"),
+    ("pais_socio_estrangeiro", "pais_socio_estrangeiro"),
+    ("numero_cpf_representante_legal", "numero_cpf_representante_legal"),
+    ("nome_representante_legal", "nome_representante_legal"),
+    ("qualificacao_representante_legal", "qualificacao_representante_legal"),
+    ("faixa_etaria", "faixa_etaria"),
+)
+# Views read by the company lookups (busca_empresas and busca_socios are the
+# search views created by the migrations), whose data make its version
+COMPANY_DATA_RELATIONS = (
+    "resposta_cnpj",
+    "resposta_socios",
+    "busca_empresas",
+    "busca_socios",
+)
+# Unique column of resposta_socios, the key of the partners in the dump
+PARTNER_ID_COLUMN = "id"
+# Fields of a partner ordering the pages of partners of a company, ending in
+# its id: the dump repeats partners with the same fields, which would be
+# skipped or listed twice across pages without a unique last key.
+PARTNER_PAGE_KEY = (
+    "razao_social",
+    "cnpj_cpf_socio",
+    "qualificacao_socio",
+    "data_entrada_sociedade",
+    "id",
+)
+PARTNER_PAGE_KEY_PARAMETERS = tuple(f"after_{field}" for field in PARTNER_PAGE_KEY)
+COMPANY_FIELD_NAMES = tuple(field for field, _ in COMPANY_FIELDS)
+PARTNER_FIELD_NAMES = tuple(field for field, _ in PARTNER_FIELDS)
+
+
 class PostgreSQLDatabaseCompanies(PostgreSQLDatabase, CompaniesDatabaseInterface):
+    PREPARED_STATEMENTS = frozenset(
+        [
+            "get_company",
+            "get_partners",
+            "get_partners_page",
+            "get_partners_page_after",
+            "get_company_with_partners",
+        ]
+    )
+
+    @traced
     def get_company(self, cnpj: str = "") -> Union[Company, None]:
         command = """
         SELECT
-            *
+            {company_columns}
         FROM
             resposta_cnpj
         WHERE
@@ -55,170 +411,626 @@ class PostgreSQLDatabaseCompanies(PostgreSQLDatabase, CompaniesDatabaseInterface
             AND estabelecimento_cnpj_dv = %(cnpj_dv)s
         ;
         """
-        if not self._is_valid_cnpj(cnpj):
-            raise InvalidCNPJException(f'CNPJ "{cnpj}" is not valid.')
-
+        cnpj = self._parse_cnpj(cnpj)
         cnpj_basico, cnpj_ordem, cnpj_dv = self._split_cnpj(cnpj)
         data = {
             "cnpj_basico": cnpj_basico,
             "cnpj_ordem": cnpj_ordem,
             "cnpj_dv": cnpj_dv,
         }
-        result = list(self._select(command, data))
+        command = command.format(company_columns=self._company_columns())
+        result = list(self._select(command, data, "get_company"))
         if result == []:
             return None
 
         return self._format_company_data(result[0], cnpj)
 
+    @traced
     def get_partners(self, cnpj: str = "") -> Tuple[int, List[Partner]]:
         command = """
         SELECT
-            *
+            {partner_columns}
         FROM
             resposta_socios
         WHERE
             cnpj_basico = %(cnpj_basico)s
         ;
         """
-        if not self._is_valid_cnpj(cnpj):
-            raise InvalidCNPJException(f'CNPJ "{cnpj}" is not valid.')
-
+        cnpj = self._parse_cnpj(cnpj)
         cnpj_basico, *_ = self._split_cnpj(cnpj)
         data = {
             "cnpj_basico": cnpj_basico,
         }
-        results = list(self._select(command, data))
-        return (
-            len(results),
-            [self._format_partner_data(result, cnpj) for result in results],
+        command = command.format(partner_columns=self._partner_columns())
+        partners = self._format_partners(
+            self._select(command, data, "get_partners"), cnpj
         )
+        return len(partners), partners
 
-    def _format_company_data(self, data: Tuple, cnpj: str) -> Company:
-        cnpj_only_digits = self._cnpj_only_digits(cnpj)
-        cnpj_basico, cnpj_ordem, cnpj_dv = self._split_cnpj(cnpj)
-        full_cnpj = self._format_full_cnpj(cnpj)
-        formatted_data = [self._always_str_or_none(value) for value in data]
-        return Company(
-            cnpj_basico=cnpj_basico,
-            cnpj_ordem=cnpj_ordem,
-            cnpj_dv=cnpj_dv,
-            cnpj_completo=full_cnpj,
-            cnpj_completo_apenas_numeros=cnpj_only_digits,
-            identificador_matriz_filial=formatted_data[4],
-            nome_fantasia=formatted_data[5],
-            situacao_cadastral=formatted_data[6],
-            data_situacao_cadastral=formatted_data[7],
-            motivo_situacao_cadastral=formatted_data[8],
-            nome_cidade_exterior=formatted_data[9],
-            data_inicio_atividade=formatted_data[10],
-            cnae_fiscal_secundario=formatted_data[11],
-            tipo_logradouro=formatted_data[12],
-            logradouro=formatted_data[13],
-            numero=formatted_data[14],
-            complemento=formatted_data[15],
-            bairro=formatted_data[16],
-            cep=formatted_data[17],
-            uf=formatted_data[18],
-            ddd_telefone_1=formatted_data[19],
-            ddd_telefone_2=formatted_data[20],
-            ddd_telefone_fax=formatted_data[21],
-            correio_eletronico=formatted_data[22],
-            situacao_especial=formatted_data[23],
-            data_situacao_especial=formatted_data[24],
-            razao_social=formatted_data[25],
-            natureza_juridica=formatted_data[26],
-            qualificacao_do_responsavel=formatted_data[27],
-            capital_social=formatted_data[28],
-            porte=formatted_data[29],
-            ente_federativo_responsavel=formatted_data[30],
-            opcao_pelo_simples=formatted_data[31],
-            data_opcao_pelo_simples=formatted_data[32],
-            data_exclusao_pelo_simples=formatted_data[33],
-            opcao_pelo_mei=formatted_data[34],
-            data_opcao_pelo_mei=formatted_data[35],
-            data_exclusao_pelo_mei=formatted_data[36],
-            cnae=formatted_data[37],
-            pais=formatted_data[38],
-            municipio=formatted_data[39],
+    @traced
+    def get_partners_page(
+        self, cnpj: str, limit: int = 100, cursor: Optional[str] = None
+    ) -> Tuple[int, List[Partner], Optional[str]]:
+        """
+        A page of the partners of the company, ordered by PARTNER_PAGE_KEY,
+        with the total number of partners and the cursor of the next page
+        (None on the last page). The total is counted by the same statement,
+        once. The page (at most limit + 1 rows) is fetched whole by _select,
+        which releases the connection before the rows are formatted, so it is
+        bounded by the limit rather than streamed from the cursor.
+        """
+        command = """
+        SELECT
+            total.partners,
+            page.*
+        FROM
+            (
+                SELECT
+                    count(*) AS partners
+                FROM
+                    resposta_socios
+                WHERE
+                    cnpj_basico = %(cnpj_basico)s
+            ) AS total
+            LEFT JOIN LATERAL (
+                SELECT
+                    {page_key},
+                    {partner_columns}
+                FROM
+                    resposta_socios
+                WHERE
+                    cnpj_basico = %(cnpj_basico)s
+                    {after}
+                ORDER BY
+                    {page_key}
+                LIMIT %(limit)s
+            ) AS page ON true
+        ;
+        """
+        cnpj = self._parse_cnpj(cnpj)
+        cnpj_basico, *_ = self._split_cnpj(cnpj)
+        data = {"cnpj_basico": cnpj_basico, "limit": limit + 1}
+        page_key = self._partner_page_key()
+        after = ""
+        statement_name = "get_partners_page"
+        if cursor is not None:
+            key = decode_cursor(cursor, len(PARTNER_PAGE_KEY))
+            if not all(isinstance(value, str) for value in key):
+                raise InvalidCursorException(f'Cursor "{cursor}" is not valid.')
+            data.update(zip(PARTNER_PAGE_KEY_PARAMETERS, key))
+            parameters = ", ".join(
+                f"%({parameter})s" for parameter in PARTNER_PAGE_KEY_PARAMETERS
+            )
+            after = f"AND ({page_key}) > ({parameters})"
+            statement_name = "get_partners_page_after"
+        command = command.format(
+            page_key=page_key,
+            partner_columns=self._partner_columns(),
+            after=after,
         )
 
-    def _format_partner_data(self, data: Tuple, cnpj: str) -> Partner:
-        cnpj_only_digits = self._cnpj_only_digits(cnpj)
+        total, partners, next_cursor = 0, [], None
+        cnpj_fields = self._cnpj_fields(cnpj)
+        key_size = len(PARTNER_PAGE_KEY)
+        for total, *row in self._select(command, data, statement_name):
+            # an empty page is a single row with the total and no partner
+            if row[0] is None:
+                continue
+            if len(partners) == limit:
+                next_cursor = encode_cursor(last_key)
+                continue
+            last_key = row[:key_size]
+            partners.append(
+                self._format_partner_data(row[key_size:], cnpj, cnpj_fields)
+            )
+        return total, partners, next_cursor
+
+    @traced
+    def get_company_with_partners(
+        self, cnpj: str = ""
+    ) -> Tuple[Union[Company, None], List[Partner]]:
+        command = """
+        SELECT
+            {company_columns},
+            (
+                SELECT
+                    json_agg(json_build_array({partner_columns}))
+                FROM
+                    resposta_socios
+                WHERE
+                    resposta_socios.cnpj_basico = %(cnpj_basico)s
+            ) AS socios
+        FROM
+            resposta_cnpj
+        WHERE
+            estabelecimento_cnpj_basico = %(cnpj_basico)s
+            AND estabelecimento_cnpj_ordem = %(cnpj_ordem)s
+            AND estabelecimento_cnpj_dv = %(cnpj_dv)s
+        ;
+        """
+        cnpj = self._parse_cnpj(cnpj)
         cnpj_basico, cnpj_ordem, cnpj_dv = self._split_cnpj(cnpj)
-        full_cnpj = self._format_full_cnpj(cnpj)
-        formatted_data = [self._always_str_or_none(value) for value in data]
-        return Partner(
-            cnpj_basico=cnpj_basico,
-            cnpj_ordem=cnpj_ordem,
-            cnpj_dv=cnpj_dv,
-            cnpj_completo=full_cnpj,
-            cnpj_completo_apenas_numeros=cnpj_only_digits,
-            identificador_socio=formatted_data[2],
-            razao_social=formatted_data[3],
-            cnpj_cpf_socio=formatted_data[4],
-            qualificacao_socio=formatted_data[5],
-            data_entrada_sociedade=formatted_data[6],
-            pais_socio_estrangeiro=formatted_data[7],
-            numero_cpf_representante_legal=formatted_data[8],
-            nome_representante_legal=formatted_data[9],
-            qualificacao_representante_legal=formatted_data[10],
-            faixa_etaria=formatted_data[11],
+        data = {
+            "cnpj_basico": cnpj_basico,
+            "cnpj_ordem": cnpj_ordem,
+            "cnpj_dv": cnpj_dv,
+        }
+        command = command.format(
+            company_columns=self._company_columns(),
+            partner_columns=self._partner_columns(),
         )
+        result = list(self._select(command, data, "get_company_with_partners"))
+        if result == []:
+            return None, []
 
-    def _is_valid_cnpj(self, cnpj: str) -> bool:
-        cnpj_only_digits = self._cnpj_only_digits(cnpj)
-        if cnpj_only_digits == "" or len(cnpj_only_digits) > 14:
-            return False
+        *company, partners = result[0]
+        return (
+            self._format_company_data(company, cnpj),
+            self._format_partners(partners or [], cnpj),
+        )
+
+    @traced
+    def get_companies(self, cnpjs: List[str]) -> List[CompanyLookup]:
+        command = """
+        SELECT
+            requested.cnpj,
+            {company_columns}
+        FROM
+            unnest(
+                %(cnpj)s::text[],
+                %(cnpj_basico)s::text[],
+                %(cnpj_ordem)s::text[],
+                %(cnpj_dv)s::text[]
+            ) AS requested(cnpj, cnpj_basico, cnpj_ordem, cnpj_dv)
+            JOIN resposta_cnpj ON
+                estabelecimento_cnpj_basico = requested.cnpj_basico
+                AND estabelecimento_cnpj_ordem = requested.cnpj_ordem
+                AND estabelecimento_cnpj_dv = requested.cnpj_dv
+        ;
+        """
+        lookups = self._batch_lookups(cnpjs, CompanyLookup)
+        requested = [cnpj for cnpj, lookup in lookups.items() if lookup.error is None]
+        if requested:
+            cnpj_basico, cnpj_ordem, cnpj_dv = zip(
+                *(self._split_cnpj(cnpj) for cnpj in requested)
+            )
+            data = {
+                "cnpj": requested,
+                "cnpj_basico": list(cnpj_basico),
+                "cnpj_ordem": list(cnpj_ordem),
+                "cnpj_dv": list(cnpj_dv),
+            }
+            command = command.format(company_columns=self._company_columns())
+            for result in self._select(command, data, "get_companies"):
+                lookup = lookups[result[0]]
+                lookup.cnpj_info = self._format_company_data(result[1:], lookup.cnpj)
+        for cnpj in requested:
+            if lookups[cnpj].cnpj_info is None:
+                lookups[cnpj].error = COMPANY_NOT_FOUND
+        return list(lookups.values())
 
-        cnpj_without_dv = cnpj_only_digits[:-2]
-        generated_dv = self._generate_cnpj_dv(cnpj_without_dv)
-        return cnpj_only_digits[-2:] == generated_dv
+    @traced
+    def get_companies_partners(self, cnpjs: List[str]) -> List[PartnersLookup]:
+        command = """
+        SELECT
+            resposta_socios.cnpj_basico,
+            {partner_columns}
+        FROM
+            resposta_socios
+        WHERE
+            cnpj_basico = ANY(%(cnpj_basico)s)
+        ;
+        """
+        lookups = self._batch_lookups(cnpjs, PartnersLookup)
+        requested = [cnpj for cnpj, lookup in lookups.items() if lookup.error is None]
+        if not requested:
+            return list(lookups.values())
 
-    def _cnpj_only_digits(self, cnpj: str) -> str:
-        only_digits = re.sub(r"[^\d]", "", cnpj)
-        if only_digits == "":
-            return only_digits
-        else:
-            return only_digits.zfill(14)
+        # the partners are shared by the branches of a company, which have
+        # the same cnpj_basico
+        results_by_cnpj_basico = {}
+        data = {"cnpj_basico": sorted({cnpj[:8] for cnpj in requested})}
+        command = command.format(partner_columns=self._partner_columns())
+        for result in self._select(command, data, "get_companies_partners"):
+            cnpj_basico = str(result[0]).zfill(8)
+            results_by_cnpj_basico.setdefault(cnpj_basico, []).append(result[1:])
+        for cnpj in requested:
+            lookup = lookups[cnpj]
+            lookup.partners = self._format_partners(
+                results_by_cnpj_basico.get(cnpj[:8], []), lookup.cnpj
+            )
+            lookup.total_partners = len(lookup.partners)
+        return list(lookups.values())
 
-    def _generate_cnpj_dv(self, cnpj_without_dv: str) -> str:
-        first_digit = self._calculate_cnpj_dv_digit(cnpj_without_dv)
-        second_digit = self._calculate_cnpj_dv_digit(
-            cnpj_without_dv, first_digit=first_digit
+    @traced
+    def search_companies(
+        self,
+        name: str,
+        uf: Optional[str] = None,
+        municipio: Optional[str] = None,
+        limit: int = 20,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[CompanySearchResult], Union[str, None]]:
+        """
+        Companies whose razao_social or nome_fantasia contains words similar
+        to the given name (see the busca_empresas view created by the
+        migrations), ordered by similarity and then by CNPJ. The page after
+        the one ending with the given cursor is returned, with the cursor of
+        its last company when there are more.
+
+        The trigram indexes only find the companies matching the name: the
+        score depends on the name, so no index gives their order, and every
+        page scores all of them before keeping the ones after the cursor. The
+        cursor keeps the pages stable, but deep pages are not cheaper than
+        the first one; a name matching too many companies should be narrowed
+        with uf or municipio.
+        """
+        command = """
+        SELECT
+            cnpj,
+            razao_social,
+            nome_fantasia,
+            uf,
+            municipio,
+            score
+        FROM (
+            SELECT
+                busca_empresas.*,
+                round(
+                    greatest(
+                        word_similarity(%(name)s, razao_social),
+                        word_similarity(%(name)s, nome_fantasia)
+                    )::numeric,
+                    4
+                ) AS score
+            FROM
+                busca_empresas
+            WHERE
+                (%(name)s <%% razao_social OR %(name)s <%% nome_fantasia)
+                {filters}
+        ) AS ranked
+        {after_cursor}
+        ORDER BY
+            score DESC,
+            cnpj
+        LIMIT %(limit)s
+        ;
+        """
+        data = {"name": " ".join(name.split()).upper(), "limit": limit + 1}
+        filters = []
+        if uf is not None:
+            data["uf"] = uf.upper()
+            filters.append("AND uf = %(uf)s")
+        if municipio is not None:
+            data["municipio"] = " ".join(municipio.split()).upper()
+            filters.append("AND municipio = %(municipio)s")
+        after_cursor = ""
+        if cursor is not None:
+            after_score, after_cnpj = decode_cursor(cursor, 2)
+            if not isinstance(after_score, (int, float)) or not isinstance(
+                after_cnpj, str
+            ):
+                raise InvalidCursorException(f'Cursor "{cursor}" is not valid.')
+            data["after_score"], data["after_cnpj"] = after_score, after_cnpj
+            after_cursor = """
+            WHERE
+                score < %(after_score)s::numeric
+                OR (score = %(after_score)s::numeric AND cnpj > %(after_cnpj)s)
+            """
+        command = command.format(filters="\n".join(filters), after_cursor=after_cursor)
+        results = [
+            self._format_company_search_data(result)
+            for result in self._select(command, data, "search_companies")
+        ]
+        if len(results) <= limit:
+            return results, None
+        last = results[limit - 1]
+        return results[:limit], encode_cursor([last.score, last.cnpj])
+
+    @traced
+    def get_companies_by_partners(
+        self, lookups: List[PartnerCompaniesLookup], limit: int = 20
+    ) -> List[PartnerCompaniesLookup]:
+        """
+        Fills each lookup with a page of the companies of its partner (see the
+        busca_socios view created by the migrations), all in a single
+        statement. A partner given by name is matched by its whole name, in
+        any case, and its companies are ordered by document and cnpj_basico.
+        A partner given by document is matched by the document as stored
+        (masked CPF or CNPJ digits) and its companies are ordered by name and
+        cnpj_basico. Each order is the one of an index, so every page is read
+        from the index right after the cursor.
+        """
+        command = """
+        SELECT
+            'name',
+            requested.position,
+            found.*
+        FROM
+            unnest(
+                %(name)s::text[],
+                %(name_after)s::text[],
+                %(name_after_cnpj_basico)s::text[]
+            ) WITH ORDINALITY AS requested(value, after, after_cnpj_basico, position)
+            CROSS JOIN LATERAL (
+                SELECT
+                    cnpj_basico,
+                    nome,
+                    documento,
+                    identificador_socio,
+                    qualificacao_socio,
+                    data_entrada_sociedade
+                FROM
+                    busca_socios
+                WHERE
+                    nome = requested.value
+                    AND (documento, cnpj_basico)
+                        > (requested.after, requested.after_cnpj_basico)
+                ORDER BY
+                    documento,
+                    cnpj_basico
+                LIMIT %(limit)s
+            ) AS found
+        UNION ALL
+        SELECT
+            'document',
+            requested.position,
+            found.*
+        FROM
+            unnest(
+                %(document)s::text[],
+                %(document_after)s::text[],
+                %(document_after_cnpj_basico)s::text[]
+            ) WITH ORDINALITY AS requested(value, after, after_cnpj_basico, position)
+            CROSS JOIN LATERAL (
+                SELECT
+                    cnpj_basico,
+                    nome,
+                    documento,
+                    identificador_socio,
+                    qualificacao_socio,
+                    data_entrada_sociedade
+                FROM
+                    busca_socios
+                WHERE
+                    documento = requested.value
+                    AND (nome, cnpj_basico)
+                        > (requested.after, requested.after_cnpj_basico)
+                ORDER BY
+                    nome,
+                    cnpj_basico
+                LIMIT %(limit)s
+            ) AS found
+        ;
+        """
+        requested = {"name": [], "document": []}
+        for lookup in lookups:
+            kind, value = self._partner_lookup_key(lookup)
+            if kind is None:
+                lookup.error = "Either the name or the document should be given."
+                continue
+            try:
+                after = decode_cursor(lookup.cursor, 2) if lookup.cursor else ("", "")
+            except InvalidCursorException as error:
+                lookup.error = str(error)
+                continue
+            if not all(isinstance(key, str) for key in after):
+                lookup.error = f'Cursor "{lookup.cursor}" is not valid.'
+                continue
+            requested[kind].append((value, *after, lookup))
+        if not requested["name"] and not requested["document"]:
+            return lookups
+
+        data = {"limit": limit + 1}
+        for kind, values in requested.items():
+            data[kind] = [value for value, *_ in values]
+            data[f"{kind}_after"] = [after for _, after, *_ in values]
+            data[f"{kind}_after_cnpj_basico"] = [
+                after_cnpj_basico for _, _, after_cnpj_basico, _ in values
+            ]
+        for kind, position, *result in self._select(
+            command, data, "get_companies_by_partners"
+        ):
+            lookup = requested[kind][position - 1][-1]
+            lookup.companies.append(self._format_partner_company_data(result))
+        for kind, values in requested.items():
+            for *_, lookup in values:
+                if len(lookup.companies) > limit:
+                    lookup.companies = lookup.companies[:limit]
+                    last = lookup.companies[-1]
+                    after = last.cnpj_cpf_socio if kind == "name" else last.razao_social
+                    lookup.next_cursor = encode_cursor([after, last.cnpj_basico])
+        return lookups
+
+    def _partner_lookup_key(
+        self, lookup: PartnerCompaniesLookup
+    ) -> Tuple[Union[str, None], Union[str, None]]:
+        """
+        How the partner of the lookup is searched ("name" or "document") and
+        the value searched, normalized as stored in busca_socios
+        """
+        name = " ".join((lookup.name or "").split()).upper()
+        document = re.sub(r"[\s./-]", "", lookup.document or "")
+        if bool(name) == bool(document):
+            return None, None
+        if name:
+            return "name", name
+        return "document", document
+
+    @traced
+    def get_data_version(self) -> Union[int, None]:
+        """
+        Number of rows written since the statistics were last reset to the
+        tables the company views are built on and to the search views, which
+        changes when a new dump is loaded. The tables are found from the
+        dependencies of the views, so writes to other tables do not count.
+        """
+        command = """
+        WITH RECURSIVE company_relations(relid) AS (
+            SELECT
+                to_regclass(relation)::oid
+            FROM
+                unnest(%(relations)s::text[]) AS relation
+            WHERE
+                to_regclass(relation) IS NOT NULL
+            UNION
+            SELECT
+                dependency.refobjid
+            FROM
+                company_relations
+                JOIN pg_rewrite rewrite
+                    ON rewrite.ev_class = company_relations.relid
+                JOIN pg_depend dependency
+                    ON dependency.classid = 'pg_rewrite'::regclass
+                    AND dependency.objid = rewrite.oid
+                    AND dependency.refclassid = 'pg_class'::regclass
+                    AND dependency.refobjid <> company_relations.relid
+        )
+        SELECT
+            sum(n_tup_ins + n_tup_upd + n_tup_del)
+        FROM
+            pg_stat_user_tables
+        WHERE
+            relid IN (SELECT relid FROM company_relations)
+        ;
+        """
+        data = {"relations": list(COMPANY_DATA_RELATIONS)}
+        ((version,),) = self._select(command, data, "get_data_version")
+        return version
+
+    def check_columns(self) -> None:
+        """
+        Fails when a column of COMPANY_FIELDS or PARTNER_FIELDS is missing
+        from the views, to be called at startup. When the database can not
+        be reached, they are checked by the first lookup instead.
+        """
+        try:
+            self._company_columns()
+            self._partner_columns()
+            self._partner_page_key()
+        except psycopg2.OperationalError as error:
+            logging.warning(
+                f"Could not check the columns of the company views: {error}"
+            )
+
+    def _company_columns(self) -> str:
+        return self._select_list("resposta_cnpj", COMPANY_FIELDS)
+
+    def _partner_columns(self) -> str:
+        return self._select_list("resposta_socios", PARTNER_FIELDS)
+
+    def _partner_page_key(self) -> str:
+        """
+        Columns of resposta_socios ordering the pages of partners, as text
+        which is never null, so it can be compared with the key of a cursor
+        """
+        if PARTNER_PAGE_KEY not in self._select_lists:
+            partner_columns = dict(PARTNER_FIELDS, id=PARTNER_ID_COLUMN)
+            columns = self._field_columns(
+                "resposta_socios",
+                tuple((field, partner_columns[field]) for field in PARTNER_PAGE_KEY),
+            )
+            self._select_lists[PARTNER_PAGE_KEY] = ", ".join(
+                f"coalesce(resposta_socios.\"{column}\"::text, '')"
+                for column in columns
+            )
+        return self._select_lists[PARTNER_PAGE_KEY]
+
+    def _batch_lookups(self, cnpjs: List[str], lookup_class) -> Dict[str, Any]:
+        """
+        A lookup per distinct CNPJ of the batch, in the order they were given.
+        The valid CNPJs are keyed by their digits, so the same CNPJ written
+        with and without the mask is looked up once. The invalid ones are
+        keyed as given and already carry the error.
+        """
+        lookups = {}
+        for cnpj, cnpj_only_digits in zip(cnpjs, parse_cnpjs(cnpjs)):
+            if cnpj_only_digits is None:
+                lookups.setdefault(
+                    cnpj, lookup_class(cnpj, error=f'CNPJ "{cnpj}" is not valid.')
+                )
+                continue
+            if cnpj_only_digits not in lookups:
+                lookups[cnpj_only_digits] = lookup_class(cnpj)
+        return lookups
+
+    def _cnpj_fields(self, cnpj: str) -> Dict[str, str]:
+        """
+        CNPJ fields shared by the Company and Partner records of a CNPJ,
+        derived once per lookup instead of once per row
+        """
+        cnpj_only_digits = cnpj_digits(cnpj)
+        cnpj_basico, cnpj_ordem, cnpj_dv = self._split_cnpj(cnpj_only_digits)
+        return {
+            "cnpj_basico": cnpj_basico,
+            "cnpj_ordem": cnpj_ordem,
+            "cnpj_dv": cnpj_dv,
+            "cnpj_completo": format_cnpj(cnpj_only_digits),
+            "cnpj_completo_apenas_numeros": cnpj_only_digits,
+        }
+
+    def _format_company_data(
+        self, data: Tuple, cnpj: str, cnpj_fields: Optional[Dict] = None
+    ) -> Company:
+        """
+        Company from a row with the columns of COMPANY_FIELDS, in their order
+        """
+        return Company(
+            **(cnpj_fields or self._cnpj_fields(cnpj)),
+            **dict(zip(COMPANY_FIELD_NAMES, map(self._always_str_or_none, data))),
+        )
+
+    def _format_partner_data(
+        self, data: Tuple, cnpj: str, cnpj_fields: Optional[Dict] = None
+    ) -> Partner:
+        """
+        Partner from a row with the columns of PARTNER_FIELDS, in their order
+        """
+        return Partner(
+            **(cnpj_fields or self._cnpj_fields(cnpj)),
+            **dict(zip(PARTNER_FIELD_NAMES, map(self._always_str_or_none, data))),
         )
-        return first_digit + second_digit
-
-    def _calculate_cnpj_dv_digit(
-        self, cnpj_without_dv: str, first_digit: str = ""
-    ) -> str:
-        weights = (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)
-        if first_digit == "":
-            weights = weights[1:]
-
-        cnpj_to_weight = cnpj_without_dv + first_digit
-        weighted_digits = [
-            int(num) * weight for num, weight in zip(cnpj_to_weight, weights)
+
+    def _format_partners(self, results: Iterable[Tuple], cnpj: str) -> List[Partner]:
+        cnpj_fields = self._cnpj_fields(cnpj)
+        return [
+            self._format_partner_data(result, cnpj, cnpj_fields) for result in results
         ]
-        sum_remainder = sum(weighted_digits) % 11
 
-        if sum_remainder < 2:
-            return "0"
-        else:
-            return str(11 - sum_remainder)
+    def _format_partner_company_data(self, data: Tuple) -> PartnerCompany:
+        formatted_data = [self._always_str_or_none(value) for value in data]
+        return PartnerCompany(
+            cnpj_basico=formatted_data[0],
+            razao_social=formatted_data[1],
+            cnpj_cpf_socio=formatted_data[2],
+            identificador_socio=formatted_data[3],
+            qualificacao_socio=formatted_data[4],
+            data_entrada_sociedade=formatted_data[5],
+        )
 
-    def _format_full_cnpj(self, cnpj: str) -> str:
-        cnpj_only_digits = self._cnpj_only_digits(cnpj)
-        mask = "{}.{}.{}/{}-{}"
-        return mask.format(
-            cnpj_only_digits[:2],
-            cnpj_only_digits[2:5],
-            cnpj_only_digits[5:8],
-            cnpj_only_digits[8:12],
-            cnpj_only_digits[12:],
+    def _format_company_search_data(self, data: Tuple) -> CompanySearchResult:
+        cnpj, razao_social, nome_fantasia, uf, municipio, score = data
+        return CompanySearchResult(
+            cnpj=cnpj,
+            cnpj_completo=format_cnpj(cnpj),
+            razao_social=self._always_str_or_none(razao_social),
+            nome_fantasia=self._always_str_or_none(nome_fantasia),
+            uf=self._always_str_or_none(uf),
+            municipio=self._always_str_or_none(municipio),
+            # rounded by the query, so it can be compared exactly in a cursor
+            score=float(score),
         )
 
-    def _split_cnpj(self, cnpj: str) -> Tuple[str, str, str]:
-        cnpj_only_digits = self._cnpj_only_digits(cnpj)
+    def _parse_cnpj(self, cnpj: str) -> str:
+        """
+        The 14 digits of the CNPJ, which is rejected when it is not valid
+        """
+        cnpj_only_digits = parse_cnpj(cnpj)
+        if cnpj_only_digits is None:
+            raise InvalidCNPJException(f'CNPJ "{cnpj}" is not valid.')
+        return cnpj_only_digits
+
+    def _split_cnpj(self, cnpj_only_digits: str) -> Tuple[str, str, str]:
         return cnpj_only_digits[:8], cnpj_only_digits[8:12], cnpj_only_digits[12:]
 
     def _unsplit_cnpj(self, cnpj_basico: str, cnpj_ordem: str, cnpj_dv: str) -> str:
@@ -231,19 +1043,36 @@ class PostgreSQLDatabaseCompanies(PostgreSQLDatabase, CompaniesDatabaseInterface
 
 
 class PostgreSQLDatabaseAggregates(PostgreSQLDatabase, AggregatesDatabaseInterface):
-    def _format_aggregates_data(self, data: Tuple) -> Aggregates:
+    def __init__(
+        self,
+        host,
+        database,
+        user,
+        password,
+        port,
+        url_builder: Optional[FileUrlBuilder] = None,
+        pool_size: int = 0,
+    ):
+        super().__init__(host, database, user, password, port, pool_size)
+        self._url_builder = url_builder
+        self._listen_connection = None
+
+    def _format_aggregates_data(
+        self, data: Tuple, url_builder: Optional[FileUrlBuilder] = None
+    ) -> Aggregates:
+        url_builder = url_builder or self._file_url_builder()
         formatted_data = [self._always_str_or_none(value) for value in data]
         return Aggregates(
             territory_id=formatted_data[1],
             state_code=formatted_data[2],
-            file_path=os.environ.get("QUERIDO_DIARIO_FILES_ENDPOINT", "")
-            + formatted_data[4],
+            file_path=url_builder.build(formatted_data[4]),
             year=formatted_data[3],
             hash_info=formatted_data[6],
             file_size_mb=formatted_data[5],
             last_updated=formatted_data[7],
         )
 
+    @traced
     def get_aggregates(
         self, territory_id: Optional[str] = None, state_code: str = ""
     ) -> Union[List[Aggregates], None]:
@@ -267,9 +1096,65 @@ class PostgreSQLDatabaseAggregates(PostgreSQLDatabase, AggregatesDatabaseInterfa
             data["territory_id"] = territory_id
             command = command.format(territory_id_query_statement="= %(territory_id)s")
 
-        results = list(self._select(command, data))
+        results = list(self._select(command, data, "get_aggregates"))
 
         if not results:
             return []
 
-        return [vars(self._format_aggregates_data(result)) for result in results]
+        url_builder = self._file_url_builder()
+        return [self._format_aggregates_data(result, url_builder) for result in results]
+
+    @traced
+    def get_all_aggregates(self) -> List[Aggregates]:
+        command = """
+            SELECT
+                *
+            FROM
+                aggregates
+            ORDER BY state_code, territory_id, year DESC
+        """
+        url_builder = self._file_url_builder()
+        return [
+            self._format_aggregates_data(result, url_builder)
+            for result in self._select(command, {}, "get_all_aggregates")
+        ]
+
+    def wait_for_notification(self, channel: str, timeout: float) -> bool:
+        """
+        Waits up to timeout seconds for a NOTIFY on the channel, returning
+        whether one arrived. The channel is listened to on a connection of
+        its own (outside the pool), kept open between calls. Notifications
+        sent while it was not open are lost, so opening it counts as one.
+        """
+        connection = self._listen_connection
+        if connection is None or connection.closed:
+            connection = self._open_connection()
+            connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        psycopg2.sql.SQL("LISTEN {}").format(
+                            psycopg2.sql.Identifier(channel)
+                        )
+                    )
+            except psycopg2.Error:
+                connection.close()
+                raise
+            self._listen_connection = connection
+            return True
+        try:
+            if connection.notifies or select.select([connection], [], [], timeout)[0]:
+                connection.poll()
+        except psycopg2.Error:
+            connection.close()
+            raise
+        notified = bool(connection.notifies)
+        connection.notifies.clear()
+        return notified
+
+    def _file_url_builder(self) -> FileUrlBuilder:
+        if self._url_builder is not None:
+            return self._url_builder
+        return FileUrlBuilder.from_environment()
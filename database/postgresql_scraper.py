@@ -1,11 +1,15 @@
 import logging
+import time
 from datetime import date, datetime
 from typing import Dict, List, Optional, Tuple
 
 import psycopg2
 from psycopg2.extras import Json
 
+from observability import traced
+from observability.metrics import track_backend_call
 from scraper import InvalidTerritoryIDException, ScraperDatabaseInterface
+from utils.deadline import check_deadline
 
 from .postgresql import PostgreSQLDatabase
 
@@ -117,28 +121,45 @@ END $$;
 class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
     _job_stats_table_ready = False
 
-    def _execute(self, command: str, data: Dict = {}) -> List[Tuple]:
+    def _execute(
+        self, command: str, data: Dict = {}, statement_name: str = ""
+    ) -> List[Tuple]:
         """
         Execute a write command, commit it and return the rows produced by a
         RETURNING clause (if any).
         """
-        connection = psycopg2.connect(
-            dbname=self.database,
-            user=self.user,
-            password=self.password,
-            host=self.host,
-            port=self.port,
-        )
+        check_deadline()
+        connection = self._connect()
         try:
-            with connection.cursor() as cursor:
-                cursor.execute(command, data)
-                logging.debug(f"Executed command: {cursor.query}")
-                results = cursor.fetchall() if cursor.description is not None else []
-            connection.commit()
+            start = time.perf_counter()
+            with track_backend_call("postgresql", "execute") as span:
+                with connection.cursor() as cursor:
+                    self._apply_statement_timeout(cursor)
+                    cursor.execute(command, data)
+                    logging.debug(f"Executed command: {cursor.query}")
+                    results = (
+                        cursor.fetchall() if cursor.description is not None else []
+                    )
+                    statement, row_count = cursor.query, cursor.rowcount
+                span.set_attributes(
+                    self._span_attributes(statement_name, command, row_count)
+                )
+                connection.commit()
+            self._log_if_slow(
+                "execute",
+                statement_name,
+                command,
+                data,
+                statement,
+                row_count,
+                time.perf_counter() - start,
+                analyze=False,
+            )
             return results
         finally:
-            connection.close()
+            self._release(connection)
 
+    @traced
     def get_enabled_spiders(
         self, start_date: Optional[date] = None, end_date: Optional[date] = None
     ) -> List[Dict]:
@@ -156,9 +177,11 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
         """
         data = {"start_date": start_date, "end_date": end_date}
         return [
-            self._format_spider_data(result) for result in self._select(command, data)
+            self._format_spider_data(result)
+            for result in self._select(command, data, "get_enabled_spiders")
         ]
 
+    @traced
     def insert_gazette(self, gazette: Dict) -> Optional[int]:
         command = """
         INSERT INTO gazettes (
@@ -175,7 +198,7 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
         ;
         """
         try:
-            results = self._execute(command, gazette)
+            results = self._execute(command, gazette, "insert_gazette")
         except psycopg2.errors.ForeignKeyViolation:
             raise InvalidTerritoryIDException(
                 f'Territory "{gazette["territory_id"]}" does not exist.'
@@ -184,6 +207,7 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
             return None
         return results[0][0]
 
+    @traced
     def insert_job_stats(
         self, spider_name: str, job_id: Optional[str], stats: Dict
     ) -> int:
@@ -195,9 +219,10 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
         ;
         """
         data = {"spider_name": spider_name, "job_id": job_id, "stats": Json(stats)}
-        results = self._execute(command, data)
+        results = self._execute(command, data, "insert_job_stats")
         return results[0][0]
 
+    @traced
     def get_job_stats(
         self,
         spider: Optional[str] = None,
@@ -220,9 +245,10 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
         data = {"spider": spider, "since": since, "limit": limit}
         return [
             self._format_job_stats_data(result)
-            for result in self._select(command, data)
+            for result in self._select(command, data, "get_job_stats")
         ]
 
+    @traced
     def sync_spiders(self, territory_spider_map: List[tuple]) -> int:
         for spider_name, territory_id, date_from in territory_spider_map:
             self._execute(
@@ -234,6 +260,7 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
                     WHERE querido_diario_spiders.date_from <> EXCLUDED.date_from
                 """,
                 {"spider_name": spider_name, "date_from": date_from},
+                "sync_spider",
             )
             self._execute(
                 """
@@ -242,13 +269,16 @@ class PostgreSQLDatabaseScraper(PostgreSQLDatabase, ScraperDatabaseInterface):
                 ON CONFLICT DO NOTHING
                 """,
                 {"spider_name": spider_name, "territory_id": territory_id},
+                "sync_territory_spider",
             )
         return len(territory_spider_map)
 
     def _ensure_job_stats_table(self) -> None:
         if not self._job_stats_table_ready:
-            self._execute(CREATE_JOB_STATS_TABLE_COMMAND)
-            self._execute(MIGRATE_JOB_STATS_TABLE_COMMAND)
+            self._execute(CREATE_JOB_STATS_TABLE_COMMAND, {}, "create_job_stats_table")
+            self._execute(
+                MIGRATE_JOB_STATS_TABLE_COMMAND, {}, "migrate_job_stats_table"
+            )
             self._job_stats_table_ready = True
 
     def _format_spider_data(self, data: Tuple) -> Dict:
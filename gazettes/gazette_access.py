@@ -1,6 +1,6 @@
 import abc
 from datetime import date, datetime
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from index import SearchEngineInterface
 from index.opensearch import (
@@ -15,7 +15,8 @@ from index.opensearch import (
     PaginationMixin,
     HighlightMixin,
 )
-from utils import build_file_url
+from observability import server_timing_stage, traced
+from utils import FileUrlBuilder, parse_date
 
 
 class GazetteRequest:
@@ -59,6 +60,20 @@ class GazetteSearchResult:
     Item to represent a gazette search result in memory inside the module
     """
 
+    __slots__ = (
+        "territory_id",
+        "date",
+        "scraped_at",
+        "url",
+        "territory_name",
+        "state_code",
+        "excerpts",
+        "edition",
+        "is_extra_edition",
+        "file_checksum",
+        "txt_url",
+    )
+
     def __init__(
         self,
         territory_id,
@@ -94,7 +109,7 @@ class GazetteSearchResult:
                 self.url,
                 self.territory_name,
                 self.state_code,
-                str(self.excerpts),
+                tuple(self.excerpts),
                 self.edition,
                 self.is_extra_edition,
                 self.file_checksum,
@@ -111,7 +126,7 @@ class GazetteSearchResult:
             and self.url == other.url
             and self.territory_name == other.territory_name
             and self.state_code == other.state_code
-            and str(self.excerpts) == str(other.excerpts)
+            and list(self.excerpts) == list(other.excerpts)
             and self.edition == other.edition
             and self.is_extra_edition == other.is_extra_edition
             and self.txt_url == other.txt_url
@@ -178,12 +193,14 @@ class GazetteQueryBuilder(
         publication_date_field: str,
         scraped_at_field: str,
         territory_id_field: str,
+        highlight_type: str = "fvh",
     ):
         self.text_content_field = text_content_field
         self.text_content_exact_field_suffix = text_content_exact_field_suffix
         self.publication_date_field = publication_date_field
         self.scraped_at_field = scraped_at_field
         self.territory_id_field = territory_id_field
+        self.highlight_type = highlight_type
 
     def build_query(
         self,
@@ -271,7 +288,7 @@ class GazetteQueryBuilder(
             number_of_fragments=number_of_excerpts,
             pre_tags=pre_tags,
             post_tags=post_tags,
-            type="fvh",
+            type=self.highlight_type,
             matched_fields=matched_fields,
         )
         self.add_highlight(
@@ -288,13 +305,16 @@ class GazetteSearchEngineGateway(GazetteDataGateway):
         search_engine: SearchEngineInterface,
         query_builder: QueryBuilderInterface,
         index: str,
+        url_builder: Optional[FileUrlBuilder] = None,
     ):
         self._engine = search_engine
         self._query_builder = query_builder
         self._index = index
+        self._url_builder = url_builder
         if not self._engine.index_exists(index):
             raise Exception(f'Index "{index}" does not exist')
 
+    @traced
     def get_gazettes(
         self,
         territory_ids: List[str],
@@ -328,18 +348,32 @@ class GazetteSearchEngineGateway(GazetteDataGateway):
         )
         gazettes = self._engine.search(query=query, index=self._index)
 
-        return (
-            self.get_total_number_items(gazettes),
-            self.create_list_with_gazette_objects(gazettes["hits"]["hits"]),
-        )
+        with server_timing_stage("assemble"):
+            gazette_objects = self.create_list_with_gazette_objects(
+                gazettes["hits"]["hits"]
+            )
+        return (self.get_total_number_items(gazettes), gazette_objects)
 
     def get_total_number_items(self, search_response_json: Dict):
         return search_response_json["hits"]["total"]["value"]
 
     def create_list_with_gazette_objects(self, gazette_hits: List[Dict]):
-        return [self._assemble_gazette_object(gazette) for gazette in gazette_hits]
+        urls = self._file_url_builder().build_hit_urls(
+            gazette_hits, "url", "file_raw_txt"
+        )
+        return [
+            self._assemble_gazette_object(gazette, gazette_urls)
+            for gazette, gazette_urls in zip(gazette_hits, urls)
+        ]
+
+    def _file_url_builder(self) -> FileUrlBuilder:
+        if self._url_builder is not None:
+            return self._url_builder
+        return FileUrlBuilder.from_environment()
 
-    def _assemble_gazette_object(self, gazette):
+    def _assemble_gazette_object(
+        self, gazette, urls: Optional[Tuple[str, Optional[str]]] = None
+    ):
         highlight = (
             gazette["highlight"].get("source_text", [])
             if "highlight" in gazette
@@ -347,15 +381,15 @@ class GazetteSearchEngineGateway(GazetteDataGateway):
         )
 
         # Build file URL from relative path or process legacy URL
-        file_url = gazette["_source"]["url"]
-        url = build_file_url(file_url)
-
-        file_raw_txt = gazette["_source"].get("file_raw_txt", None)
-        txt_url = build_file_url(file_raw_txt) if file_raw_txt else None
+        if urls is None:
+            (urls,) = self._file_url_builder().build_hit_urls(
+                [gazette], "url", "file_raw_txt"
+            )
+        url, txt_url = urls
 
         return GazetteSearchResult(
             gazette["_source"]["territory_id"],
-            datetime.strptime(gazette["_source"]["date"], "%Y-%m-%d").date(),
+            parse_date(gazette["_source"]["date"]),
             datetime.fromisoformat(gazette["_source"]["scraped_at"]),
             url,
             gazette["_source"]["file_checksum"],
@@ -372,11 +406,12 @@ class GazetteAccess(GazetteAccessInterface):
     def __init__(self, data_gateway: GazetteDataGateway):
         self._data_gateway = data_gateway
 
+    @traced
     def get_gazettes(self, filters: GazetteRequest):
         total_number_gazettes, gazettes = self._data_gateway.get_gazettes(
             **vars(filters)
         )
-        return (total_number_gazettes, [vars(gazette) for gazette in gazettes])
+        return (total_number_gazettes, gazettes)
 
 
 def create_gazettes_query_builder(
@@ -385,6 +420,7 @@ def create_gazettes_query_builder(
     gazette_publication_date_field: str,
     gazette_scraped_at_field: str,
     gazette_territory_id_field: str,
+    gazette_highlight_type: str = "fvh",
 ) -> QueryBuilderInterface:
     return GazetteQueryBuilder(
         gazette_content_field,
@@ -392,6 +428,7 @@ def create_gazettes_query_builder(
         gazette_publication_date_field,
         gazette_scraped_at_field,
         gazette_territory_id_field,
+        gazette_highlight_type,
     )
 
 
@@ -399,6 +436,7 @@ def create_gazettes_data_gateway(
     search_engine: SearchEngineInterface,
     query_builder: QueryBuilderInterface,
     index: str,
+    url_builder: Optional[FileUrlBuilder] = None,
 ) -> GazetteDataGateway:
     if not isinstance(search_engine, SearchEngineInterface):
         raise Exception(
@@ -408,7 +446,7 @@ def create_gazettes_data_gateway(
         raise Exception(
             "Query builder should implement the QueryBuilderInterface interface"
         )
-    return GazetteSearchEngineGateway(search_engine, query_builder, index)
+    return GazetteSearchEngineGateway(search_engine, query_builder, index, url_builder)
 
 
 def create_gazettes_interface(
@@ -19,7 +19,15 @@ from gazettes import (
     create_gazettes_query_builder,
 )
 from index import create_search_engine_interface
+from observability import (
+    SlowQueryLog,
+    Tracer,
+    configure_slow_query_log,
+    configure_tracer,
+    create_span_exporter,
+)
 from suggestions import create_suggestion_service
+from utils import FileUrlBuilder
 from themed_excerpts import (
     create_themes_database_gateway,
     create_themed_excerpts_data_gateway,
@@ -29,10 +37,35 @@ from themed_excerpts import (
 
 configuration = load_configuration()
 
+if configuration.slow_query_log_file:
+    configure_slow_query_log(
+        SlowQueryLog(
+            configuration.slow_query_log_file,
+            threshold=configuration.slow_query_threshold,
+            max_bytes=configuration.slow_query_log_max_bytes,
+            backup_count=configuration.slow_query_log_backup_count,
+            explain_sample_rate=configuration.slow_query_explain_sample_rate,
+            explain_timeout=configuration.slow_query_explain_timeout,
+        )
+    )
+
+tracer = None
+if configuration.tracing_exporter:
+    tracer = Tracer(
+        create_span_exporter(
+            configuration.tracing_exporter, configuration.tracing_exporter_target
+        ),
+        service_name=configuration.tracing_service_name,
+    )
+    configure_tracer(tracer)
+
+file_url_builder = FileUrlBuilder.from_configuration(configuration)
+
 search_engine = create_search_engine_interface(
     configuration.host,
     (configuration.opensearch_user, configuration.opensearch_pswd),
     configuration.gazette_index,
+    configuration.opensearch_serializer,
 )
 
 gazettes_query_builder = create_gazettes_query_builder(
@@ -41,9 +74,13 @@ gazettes_query_builder = create_gazettes_query_builder(
     configuration.gazette_publication_date_field,
     configuration.gazette_scraped_at_field,
     configuration.gazette_territory_id_field,
+    configuration.gazette_highlight_type,
 )
 gazettes_search_engine_gateway = create_gazettes_data_gateway(
-    search_engine, gazettes_query_builder, configuration.gazette_index
+    search_engine,
+    gazettes_query_builder,
+    configuration.gazette_index,
+    file_url_builder,
 )
 gazettes_interface = create_gazettes_interface(gazettes_search_engine_gateway)
 
@@ -59,9 +96,10 @@ themed_excerpts_query_builder = create_themed_excerpts_query_builder(
     configuration.themed_excerpt_tfidf_score_field,
     configuration.themed_excerpt_fragment_size,
     configuration.themed_excerpt_number_of_fragments,
+    configuration.themed_excerpt_highlight_type,
 )
 themed_excerpts_search_engine_gateway = create_themed_excerpts_data_gateway(
-    search_engine, themed_excerpts_query_builder
+    search_engine, themed_excerpts_query_builder, file_url_builder
 )
 themes_database_gateway = create_themes_database_gateway(
     configuration.themes_database_file
@@ -88,16 +126,29 @@ companies_database = create_companies_database_interface(
     db_user=configuration.companies_database_user,
     db_pass=configuration.companies_database_pass,
     db_port=configuration.companies_database_port,
+    pool_size=configuration.companies_database_pool_size,
+)
+companies_database.check_columns()
+companies_interface = create_companies_interface(
+    companies_database,
+    cache_size=configuration.companies_cache_size,
+    cache_ttl=configuration.companies_cache_ttl,
+    cache_negative_ttl=configuration.companies_cache_negative_ttl,
+    version_check_interval=configuration.companies_cache_version_check_interval,
 )
-companies_interface = create_companies_interface(companies_database)
 aggregates_database = create_aggregates_database_interface(
     db_host=configuration.aggregates_database_host,
     db_name=configuration.aggregates_database_db,
     db_user=configuration.aggregates_database_user,
     db_pass=configuration.aggregates_database_pass,
     db_port=configuration.aggregates_database_port,
+    url_builder=file_url_builder,
+)
+aggregates_interface = create_aggregates_interface(
+    aggregates_database,
+    snapshot_refresh_interval=configuration.aggregates_snapshot_refresh_interval,
+    notification_channel=configuration.aggregates_notification_channel,
 )
-aggregates_interface = create_aggregates_interface(aggregates_database)
 scraper_database = create_scraper_database_interface(
     db_host=configuration.aggregates_database_host,
     db_name=configuration.aggregates_database_db,
@@ -138,3 +189,7 @@ uvicorn.run(
     root_path=configuration.root_path,
     log_level=log_level,
 )
+
+# Export the spans still waiting in the queue
+if tracer is not None:
+    tracer.shutdown()
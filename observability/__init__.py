@@ -0,0 +1,27 @@
+from .metrics import (
+    MetricsMiddleware,
+    PROMETHEUS_CONTENT_TYPE,
+    record_cache_lookup,
+    record_snapshot_refresh,
+    registry,
+    track_backend_call,
+    track_snapshot_age,
+)
+from .server_timing import (
+    ServerTimingMiddleware,
+    current_server_timing,
+    server_timing_stage,
+)
+from .profiling import ProfilingMiddleware, profiled
+from .slow_queries import SlowQueryLog, configure_slow_query_log, slow_query_log
+from .tracing import (
+    SPAN_EXPORTERS,
+    SpanExporter,
+    Tracer,
+    TracingMiddleware,
+    configure_tracer,
+    create_span_exporter,
+    current_span,
+    start_span,
+    traced,
+)
@@ -0,0 +1,442 @@
+"""
+In-process metrics exposed in the Prometheus text format.
+
+Metrics are plain counters, gauges and fixed-bucket histograms kept in memory.
+Recording a value only takes a lock and a bisect, so they can be used in the
+request hot path.
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+
+from .routes import route_name
+from .server_timing import server_timing_stage
+from .tracing import Span, start_span
+
+DEFAULT_LATENCY_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+)
+
+DEFAULT_SIZE_BUCKETS = (
+    1_000,
+    10_000,
+    50_000,
+    100_000,
+    500_000,
+    1_000_000,
+    5_000_000,
+    10_000_000,
+)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    labels = ",".join(
+        f'{name}="{_escape_label_value(value)}"' for name, value in zip(names, values)
+    )
+    return f"{{{labels}}}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Base class for metrics with (optional) labels. Each combination of label
+    values is kept as a child holding the actual values.
+    """
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *labelvalues: str):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(
+                f"Metric {self.name} expects labels {self.labelnames}, got {labelvalues}"
+            )
+        labelvalues = tuple(str(value) for value in labelvalues)
+        child = self._children.get(labelvalues)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def children(self) -> List[Tuple[Tuple[str, ...], object]]:
+        with self._lock:
+            return list(self._children.items())
+
+    def expose(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type}",
+        ]
+        for labelvalues, child in self.children():
+            lines.extend(self._expose_child(labelvalues, child))
+        return lines
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _expose_child(self, labelvalues, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1) -> None:
+        self.labels().inc(amount)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def _expose_child(self, labelvalues, child) -> List[str]:
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(child.value)}"]
+
+
+class _GaugeChild(_CounterChild):
+    _function = None
+
+    def dec(self, amount: float = 1) -> None:
+        self.inc(-amount)
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """
+        Computes the value when it is exposed, instead of keeping it
+        """
+        self._function = function
+
+    def get(self) -> float:
+        function = self._function
+        return self.value if function is None else function()
+
+
+class Gauge(Counter):
+    type = "gauge"
+
+    def dec(self, amount: float = 1) -> None:
+        self.labels().dec(amount)
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self.labels().set_function(function)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def _expose_child(self, labelvalues, child) -> List[str]:
+        labels = _format_labels(self.labelnames, labelvalues)
+        return [f"{self.name}{labels} {_format_value(child.get())}"]
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        with self._lock:
+            return list(self.counts), self.sum
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _expose_child(self, labelvalues, child) -> List[str]:
+        counts, total = child.snapshot()
+        lines = []
+        cumulative = 0
+        bucket_labelnames = self.labelnames + ("le",)
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            labels = _format_labels(
+                bucket_labelnames, labelvalues + (_format_value(bound),)
+            )
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, labelvalues)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Collection of the metrics exposed by the application
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames=(),
+        buckets=DEFAULT_LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def expose(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS_IN_FLIGHT = registry.gauge(
+    "querido_diario_http_requests_in_flight",
+    "Number of HTTP requests being processed.",
+)
+HTTP_REQUEST_DURATION = registry.histogram(
+    "querido_diario_http_request_duration_seconds",
+    "Time to process HTTP requests, by route and status code.",
+    ("method", "route", "status"),
+)
+HTTP_RESPONSE_SIZE = registry.histogram(
+    "querido_diario_http_response_size_bytes",
+    "Size of the HTTP response bodies, by route.",
+    ("route",),
+    buckets=DEFAULT_SIZE_BUCKETS,
+)
+BACKEND_CALLS_IN_FLIGHT = registry.gauge(
+    "querido_diario_backend_calls_in_flight",
+    "Number of calls to backends waiting for an answer.",
+    ("backend",),
+)
+BACKEND_CALL_DURATION = registry.histogram(
+    "querido_diario_backend_call_duration_seconds",
+    "Wall time of the calls to backends, by backend and operation.",
+    ("backend", "operation"),
+)
+OPENSEARCH_TOOK = registry.histogram(
+    "querido_diario_opensearch_took_seconds",
+    "Search time reported by OpenSearch (the took field of the response).",
+)
+OPENSEARCH_OVERHEAD = registry.histogram(
+    "querido_diario_opensearch_overhead_seconds",
+    "Wall time of searches not spent in OpenSearch (network, (de)serialization).",
+)
+CACHE_REQUESTS = registry.counter(
+    "querido_diario_cache_requests_total",
+    "Lookups in in-memory caches, by cache and result (hit or miss).",
+    ("cache", "result"),
+)
+CANCELLED_OPERATIONS = registry.counter(
+    "querido_diario_cancelled_operations_total",
+    "Backend operations cancelled because the client disconnected.",
+    ("backend",),
+)
+CLIENT_DISCONNECTS = registry.counter(
+    "querido_diario_client_disconnects_total",
+    "Requests abandoned by the client before the response, by route.",
+    ("route",),
+)
+SNAPSHOT_AGE = registry.gauge(
+    "querido_diario_snapshot_age_seconds",
+    "Time since the last refresh of in-memory snapshots of tables, by snapshot.",
+    ("snapshot",),
+)
+SNAPSHOT_ROWS = registry.gauge(
+    "querido_diario_snapshot_rows",
+    "Rows loaded by the last refresh of in-memory snapshots, by snapshot.",
+    ("snapshot",),
+)
+SNAPSHOT_REFRESHES = registry.counter(
+    "querido_diario_snapshot_refreshes_total",
+    "Refreshes of in-memory snapshots, by snapshot and result (success or failure).",
+    ("snapshot", "result"),
+)
+
+
+@contextmanager
+def track_backend_call(backend: str, operation: str) -> Iterator[Span]:
+    """
+    Measures the wall time of the backend call running inside the block (also
+    reported as a Server-Timing stage named after the backend and operation)
+    and traces it in a client span, given to the block to add attributes
+    """
+    in_flight = BACKEND_CALLS_IN_FLIGHT.labels(backend)
+    in_flight.inc()
+    start = time.perf_counter()
+    try:
+        with server_timing_stage(f"{backend}_{operation}"), start_span(
+            f"{backend} {operation}",
+            kind="client",
+            attributes={"peer.service": backend},
+        ) as span:
+            yield span
+    finally:
+        BACKEND_CALL_DURATION.labels(backend, operation).observe(
+            time.perf_counter() - start
+        )
+        in_flight.dec()
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def track_snapshot_age(snapshot: str, age: Callable[[], float]) -> None:
+    """
+    Exposes the age of the snapshot, as computed by age when scraped
+    """
+    SNAPSHOT_AGE.labels(snapshot).set_function(age)
+
+
+def record_snapshot_refresh(snapshot: str, rows: Union[int, None]) -> None:
+    """
+    Records a refresh of the snapshot, which failed when rows is None
+    """
+    if rows is None:
+        SNAPSHOT_REFRESHES.labels(snapshot, "failure").inc()
+        return
+    SNAPSHOT_REFRESHES.labels(snapshot, "success").inc()
+    SNAPSHOT_ROWS.labels(snapshot).set(rows)
+
+
+_current_request_scope: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_request_scope", default=None
+)
+
+
+def current_route() -> Union[str, None]:
+    """
+    Route of the HTTP request being processed (if any)
+    """
+    scope = _current_request_scope.get()
+    if scope is None:
+        return None
+    return route_name(scope)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording latency, status and response size of every
+    HTTP request
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        response_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_REQUESTS_IN_FLIGHT.inc()
+        token = _current_request_scope.set(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            _current_request_scope.reset(token)
+            HTTP_REQUESTS_IN_FLIGHT.dec()
+            route = route_name(scope)
+            HTTP_REQUEST_DURATION.labels(
+                scope["method"], route, str(status_code)
+            ).observe(duration)
+            HTTP_RESPONSE_SIZE.labels(route).observe(response_size)
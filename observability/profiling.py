@@ -0,0 +1,230 @@
+"""
+On-demand sampling profiler for single requests.
+
+Requests sent with a valid admin key in the X-API-Key header and the
+X-Profile header run while a background thread samples the stacks of the
+threads working for them (the event loop and the worker threads running the
+backend calls). The samples are written in the collapsed stack format read by
+flamegraph.pl, speedscope and most flame graph tools.
+
+Requests without the X-Profile header only pay for a header lookup, and the
+middleware is not installed at all when no admin key is configured.
+"""
+
+import asyncio
+import collections
+import contextvars
+import functools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Callable, Union
+
+PROFILE_HEADER = b"x-profile"
+API_KEY_HEADER = b"x-api-key"
+PROFILE_FILE_HEADER = b"x-profile-file"
+
+# X-Profile value asking for the profile as response body instead of a file
+INLINE_PROFILE = "inline"
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+
+def _collapse_stack(frame) -> str:
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SamplingProfiler:
+    """
+    Samples the current stack of the registered threads at a fixed interval
+    and counts how many times each stack was seen
+    """
+
+    def __init__(self, interval: float = DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._threads = set()
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.add(ident)
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads.discard(ident)
+
+    def start(self) -> None:
+        self._sampler = threading.Thread(
+            target=self._run, name="request-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def sample(self) -> None:
+        frames = sys._current_frames()
+        with self._lock:
+            for ident in self._threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self._stacks[_collapse_stack(frame)] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """
+        Profile in the collapsed stack format: one line per distinct stack,
+        with the frames separated by semicolons followed by the sample count
+        """
+        with self._lock:
+            stacks = self._stacks.most_common()
+        return "".join(f"{stack} {count}\n" for stack, count in stacks)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.interval):
+            self.sample()
+
+
+_current_profiler: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_profiler", default=None
+)
+
+
+def current_profiler() -> Union[SamplingProfiler, None]:
+    return _current_profiler.get()
+
+
+def profiled(function: Callable) -> Callable:
+    """
+    Wraps a function about to run in a worker thread so that thread is sampled
+    by the profiler of the current request (if any)
+    """
+    profiler = current_profiler()
+    if profiler is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        profiler.add_thread(ident)
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.remove_thread(ident)
+
+    return wrapper
+
+
+def _get_header(scope, name: bytes) -> Union[str, None]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware running the requests which ask for it (and are allowed to)
+    under the sampling profiler
+    """
+
+    def __init__(
+        self,
+        app,
+        is_admin_key: Callable[[str], bool],
+        output_dir: str = "",
+        interval: float = DEFAULT_SAMPLE_INTERVAL,
+    ):
+        self.app = app
+        self.is_admin_key = is_admin_key
+        self.output_dir = output_dir or os.path.join(
+            tempfile.gettempdir(), "querido-diario-profiles"
+        )
+        self.interval = interval
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        mode = _get_header(scope, PROFILE_HEADER)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not self.is_admin_key(_get_header(scope, API_KEY_HEADER) or ""):
+            logging.warning(f"Profiling of {scope['path']} refused: invalid API key")
+            await self.app(scope, receive, send)
+            return
+
+        if mode.strip().lower() == INLINE_PROFILE:
+            await self._profile_inline(scope, receive, send)
+        else:
+            await self._profile_to_file(scope, receive, send)
+
+    async def _run_profiled(self, scope, receive, send) -> SamplingProfiler:
+        profiler = SamplingProfiler(self.interval)
+        profiler.add_thread(threading.get_ident())
+        token = _current_profiler.set(profiler)
+        profiler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profiler.stop()
+            _current_profiler.reset(token)
+        return profiler
+
+    async def _profile_to_file(self, scope, receive, send):
+        filename = f"{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.collapsed"
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_FILE_HEADER, filename.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        profiler = await self._run_profiled(scope, receive, send_wrapper)
+        path = os.path.join(self.output_dir, filename)
+        await asyncio.to_thread(self._write_profile, path, profiler.collapsed())
+        logging.info(
+            f"Profile of {scope['path']} ({profiler.samples} samples) written to {path}"
+        )
+
+    async def _profile_inline(self, scope, receive, send):
+        async def discard(message):
+            pass
+
+        profiler = await self._run_profiled(scope, receive, discard)
+        body = profiler.collapsed().encode()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
+
+    def _write_profile(self, path: str, profile: str) -> None:
+        os.makedirs(self.output_dir, exist_ok=True)
+        with open(path, "w") as profile_file:
+            profile_file.write(profile)
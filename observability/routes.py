@@ -0,0 +1,10 @@
+from typing import Dict
+
+
+def route_name(scope: Dict) -> str:
+    """
+    Path template of the route which handled the request. Unmatched paths
+    share a single label value to keep the number of series bounded.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", "unmatched")
@@ -0,0 +1,123 @@
+"""
+Per-request breakdown of where the time went, sent in the Server-Timing
+response header (https://www.w3.org/TR/server-timing/).
+
+The middleware opens a timing for each request. Code running for the request
+(including worker threads started from it) adds the duration of its stages,
+which are read by browser devtools and can be logged by load balancers.
+"""
+
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, Union
+
+
+class ServerTiming:
+    """
+    Durations (in seconds) of the stages of a request, accumulated by stage
+    name in the order they first happened
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.backend_done_at = None
+        self._durations = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, duration: float) -> None:
+        with self._lock:
+            self._durations[name] = self._durations.get(name, 0.0) + duration
+
+    @contextmanager
+    def measure(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def mark_backend_done(self) -> None:
+        """
+        Marks the end of the backend work of the request, so the time until the
+        response starts is reported as serialization
+        """
+        self.backend_done_at = time.perf_counter()
+
+    def finish(self) -> None:
+        now = time.perf_counter()
+        if self.backend_done_at is not None:
+            self.add("serialize", now - self.backend_done_at)
+        self.add("total", now - self.start)
+
+    def header_value(self) -> str:
+        with self._lock:
+            durations = list(self._durations.items())
+        return ", ".join(
+            f"{name};dur={duration * 1000:.1f}" for name, duration in durations
+        )
+
+
+_current_timing: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_server_timing", default=None
+)
+
+
+def current_server_timing() -> Union[ServerTiming, None]:
+    return _current_timing.get()
+
+
+@contextmanager
+def request_server_timing() -> Iterator[ServerTiming]:
+    """
+    Makes a new timing active for the code running inside the block,
+    including worker threads started from it
+    """
+    timing = ServerTiming()
+    token = _current_timing.set(timing)
+    try:
+        yield timing
+    finally:
+        _current_timing.reset(token)
+
+
+@contextmanager
+def server_timing_stage(name: str) -> Iterator[None]:
+    """
+    Adds the time spent inside the block to the given stage of the current
+    request (does nothing when Server-Timing is disabled)
+    """
+    timing = _current_timing.get()
+    if timing is None:
+        yield
+        return
+    with timing.measure(name):
+        yield
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware which times each HTTP request and adds the Server-Timing
+    header to its response
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with request_server_timing() as timing:
+
+            async def send_wrapper(message):
+                if message["type"] == "http.response.start":
+                    timing.finish()
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timing.header_value().encode()))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, receive, send_wrapper)
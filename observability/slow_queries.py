@@ -0,0 +1,147 @@
+"""
+Log of the backend queries slower than a threshold.
+
+Each slow query is written as one JSON object per line (NDJSON) to a local
+file rotated by size, with what is needed to reproduce and tune it: the
+OpenSearch query body and its took/shard statistics, or the SQL statement with
+its parameters and (for a sample of them) the PostgreSQL plan.
+
+The plans are captured by a background worker, so a request that was
+already slow does not also wait for its query to be explained.
+
+The log is disabled unless configured, in which case backends only check for
+its absence.
+"""
+
+import json
+import logging
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+from typing import Any, Callable, Dict, Union
+
+from .metrics import current_route
+
+# Slow queries waiting for their plan. When the worker falls this far behind,
+# the next ones are logged without a plan.
+EXPLAIN_QUEUE_SIZE = 16
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 1.0,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        explain_sample_rate: float = 0.1,
+        explain_timeout: float = 10.0,
+    ):
+        self.threshold = threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_timeout = explain_timeout
+        self._explain_queue = queue.Queue(EXPLAIN_QUEUE_SIZE)
+        self._explain_worker = None
+        self._explain_worker_lock = threading.Lock()
+        handler = RotatingFileHandler(
+            path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        # standalone logger, so slow queries do not go to the application logs
+        self._logger = logging.Logger("querido_diario.slow_queries")
+        self._logger.addHandler(handler)
+
+    def is_slow(self, duration: float) -> bool:
+        return duration >= self.threshold
+
+    def should_explain(self) -> bool:
+        """
+        Whether to also capture the plan of the current slow query. Only a
+        sample is explained as it runs the query again.
+        """
+        return random.random() < self.explain_sample_rate
+
+    def record(self, backend: str, operation: str, duration: float, **details):
+        self._write(self._entry(backend, operation, duration, details))
+
+    def record_with_plan(
+        self,
+        explain: Callable[[float], Any],
+        backend: str,
+        operation: str,
+        duration: float,
+        **details,
+    ):
+        """
+        Records the query with the plan returned by explain, which is called
+        by the background worker with the explain timeout (in seconds)
+        """
+        entry = self._entry(backend, operation, duration, details)
+        try:
+            self._explain_queue.put_nowait((entry, explain))
+        except queue.Full:
+            self._write(entry)
+            return
+        self._start_explain_worker()
+
+    def flush(self) -> None:
+        """
+        Waits for the plans being captured to be logged
+        """
+        self._explain_queue.join()
+
+    def _entry(
+        self, backend: str, operation: str, duration: float, details: Dict
+    ) -> Dict:
+        return {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "backend": backend,
+            "operation": operation,
+            "route": current_route(),
+            "duration_ms": round(duration * 1000, 1),
+            **details,
+        }
+
+    def _write(self, entry: Dict) -> None:
+        self._logger.info(json.dumps(entry, default=str, ensure_ascii=False))
+
+    def _start_explain_worker(self) -> None:
+        with self._explain_worker_lock:
+            if self._explain_worker is None:
+                self._explain_worker = threading.Thread(
+                    target=self._explain_forever, name="slow-query-plans", daemon=True
+                )
+                self._explain_worker.start()
+
+    def _explain_forever(self) -> None:
+        while True:
+            entry, explain = self._explain_queue.get()
+            try:
+                entry["plan"] = explain(self.explain_timeout)
+            except Exception as error:
+                logging.warning(f"Could not explain slow query: {error}")
+                entry["plan"] = None
+            try:
+                self._write(entry)
+            finally:
+                self._explain_queue.task_done()
+
+    def close(self) -> None:
+        self.flush()
+        for handler in list(self._logger.handlers):
+            handler.close()
+            self._logger.removeHandler(handler)
+
+
+_slow_query_log = None
+
+
+def configure_slow_query_log(log: Union[SlowQueryLog, None]) -> None:
+    global _slow_query_log
+    _slow_query_log = log
+
+
+def slow_query_log() -> Union[SlowQueryLog, None]:
+    return _slow_query_log
@@ -0,0 +1,450 @@
+"""
+Distributed tracing compatible with OpenTelemetry.
+
+Spans follow the OpenTelemetry data model (W3C trace context ids, kinds,
+attributes, status) and are exported in the OTLP/JSON encoding, so they can be
+sent to any OpenTelemetry collector or read back from files by one.
+
+A span is opened for each HTTP request, for the methods of the access and
+gateway layers decorated with `traced` and for every backend call (through
+`observability.metrics.track_backend_call`). Tracing is disabled until a
+tracer is configured, in which case opening a span only checks for it.
+"""
+
+import abc
+import collections
+import contextvars
+import functools
+import json
+import logging
+import random
+import re
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from .routes import route_name
+
+SPAN_KINDS = {
+    "internal": 1,
+    "server": 2,
+    "client": 3,
+}
+
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT_HEADER = b"traceparent"
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+
+
+class Span:
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        span_id: str,
+        parent_span_id: str = "",
+        kind: str = "internal",
+        attributes: Optional[Dict] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_span_id = parent_span_id
+        self.kind = kind
+        self.attributes = dict(attributes or {})
+        self.status = STATUS_UNSET
+        self.status_message = ""
+        self.start_time = time.time_ns()
+        self.end_time = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, attributes: Dict) -> None:
+        self.attributes.update(attributes)
+
+    def set_status(self, status: int, message: str = "") -> None:
+        self.status = status
+        self.status_message = message
+
+    def record_exception(self, exception: BaseException) -> None:
+        self.attributes["exception.type"] = type(exception).__name__
+        self.attributes["exception.message"] = str(exception)
+        self.set_status(STATUS_ERROR, str(exception))
+
+    def end(self) -> None:
+        self.end_time = time.time_ns()
+
+
+class _NoopSpan(Span):
+    """
+    Span returned while tracing is disabled, so callers can always set
+    attributes on the current span
+    """
+
+    def __init__(self):
+        super().__init__("noop", "0" * 32, "0" * 16)
+
+    def set_attribute(self, key: str, value) -> None:
+        pass
+
+    def set_attributes(self, attributes: Dict) -> None:
+        pass
+
+    def set_status(self, status: int, message: str = "") -> None:
+        pass
+
+    def record_exception(self, exception: BaseException) -> None:
+        pass
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _format_attribute_value(value) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {
+            "arrayValue": {"values": [_format_attribute_value(item) for item in value]}
+        }
+    return {"stringValue": str(value)}
+
+
+def _format_attributes(attributes: Dict) -> List[Dict]:
+    return [
+        {"key": key, "value": _format_attribute_value(value)}
+        for key, value in attributes.items()
+        if value is not None
+    ]
+
+
+def format_otlp_spans(spans: List[Span], service_name: str) -> Dict:
+    """
+    Spans in the OTLP/JSON encoding of an ExportTraceServiceRequest
+    """
+    return {
+        "resourceSpans": [
+            {
+                "resource": {
+                    "attributes": _format_attributes({"service.name": service_name})
+                },
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "querido-diario-api"},
+                        "spans": [
+                            {
+                                "traceId": span.trace_id,
+                                "spanId": span.span_id,
+                                "parentSpanId": span.parent_span_id,
+                                "name": span.name,
+                                "kind": SPAN_KINDS[span.kind],
+                                "startTimeUnixNano": str(span.start_time),
+                                "endTimeUnixNano": str(span.end_time),
+                                "attributes": _format_attributes(span.attributes),
+                                "status": {
+                                    "code": span.status,
+                                    "message": span.status_message,
+                                },
+                            }
+                            for span in spans
+                        ],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class SpanExporter(abc.ABC):
+    """
+    Destination of the finished spans
+    """
+
+    @abc.abstractmethod
+    def export(self, spans: List[Span], service_name: str) -> None:
+        """
+        Sends a batch of finished spans
+        """
+
+    def shutdown(self) -> None:
+        """
+        Releases the resources used by the exporter
+        """
+
+
+class FileSpanExporter(SpanExporter):
+    """
+    Appends each batch of spans to a local file as one OTLP/JSON line, the
+    format read by the OpenTelemetry collector otlpjsonfile receiver
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span], service_name: str) -> None:
+        line = json.dumps(format_otlp_spans(spans, service_name), default=str)
+        with self._lock, open(self.path, "a", encoding="utf-8") as trace_file:
+            trace_file.write(line + "\n")
+
+
+class OTLPHttpSpanExporter(SpanExporter):
+    """
+    Sends the spans to an OpenTelemetry collector through OTLP/HTTP with the
+    JSON encoding
+    """
+
+    def __init__(self, endpoint: str, timeout: float = 5.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, spans: List[Span], service_name: str) -> None:
+        body = json.dumps(format_otlp_spans(spans, service_name), default=str)
+        request = urllib.request.Request(
+            self.url,
+            data=body.encode(),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+
+SPAN_EXPORTERS: Dict[str, Callable[..., SpanExporter]] = {
+    "file": FileSpanExporter,
+    "otlp": OTLPHttpSpanExporter,
+}
+
+
+def create_span_exporter(name: str, *args, **kwargs) -> SpanExporter:
+    """
+    Creates the exporter registered in SPAN_EXPORTERS with the given name.
+    Other exporters can be plugged in by adding them to SPAN_EXPORTERS.
+    """
+    if name not in SPAN_EXPORTERS:
+        raise ValueError(f'Unknown span exporter "{name}"')
+    return SPAN_EXPORTERS[name](*args, **kwargs)
+
+
+class Tracer:
+    """
+    Creates the spans and exports the finished ones in batches from a
+    background thread. Spans finished while the queue is full are dropped.
+    """
+
+    def __init__(
+        self,
+        exporter: SpanExporter,
+        service_name: str = "querido-diario-api",
+        export_interval: float = 1.0,
+        max_queue_size: int = 2048,
+    ):
+        self.exporter = exporter
+        self.service_name = service_name
+        self.export_interval = export_interval
+        self.max_queue_size = max_queue_size
+        self.dropped_spans = 0
+        self._queue = collections.deque()
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._exporter_thread = None
+
+    def create_span(
+        self,
+        name: str,
+        parent: Union[Tuple[str, str], None],
+        kind: str = "internal",
+        attributes: Optional[Dict] = None,
+    ) -> Span:
+        if parent is None:
+            trace_id, parent_span_id = f"{random.getrandbits(128):032x}", ""
+        else:
+            trace_id, parent_span_id = parent
+        return Span(
+            name,
+            trace_id,
+            f"{random.getrandbits(64):016x}",
+            parent_span_id,
+            kind,
+            attributes,
+        )
+
+    def end_span(self, span: Span) -> None:
+        span.end()
+        with self._lock:
+            if len(self._queue) >= self.max_queue_size:
+                self.dropped_spans += 1
+                return
+            self._queue.append(span)
+        self._ensure_exporter_thread()
+
+    def flush(self) -> None:
+        with self._lock:
+            spans = list(self._queue)
+            self._queue.clear()
+        if not spans:
+            return
+        with self._export_lock:
+            try:
+                self.exporter.export(spans, self.service_name)
+            except Exception:
+                logging.exception(f"Could not export {len(spans)} span(s)")
+
+    def shutdown(self) -> None:
+        self._stopped.set()
+        if self._exporter_thread is not None:
+            self._exporter_thread.join()
+        self.flush()
+        self.exporter.shutdown()
+
+    def _ensure_exporter_thread(self) -> None:
+        if self._exporter_thread is not None:
+            return
+        with self._lock:
+            if self._exporter_thread is None:
+                self._exporter_thread = threading.Thread(
+                    target=self._run, name="span-exporter", daemon=True
+                )
+                self._exporter_thread.start()
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.export_interval):
+            self.flush()
+
+
+_tracer = None
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_span", default=None
+)
+
+
+def configure_tracer(tracer: Union[Tracer, None]) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+def current_tracer() -> Union[Tracer, None]:
+    return _tracer
+
+
+def current_span() -> Span:
+    """
+    Span of the code currently running (or a span ignoring everything, when
+    there is none)
+    """
+    span = _current_span.get()
+    return NOOP_SPAN if span is None else span
+
+
+@contextmanager
+def start_span(
+    name: str,
+    kind: str = "internal",
+    attributes: Optional[Dict] = None,
+    parent: Union[Tuple[str, str], None] = None,
+) -> Iterator[Span]:
+    """
+    Runs the block inside a new span, child of the current span (or of the
+    given remote parent trace and span ids)
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+
+    if parent is None:
+        current = _current_span.get()
+        if current is not None:
+            parent = (current.trace_id, current.span_id)
+    span = tracer.create_span(name, parent, kind, attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exception:
+        span.record_exception(exception)
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.end_span(span)
+
+
+def traced(function: Callable) -> Callable:
+    """
+    Decorator running each call of the function inside a span named after it
+    """
+    name = function.__qualname__
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _tracer is None:
+            return function(*args, **kwargs)
+        with start_span(name):
+            return function(*args, **kwargs)
+
+    return wrapper
+
+
+def parse_traceparent(value: str) -> Union[Tuple[str, str], None]:
+    """
+    Trace and parent span ids from a W3C traceparent header (if valid)
+    """
+    match = TRACEPARENT_PATTERN.match(value.strip())
+    if match is None or match.group(1) == "0" * 32:
+        return None
+    return match.group(1), match.group(2)
+
+
+class TracingMiddleware:
+    """
+    ASGI middleware opening the server span of each HTTP request, continuing
+    the trace of the caller when it sends the traceparent header
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        parent = None
+        for key, value in scope["headers"]:
+            if key == TRACEPARENT_HEADER:
+                parent = parse_traceparent(value.decode("latin-1"))
+                break
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        attributes = {"http.request.method": scope["method"], "url.path": scope["path"]}
+        with start_span(
+            scope["method"], kind="server", attributes=attributes, parent=parent
+        ) as span:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = route_name(scope)
+                span.name = f"{scope['method']} {route}"
+                span.set_attributes(
+                    {"http.route": route, "http.response.status_code": status_code}
+                )
+                if status_code >= 500:
+                    span.set_status(STATUS_ERROR)
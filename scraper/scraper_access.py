@@ -2,6 +2,8 @@ import abc
 from datetime import date, datetime
 from typing import Dict, List, Optional
 
+from observability import traced
+
 
 class InvalidTerritoryIDException(Exception):
     pass
@@ -97,19 +99,23 @@ class ScraperAccess(ScraperAccessInterface):
     def __init__(self, database_gateway=None):
         self._database_gateway = database_gateway
 
+    @traced
     def get_enabled_spiders(
         self, start_date: Optional[date] = None, end_date: Optional[date] = None
     ) -> List[Dict]:
         return self._database_gateway.get_enabled_spiders(start_date, end_date)
 
+    @traced
     def create_gazette(self, gazette: Dict) -> Optional[int]:
         return self._database_gateway.insert_gazette(gazette)
 
+    @traced
     def create_job_stats(
         self, spider_name: str, job_id: Optional[str], stats: Dict
     ) -> int:
         return self._database_gateway.insert_job_stats(spider_name, job_id, stats)
 
+    @traced
     def get_job_stats(
         self,
         spider: Optional[str] = None,
@@ -118,6 +124,7 @@ class ScraperAccess(ScraperAccessInterface):
     ) -> List[Dict]:
         return self._database_gateway.get_job_stats(spider, since, limit)
 
+    @traced
     def sync_spiders(self, territory_spider_map: List[tuple]) -> int:
         return self._database_gateway.sync_spiders(territory_spider_map)
 
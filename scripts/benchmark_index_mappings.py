@@ -0,0 +1,271 @@
+"""
+Compares alternative mappings of the gazettes index.
+
+The same synthetic corpus (see `load_fake_gazettes.py --synthetic`) is
+indexed under each mapping variant, then the queries built by the API query
+builder are run against every index, with and without highlighting. For each
+variant it reports the index size, the indexing throughput and the search
+and highlight latencies:
+
+    python scripts/benchmark_index_mappings.py --gazettes 200000 \\
+        --variants baseline offsets_unified
+
+The indexes are named `<prefix>-<variant>` and deleted at the end unless
+`--keep-indexes` is given.
+"""
+
+from datetime import date
+import argparse
+import copy
+import itertools
+import json
+import os
+import time
+
+from benchmarks.stats import format_table, percentile
+from gazettes import create_gazettes_query_builder
+
+from load_fake_gazettes import (
+    INDEX_BODY,
+    GazetteGenerator,
+    create_search_engine,
+    delete_index,
+    load_territories,
+    recreate_index,
+    stream_gazettes,
+)
+
+TEXT_FIELD = "source_text"
+
+
+def _text_field(body):
+    return body["mappings"]["properties"][TEXT_FIELD]
+
+
+def _without_term_vectors(body):
+    text_field = _text_field(body)
+    for field in [text_field] + list(text_field["fields"].values()):
+        field.pop("term_vector", None)
+    return body
+
+
+def _without_offsets(body):
+    text_field = _text_field(body)
+    for field in [text_field] + list(text_field["fields"].values()):
+        field.pop("term_vector", None)
+        field.pop("index_options", None)
+    return body
+
+
+def _without_stopwords_field(body):
+    _text_field(body)["fields"].pop("with_stopwords")
+    return body
+
+
+# name: (changes to the current mapping, highlighter used by the queries)
+MAPPING_VARIANTS = {
+    "baseline": ([], "fvh"),
+    "no_with_stopwords": ([_without_stopwords_field], "fvh"),
+    "offsets_unified": ([_without_term_vectors], "unified"),
+    "offsets_unified_no_with_stopwords": (
+        [_without_term_vectors, _without_stopwords_field],
+        "unified",
+    ),
+    "reanalyze_unified": ([_without_offsets], "unified"),
+}
+
+# keyword arguments of the gazettes query builder, besides the common ones
+QUERIES = {
+    "term": {"querystring": "licitação"},
+    "phrase": {"querystring": '"pregão eletrônico"'},
+    "boolean": {"querystring": "contrato + saúde -pavimentação"},
+    "prefix": {"querystring": "medicament*"},
+    "filtered": {
+        "querystring": "nomear",
+        "published_since": date(2020, 1, 1),
+        "published_until": date(2023, 12, 31),
+    },
+}
+
+
+def mapping_for(variant):
+    changes, _ = MAPPING_VARIANTS[variant]
+    body = copy.deepcopy(INDEX_BODY)
+    for change in changes:
+        body = change(body)
+    return body
+
+
+def build_queries(highlight_type, excerpt_size=500, number_of_excerpts=1, size=10):
+    query_builder = create_gazettes_query_builder(
+        TEXT_FIELD, ".exact", "date", "scraped_at", "territory_id", highlight_type
+    )
+    queries = {}
+    for name, arguments in QUERIES.items():
+        query_arguments = {
+            "territory_ids": [],
+            "published_since": None,
+            "published_until": None,
+            "scraped_since": None,
+            "scraped_until": None,
+            "excerpt_size": excerpt_size,
+            "number_of_excerpts": number_of_excerpts,
+            "pre_tags": ["<b>"],
+            "post_tags": ["</b>"],
+            "size": size,
+            "offset": 0,
+            "sort_by": "relevance",
+        }
+        query_arguments.update(arguments)
+        queries[name] = query_builder.build_query(**query_arguments)
+    return queries
+
+
+def index_size(search_engine, index):
+    stats = search_engine.indices.stats(index=index, metric="store")
+    return stats["indices"][index]["primaries"]["store"]["size_in_bytes"]
+
+
+def index_corpus(search_engine, index, args):
+    generator = GazetteGenerator(
+        load_territories(args.census), args.text_size, seed=args.seed
+    )
+    search_engine.indices.put_settings(
+        index=index, body={"index": {"refresh_interval": "-1"}}
+    )
+    start = time.perf_counter()
+    result = stream_gazettes(
+        search_engine,
+        itertools.islice(generator, args.gazettes),
+        index,
+        args.threads,
+        args.chunk_size,
+        label=f"[{index}] ",
+    )
+    search_engine.indices.put_settings(
+        index=index, body={"index": {"refresh_interval": None}}
+    )
+    search_engine.indices.refresh(index=index)
+    seconds = time.perf_counter() - start
+    if args.force_merge:
+        search_engine.indices.forcemerge(
+            index=index, max_num_segments=1, request_timeout=3600
+        )
+    return result["indexed"], result["failed"], seconds
+
+
+def measure_queries(search_engine, index, queries, repeat, warmup):
+    """
+    Median and p95 of the server-side time (`took`, in milliseconds) of the
+    queries, with and without the highlighting
+    """
+    with_highlight = []
+    without_highlight = []
+    for query in queries.values():
+        plain_query = {key: value for key, value in query.items() if key != "highlight"}
+        for body, timings in (
+            (query, with_highlight),
+            (plain_query, without_highlight),
+        ):
+            for attempt in range(warmup + repeat):
+                response = search_engine.search(
+                    index=index, body=body, request_cache=False
+                )
+                if attempt >= warmup:
+                    timings.append(response["took"])
+    with_highlight.sort()
+    without_highlight.sort()
+    return {
+        "search_p50_ms": percentile(without_highlight, 0.5),
+        "search_p95_ms": percentile(without_highlight, 0.95),
+        "highlight_p50_ms": percentile(with_highlight, 0.5),
+        "highlight_p95_ms": percentile(with_highlight, 0.95),
+    }
+
+
+def benchmark_variant(search_engine, variant, args):
+    index = f"{args.prefix}-{variant}"
+    recreate_index(search_engine, index, mapping_for(variant))
+    indexed, failed, seconds = index_corpus(search_engine, index, args)
+    _, highlight_type = MAPPING_VARIANTS[variant]
+    result = {
+        "variant": variant,
+        "highlighter": highlight_type,
+        "gazettes": indexed,
+        "failed": failed,
+        "size_mib": index_size(search_engine, index) / 2**20,
+        "gazettes_per_s": indexed / seconds if seconds else 0.0,
+        **measure_queries(
+            search_engine,
+            index,
+            build_queries(highlight_type, args.excerpt_size),
+            args.repeat,
+            args.warmup,
+        ),
+    }
+    if not args.keep_indexes:
+        delete_index(search_engine, index)
+    return result
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--variants",
+        nargs="*",
+        choices=list(MAPPING_VARIANTS),
+        default=list(MAPPING_VARIANTS),
+    )
+    parser.add_argument("--gazettes", type=int, default=50000)
+    parser.add_argument(
+        "--census", default=os.environ.get("CITY_DATABASE_CSV", "censo.csv")
+    )
+    parser.add_argument("--text-size", type=int, default=5000)
+    parser.add_argument("--excerpt-size", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=20, help="runs per query")
+    parser.add_argument("--warmup", type=int, default=3, help="runs per query")
+    parser.add_argument(
+        "--no-force-merge",
+        dest="force_merge",
+        action="store_false",
+        help="measure the size without merging the segments first",
+    )
+    parser.add_argument("--prefix", default="mapping-benchmark")
+    parser.add_argument("--keep-indexes", action="store_true")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    return parser.parse_args(arguments)
+
+
+def main():
+    args = parse_arguments()
+    search_engine = create_search_engine()
+    results = [
+        benchmark_variant(search_engine, variant, args) for variant in args.variants
+    ]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(
+        format_table(
+            results,
+            [
+                "variant",
+                "highlighter",
+                "gazettes",
+                "failed",
+                "size_mib",
+                "gazettes_per_s",
+                "search_p50_ms",
+                "search_p95_ms",
+                "highlight_p50_ms",
+                "highlight_p95_ms",
+            ],
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
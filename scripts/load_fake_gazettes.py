@@ -1,8 +1,28 @@
-from datetime import date, timedelta
+"""
+Loads gazettes into the OpenSearch index used by the API.
+
+Without arguments the index is recreated with a few fixture gazettes (used by
+the development and test environments). With `--synthetic N`, N realistic
+gazettes are generated instead and streamed into the index, to benchmark the
+search at production-like data sizes:
+
+    python scripts/load_fake_gazettes.py --synthetic 1000000 --text-size 8000 \\
+        --census censo.csv --threads 4 --processes 2
+"""
+
+from datetime import date, datetime, timedelta
+import argparse
+import bisect
+import csv
+import itertools
+import math
+import multiprocessing
+import random
 import time
 import os
 
 import opensearchpy
+from opensearchpy import helpers
 
 TERRITORY_ID1 = "3304557"
 TERRITORY_ID2 = "4205902"
@@ -10,12 +30,84 @@ TERRITORY_ID3 = "4205919"
 TERRITORY_ID4 = "4205920"
 INDEX = "querido-diario"
 
+INDEX_BODY = {
+    "mappings": {
+        "properties": {
+            "created_at": {"type": "date"},
+            "date": {"type": "date"},
+            "edition_number": {
+                "type": "text",
+                "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+            },
+            "file_checksum": {"type": "keyword"},
+            "file_path": {"type": "keyword"},
+            "file_url": {"type": "keyword"},
+            "id": {"type": "keyword"},
+            "is_extra_edition": {"type": "boolean"},
+            "power": {"type": "keyword"},
+            "processed": {"type": "boolean"},
+            "scraped_at": {"type": "date"},
+            "source_text": {
+                "type": "text",
+                "analyzer": "brazilian",
+                "index_options": "offsets",
+                "term_vector": "with_positions_offsets",
+                "fields": {
+                    "with_stopwords": {
+                        "type": "text",
+                        "analyzer": "brazilian_with_stopwords",
+                        "index_options": "offsets",
+                        "term_vector": "with_positions_offsets",
+                    },
+                    "exact": {
+                        "type": "text",
+                        "analyzer": "exact",
+                        "index_options": "offsets",
+                        "term_vector": "with_positions_offsets",
+                    },
+                },
+            },
+            "state_code": {"type": "keyword"},
+            "territory_id": {"type": "keyword"},
+            "territory_name": {
+                "type": "text",
+                "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+            },
+            "url": {"type": "keyword"},
+        }
+    },
+    "settings": {
+        "index": {
+            "sort.field": ["territory_id", "date"],
+            "sort.order": ["asc", "desc"],
+        },
+        "analysis": {
+            "filter": {
+                "brazilian_stemmer": {
+                    "type": "stemmer",
+                    "language": "brazilian",
+                }
+            },
+            "analyzer": {
+                "brazilian_with_stopwords": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase", "brazilian_stemmer"],
+                },
+                "exact": {
+                    "tokenizer": "standard",
+                    "filter": ["lowercase"],
+                },
+            },
+        },
+    },
+}
+
 
-def delete_index(search_engine):
+def delete_index(search_engine, index=INDEX):
     for attempt in range(3):
         try:
             search_engine.indices.delete(
-                index=INDEX, ignore_unavailable=True, timeout=30
+                index=index, ignore_unavailable=True, timeout=30
             )
             search_engine.indices.refresh()
             print("Index deleted")
@@ -25,99 +117,23 @@ def delete_index(search_engine):
             time.sleep(10)
 
 
-def create_index(search_engine):
+def create_index(search_engine, index=INDEX, body=None):
     for attempt in range(3):
         try:
             search_engine.indices.create(
-                index=INDEX,
-                timeout=30,
-                body={
-                    "mappings": {
-                        "properties": {
-                            "created_at": {"type": "date"},
-                            "date": {"type": "date"},
-                            "edition_number": {
-                                "type": "text",
-                                "fields": {
-                                    "keyword": {"type": "keyword", "ignore_above": 256}
-                                },
-                            },
-                            "file_checksum": {"type": "keyword"},
-                            "file_path": {"type": "keyword"},
-                            "file_url": {"type": "keyword"},
-                            "id": {"type": "keyword"},
-                            "is_extra_edition": {"type": "boolean"},
-                            "power": {"type": "keyword"},
-                            "processed": {"type": "boolean"},
-                            "scraped_at": {"type": "date"},
-                            "source_text": {
-                                "type": "text",
-                                "analyzer": "brazilian",
-                                "index_options": "offsets",
-                                "term_vector": "with_positions_offsets",
-                                "fields": {
-                                    "with_stopwords": {
-                                        "type": "text",
-                                        "analyzer": "brazilian_with_stopwords",
-                                        "index_options": "offsets",
-                                        "term_vector": "with_positions_offsets",
-                                    },
-                                    "exact": {
-                                        "type": "text",
-                                        "analyzer": "exact",
-                                        "index_options": "offsets",
-                                        "term_vector": "with_positions_offsets",
-                                    },
-                                },
-                            },
-                            "state_code": {"type": "keyword"},
-                            "territory_id": {"type": "keyword"},
-                            "territory_name": {
-                                "type": "text",
-                                "fields": {
-                                    "keyword": {"type": "keyword", "ignore_above": 256}
-                                },
-                            },
-                            "url": {"type": "keyword"},
-                        }
-                    },
-                    "settings": {
-                        "index": {
-                            "sort.field": ["territory_id", "date"],
-                            "sort.order": ["asc", "desc"],
-                        },
-                        "analysis": {
-                            "filter": {
-                                "brazilian_stemmer": {
-                                    "type": "stemmer",
-                                    "language": "brazilian",
-                                }
-                            },
-                            "analyzer": {
-                                "brazilian_with_stopwords": {
-                                    "tokenizer": "standard",
-                                    "filter": ["lowercase", "brazilian_stemmer"],
-                                },
-                                "exact": {
-                                    "tokenizer": "standard",
-                                    "filter": ["lowercase"],
-                                },
-                            },
-                        },
-                    },
-                },
+                index=index, timeout=30, body=body or INDEX_BODY
             )
             search_engine.indices.refresh()
-            print(f"Index {INDEX} created")
+            print(f"Index {index} created")
             return
         except Exception as e:
             print(f"Index creation failed: {e}")
             time.sleep(10)
 
 
-def recreate_index(search_engine):
-    delete_index(search_engine)
-    create_index(search_engine)
+def recreate_index(search_engine, index=INDEX, body=None):
+    delete_index(search_engine, index)
+    create_index(search_engine, index, body)
 
 
 def try_push_data_to_index(search_engine, bulk_data):
@@ -377,15 +393,496 @@ def get_data():
     ]
 
 
-def main():
+FIRST_NAMES = [
+    "Ana",
+    "Antônio",
+    "Beatriz",
+    "Carlos",
+    "Cláudia",
+    "Daniel",
+    "Eduarda",
+    "Fernando",
+    "Gabriela",
+    "João",
+    "José",
+    "Juliana",
+    "Luiz",
+    "Márcia",
+    "Maria",
+    "Paulo",
+    "Pedro",
+    "Raimundo",
+    "Sandra",
+    "Tereza",
+]
+SURNAMES = [
+    "Almeida",
+    "Alves",
+    "Araújo",
+    "Barbosa",
+    "Cardoso",
+    "Carvalho",
+    "Costa",
+    "Ferreira",
+    "Gomes",
+    "Lima",
+    "Martins",
+    "Oliveira",
+    "Pereira",
+    "Ribeiro",
+    "Rodrigues",
+    "Santos",
+    "Silva",
+    "Soares",
+    "Souza",
+    "Vieira",
+]
+COMPANY_WORDS = [
+    "Construtora",
+    "Comercial",
+    "Distribuidora",
+    "Engenharia",
+    "Serviços",
+    "Alimentos",
+    "Saneamento",
+    "Tecnologia",
+    "Transportes",
+    "Medicamentos",
+]
+DEPARTMENTS = [
+    "Secretaria Municipal de Saúde",
+    "Secretaria Municipal de Educação",
+    "Secretaria Municipal de Obras e Infraestrutura",
+    "Secretaria Municipal de Administração",
+    "Secretaria Municipal de Meio Ambiente",
+    "Secretaria Municipal de Assistência Social",
+    "Secretaria Municipal de Finanças",
+]
+POSITIONS = [
+    "Assessor Especial",
+    "Chefe de Gabinete",
+    "Coordenador de Programas",
+    "Diretor de Departamento",
+    "Gerente de Divisão",
+    "Secretário Adjunto",
+]
+SUBJECTS = [
+    "a abertura de crédito adicional suplementar no orçamento vigente",
+    "a regulamentação do horário de funcionamento dos órgãos municipais",
+    "a declaração de situação de emergência em razão das fortes chuvas",
+    "a composição do Conselho Municipal de Saúde",
+    "o licenciamento ambiental de atividades de impacto local",
+    "a nomeação da comissão permanente de licitação",
+    "o reajuste do piso salarial dos profissionais do magistério",
+]
+OBJECTS = [
+    "aquisição de medicamentos para a rede municipal de saúde",
+    "contratação de empresa para execução de obras de pavimentação asfáltica",
+    "aquisição de gêneros alimentícios para a merenda escolar",
+    "prestação de serviços de coleta de resíduos sólidos urbanos",
+    "locação de veículos para o transporte escolar",
+    "aquisição de material de limpeza e higienização",
+    "reforma e ampliação da unidade básica de saúde",
+    "fornecimento de combustível para a frota municipal",
+]
+FILLER = [
+    "Publique-se, registre-se e cumpra-se.",
+    "Revogam-se as disposições em contrário.",
+    "Os recursos necessários correrão por conta das dotações orçamentárias próprias.",
+    "A íntegra do documento encontra-se à disposição dos interessados na sede da Prefeitura.",
+    "Os casos omissos serão resolvidos pela autoridade competente.",
+    "Esta publicação atende ao princípio da publicidade previsto no artigo 37 da Constituição Federal.",
+    "Fica o servidor responsável pela fiscalização do cumprimento das obrigações contratuais.",
+]
+MONTHS = [
+    "janeiro",
+    "fevereiro",
+    "março",
+    "abril",
+    "maio",
+    "junho",
+    "julho",
+    "agosto",
+    "setembro",
+    "outubro",
+    "novembro",
+    "dezembro",
+]
+CNPJ_WEIGHTS = [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]
+
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)} {rng.choice(SURNAMES)}"
+
+
+def _cnpj(rng):
+    digits = [rng.randrange(10) for _ in range(8)] + [0, 0, 0, 1]
+    for length in (12, 13):
+        total = sum(
+            digit * weight for digit, weight in zip(digits, CNPJ_WEIGHTS[13 - length :])
+        )
+        remainder = total % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    cnpj = "".join(map(str, digits))
+    return f"{cnpj[:2]}.{cnpj[2:5]}.{cnpj[5:8]}/{cnpj[8:12]}-{cnpj[12:]}"
+
+
+def _money(rng):
+    value = f"{rng.lognormvariate(11, 1.5):,.2f}"
+    return value.replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def _long_date(day):
+    return f"{day.day} de {MONTHS[day.month - 1]} de {day.year}"
+
+
+def _decree(rng, city, day):
+    return (
+        f"DECRETO Nº {rng.randrange(1, 9999)}, DE {_long_date(day).upper()}. "
+        f"Dispõe sobre {rng.choice(SUBJECTS)} e dá outras providências. "
+        f"O PREFEITO MUNICIPAL DE {city.upper()}, no uso das atribuições que lhe "
+        "confere a Lei Orgânica do Município, DECRETA: "
+        f"Art. 1º Fica aprovada {rng.choice(SUBJECTS)}, nos termos do anexo "
+        "deste Decreto. Art. 2º Este Decreto entra em vigor na data de sua "
+        f"publicação. {rng.choice(FILLER)} {city}, {_long_date(day)}. {_person(rng)}, "
+        "Prefeito Municipal."
+    )
+
+
+def _appointment(rng, city, day):
+    action = rng.choice(["NOMEAR", "EXONERAR"])
+    return (
+        f"PORTARIA Nº {rng.randrange(1, 2999)}/{day.year}. O PREFEITO MUNICIPAL "
+        f"DE {city.upper()}, no uso de suas atribuições legais, RESOLVE: "
+        f"{action} {_person(rng).upper()}, para o cargo em comissão de "
+        f"{rng.choice(POSITIONS)}, lotado na {rng.choice(DEPARTMENTS)}. "
+        f"{rng.choice(FILLER)}"
+    )
+
+
+def _contract(rng, city, day):
+    company = f"{_person(rng).split()[-1]} {rng.choice(COMPANY_WORDS)} LTDA"
+    return (
+        f"EXTRATO DO CONTRATO Nº {rng.randrange(1, 999)}/{day.year}. "
+        f"Contratante: Prefeitura Municipal de {city}. Contratada: "
+        f"{company.upper()}, inscrita no CNPJ sob o nº {_cnpj(rng)}. Objeto: "
+        f"{rng.choice(OBJECTS)}. Valor global: R$ {_money(rng)}. Vigência: "
+        f"{rng.choice([3, 6, 12, 24])} meses. Fundamento legal: Lei Federal nº "
+        f"14.133/2021. Dotação orçamentária: {rng.choice(DEPARTMENTS)}."
+    )
+
+
+def _bid(rng, city, day):
+    opening = day + timedelta(days=rng.randrange(8, 30))
+    return (
+        f"AVISO DE LICITAÇÃO. PREGÃO ELETRÔNICO Nº {rng.randrange(1, 299)}/"
+        f"{day.year}. Objeto: {rng.choice(OBJECTS)}. Abertura das propostas: "
+        f"{opening.strftime('%d/%m/%Y')} às {rng.randrange(8, 17)}h. O edital "
+        "está disponível no sítio eletrônico da Prefeitura Municipal de "
+        f"{city}. {rng.choice(DEPARTMENTS)}."
+    )
+
+
+def _notice(rng, city, day):
+    return " ".join(rng.sample(FILLER, 3))
+
+
+SECTIONS = [_decree, _appointment, _contract, _bid, _notice]
+SECTION_WEIGHTS = [3, 5, 4, 2, 1]
+
+
+def load_territories(census_file):
+    """
+    Territories (id, name, state code and the date since which gazettes are
+    available) from the census CSV used by the cities API
+    """
+    territories = []
+    with open(census_file, newline="") as csv_file:
+        for row in csv.DictReader(csv_file):
+            try:
+                available_since = date.fromisoformat(row["availability_date"])
+            except (KeyError, ValueError):
+                available_since = None
+            territories.append(
+                (row["ibge_id"], row["city_name"], row["uf"], available_since)
+            )
+    return territories
+
+
+class GazetteGenerator:
+    """
+    Deterministic generator of realistic gazettes.
+
+    Territories are drawn with Zipf-like weights (a few cities publish most of
+    the gazettes), publication dates get denser in recent years and rarely
+    fall on weekends, the scraping happens hours to days after the
+    publication and the text size follows a log-normal distribution around
+    `text_size` characters.
+    """
+
+    def __init__(self, territories, text_size=5000, since=None, until=None, seed=0):
+        self.rng = random.Random(seed)
+        self.territories = list(territories)
+        self.rng.shuffle(self.territories)
+        self.cumulative_weights = list(
+            itertools.accumulate(
+                1 / (rank + 1) ** 0.8 for rank in range(len(self.territories))
+            )
+        )
+        self.text_size = text_size
+        self.since = since or date(2010, 1, 1)
+        self.until = until or date.today()
+        self.editions = {}
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.gazette()
+
+    def gazette(self):
+        rng = self.rng
+        territory_id, territory_name, state_code, available_since = self.territories[
+            bisect.bisect_left(
+                self.cumulative_weights,
+                rng.random() * self.cumulative_weights[-1],
+            )
+        ]
+        day = self._publication_date(available_since)
+        scraped_at = datetime.combine(day, datetime.min.time()) + timedelta(
+            hours=min(rng.lognormvariate(math.log(20), 1.2), 24 * 90)
+        )
+        created_at = scraped_at + timedelta(seconds=rng.randrange(30, 3600))
+        edition = self.editions.get(territory_id) or rng.randrange(1, 3000)
+        self.editions[territory_id] = edition + 1
+        checksum = f"{rng.getrandbits(128):032x}"
+        path = f"{territory_id}/{day.isoformat()}/{checksum}"
+        return {
+            "source_text": self._text(territory_name, day),
+            "date": day.isoformat(),
+            "is_extra_edition": rng.random() < 0.08,
+            "power": "executive" if rng.random() < 0.9 else "executive_legislative",
+            "file_checksum": checksum,
+            "file_path": f"{path}.pdf",
+            "file_raw_txt": f"{path}.txt",
+            "file_url": f"https://{territory_id}.diariooficial.example.gov.br/{checksum}.pdf",
+            "url": f"{path}.pdf",
+            "scraped_at": scraped_at.isoformat(),
+            "created_at": created_at.isoformat(),
+            "territory_id": territory_id,
+            "territory_name": territory_name,
+            "state_code": state_code,
+            "edition_number": str(edition),
+        }
+
+    def _publication_date(self, available_since):
+        rng = self.rng
+        start = max(self.since, available_since or self.since)
+        if start > self.until:
+            start = self.since
+        span = (self.until - start).days
+        # the square root of a uniform variable has a linearly increasing
+        # density: more municipalities publish online every year
+        day = start + timedelta(days=int(math.sqrt(rng.random()) * span))
+        if day.weekday() >= 5 and rng.random() < 0.9:
+            # moved to the closest weekday: saturdays to friday and sundays
+            # to monday
+            weekday = day + timedelta(days=1 if day.weekday() == 6 else -1)
+            if start <= weekday <= self.until:
+                day = weekday
+        return day
+
+    def _text(self, territory_name, day):
+        rng = self.rng
+        sigma = 0.8
+        size = int(rng.lognormvariate(math.log(self.text_size) - sigma**2 / 2, sigma))
+        size = max(200, min(size, self.text_size * 20))
+        sections = [f"DIÁRIO OFICIAL DO MUNICÍPIO DE {territory_name.upper()}"]
+        length = len(sections[0])
+        while length < size:
+            section = rng.choices(SECTIONS, SECTION_WEIGHTS)[0]
+            sections.append(section(rng, territory_name, day))
+            length += len(sections[-1]) + 2
+        return "\n\n".join(sections)[:size]
+
+
+def create_search_engine():
     # Use environment variables for OpenSearch connection
     opensearch_host = os.environ.get("QUERIDO_DIARIO_OPENSEARCH_HOST", "localhost")
     opensearch_user = os.environ.get("QUERIDO_DIARIO_OPENSEARCH_USER", "admin")
     opensearch_password = os.environ.get("QUERIDO_DIARIO_OPENSEARCH_PASSWORD", "admin")
 
-    search_engine = opensearchpy.OpenSearch(
-        hosts=[opensearch_host], http_auth=(opensearch_user, opensearch_password)
+    return opensearchpy.OpenSearch(
+        hosts=[opensearch_host],
+        http_auth=(opensearch_user, opensearch_password),
+        timeout=120,
+    )
+
+
+def stream_gazettes(
+    search_engine,
+    gazettes,
+    index=INDEX,
+    threads=4,
+    chunk_size=500,
+    max_chunk_bytes=10 * 1024 * 1024,
+    report_interval=10.0,
+    label="",
+):
+    """
+    Streams the gazettes into the index with bulk requests of `chunk_size`
+    documents, without refreshing the index. At most `threads` requests are
+    built and in flight at once, so the memory used does not depend on the
+    number of gazettes. Returns the loading statistics.
+    """
+    text_characters = 0
+
+    def actions():
+        nonlocal text_characters
+        for gazette in gazettes:
+            text_characters += len(gazette["source_text"])
+            yield {"_index": index, "_id": gazette["file_checksum"], "_source": gazette}
+
+    if threads > 1:
+        results = helpers.parallel_bulk(
+            search_engine,
+            actions(),
+            thread_count=threads,
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            queue_size=threads,
+            raise_on_error=False,
+        )
+    else:
+        results = helpers.streaming_bulk(
+            search_engine,
+            actions(),
+            chunk_size=chunk_size,
+            max_chunk_bytes=max_chunk_bytes,
+            max_retries=3,
+            raise_on_error=False,
+        )
+
+    indexed = failed = 0
+    start = last_report = time.perf_counter()
+    for ok, item in results:
+        if ok:
+            indexed += 1
+        else:
+            failed += 1
+            if failed <= 10:
+                print(f"{label}Failed to index gazette: {item}")
+        now = time.perf_counter()
+        if now - last_report >= report_interval:
+            last_report = now
+            print(
+                f"{label}{indexed} gazettes indexed "
+                f"({indexed / (now - start):.0f} gazettes/s)"
+            )
+    return {
+        "indexed": indexed,
+        "failed": failed,
+        "seconds": time.perf_counter() - start,
+        "text_characters": text_characters,
+    }
+
+
+def _load_partition(partition):
+    args, worker, count = partition
+    generator = GazetteGenerator(
+        load_territories(args.census),
+        args.text_size,
+        args.since,
+        args.until,
+        seed=f"{args.seed}-{worker}",
+    )
+    return stream_gazettes(
+        create_search_engine(),
+        itertools.islice(generator, count),
+        args.index,
+        args.threads,
+        args.chunk_size,
+        args.max_chunk_bytes,
+        label=f"[worker {worker}] " if args.processes > 1 else "",
+    )
+
+
+def load_synthetic_corpus(search_engine, args):
+    if not os.path.exists(args.census):
+        raise SystemExit(f"Census file not found: {args.census}")
+    if not args.append:
+        recreate_index(search_engine, args.index)
+    # refreshing while loading would create many small segments, the index is
+    # refreshed once at the end
+    search_engine.indices.put_settings(
+        index=args.index, body={"index": {"refresh_interval": "-1"}}
+    )
+    start = time.perf_counter()
+    count, remainder = divmod(args.synthetic, args.processes)
+    partitions = [
+        (args, worker, count + (1 if worker < remainder else 0))
+        for worker in range(args.processes)
+    ]
+    try:
+        if args.processes > 1:
+            with multiprocessing.Pool(args.processes) as pool:
+                results = pool.map(_load_partition, partitions)
+        else:
+            results = [_load_partition(partitions[0])]
+    finally:
+        search_engine.indices.put_settings(
+            index=args.index, body={"index": {"refresh_interval": None}}
+        )
+    search_engine.indices.refresh(index=args.index)
+    seconds = time.perf_counter() - start
+
+    indexed = sum(result["indexed"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    text_megabytes = sum(result["text_characters"] for result in results) / 2**20
+    print(
+        f"{indexed} gazettes indexed ({failed} failed) in {seconds:.1f}s: "
+        f"{indexed / seconds:.0f} gazettes/s, {text_megabytes / seconds:.2f} MiB "
+        "of text/s (including the final refresh)"
+    )
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--synthetic",
+        type=int,
+        default=None,
+        metavar="N",
+        help="generate N gazettes instead of loading the fixtures",
+    )
+    parser.add_argument(
+        "--census",
+        default=os.environ.get("CITY_DATABASE_CSV", "censo.csv"),
+        help="census CSV the territories are drawn from",
     )
+    parser.add_argument(
+        "--text-size", type=int, default=5000, help="mean characters per gazette"
+    )
+    parser.add_argument("--since", type=date.fromisoformat, default=date(2010, 1, 1))
+    parser.add_argument("--until", type=date.fromisoformat, default=date.today())
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--index", default=INDEX)
+    parser.add_argument(
+        "--append", action="store_true", help="keep the documents already indexed"
+    )
+    parser.add_argument("--threads", type=int, default=4, help="per process")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--max-chunk-bytes", type=int, default=10 * 1024 * 1024)
+    return parser.parse_args(arguments)
+
+
+def main():
+    args = parse_arguments()
+    search_engine = create_search_engine()
+    if args.synthetic:
+        load_synthetic_corpus(search_engine, args)
+        return
     recreate_index(search_engine)
     add_data_on_index(get_data(), search_engine)
 
@@ -0,0 +1,49 @@
+"""
+Prepares the companies database for the API (see database/migrations.py),
+using the POSTGRES_COMPANIES_* environment variables:
+
+    python scripts/migrate_companies_database.py
+
+After loading a new Receita Federal dump, refresh the company and partner search views:
+
+    python scripts/migrate_companies_database.py --refresh
+"""
+
+import argparse
+import logging
+
+from config import load_configuration
+from database import create_companies_database_interface
+from database.migrations import refresh_company_search, run_migrations
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Refresh the search views after applying the migrations.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    arguments = parse_arguments()
+    configuration = load_configuration()
+    database = create_companies_database_interface(
+        db_host=configuration.companies_database_host,
+        db_name=configuration.companies_database_db,
+        db_user=configuration.companies_database_user,
+        db_pass=configuration.companies_database_pass,
+        db_port=configuration.companies_database_port,
+    )
+    applied = run_migrations(database)
+    print(f"Applied {len(applied)} migrations: {', '.join(applied) or '-'}")
+    if arguments.refresh:
+        refresh_company_search(database)
+        print("Refreshed the search views")
+
+
+if __name__ == "__main__":
+    main()
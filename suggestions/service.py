@@ -3,6 +3,9 @@ import logging
 
 from mailjet_rest import Client
 
+from observability import traced
+from observability.metrics import track_backend_call
+
 from .model import (
     Suggestion,
     SuggestionSent,
@@ -39,6 +42,7 @@ class MailjetSuggestionService(SuggestionServiceInterface):
         self.suggestion_mailjet_custom_id = suggestion_mailjet_custom_id
         self.logger = logging.getLogger(__name__)
 
+    @traced
     def add_suggestion(self, suggestion: Suggestion):
         data = {
             "Messages": [
@@ -59,7 +63,9 @@ class MailjetSuggestionService(SuggestionServiceInterface):
                 }
             ]
         }
-        result = self.mailjet_client.send.create(data=data)
+        with track_backend_call("mailjet", "send") as span:
+            result = self.mailjet_client.send.create(data=data)
+            span.set_attribute("http.response.status_code", result.status_code)
         result_json = result.json()
 
         self.logger.debug(f"Suggestion body response {result_json}")
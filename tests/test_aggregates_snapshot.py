@@ -0,0 +1,166 @@
+"""
+Tests for the in-memory snapshot of the aggregates, its background refresh
+and the change notifications it listens to.
+"""
+
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import psycopg2.sql
+
+from aggregates import (
+    AggregatesAccess,
+    SnapshotAggregatesAccess,
+    create_aggregates_interface,
+)
+from aggregates.aggregates_access import Aggregates
+from database.postgresql import PostgreSQLDatabaseAggregates
+from observability import registry
+
+
+def create_aggregate(territory_id, year, state_code="BA"):
+    return Aggregates(territory_id, state_code, f"{year}.zip", year, "", "hash", "1.0")
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Condition not met in time")
+        time.sleep(0.005)
+
+
+class AggregatesDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = PostgreSQLDatabaseAggregates(
+            "localhost", "db", "user", "pswd", 5432
+        )
+
+    def test_all_aggregates_should_be_loaded_in_one_statement(self):
+        row = (1, "2927408", "BA", "2024", "BA/2024.zip", "1.0", "hash", "2024")
+        with patch.object(self.database, "_select", return_value=iter([row])):
+            (aggregate,) = self.database.get_all_aggregates()
+            command, _, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_all_aggregates")
+        self.assertNotIn("WHERE", command)
+        self.assertEqual((aggregate.territory_id, aggregate.year), ("2927408", "2024"))
+
+    @patch("database.postgresql.select.select", return_value=([], [], []))
+    def test_should_listen_on_a_connection_of_its_own(self, select):
+        connection = MagicMock(closed=False, notifies=[])
+        with patch.object(self.database, "_open_connection", return_value=connection):
+            # opening the connection counts as a notification
+            self.assertTrue(self.database.wait_for_notification("changed", 1))
+            self.assertFalse(self.database.wait_for_notification("changed", 1))
+            self.assertEqual(self.database._open_connection.call_count, 1)
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.execute.assert_called_once_with(
+            psycopg2.sql.SQL("LISTEN {}").format(psycopg2.sql.Identifier("changed"))
+        )
+        select.assert_called_once_with([connection], [], [], 1)
+
+        select.return_value = ([connection], [], [])
+        connection.poll.side_effect = lambda: connection.notifies.append("notify")
+        self.assertTrue(self.database.wait_for_notification("changed", 1))
+        self.assertEqual(connection.notifies, [])
+
+
+class SnapshotAggregatesAccessTests(TestCase):
+    def setUp(self):
+        self.database = MagicMock(spec=PostgreSQLDatabaseAggregates)
+        self.database.get_all_aggregates.return_value = [
+            create_aggregate(None, "2024"),
+            create_aggregate("2927408", "2024"),
+            create_aggregate("2927408", "2023"),
+        ]
+        self.now = 100.0
+        self.aggregates = SnapshotAggregatesAccess(
+            self.database, refresh_interval=60, clock=lambda: self.now
+        )
+
+    def test_lookups_should_be_served_from_the_snapshot(self):
+        self.assertTrue(self.aggregates.refresh())
+        years = [
+            aggregate.year
+            for aggregate in self.aggregates.get_aggregates("2927408", "BA")
+        ]
+        self.assertEqual(years, ["2024", "2023"])
+        self.assertEqual(len(self.aggregates.get_aggregates(None, "BA")), 1)
+        self.assertEqual(self.aggregates.get_aggregates(None, "SC"), [])
+        self.database.get_aggregates.assert_not_called()
+
+    def test_lookups_should_go_to_the_database_before_the_first_refresh(self):
+        self.database.get_aggregates.return_value = []
+        self.assertEqual(self.aggregates.get_aggregates("2927408", "BA"), [])
+        self.database.get_aggregates.assert_called_once_with("2927408", "BA")
+
+    def test_failed_refreshes_should_keep_the_snapshot(self):
+        self.aggregates.refresh()
+        self.database.get_all_aggregates.side_effect = Exception("connection lost")
+        self.now += 90
+        self.assertFalse(self.aggregates.refresh())
+        self.assertEqual(len(self.aggregates.get_aggregates("2927408", "BA")), 2)
+        self.assertEqual(self.aggregates.age(), 90)
+
+    def test_staleness_should_be_exposed(self):
+        self.assertEqual(self.aggregates.age(), float("inf"))
+        self.aggregates.refresh()
+        self.now += 12
+        exposed = registry.expose()
+        self.assertIn(
+            'querido_diario_snapshot_age_seconds{snapshot="aggregates"} 12', exposed
+        )
+        self.assertIn('querido_diario_snapshot_rows{snapshot="aggregates"} 3', exposed)
+
+
+class SnapshotRefreshTests(TestCase):
+    def setUp(self):
+        self.database = MagicMock(spec=PostgreSQLDatabaseAggregates)
+        self.database.get_all_aggregates.return_value = []
+
+    def test_should_refresh_on_schedule(self):
+        aggregates = SnapshotAggregatesAccess(self.database, refresh_interval=0.01)
+        aggregates.start()
+        try:
+            wait_until(lambda: self.database.get_all_aggregates.call_count >= 3)
+        finally:
+            aggregates.stop()
+        self.database.wait_for_notification.assert_not_called()
+
+    def test_should_refresh_when_notified(self):
+        notify = threading.Event()
+
+        def wait_for_notification(channel, timeout):
+            notified = notify.wait(timeout)
+            notify.clear()
+            return notified
+
+        self.database.wait_for_notification.side_effect = wait_for_notification
+        aggregates = SnapshotAggregatesAccess(
+            self.database, refresh_interval=60, notification_channel="changed"
+        )
+        aggregates.start()
+        try:
+            wait_until(lambda: self.database.get_all_aggregates.call_count == 1)
+            notify.set()
+            wait_until(lambda: self.database.get_all_aggregates.call_count == 2)
+        finally:
+            aggregates.stop()
+        self.assertEqual(
+            self.database.wait_for_notification.call_args.args[0], "changed"
+        )
+
+    def test_factory_should_start_the_snapshot_when_configured(self):
+        self.assertIsInstance(
+            create_aggregates_interface(self.database), AggregatesAccess
+        )
+        aggregates = create_aggregates_interface(
+            self.database, snapshot_refresh_interval=60
+        )
+        try:
+            self.assertIsInstance(aggregates, SnapshotAggregatesAccess)
+            wait_until(lambda: self.database.get_all_aggregates.called)
+        finally:
+            aggregates.stop()
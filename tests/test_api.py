@@ -1,16 +1,18 @@
+import time
 from datetime import date, timedelta, datetime
-from unittest.mock import MagicMock
+from unittest.mock import MagicMock, patch
 from unittest import TestCase, expectedFailure
 
 from fastapi.testclient import TestClient
 
-from api import app, configure_api_app
+from api import api, app, configure_api_app
 from gazettes import GazetteAccessInterface, GazetteRequest
 from suggestions import Suggestion, SuggestionSent, SuggestionServiceInterface
 from companies import CompaniesAccessInterface
 from themed_excerpts import ThemedExcerptAccessInterface
 from cities import CityAccessInterface
 from aggregates import AggregatesAccessInterface
+from utils.deadline import DeadlineExceededException, check_deadline, current_deadline
 
 from tests.test_helpers import (
     create_default_mocks,
@@ -214,6 +216,45 @@ class ApiGazettesEndpointTests(TestCase):
             {"total_gazettes": 0, "gazettes": []},
         )
 
+    def test_get_gazettes_should_flag_partial_results(self):
+        interface = create_mock_gazette_interface()
+
+        def timed_out_search(filters):
+            current_deadline().record_search_response({"timed_out": True})
+            return (0, [])
+
+        interface.get_gazettes.side_effect = timed_out_search
+        configure_api_app(interface, *create_default_mocks()[1:])
+        client = TestClient(app)
+        response = client.get("/gazettes", params={"querystring": "lei"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {"total_gazettes": 0, "gazettes": [], "timed_out": True, "partial": True},
+        )
+
+    def test_get_gazettes_should_time_out_when_the_deadline_expired(self):
+        interface = create_mock_gazette_interface()
+        interface.get_gazettes.side_effect = DeadlineExceededException(
+            "Request deadline of 5s expired"
+        )
+        configure_api_app(interface, *create_default_mocks()[1:])
+        client = TestClient(app)
+        response = client.get("/gazettes", params={"querystring": "lei"})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(response.json(), {"detail": "Request deadline of 5s expired"})
+
+    def test_get_gazettes_should_run_inside_a_request_deadline(self):
+        interface = create_mock_gazette_interface()
+        interface.get_gazettes.side_effect = lambda filters: (
+            0 if current_deadline() is None else 1,
+            [],
+        )
+        configure_api_app(interface, *create_default_mocks()[1:])
+        client = TestClient(app)
+        response = client.get("/gazettes")
+        self.assertEqual(response.json()["total_gazettes"], 1)
+
     def test_gazettes_endpoint_should_accept_query_querystring_date(self):
         configure_api_app(create_mock_gazette_interface(), *create_default_mocks()[1:])
         client = TestClient(app)
@@ -589,6 +630,26 @@ class ApiGazettesEndpointTests(TestCase):
         )
 
 
+class ApiThemedExcerptsEndpointTests(TestCase):
+    @patch.object(api.config, "themed_excerpts_request_timeout", 0.01)
+    def test_should_time_out_when_the_backend_runs_past_its_budget(self):
+        mocks = create_default_mocks()
+
+        def slow_search(request):
+            time.sleep(0.05)
+            check_deadline()
+            return (0, [])
+
+        mocks[1].get_themed_excerpts = MagicMock(side_effect=slow_search)
+        configure_api_app(*mocks)
+        client = TestClient(app)
+        response = client.get("/gazettes/by_theme/educacao")
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(
+            response.json(), {"detail": "Request deadline of 0.01s expired"}
+        )
+
+
 class ApiSuggestionsEndpointTests(TestCase):
     def setUp(self):
         self.suggestion_service = MockSuggestionService()
@@ -0,0 +1,180 @@
+import asyncio
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+import httpx
+
+from benchmarks.api_benchmark import build_benchmark_app, build_routes, run_benchmark
+from benchmarks.fakes import FakeSearchEngine, GAZETTES_INDEX
+from benchmarks.micro import (
+    MICRO_BENCHMARKS,
+    compare,
+    load_baselines,
+    save_baselines,
+)
+from benchmarks.replay import read_requests, replay, route_for, schedule
+from benchmarks.stats import LatencyRecorder, percentile
+
+
+class StatsTests(TestCase):
+    def test_percentile_should_use_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.5), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile(values, 1.0), 100)
+        self.assertEqual(percentile([], 0.5), 0.0)
+
+    def test_recorder_should_count_server_errors(self):
+        recorder = LatencyRecorder()
+        recorder.record(0.010, 200)
+        recorder.record(0.020, 404)
+        recorder.record(0.030, 503)
+        summary = recorder.summary(elapsed=1.0)
+        self.assertEqual(summary["requests"], 3)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["throughput"], 3.0)
+        self.assertAlmostEqual(summary["p50_ms"], 20.0)
+        self.assertEqual(summary["status_codes"], {200: 1, 404: 1, 503: 1})
+
+
+class FakeSearchEngineTests(TestCase):
+    def test_hits_should_be_deterministic_and_sized(self):
+        first = FakeSearchEngine(hits=3, excerpt_size=50).search({}, GAZETTES_INDEX)
+        second = FakeSearchEngine(hits=3, excerpt_size=50).search({}, GAZETTES_INDEX)
+        self.assertEqual(first, second)
+        self.assertEqual(len(first["hits"]["hits"]), 3)
+        for hit in first["hits"]["hits"]:
+            self.assertLessEqual(len(hit["highlight"]["source_text"][0]), 50)
+
+
+class ApiBenchmarkTests(TestCase):
+    @patch.dict(os.environ, {})
+    def test_every_route_should_succeed_with_fake_backends(self):
+        app, territory_id = build_benchmark_app(hits=2, cities=20)
+        results = asyncio.run(
+            run_benchmark(
+                app,
+                build_routes(territory_id),
+                requests=4,
+                concurrency=2,
+                warmup=0,
+                allocation_requests=1,
+            )
+        )
+        for result in results:
+            with self.subTest(route=result["route"]):
+                self.assertEqual(result["requests"], 4)
+                self.assertTrue(
+                    all(200 <= status < 300 for status in result["status_codes"]),
+                    result["status_codes"],
+                )
+                self.assertGreater(result["alloc_kib"], 0)
+
+
+class MicroBenchmarkTests(TestCase):
+    def results(self, **relative):
+        return {
+            "benchmarks": {
+                name: {"ns_per_call": value * 100, "relative": value}
+                for name, value in relative.items()
+            }
+        }
+
+    def test_compare_should_flag_slowdowns_beyond_threshold(self):
+        baselines = self.results(fast=1.0, slow=1.0)
+        rows, regressions = compare(
+            self.results(fast=1.1, slow=1.5), baselines, threshold=0.25
+        )
+        self.assertEqual(regressions, ["slow"])
+        self.assertEqual(rows[0]["change"], "+10.0%")
+        self.assertEqual(rows[1]["change"], "+50.0% REGRESSION")
+
+    def test_compare_should_not_flag_benchmarks_without_baseline(self):
+        rows, regressions = compare(self.results(added=3.0), {}, threshold=0.25)
+        self.assertEqual(regressions, [])
+        self.assertEqual(rows[0]["change"], "new")
+
+    def test_baselines_should_round_trip(self):
+        path = os.path.join(tempfile.mkdtemp(), "baselines.json")
+        self.assertEqual(load_baselines(path), {})
+        save_baselines(self.results(fast=1.0), path)
+        self.assertEqual(load_baselines(path), self.results(fast=1.0))
+
+    @patch.dict(os.environ, {})
+    def test_every_micro_benchmark_should_run(self):
+        for name, setup in MICRO_BENCHMARKS.items():
+            with self.subTest(benchmark=name):
+                setup()()
+
+    def test_stored_baselines_should_cover_every_micro_benchmark(self):
+        self.assertEqual(set(load_baselines()["benchmarks"]), set(MICRO_BENCHMARKS))
+
+
+class ReplayTests(TestCase):
+    LOG_LINES = [
+        "2024-05-01 10:00:00,000 INFO:     10.0.0.1:4242 - "
+        '"GET /gazettes?querystring=obra HTTP/1.1" 200 OK',
+        'INFO:     10.0.0.1:4242 - "GET /health HTTP/1.1" 200 OK',
+        "2024-05-01 10:00:01,500 INFO:     10.0.0.1:4242 - "
+        '"POST /suggestions HTTP/1.1" 200 OK',
+        '{"method": "GET", "path": "/cities", "query_string": "city_name=munic", '
+        '"timestamp": "2024-05-01T10:00:02", "status": 200}',
+        "not a request",
+    ]
+
+    def test_routes_should_be_named_after_their_path(self):
+        self.assertEqual(route_for("/gazettes?size=1"), "gazettes")
+        self.assertEqual(route_for("/gazettes/by_theme/ambiental"), "gazettes_by_theme")
+        self.assertEqual(route_for("/gazettes/by_theme/themes/"), "themes")
+        self.assertEqual(route_for("/cities/3304557"), "city")
+        self.assertEqual(route_for("/company/info/00000000000191"), "company_info")
+        self.assertIsNone(route_for("/health"))
+
+    def test_should_read_replayable_requests_from_both_formats(self):
+        requests = list(read_requests(self.LOG_LINES))
+        self.assertEqual(
+            [(request.route, request.target) for request in requests],
+            [
+                ("gazettes", "/gazettes?querystring=obra"),
+                ("cities", "/cities?city_name=munic"),
+            ],
+        )
+        self.assertEqual(requests[1].timestamp - requests[0].timestamp, 2.0)
+        self.assertEqual(requests[1].status_code, 200)
+
+    def test_schedule_should_follow_the_replay_mode(self):
+        requests = list(read_requests(self.LOG_LINES))
+        self.assertEqual(schedule(requests, "original"), [0.0, 2.0])
+        self.assertEqual(schedule(requests, "scaled", speed=4), [0.0, 0.5])
+        self.assertEqual(schedule(requests, "max"), [0.0, 0.0])
+
+    def test_timed_modes_should_require_timestamps(self):
+        requests = list(read_requests(['"GET /gazettes HTTP/1.1" 200']))
+        self.assertEqual(schedule(requests, "max"), [0.0])
+        with self.assertRaises(ValueError):
+            schedule(requests, "original")
+
+    @patch.dict(os.environ, {})
+    def test_replay_should_report_each_route(self):
+        app, _ = build_benchmark_app(hits=2, cities=20)
+        requests = list(read_requests(self.LOG_LINES)) * 3
+
+        async def run():
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://replay"
+            ) as client:
+                return await replay(
+                    client, requests, schedule(requests, "max"), concurrency=2
+                )
+
+        results = asyncio.run(run())
+        self.assertEqual(results["requests"], 6)
+        self.assertEqual(
+            [(route["route"], route["requests"]) for route in results["routes"]],
+            [("cities", 3), ("gazettes", 3)],
+        )
+        for route in results["routes"]:
+            self.assertEqual(route["errors"], 0)
+            self.assertEqual(route["status_mismatches"], 0)
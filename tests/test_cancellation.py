@@ -0,0 +1,157 @@
+import asyncio
+import contextvars
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from api.api import ClientDisconnectedException, run_until_disconnected
+from index.opensearch import OpenSearch
+from observability.metrics import CANCELLED_OPERATIONS
+from utils.cancellation import (
+    CancellationScope,
+    OperationCancelledException,
+    cancel_on,
+    cancellation_scope,
+    current_cancellation_scope,
+)
+
+
+class CancellationScopeTests(TestCase):
+    def test_cancel_on_should_do_nothing_without_scope(self):
+        callback = MagicMock()
+        with cancel_on(callback, "test"):
+            self.assertIsNone(current_cancellation_scope())
+        callback.assert_not_called()
+
+    def test_cancel_should_call_callbacks_of_operations_in_flight(self):
+        scope = CancellationScope()
+        callback = MagicMock()
+        with cancellation_scope(scope), cancel_on(callback, "test"):
+            self.assertEqual(scope.cancel(), 1)
+        callback.assert_called_once()
+
+    def test_cancel_should_not_call_callbacks_of_finished_operations(self):
+        scope = CancellationScope()
+        callback = MagicMock()
+        with cancellation_scope(scope):
+            with cancel_on(callback, "test"):
+                pass
+        self.assertEqual(scope.cancel(), 0)
+        callback.assert_not_called()
+
+    def test_operations_should_not_start_in_cancelled_scope(self):
+        scope = CancellationScope()
+        scope.cancel()
+        with cancellation_scope(scope), self.assertRaises(OperationCancelledException):
+            with cancel_on(MagicMock(), "test"):
+                pass
+
+    def test_cancelled_operations_should_be_counted_by_kind(self):
+        counter = CANCELLED_OPERATIONS.labels("counted")
+        before = counter.value
+        scope = CancellationScope()
+        with cancellation_scope(scope), cancel_on(MagicMock(), "counted"):
+            scope.cancel()
+        self.assertEqual(counter.value, before + 1)
+
+    def test_failing_callback_should_not_stop_other_cancellations(self):
+        scope = CancellationScope()
+        failing = MagicMock(side_effect=Exception("boom"))
+        callback = MagicMock()
+        with cancellation_scope(scope):
+            with cancel_on(failing, "test"), cancel_on(callback, "test"):
+                scope.cancel()
+        callback.assert_called_once()
+
+    def test_finished_operations_should_wait_for_a_cancel_in_progress(self):
+        scope = CancellationScope()
+        cancelling, release = threading.Event(), threading.Event()
+        events = []
+
+        def slow_cancel():
+            cancelling.set()
+            release.wait(5)
+            events.append("cancelled")
+
+        def operation():
+            with cancel_on(slow_cancel, "test"):
+                cancelling.wait(5)
+            events.append("finished")
+
+        with cancellation_scope(scope):
+            worker = threading.Thread(
+                target=contextvars.copy_context().run, args=(operation,)
+            )
+            worker.start()
+        canceller = threading.Thread(target=scope.cancel)
+        canceller.start()
+        cancelling.wait(5)
+        worker.join(0.05)
+        self.assertTrue(worker.is_alive())
+        release.set()
+        canceller.join(5)
+        worker.join(5)
+        self.assertEqual(events, ["cancelled", "finished"])
+
+
+class RunUntilDisconnectedTests(TestCase):
+    def _request(self, disconnected):
+        request = MagicMock()
+        request.url.path = "/gazettes"
+
+        async def is_disconnected():
+            return disconnected
+
+        request.is_disconnected = is_disconnected
+        return request
+
+    def test_should_return_the_backend_result(self):
+        result = asyncio.run(
+            run_until_disconnected(self._request(False), lambda x: x * 2, 21)
+        )
+        self.assertEqual(result, 42)
+
+    def test_should_cancel_backend_work_when_client_disconnects(self):
+        released = threading.Event()
+
+        def blocking_backend():
+            with cancel_on(released.set, "test"):
+                released.wait(5)
+
+        with self.assertRaises(ClientDisconnectedException):
+            asyncio.run(run_until_disconnected(self._request(True), blocking_backend))
+        self.assertTrue(released.is_set())
+
+
+class OpenSearchCancellationTests(TestCase):
+    def setUp(self):
+        self.client_patcher = patch("opensearchpy.OpenSearch")
+        self.client = self.client_patcher.start().return_value
+        self.client.indices.exists.return_value = True
+        self.engine = OpenSearch("localhost", default_index="gazettes")
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    def test_search_should_send_an_opaque_id(self):
+        self.client.search.return_value = {}
+        self.engine.search({"query": {}})
+        self.assertTrue(self.client.search.call_args.kwargs["opaque_id"])
+
+    def test_cancel_search_should_cancel_only_the_parent_task_of_the_search(self):
+        self.client.tasks.list.return_value = {
+            "nodes": {
+                "node1": {
+                    "tasks": {
+                        "node1:1": {"headers": {"X-Opaque-Id": "abc"}},
+                        "node1:2": {
+                            "headers": {"X-Opaque-Id": "abc"},
+                            "parent_task_id": "node1:1",
+                        },
+                        "node1:3": {"headers": {"X-Opaque-Id": "other"}},
+                    }
+                }
+            }
+        }
+        self.engine._cancel_search("abc")
+        self.client.tasks.cancel.assert_called_once_with(task_id="node1:1")
@@ -0,0 +1,89 @@
+"""
+Tests for the validation and formatting of CNPJs, one at a time and in
+batches (with and without numpy).
+"""
+
+import random
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+from companies import cnpj
+from companies.cnpj import (
+    check_digits,
+    cnpj_digits,
+    format_cnpj,
+    is_valid_cnpj,
+    parse_cnpj,
+    parse_cnpjs,
+)
+
+
+def random_cnpjs(count, seed=1):
+    """
+    Bare CNPJs, about half of them with the right check digits
+    """
+    generator = random.Random(seed)
+    cnpjs = []
+    for number in range(count):
+        without_check_digits = f"{generator.randrange(10**12):012d}"
+        if number % 2:
+            cnpjs.append(without_check_digits + check_digits(without_check_digits))
+        else:
+            cnpjs.append(f"{without_check_digits}{generator.randrange(100):02d}")
+    return cnpjs
+
+
+class CnpjTests(TestCase):
+    def test_should_parse_masked_and_bare_cnpjs(self):
+        for value in ["00.000.000/0001-91", "00000000000191", "191", " 0001-91 "]:
+            with self.subTest(value=value):
+                self.assertEqual(parse_cnpj(value), "00000000000191")
+                self.assertTrue(is_valid_cnpj(value))
+
+    def test_should_reject_invalid_cnpjs(self):
+        for value in ["", "abc", "00000000000192", "100000000000191", "١٩١"]:
+            with self.subTest(value=value):
+                self.assertIsNone(parse_cnpj(value))
+
+    def test_check_digits(self):
+        self.assertEqual(check_digits("112223330001"), "81")
+        self.assertEqual(check_digits("000000000001"), "91")
+
+    def test_should_format_the_digits(self):
+        self.assertEqual(cnpj_digits("11.222.333/0001-81"), "11222333000181")
+        self.assertEqual(cnpj_digits("-"), "")
+        self.assertEqual(format_cnpj("191"), "00.000.000/0001-91")
+
+
+class ParseCnpjsTests(TestCase):
+    VALUES = random_cnpjs(200) + [
+        "11.222.333/0001-81",
+        "191",
+        "",
+        "1" * 15,
+        "not a cnpj",
+    ]
+
+    def expected(self, values):
+        return [parse_cnpj(value) for value in values]
+
+    def test_small_batches_should_be_parsed_one_by_one(self):
+        values = self.VALUES[:10]
+        self.assertEqual(parse_cnpjs(values), self.expected(values))
+
+    @patch.object(cnpj, "numpy", None)
+    def test_should_fall_back_to_parsing_one_by_one_without_numpy(self):
+        self.assertEqual(parse_cnpjs(self.VALUES), self.expected(self.VALUES))
+
+    @skipIf(cnpj.numpy is None, "numpy is not installed")
+    def test_arrays_should_agree_with_the_parser(self):
+        for values in [self.VALUES, random_cnpjs(200, seed=2)]:
+            with self.subTest(size=len(values)):
+                self.assertEqual(parse_cnpjs(values), self.expected(values))
+
+    @skipIf(cnpj.numpy is None, "numpy is not installed")
+    def test_misaligned_lengths_should_not_pass_as_bare_cnpjs(self):
+        # 13 + 15 digits add up to the length of two bare CNPJs
+        values = random_cnpjs(62) + ["1122233300018", "111444777000161"]
+        self.assertEqual(parse_cnpjs(values), self.expected(values))
+        self.assertEqual(parse_cnpjs(values)[-2:], [None, None])
@@ -0,0 +1,157 @@
+"""
+Tests for the batch lookups of companies and partners.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from api.api import config
+from companies import CompanyLookup, PartnersLookup
+from database.postgresql import (
+    COMPANY_FIELDS,
+    PARTNER_FIELDS,
+    PostgreSQLDatabaseCompanies,
+)
+
+from tests.test_helpers import create_default_mocks
+
+VIEW_COLUMNS = {
+    "resposta_cnpj": [
+        "estabelecimento_cnpj_basico",
+        *(column for _, column in COMPANY_FIELDS),
+    ],
+    "resposta_socios": ["id", "cnpj_basico", *(column for _, column in PARTNER_FIELDS)],
+}
+COMPANY_ROW = ("value",) * 36
+PARTNER_ROW = ("2", "FULANO DE TAL") + (None,) * 8
+
+
+def create_companies_database():
+    database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+    database._describe = MagicMock(side_effect=VIEW_COLUMNS.get)
+    database._select = MagicMock(return_value=iter([]))
+    return database
+
+
+class CompaniesBatchDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_should_look_up_distinct_valid_cnpjs_in_a_single_statement(self):
+        self.database._select.return_value = iter([("00000000000191",) + COMPANY_ROW])
+        lookups = self.database.get_companies(
+            ["00.000.000/0001-91", "00000000000191", "11.222.333/0001-81", "123"]
+        )
+        self.database._select.assert_called_once()
+        _, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_companies")
+        self.assertEqual(data["cnpj"], ["00000000000191", "11222333000181"])
+        self.assertEqual(data["cnpj_basico"], ["00000000", "11222333"])
+        self.assertEqual(data["cnpj_ordem"], ["0001", "0001"])
+        self.assertEqual(data["cnpj_dv"], ["91", "81"])
+
+        self.assertEqual(
+            [(lookup.cnpj, lookup.error) for lookup in lookups],
+            [
+                ("00.000.000/0001-91", None),
+                ("11.222.333/0001-81", "Company not found."),
+                ("123", 'CNPJ "123" is not valid.'),
+            ],
+        )
+        self.assertEqual(lookups[0].cnpj_info.cnpj_completo, "00.000.000/0001-91")
+        self.assertIsNone(lookups[1].cnpj_info)
+
+    def test_should_not_query_without_valid_cnpjs(self):
+        lookups = self.database.get_companies(["123", "abc"])
+        self.database._select.assert_not_called()
+        self.assertEqual(len(lookups), 2)
+        self.assertTrue(all(lookup.error for lookup in lookups))
+
+    def test_should_share_the_partners_of_the_branches_of_a_company(self):
+        self.database._select.return_value = iter(
+            [("00000000",) + PARTNER_ROW, ("00000000",) + PARTNER_ROW]
+        )
+        lookups = self.database.get_companies_partners(
+            ["00.000.000/0001-91", "00.000.000/0002-72", "11.222.333/0001-81"]
+        )
+        _, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_companies_partners")
+        self.assertEqual(data, {"cnpj_basico": ["00000000", "11222333"]})
+        self.assertEqual(
+            [(lookup.total_partners, lookup.error) for lookup in lookups],
+            [(2, None), (2, None), (0, None)],
+        )
+        self.assertEqual(lookups[1].partners[0].cnpj_completo, "00.000.000/0002-72")
+
+
+class CompaniesBatchApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_companies_batch_should_return_an_item_per_cnpj(self):
+        self.mocks[4].get_companies = MagicMock(
+            return_value=[
+                CompanyLookup("00000000000191", error="Company not found."),
+                CompanyLookup("123", error='CNPJ "123" is not valid.'),
+            ]
+        )
+        response = self.client.post(
+            "/company/info/batch", json={"cnpjs": ["00000000000191", "123"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_companies.assert_called_once_with(["00000000000191", "123"])
+        self.assertEqual(
+            response.json(),
+            {
+                "companies": [
+                    {
+                        "cnpj": "00000000000191",
+                        "cnpj_info": None,
+                        "error": "Company not found.",
+                    },
+                    {
+                        "cnpj": "123",
+                        "cnpj_info": None,
+                        "error": 'CNPJ "123" is not valid.',
+                    },
+                ]
+            },
+        )
+
+    def test_partners_batch_should_return_an_item_per_cnpj(self):
+        self.mocks[4].get_companies_partners = MagicMock(
+            return_value=[PartnersLookup("00000000000191")]
+        )
+        response = self.client.post(
+            "/company/partners/batch", json={"cnpjs": ["00000000000191"]}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "companies": [
+                    {
+                        "cnpj": "00000000000191",
+                        "total_partners": 0,
+                        "partners": [],
+                        "error": None,
+                    }
+                ]
+            },
+        )
+
+    def test_batches_should_be_limited(self):
+        for path in ["/company/info/batch", "/company/partners/batch"]:
+            with self.subTest(path=path):
+                empty = self.client.post(path, json={"cnpjs": []})
+                self.assertEqual(empty.status_code, 422)
+                too_big = self.client.post(
+                    path,
+                    json={"cnpjs": ["1"] * (config.companies_batch_max_size + 1)},
+                )
+                self.assertEqual(too_big.status_code, 422)
@@ -0,0 +1,325 @@
+"""
+Tests for the TTL cache of companies and partners and for its admin
+endpoints.
+"""
+
+import os
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from companies import (
+    COMPANY_NOT_FOUND,
+    CachedCompaniesAccess,
+    CompaniesAccess,
+    CompanyLookup,
+    InvalidCNPJException,
+    PartnersLookup,
+    create_companies_interface,
+)
+from database.postgresql import PostgreSQLDatabaseCompanies
+from utils.ttl_cache import MISSING, TTLCache
+
+from tests.test_helpers import create_default_mocks
+from tests.test_records import create_company, create_partner
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TTLCacheTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TTLCache("test", 2, 10, negative_ttl=1, clock=self.clock)
+
+    def test_entries_should_expire_after_their_ttl(self):
+        self.cache.set("key", "value")
+        self.clock.now = 9.9
+        self.assertEqual(self.cache.get("key"), "value")
+        self.clock.now = 10
+        self.assertIs(self.cache.get("key"), MISSING)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_none_values_should_use_the_negative_ttl(self):
+        self.cache.set("key", None)
+        self.assertIsNone(self.cache.get("key"))
+        self.clock.now = 1
+        self.assertIs(self.cache.get("key"), MISSING)
+
+    def test_least_recently_used_entry_should_be_evicted(self):
+        self.cache.set("first", 1)
+        self.cache.set("second", 2)
+        self.cache.get("first")
+        self.cache.set("third", 3)
+        self.assertIs(self.cache.get("second"), MISSING)
+        self.assertEqual(self.cache.get("first"), 1)
+        self.assertEqual(self.cache.get("third"), 3)
+
+    def test_invalidate_should_drop_the_given_keys_or_everything(self):
+        self.cache.set("first", 1)
+        self.cache.set("second", 2)
+        self.assertEqual(self.cache.invalidate(["first", "unknown"]), 1)
+        self.assertEqual(len(self.cache), 1)
+        self.assertEqual(self.cache.invalidate(), 1)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_stats_should_report_the_hit_ratio(self):
+        self.assertIsNone(self.cache.stats()["hit_ratio"])
+        self.cache.set("key", "value")
+        self.cache.get("key")
+        self.cache.get("key")
+        self.cache.get("unknown")
+        self.cache.get("unknown")
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 2))
+        self.assertEqual(stats["hit_ratio"], 0.5)
+        self.assertEqual(stats["size"], 1)
+
+    def test_lookups_should_be_counted_in_the_metrics(self):
+        with patch("utils.ttl_cache.record_cache_lookup") as record_cache_lookup:
+            self.cache.get("key")
+        record_cache_lookup.assert_called_once_with("test", False)
+
+    def test_disabled_cache_should_not_store_anything(self):
+        cache = TTLCache("test", 0, 10)
+        cache.set("key", "value")
+        self.assertIs(cache.get("key"), MISSING)
+
+
+class CachedCompaniesAccessTests(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.database = MagicMock(spec=PostgreSQLDatabaseCompanies)
+        self.database.get_company.return_value = create_company()
+        self.database.get_partners.return_value = (1, [create_partner()])
+        self.database.get_company_with_partners.return_value = (
+            create_company(),
+            [create_partner()],
+        )
+        self.database.get_data_version.return_value = 1
+        self.cache = TTLCache("companies", 100, 60, negative_ttl=5, clock=self.clock)
+        self.companies = CachedCompaniesAccess(
+            self.database, self.cache, version_check_interval=30
+        )
+
+    def test_should_create_a_cached_access_when_configured(self):
+        database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+        self.assertIsInstance(
+            create_companies_interface(database, cache_size=10, cache_ttl=60),
+            CachedCompaniesAccess,
+        )
+        uncached = create_companies_interface(database)
+        self.assertNotIsInstance(uncached, CachedCompaniesAccess)
+        self.assertIsInstance(uncached, CompaniesAccess)
+        self.assertIsNone(uncached.get_cache_stats())
+
+    def test_repeated_lookups_should_be_answered_by_the_cache(self):
+        first = self.companies.get_company("00.000.000/0001-91")
+        second = self.companies.get_company("00000000000191")
+        self.assertIs(first, second)
+        self.database.get_company.assert_called_once_with("00.000.000/0001-91")
+
+    def test_unknown_companies_should_be_cached_with_the_negative_ttl(self):
+        self.database.get_company.return_value = None
+        self.assertIsNone(self.companies.get_company("00000000000191"))
+        self.assertIsNone(self.companies.get_company("00000000000191"))
+        self.assertEqual(self.database.get_company.call_count, 1)
+        self.clock.now = 5
+        self.companies.get_company("00000000000191")
+        self.assertEqual(self.database.get_company.call_count, 2)
+
+    def test_invalid_cnpjs_should_not_be_cached(self):
+        self.database.get_company.side_effect = InvalidCNPJException("invalid")
+        for _ in range(2):
+            with self.assertRaises(InvalidCNPJException):
+                self.companies.get_company("123")
+        self.assertEqual(self.database.get_company.call_count, 2)
+        self.assertEqual(len(self.cache), 0)
+
+    def test_partners_should_be_cached(self):
+        self.companies.get_partners("00000000000191")
+        total, partners = self.companies.get_partners("00000000000191")
+        self.assertEqual(total, 1)
+        self.assertEqual(partners, [create_partner()])
+        self.database.get_partners.assert_called_once()
+
+    def test_company_with_partners_should_reuse_the_cached_records(self):
+        self.companies.get_company("00000000000191")
+        self.companies.get_partners("00000000000191")
+        company, partners = self.companies.get_company_with_partners("00000000000191")
+        self.assertEqual(company.cnpj_completo, "00.000.000/0001-91")
+        self.assertEqual(len(partners), 1)
+        self.database.get_company_with_partners.assert_not_called()
+
+    def test_company_with_partners_should_fill_both_entries(self):
+        self.companies.get_company_with_partners("00000000000191")
+        self.companies.get_company("00000000000191")
+        self.companies.get_partners("00000000000191")
+        self.database.get_company.assert_not_called()
+        self.database.get_partners.assert_not_called()
+
+    def test_batch_should_only_look_up_the_cnpjs_missing_from_the_cache(self):
+        self.companies.get_company("00000000000191")
+        self.database.get_companies.return_value = [
+            CompanyLookup("11.222.333/0001-81", error=COMPANY_NOT_FOUND),
+            CompanyLookup("123", error='CNPJ "123" is not valid.'),
+        ]
+        lookups = self.companies.get_companies(
+            ["00000000000191", "11.222.333/0001-81", "123", "00.000.000/0001-91"]
+        )
+        self.database.get_companies.assert_called_once_with(
+            ["11.222.333/0001-81", "123"]
+        )
+        self.assertEqual(
+            [(lookup.cnpj, lookup.error) for lookup in lookups],
+            [
+                ("00000000000191", None),
+                ("11.222.333/0001-81", COMPANY_NOT_FOUND),
+                ("123", 'CNPJ "123" is not valid.'),
+            ],
+        )
+
+        self.database.get_companies.reset_mock()
+        self.database.get_companies.return_value = [
+            CompanyLookup("123", error='CNPJ "123" is not valid.')
+        ]
+        lookups = self.companies.get_companies(["11222333000181", "123"])
+        self.database.get_companies.assert_called_once_with(["123"])
+        self.assertEqual(lookups[0].error, COMPANY_NOT_FOUND)
+
+    def test_batch_partners_should_be_cached(self):
+        self.database.get_companies_partners.return_value = [
+            PartnersLookup("00000000000191", partners=[create_partner()])
+        ]
+        self.companies.get_companies_partners(["00000000000191"])
+        (lookup,) = self.companies.get_companies_partners(["00000000000191"])
+        self.assertEqual(lookup.total_partners, 1)
+        self.database.get_companies_partners.assert_called_once()
+
+    def test_cache_should_be_dropped_when_the_data_version_changes(self):
+        self.assertTrue(self.companies.check_data_version())
+        self.companies.get_company("00000000000191")
+        self.assertTrue(self.companies.check_data_version())
+        self.companies.get_company("00000000000191")
+        self.assertEqual(self.database.get_company.call_count, 1)
+        self.database.get_data_version.return_value = 2
+        self.assertTrue(self.companies.check_data_version())
+        self.companies.get_company("00000000000191")
+        self.assertEqual(self.database.get_company.call_count, 2)
+
+    def test_failed_version_checks_should_keep_the_cache(self):
+        self.companies.check_data_version()
+        self.companies.get_company("00000000000191")
+        self.database.get_data_version.side_effect = Exception("unavailable")
+        self.assertFalse(self.companies.check_data_version())
+        self.companies.get_company("00000000000191")
+        self.assertEqual(self.database.get_company.call_count, 1)
+
+    def test_lookups_should_not_check_the_data_version(self):
+        self.companies.get_company("00000000000191")
+        self.companies.get_partners_page("00000000000191")
+        self.database.get_companies.return_value = []
+        self.companies.get_companies(["00000000000191"])
+        self.database.get_data_version.assert_not_called()
+
+    def test_data_version_should_be_checked_in_the_background(self):
+        checked = threading.Event()
+        self.database.get_data_version.side_effect = lambda: checked.set() or 1
+        companies = CachedCompaniesAccess(
+            self.database, self.cache, version_check_interval=60
+        )
+        companies.start()
+        try:
+            self.assertTrue(checked.wait(5))
+        finally:
+            companies.stop()
+
+    def test_invalidation_should_drop_the_given_cnpjs(self):
+        self.companies.get_company("00000000000191")
+        self.companies.get_partners("00000000000191")
+        self.companies.get_company("11222333000181")
+        self.assertEqual(self.companies.invalidate_cache(["00.000.000/0001-91"]), 2)
+        self.assertEqual(self.companies.invalidate_cache(), 1)
+
+
+class DataVersionTests(TestCase):
+    def test_version_should_only_count_the_writes_to_the_company_data(self):
+        database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+        database._select = MagicMock(return_value=iter([(42,)]))
+        self.assertEqual(database.get_data_version(), 42)
+        command, data, statement_name = database._select.call_args.args
+        self.assertEqual(statement_name, "get_data_version")
+        self.assertEqual(
+            data["relations"],
+            ["resposta_cnpj", "resposta_socios", "busca_empresas", "busca_socios"],
+        )
+        # the tables under the views, found from their dependencies
+        self.assertIn("pg_depend", command)
+        self.assertIn("relid IN (SELECT relid FROM company_relations)", command)
+
+
+@patch.dict(os.environ, {"QUERIDO_DIARIO_ADMIN_API_KEYS": "admin-key"})
+class CompaniesCacheApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        self.mocks[4].invalidate_cache = MagicMock(return_value=3)
+        self.mocks[4].get_cache_stats = MagicMock(
+            return_value={
+                "size": 1,
+                "max_size": 10,
+                "hits": 3,
+                "misses": 1,
+                "hit_ratio": 0.75,
+            }
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_stats_should_be_returned_to_admins(self):
+        response = self.client.get("/company/cache", headers={"X-API-Key": "admin-key"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["hit_ratio"], 0.75)
+        self.assertTrue(response.json()["enabled"])
+
+    def test_disabled_cache_should_be_reported(self):
+        self.mocks[4].get_cache_stats.return_value = None
+        response = self.client.get("/company/cache", headers={"X-API-Key": "admin-key"})
+        self.assertEqual(response.json()["enabled"], False)
+
+    def test_invalidation_should_drop_everything_by_default(self):
+        response = self.client.post(
+            "/company/cache/invalidate", headers={"X-API-Key": "admin-key"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"invalidated": 3})
+        self.mocks[4].invalidate_cache.assert_called_once_with(None)
+
+    def test_invalidation_should_drop_the_given_cnpjs(self):
+        self.client.post(
+            "/company/cache/invalidate",
+            headers={"X-API-Key": "admin-key"},
+            json={"cnpjs": ["00000000000191"]},
+        )
+        self.mocks[4].invalidate_cache.assert_called_once_with(["00000000000191"])
+
+    def test_endpoints_should_require_an_admin_key(self):
+        for headers, status_code in [({}, 401), ({"X-API-Key": "other"}, 403)]:
+            with self.subTest(status_code=status_code):
+                response = self.client.post(
+                    "/company/cache/invalidate", headers=headers
+                )
+                self.assertEqual(response.status_code, status_code)
+        self.mocks[4].invalidate_cache.assert_not_called()
+
+    @patch.dict(os.environ, {"QUERIDO_DIARIO_ADMIN_API_KEYS": ""})
+    def test_endpoints_should_be_unavailable_without_admin_keys(self):
+        response = self.client.get("/company/cache", headers={"X-API-Key": "x"})
+        self.assertEqual(response.status_code, 503)
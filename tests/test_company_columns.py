@@ -0,0 +1,150 @@
+"""
+Tests for the projection of the company views on the fields of the records
+and for the prepared statements of the company lookups.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+import psycopg2
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from database.postgresql import PostgreSQLDatabaseCompanies
+
+from tests.test_companies_batch import (
+    COMPANY_ROW,
+    PARTNER_ROW,
+    create_companies_database,
+)
+
+
+class SelectListTests(TestCase):
+    def setUp(self):
+        self.database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+        self.database._describe = MagicMock()
+
+    def test_fields_should_be_read_from_their_columns(self):
+        self.database._describe.return_value = [
+            "estabelecimento_cnpj_basico",
+            "estabelecimento_uf",
+            "faixa_etaria",
+        ]
+        select_list = self.database._select_list(
+            "resposta_cnpj", (("uf", "estabelecimento_uf"), ("faixa", "faixa_etaria"))
+        )
+        self.assertEqual(
+            select_list,
+            'resposta_cnpj."estabelecimento_uf", resposta_cnpj."faixa_etaria"',
+        )
+
+    def test_missing_columns_should_fail(self):
+        # columns of similar names are not taken for the missing one
+        self.database._describe.return_value = [
+            "estabelecimento_situacao_especial",
+            "estabelecimento_data_situacao_cadastral",
+        ]
+        with self.assertRaisesRegex(Exception, "estabelecimento_situacao_cadastral"):
+            self.database._select_list(
+                "resposta_cnpj",
+                (("situacao_cadastral", "estabelecimento_situacao_cadastral"),),
+            )
+
+    def test_views_should_be_described_once(self):
+        self.database._describe.return_value = ["uf"]
+        for _ in range(3):
+            self.database._select_list("resposta_cnpj", (("uf", "uf"),))
+        self.database._describe.assert_called_once_with("resposta_cnpj")
+
+    def test_columns_should_be_checked_at_startup(self):
+        create_companies_database().check_columns()
+        self.database._describe.side_effect = lambda relation: ["cnpj_basico"]
+        with self.assertRaisesRegex(Exception, "resposta_cnpj"):
+            self.database.check_columns()
+
+    def test_columns_should_be_checked_later_without_database(self):
+        self.database._describe.side_effect = psycopg2.OperationalError("refused")
+        with self.assertLogs(level="WARNING"):
+            self.database.check_columns()
+
+
+class CompanyColumnsTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_company_lookup_should_select_only_the_record_fields(self):
+        self.database._select.return_value = iter([COMPANY_ROW])
+        company = self.database.get_company("00000000000191")
+        command, _, _ = self.database._select.call_args.args
+        self.assertNotIn("*", command)
+        self.assertIn('resposta_cnpj."municipio_descricao"', command)
+        self.assertEqual(company.municipio, "value")
+        self.assertEqual(company.cnpj_completo, "00.000.000/0001-91")
+
+    def test_partners_should_be_mapped_by_name(self):
+        self.database._select.return_value = iter([PARTNER_ROW, PARTNER_ROW])
+        total, partners = self.database.get_partners("00000000000191")
+        self.assertEqual(total, 2)
+        self.assertEqual(partners[1].identificador_socio, "2")
+        self.assertEqual(partners[1].razao_social, "FULANO DE TAL")
+        self.assertIsNone(partners[1].faixa_etaria)
+        self.assertEqual(partners[1].cnpj_completo_apenas_numeros, "00000000000191")
+
+
+class PreparedStatementTests(TestCase):
+    def setUp(self):
+        self.connect_patcher = patch("psycopg2.connect")
+        self.connect = self.connect_patcher.start()
+        self.connect.side_effect = self.create_connection
+        self.connections = []
+
+    def tearDown(self):
+        self.connect_patcher.stop()
+
+    def create_connection(self, *args, **kwargs):
+        connection = MagicMock(closed=0)
+        self.connections.append(connection)
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        return connection
+
+    def executed(self, connection):
+        cursor = connection.cursor.return_value.__enter__.return_value
+        return [call.args for call in cursor.execute.call_args_list]
+
+    def test_fixed_lookups_should_be_prepared_once_per_connection(self):
+        database = PostgreSQLDatabaseCompanies("", "", "", "", "", pool_size=1)
+        database._select_list = MagicMock(return_value="resposta_cnpj.uf")
+        for _ in range(3):
+            database.get_company("00000000000191")
+        (connection,) = database._pool._pool
+        executed = self.executed(connection)
+        self.assertEqual(len(executed), 4)
+        (prepare,) = executed[0]
+        self.assertTrue(prepare.startswith("PREPARE get_company AS"))
+        self.assertIn("estabelecimento_cnpj_basico = $1", prepare)
+        self.assertIn("estabelecimento_cnpj_dv = $3", prepare)
+        self.assertNotIn(";", prepare)
+        self.assertEqual(
+            executed[1],
+            (
+                "EXECUTE get_company (%(cnpj_basico)s, %(cnpj_ordem)s, %(cnpj_dv)s)",
+                {"cnpj_basico": "00000000", "cnpj_ordem": "0001", "cnpj_dv": "91"},
+            ),
+        )
+
+    def test_statements_should_not_be_prepared_without_a_pool(self):
+        database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+        database._select_list = MagicMock(return_value="resposta_socios.uf")
+        database.get_partners("00000000000191")
+        command, data = self.executed(self.connections[-1])[-1]
+        self.assertIn("FROM", command)
+        self.assertEqual(data, {"cnpj_basico": "00000000"})
+
+    def test_batch_lookups_should_not_be_prepared(self):
+        database = PostgreSQLDatabaseCompanies("", "", "", "", "", pool_size=1)
+        database._select_list = MagicMock(return_value="resposta_cnpj.uf")
+        database.get_companies(["00000000000191"])
+        (connection,) = database._pool._pool
+        ((command, _),) = self.executed(connection)
+        self.assertNotIn("PREPARE", command)
@@ -0,0 +1,260 @@
+"""
+Tests for the search of companies by name, its keyset pagination and the
+migrations creating the search view.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import psycopg2
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from companies import CompanySearchResult
+from database.migrations import (
+    DROP_INDEX_COMMAND,
+    MIGRATIONS,
+    refresh_company_search,
+    run_migrations,
+)
+from database.postgresql import PostgreSQLDatabaseCompanies
+from utils.cursor import InvalidCursorException, decode_cursor, encode_cursor
+
+from tests.test_companies_batch import create_companies_database
+from tests.test_helpers import create_default_mocks
+
+
+def search_row(cnpj, score):
+    return (cnpj, "EMPRESA", None, "SC", "GASPAR", score)
+
+
+class CursorTests(TestCase):
+    def test_cursors_should_hold_the_key(self):
+        cursor = encode_cursor([0.75, "00000000000191"])
+        self.assertNotIn("=", cursor)
+        self.assertEqual(decode_cursor(cursor, 2), (0.75, "00000000000191"))
+
+    def test_invalid_cursors_should_fail(self):
+        for cursor in ["not a cursor", encode_cursor([1]), "e30"]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursorException):
+                    decode_cursor(cursor, 2)
+
+
+class CompanySearchDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_should_rank_the_companies_by_similarity(self):
+        self.database._select.return_value = iter([search_row("00000000000191", 0.8)])
+        results, next_cursor = self.database.search_companies(" empresa  x ")
+        command, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "search_companies")
+        self.assertEqual(data, {"name": "EMPRESA X", "limit": 21})
+        self.assertIn("ORDER BY", command)
+        self.assertNotIn("uf =", command)
+        self.assertNotIn("after_score", command)
+        self.assertIsNone(next_cursor)
+        (result,) = results
+        self.assertEqual(result.cnpj_completo, "00.000.000/0001-91")
+        self.assertIsNone(result.nome_fantasia)
+        self.assertEqual(result.score, 0.8)
+
+    def test_should_filter_by_uf_and_municipio(self):
+        self.database.search_companies("empresa", uf="sc", municipio="gaspar")
+        command, data, _ = self.database._select.call_args.args
+        self.assertIn("AND uf = %(uf)s", command)
+        self.assertIn("AND municipio = %(municipio)s", command)
+        self.assertEqual((data["uf"], data["municipio"]), ("SC", "GASPAR"))
+
+    def test_full_pages_should_have_the_cursor_of_their_last_company(self):
+        self.database._select.return_value = iter(
+            [
+                search_row("00000000000191", 0.9),
+                search_row("11222333000181", 0.5),
+                search_row("11444777000161", 0.5),
+            ]
+        )
+        results, next_cursor = self.database.search_companies("empresa", limit=2)
+        self.assertEqual(len(results), 2)
+        self.assertEqual(decode_cursor(next_cursor, 2), (0.5, "11222333000181"))
+
+        self.database._select.return_value = iter([])
+        self.database.search_companies("empresa", limit=2, cursor=next_cursor)
+        command, data, _ = self.database._select.call_args.args
+        self.assertIn("cnpj > %(after_cnpj)s", command)
+        self.assertEqual(
+            (data["after_score"], data["after_cnpj"]), (0.5, "11222333000181")
+        )
+
+    def test_cursors_with_unexpected_values_should_fail(self):
+        with self.assertRaises(InvalidCursorException):
+            self.database.search_companies("empresa", cursor=encode_cursor(["a", 1]))
+        self.database._select.assert_not_called()
+
+
+class MigrationsTests(TestCase):
+    def setUp(self):
+        self.database = PostgreSQLDatabaseCompanies("", "", "", "", "")
+        self.database._describe = MagicMock(
+            side_effect={
+                "resposta_cnpj": [
+                    "estabelecimento_cnpj_basico",
+                    "estabelecimento_nome_fantasia",
+                    "empresa_razao_social",
+                    "estabelecimento_uf",
+                    "municipio_descricao",
+                ],
+                "resposta_socios": [
+                    "cnpj_basico",
+                    "identificador_socio",
+                    "razao_social",
+                    "cnpj_cpf_socio",
+                    "qualificacao_socio",
+                    "data_entrada_sociedade",
+                ],
+            }.get
+        )
+        self.connection = MagicMock()
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+        self.database._connect = MagicMock(return_value=self.connection)
+        self.database._release = MagicMock()
+        # the indexes are found valid
+        self.cursor.fetchone.return_value = (True,)
+
+    def test_should_apply_the_pending_migrations_in_order(self):
+        self.cursor.fetchall.return_value = [("0001_pg_trgm",)]
+        applied = run_migrations(self.database)
+        self.assertEqual(applied, [name for name, _ in MIGRATIONS[1:]])
+        commands = [call.args[0] for call in self.cursor.execute.call_args_list]
+        self.assertFalse(any("pg_trgm;" in command for command in commands))
+        view, partners_view = [
+            command for command in commands if "MATERIALIZED VIEW" in command
+        ]
+        self.assertIn('upper("empresa_razao_social") AS razao_social', view)
+        self.assertIn('upper("estabelecimento_nome_fantasia")', view)
+        self.assertIn('upper("estabelecimento_uf") AS uf', view)
+        self.assertTrue(
+            any("gin (razao_social gin_trgm_ops)" in command for command in commands)
+        )
+        self.assertIn("upper(\"razao_social\"), '') AS nome", partners_view)
+        self.assertIn('"cnpj_cpf_socio"::text', partners_view)
+        self.assertTrue(
+            any("busca_socios (documento, nome, cnpj_basico)" in c for c in commands)
+        )
+        self.database._release.assert_called_once_with(self.connection)
+
+    def test_should_not_apply_migrations_twice(self):
+        self.cursor.fetchall.return_value = [(name,) for name, _ in MIGRATIONS]
+        self.assertEqual(run_migrations(self.database), [])
+        self.assertEqual(self.cursor.execute.call_count, 2)
+
+    def test_invalid_indexes_should_be_dropped_before_being_built(self):
+        self.cursor.fetchall.return_value = [
+            (name,) for name, _ in MIGRATIONS if name != "0003_busca_empresas_cnpj"
+        ]
+        self.cursor.fetchone.side_effect = [(False,), (True,)]
+        self.assertEqual(run_migrations(self.database), ["0003_busca_empresas_cnpj"])
+        commands = [call.args[0] for call in self.cursor.execute.call_args_list]
+        drop = commands.index(DROP_INDEX_COMMAND.format(index="busca_empresas_cnpj"))
+        create = next(i for i, c in enumerate(commands) if "CREATE UNIQUE INDEX" in c)
+        self.assertLess(drop, create)
+        self.assertIn("INSERT INTO api_migrations", commands[-1])
+
+    def test_migrations_should_not_be_recorded_with_an_invalid_index(self):
+        self.cursor.fetchall.return_value = [
+            (name,) for name, _ in MIGRATIONS if name != "0003_busca_empresas_cnpj"
+        ]
+        self.cursor.fetchone.side_effect = [None, (False,)]
+        with self.assertRaisesRegex(Exception, "busca_empresas_cnpj"):
+            run_migrations(self.database)
+        commands = [call.args[0] for call in self.cursor.execute.call_args_list]
+        self.assertFalse(any("INSERT INTO api_migrations" in c for c in commands))
+        self.assertFalse(any("DROP INDEX" in c for c in commands))
+        self.database._release.assert_called_once_with(self.connection)
+
+    def test_views_should_be_refreshed_one_at_a_time(self):
+        refresh_company_search(self.database)
+        self.assertEqual(
+            [call.args[0] for call in self.cursor.execute.call_args_list],
+            [
+                "REFRESH MATERIALIZED VIEW CONCURRENTLY busca_empresas;",
+                "REFRESH MATERIALIZED VIEW CONCURRENTLY busca_socios;",
+            ],
+        )
+
+    def test_failed_refreshes_should_name_their_view(self):
+        self.cursor.execute.side_effect = [None, psycopg2.OperationalError("lock")]
+        with self.assertRaisesRegex(Exception, "Could not refresh busca_socios"):
+            refresh_company_search(self.database)
+        self.database._release.assert_called_once_with(self.connection)
+
+
+class CompanySearchApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        self.mocks[4].search_companies = MagicMock(
+            return_value=(
+                [
+                    CompanySearchResult(
+                        "00000000000191",
+                        "00.000.000/0001-91",
+                        "EMPRESA",
+                        None,
+                        "SC",
+                        "GASPAR",
+                        0.8,
+                    )
+                ],
+                "cursor",
+            )
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_should_return_a_page_of_companies(self):
+        response = self.client.get(
+            "/company/search",
+            params={"name": "empresa", "uf": "SC", "limit": 1, "cursor": "abc"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].search_companies.assert_called_once_with(
+            "empresa", "SC", None, 1, "abc"
+        )
+        self.assertEqual(
+            response.json(),
+            {
+                "companies": [
+                    {
+                        "cnpj": "00000000000191",
+                        "cnpj_completo": "00.000.000/0001-91",
+                        "razao_social": "EMPRESA",
+                        "nome_fantasia": None,
+                        "uf": "SC",
+                        "municipio": "GASPAR",
+                        "score": 0.8,
+                    }
+                ],
+                "next_cursor": "cursor",
+            },
+        )
+
+    def test_should_validate_the_parameters(self):
+        for params in [
+            {"name": "ab"},
+            {"name": "empresa", "uf": "SCX"},
+            {"name": "empresa", "limit": 0},
+            {"name": "empresa", "limit": 101},
+        ]:
+            with self.subTest(params=params):
+                response = self.client.get("/company/search", params=params)
+                self.assertEqual(response.status_code, 422)
+
+    def test_invalid_cursor_should_be_a_bad_request(self):
+        self.mocks[4].search_companies.side_effect = InvalidCursorException(
+            'Cursor "abc" is not valid.'
+        )
+        response = self.client.get(
+            "/company/search", params={"name": "empresa", "cursor": "abc"}
+        )
+        self.assertEqual(response.status_code, 400)
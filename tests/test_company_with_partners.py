@@ -0,0 +1,163 @@
+"""
+Tests for the lookup of a company together with its partners and for the
+pool of PostgreSQL connections serving it.
+"""
+
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from database.postgresql import PostgreSQLDatabase
+from utils.deadline import request_deadline
+
+from tests.test_companies_batch import (
+    COMPANY_ROW,
+    PARTNER_ROW,
+    create_companies_database,
+)
+from tests.test_helpers import create_default_mocks
+from tests.test_records import create_company, create_partner
+
+
+class CompanyWithPartnersDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_should_return_the_company_and_the_aggregated_partners(self):
+        self.database._select.return_value = iter(
+            [COMPANY_ROW + ([list(PARTNER_ROW)],)]
+        )
+        company, partners = self.database.get_company_with_partners("00000000000191")
+        _, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_company_with_partners")
+        self.assertEqual(
+            data, {"cnpj_basico": "00000000", "cnpj_ordem": "0001", "cnpj_dv": "91"}
+        )
+        self.assertEqual(company.cnpj_completo, "00.000.000/0001-91")
+        self.assertEqual(company.cnae, "value")
+        (partner,) = partners
+        self.assertEqual(partner.razao_social, "FULANO DE TAL")
+        self.assertEqual(partner.identificador_socio, "2")
+
+    def test_company_without_partners_should_have_an_empty_list(self):
+        self.database._select.return_value = iter([COMPANY_ROW + (None,)])
+        _, partners = self.database.get_company_with_partners("00000000000191")
+        self.assertEqual(partners, [])
+
+    def test_unknown_company_should_be_none(self):
+        self.database._select.return_value = iter([])
+        self.assertEqual(
+            self.database.get_company_with_partners("00000000000191"), (None, [])
+        )
+
+
+class CompanyWithPartnersApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        self.mocks[4].get_company = MagicMock(return_value=create_company())
+        self.mocks[4].get_company_with_partners = MagicMock(
+            return_value=(create_company(), [create_partner()])
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_partners_should_only_be_returned_when_included(self):
+        response = self.client.get("/company/info/00000000000191")
+        self.assertEqual(list(response.json()), ["cnpj_info"])
+        self.mocks[4].get_company_with_partners.assert_not_called()
+
+    def test_included_partners_should_come_from_the_combined_lookup(self):
+        response = self.client.get(
+            "/company/info/00000000000191", params={"include": "partners"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_company.assert_not_called()
+        body = response.json()
+        self.assertEqual(body["cnpj_info"]["cnpj_completo"], "00.000.000/0001-91")
+        self.assertEqual(body["total_partners"], 1)
+        self.assertEqual(body["partners"][0]["razao_social"], "FULANO DE TAL")
+
+    def test_unknown_company_should_not_be_found_with_partners(self):
+        self.mocks[4].get_company_with_partners.return_value = (None, [])
+        response = self.client.get(
+            "/company/info/00000000000191", params={"include": "partners"}
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_unknown_include_should_be_rejected(self):
+        response = self.client.get(
+            "/company/info/00000000000191", params={"include": "branches"}
+        )
+        self.assertEqual(response.status_code, 422)
+
+
+class ConnectionPoolTests(TestCase):
+    def setUp(self):
+        self.connect_patcher = patch("psycopg2.connect")
+        self.connect = self.connect_patcher.start()
+        self.connect.side_effect = self.create_connection
+
+    def tearDown(self):
+        self.connect_patcher.stop()
+
+    def create_connection(self, *args, **kwargs):
+        connection = MagicMock(closed=0)
+        connection.info.transaction_status = TRANSACTION_STATUS_IDLE
+        cursor = connection.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [("row",)]
+        return connection
+
+    def test_without_pool_every_statement_should_open_a_connection(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432)
+        list(database._select("SELECT 1"))
+        list(database._select("SELECT 1"))
+        self.assertEqual(self.connect.call_count, 2)
+        self.connect.return_value.close.assert_not_called()
+
+    def test_pooled_connections_should_be_reused(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432, 2)
+        self.connect.assert_not_called()
+        for _ in range(5):
+            list(database._select("SELECT 1"))
+        self.assertEqual(self.connect.call_count, 2)
+
+    def test_pooled_connection_should_end_the_transaction_when_released(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432, 2)
+        with request_deadline(5):
+            list(database._select("SELECT 1"))
+        connection = database._pool._pool[-1]
+        cursor = connection.cursor.return_value.__enter__.return_value
+        statement, _ = cursor.execute.call_args_list[0].args
+        self.assertEqual(statement, "SET LOCAL statement_timeout = %s")
+        connection.rollback.assert_called_once()
+        connection.close.assert_not_called()
+
+    def test_closed_connections_should_not_return_to_the_pool(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432, 2)
+        connection = database._connect()
+        connection.closed = 2
+        database._release(connection)
+        connection.close.assert_called_once()
+        self.assertEqual(len(database._pool._pool), 1)
+        self.assertNotIn(connection, database._pool._pool)
+
+    def test_callers_should_wait_for_a_free_connection(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432, 1)
+        connection = database._connect()
+        finished = threading.Event()
+
+        def select():
+            list(database._select("SELECT 1"))
+            finished.set()
+
+        thread = threading.Thread(target=select)
+        thread.start()
+        self.assertFalse(finished.wait(0.1))
+        database._release(connection)
+        self.assertTrue(finished.wait(5))
+        thread.join()
+        self.assertEqual(self.connect.call_count, 1)
@@ -0,0 +1,125 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from database.postgresql import PostgreSQLDatabase
+from index.opensearch import CLIENT_TIMEOUT_MARGIN, OpenSearch
+from utils.deadline import (
+    Deadline,
+    DeadlineExceededException,
+    current_deadline,
+    request_deadline,
+)
+
+
+class DeadlineTests(TestCase):
+    def test_deadline_should_only_be_active_inside_the_block(self):
+        self.assertIsNone(current_deadline())
+        with request_deadline(5) as deadline:
+            self.assertIs(current_deadline(), deadline)
+        self.assertIsNone(current_deadline())
+
+    def test_bound_should_never_exceed_the_remaining_time(self):
+        deadline = Deadline(2)
+        self.assertLessEqual(deadline.bound(30), 2)
+        self.assertEqual(deadline.bound(1), 1)
+
+    def test_expired_deadline_should_have_no_remaining_time(self):
+        deadline = Deadline(0)
+        self.assertTrue(deadline.expired())
+        self.assertEqual(deadline.remaining(), 0.0)
+
+    def test_expired_deadline_should_fail_the_check(self):
+        Deadline(5).check()
+        deadline = Deadline(0)
+        with self.assertRaises(DeadlineExceededException):
+            deadline.check()
+        self.assertTrue(deadline.timed_out)
+
+    def test_timed_out_search_response_should_flag_deadline(self):
+        deadline = Deadline(5)
+        deadline.record_search_response({"timed_out": True, "_shards": {}})
+        self.assertTrue(deadline.timed_out)
+        self.assertTrue(deadline.partial)
+
+    def test_failed_shards_should_flag_deadline_as_partial_only(self):
+        deadline = Deadline(5)
+        deadline.record_search_response(
+            {"timed_out": False, "_shards": {"total": 2, "failed": 1}}
+        )
+        self.assertFalse(deadline.timed_out)
+        self.assertTrue(deadline.partial)
+
+    def test_complete_search_response_should_not_flag_deadline(self):
+        deadline = Deadline(5)
+        deadline.record_search_response(
+            {"timed_out": False, "_shards": {"total": 2, "failed": 0}}
+        )
+        self.assertFalse(deadline.timed_out)
+        self.assertFalse(deadline.partial)
+
+
+class OpenSearchDeadlineTests(TestCase):
+    def setUp(self):
+        self.client_patcher = patch("opensearchpy.OpenSearch")
+        self.client = self.client_patcher.start().return_value
+        self.client.indices.exists.return_value = True
+        self.client.search.return_value = {"timed_out": True, "_shards": {}}
+        self.engine = OpenSearch("localhost", default_index="gazettes")
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    def test_search_without_deadline_should_use_the_given_timeout(self):
+        self.engine.search({"query": {}}, timeout=30)
+        kwargs = self.client.search.call_args.kwargs
+        self.assertEqual(kwargs["body"]["timeout"], "30000ms")
+        self.assertEqual(kwargs["request_timeout"], 30 + CLIENT_TIMEOUT_MARGIN)
+        self.assertTrue(kwargs["allow_partial_search_results"])
+
+    def test_search_should_not_change_the_given_query(self):
+        query = {"query": {}}
+        self.engine.search(query)
+        self.assertEqual(query, {"query": {}})
+
+    def test_search_should_propagate_the_request_deadline(self):
+        with request_deadline(2) as deadline:
+            self.engine.search({"query": {}}, timeout=30)
+        kwargs = self.client.search.call_args.kwargs
+        server_timeout = int(kwargs["body"]["timeout"].rstrip("ms"))
+        self.assertLessEqual(server_timeout, 2000)
+        self.assertLessEqual(kwargs["request_timeout"], 2 + CLIENT_TIMEOUT_MARGIN)
+        self.assertTrue(deadline.timed_out)
+
+    def test_search_should_fail_fast_when_the_deadline_expired(self):
+        with request_deadline(0):
+            with self.assertRaises(DeadlineExceededException):
+                self.engine.search({"query": {}})
+        self.client.indices.exists.assert_not_called()
+        self.client.search.assert_not_called()
+
+
+class PostgreSQLDeadlineTests(TestCase):
+    def setUp(self):
+        self.database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432)
+        self.cursor = MagicMock()
+
+    def test_statement_timeout_should_not_be_set_without_deadline(self):
+        self.database._apply_statement_timeout(self.cursor)
+        self.cursor.execute.assert_not_called()
+
+    def test_statement_timeout_should_follow_the_request_deadline(self):
+        with request_deadline(3):
+            self.database._apply_statement_timeout(self.cursor)
+        command, (statement_timeout,) = self.cursor.execute.call_args.args
+        self.assertEqual(command, "SET LOCAL statement_timeout = %s")
+        self.assertGreater(statement_timeout, 0)
+        self.assertLessEqual(statement_timeout, 3000)
+
+    def test_expired_deadline_should_fail_without_a_round_trip(self):
+        with request_deadline(0), patch.object(self.database, "_connect") as connect:
+            with self.assertRaises(DeadlineExceededException):
+                self.database._apply_statement_timeout(self.cursor)
+            with self.assertRaises(DeadlineExceededException):
+                list(self.database._select("SELECT 1"))
+        self.cursor.execute.assert_not_called()
+        connect.assert_not_called()
@@ -0,0 +1,84 @@
+"""
+Tests for the decoding of search responses: the OpenSearch serializers and
+the parsing of the hit dates.
+"""
+
+from datetime import date, datetime
+from unittest import TestCase, skipIf
+from unittest.mock import patch
+
+import opensearchpy
+
+from index import opensearch
+from index.opensearch import (
+    TimedJSONSerializer,
+    TimedOrjsonSerializer,
+    create_serializer,
+)
+from utils import parse_date
+
+
+class SerializerTests(TestCase):
+    BODY = {
+        "query": {"range": {"date": {"gte": date(2024, 1, 2)}}},
+        "scraped_at": datetime(2024, 1, 3, 10, 30, 15, 123),
+        "text": "licitação",
+    }
+
+    def test_unknown_serializer_should_fail(self):
+        with self.assertRaises(Exception):
+            create_serializer("yaml")
+
+    def test_json_serializer_should_be_used_when_requested(self):
+        self.assertIsInstance(create_serializer("json"), TimedJSONSerializer)
+        self.assertNotIsInstance(create_serializer("json"), TimedOrjsonSerializer)
+
+    @patch.object(opensearch, "orjson", None)
+    def test_should_fall_back_to_json_without_orjson(self):
+        for name in ["auto", "orjson"]:
+            with self.subTest(name=name):
+                serializer = create_serializer(name)
+                self.assertNotIsInstance(serializer, TimedOrjsonSerializer)
+
+    @skipIf(opensearch.orjson is None, "orjson is not installed")
+    def test_auto_should_pick_orjson_when_installed(self):
+        self.assertIsInstance(create_serializer("auto"), TimedOrjsonSerializer)
+
+    @skipIf(opensearch.orjson is None, "orjson is not installed")
+    def test_orjson_serializer_should_match_the_json_serializer(self):
+        json_serializer = create_serializer("json")
+        orjson_serializer = create_serializer("orjson")
+        self.assertEqual(
+            orjson_serializer.dumps(self.BODY), json_serializer.dumps(self.BODY)
+        )
+        encoded = json_serializer.dumps(self.BODY)
+        self.assertEqual(
+            orjson_serializer.loads(encoded), json_serializer.loads(encoded)
+        )
+        self.assertEqual(orjson_serializer.dumps("{}"), "{}")
+
+    @skipIf(opensearch.orjson is None, "orjson is not installed")
+    def test_orjson_serializer_should_raise_serialization_errors(self):
+        serializer = create_serializer("orjson")
+        with self.assertRaises(opensearchpy.SerializationError):
+            serializer.loads("{not json")
+        with self.assertRaises(opensearchpy.SerializationError):
+            serializer.dumps({"value": object()})
+
+
+class ParseDateTests(TestCase):
+    def test_should_parse_iso_dates(self):
+        self.assertEqual(parse_date("2024-01-02"), date(2024, 1, 2))
+
+    def test_should_accept_single_digit_months_and_days(self):
+        self.assertEqual(parse_date("2024-1-2"), date(2024, 1, 2))
+
+    def test_should_fail_with_invalid_dates(self):
+        with self.assertRaises(ValueError):
+            parse_date("02/01/2024")
+
+    def test_should_memoize_the_parsed_dates(self):
+        parse_date.cache_clear()
+        parse_date("2024-01-02")
+        parse_date("2024-01-02")
+        self.assertEqual(parse_date.cache_info().hits, 1)
@@ -0,0 +1,118 @@
+"""
+Tests for the extraction of the CNPJs written in the search results and for
+their enrichment with the companies.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from companies import COMPANY_NOT_FOUND, CompaniesAccess, CompanyLookup
+from companies.cnpj import find_cnpjs
+from database.postgresql import PostgreSQLDatabaseCompanies
+
+from tests.test_helpers import create_default_mocks
+from tests.test_records import (
+    create_company,
+    create_gazette,
+    create_themed_excerpt,
+)
+
+
+class FindCnpjsTests(TestCase):
+    def test_should_find_masked_and_unmasked_cnpjs(self):
+        text = (
+            "Contratada: EMPRESA, CNPJ 00.000.000/0001-91, e 11222333000181;"
+            " também 00.000.000/0001-91 e 11.222.333/0001-81."
+        )
+        self.assertEqual(find_cnpjs(text), ["00000000000191", "11222333000181"])
+
+    def test_should_not_split_longer_numbers(self):
+        for text in [
+            "Processo 1234567890123456",
+            "CPF 123.456.789-09",
+            "Protocolo 9.11.222.333/0001-81",
+            "",
+        ]:
+            with self.subTest(text=text):
+                self.assertEqual(find_cnpjs(text), [])
+
+
+class MentionedCompaniesAccessTests(TestCase):
+    def setUp(self):
+        self.database = MagicMock(spec=PostgreSQLDatabaseCompanies)
+        self.database.get_companies.return_value = [
+            CompanyLookup("00000000000191", cnpj_info=create_company()),
+            CompanyLookup("11222333000181", error=COMPANY_NOT_FOUND),
+            CompanyLookup(
+                "11222333000182", error='CNPJ "11222333000182" is not valid.'
+            ),
+        ]
+        self.companies = CompaniesAccess(self.database)
+
+    def test_should_look_up_the_cnpjs_of_all_texts_at_once(self):
+        companies = self.companies.get_mentioned_companies(
+            [
+                "CNPJ 00.000.000/0001-91 e 11222333000181",
+                "sem CNPJ",
+                "CNPJ 11222333000182 e 00000000000191",
+            ]
+        )
+        self.database.get_companies.assert_called_once_with(
+            ["00000000000191", "11222333000181", "11222333000182"]
+        )
+        self.assertEqual(companies, [[create_company()], [], [create_company()]])
+
+    def test_texts_without_cnpjs_should_not_be_looked_up(self):
+        self.assertEqual(self.companies.get_mentioned_companies(["a", "b"]), [[], []])
+        self.database.get_companies.assert_not_called()
+
+
+class MentionedCompaniesApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        self.mocks[0].get_gazettes = MagicMock(
+            return_value=(1, [create_gazette(["CNPJ 00.000.000/0001-91"])])
+        )
+        self.mocks[1].get_themed_excerpts = MagicMock(
+            return_value=(1, [create_themed_excerpt([], [])])
+        )
+        self.mocks[4].get_mentioned_companies = MagicMock(
+            return_value=[[create_company()]]
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_gazettes_should_have_the_companies_of_their_excerpts(self):
+        response = self.client.get("/gazettes", params={"extract_cnpjs": True})
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_mentioned_companies.assert_called_once_with(
+            ["CNPJ 00.000.000/0001-91"]
+        )
+        (gazette,) = response.json()["gazettes"]
+        self.assertEqual(gazette["excerpts"], ["CNPJ 00.000.000/0001-91"])
+        self.assertEqual(
+            gazette["companies"],
+            [
+                {
+                    "cnpj_completo": "00.000.000/0001-91",
+                    "cnpj_completo_apenas_numeros": "00000000000191",
+                }
+            ],
+        )
+
+    def test_themed_excerpts_should_have_the_companies_of_their_excerpt(self):
+        response = self.client.get(
+            "/gazettes/by_theme/educacao", params={"extract_cnpjs": True}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_mentioned_companies.assert_called_once_with(["excerpt"])
+        (excerpt,) = response.json()["excerpts"]
+        self.assertEqual(len(excerpt["companies"]), 1)
+
+    def test_companies_should_only_be_extracted_when_requested(self):
+        response = self.client.get("/gazettes")
+        self.assertNotIn("companies", response.json()["gazettes"][0])
+        self.mocks[4].get_mentioned_companies.assert_not_called()
@@ -0,0 +1,115 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from observability.metrics import (
+    BACKEND_CALL_DURATION,
+    MetricsRegistry,
+    track_backend_call,
+)
+from suggestions import MailjetSuggestionService, Suggestion
+
+from tests.test_helpers import create_default_mocks
+
+
+class MetricsRegistryTests(TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+
+    def test_counter_should_be_exposed_with_its_labels(self):
+        counter = self.registry.counter("requests_total", "Requests.", ("route",))
+        counter.labels("/gazettes").inc()
+        counter.labels("/gazettes").inc(2)
+        exposed = self.registry.expose()
+        self.assertIn("# TYPE requests_total counter", exposed)
+        self.assertIn('requests_total{route="/gazettes"} 3', exposed)
+
+    def test_gauge_should_go_up_and_down(self):
+        gauge = self.registry.gauge("in_flight", "In flight.")
+        gauge.inc()
+        gauge.inc()
+        gauge.dec()
+        self.assertIn("in_flight 1", self.registry.expose())
+
+    def test_gauge_function_should_be_computed_when_exposed(self):
+        gauge = self.registry.gauge("age_seconds", "Age.", ("snapshot",))
+        ages = iter([1.5, float("inf")])
+        gauge.labels("aggregates").set_function(lambda: next(ages))
+        self.assertIn('age_seconds{snapshot="aggregates"} 1.5', self.registry.expose())
+        self.assertIn('age_seconds{snapshot="aggregates"} +Inf', self.registry.expose())
+
+    def test_histogram_buckets_should_be_cumulative(self):
+        histogram = self.registry.histogram(
+            "latency_seconds", "Latency.", buckets=(0.1, 1.0)
+        )
+        for value in (0.05, 0.5, 0.5, 5):
+            histogram.observe(value)
+        exposed = self.registry.expose()
+        self.assertIn('latency_seconds_bucket{le="0.1"} 1', exposed)
+        self.assertIn('latency_seconds_bucket{le="1"} 3', exposed)
+        self.assertIn('latency_seconds_bucket{le="+Inf"} 4', exposed)
+        self.assertIn("latency_seconds_count 4", exposed)
+        self.assertIn("latency_seconds_sum 6.05", exposed)
+
+    def test_label_values_should_be_escaped(self):
+        counter = self.registry.counter("escaped_total", "Escaped.", ("value",))
+        counter.labels('a"b').inc()
+        self.assertIn(r'escaped_total{value="a\"b"} 1', self.registry.expose())
+
+    def test_wrong_number_of_labels_should_fail(self):
+        counter = self.registry.counter("labeled_total", "Labeled.", ("a", "b"))
+        with self.assertRaises(ValueError):
+            counter.labels("only one")
+
+    def test_metric_names_should_be_unique(self):
+        self.registry.counter("unique_total", "Unique.")
+        with self.assertRaises(ValueError):
+            self.registry.counter("unique_total", "Unique.")
+
+
+class BackendMetricsTests(TestCase):
+    def test_track_backend_call_should_observe_failed_calls(self):
+        child = BACKEND_CALL_DURATION.labels("test", "failing")
+        with self.assertRaises(RuntimeError):
+            with track_backend_call("test", "failing"):
+                raise RuntimeError()
+        self.assertEqual(sum(child.snapshot()[0]), 1)
+
+    def test_mailjet_calls_should_be_measured(self):
+        child = BACKEND_CALL_DURATION.labels("mailjet", "send")
+        before = sum(child.snapshot()[0])
+        mailjet_client = MagicMock()
+        mailjet_client.send.create.return_value.status_code = 200
+        service = MailjetSuggestionService(
+            mailjet_client, "Sender", "sender@email", "Recipient", "to@email", "id"
+        )
+        service.add_suggestion(Suggestion("email@address", "Name", "Content"))
+        self.assertEqual(sum(child.snapshot()[0]), before + 1)
+
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        configure_api_app(*create_default_mocks())
+        self.client = TestClient(app)
+
+    def test_metrics_endpoint_should_expose_request_latency_by_route(self):
+        self.client.get("/cities/1234567")
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn(
+            'querido_diario_http_request_duration_seconds_count{method="GET",route="/cities/{territory_id}",status="404"}',
+            response.text,
+        )
+        self.assertIn(
+            'querido_diario_http_response_size_bytes_count{route="/cities/{territory_id}"}',
+            response.text,
+        )
+
+    def test_unmatched_paths_should_share_a_route_label(self):
+        self.client.get("/this/does/not/exist")
+        response = self.client.get("/metrics")
+        self.assertIn('route="unmatched",status="404"', response.text)
+        self.assertNotIn("/this/does/not/exist", response.text)
@@ -0,0 +1,168 @@
+"""
+Tests for the reverse lookup of the companies of partners, by name or by
+document, and its endpoints.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from companies import PartnerCompaniesLookup, PartnerCompany
+from utils.cursor import decode_cursor, encode_cursor
+
+from tests.test_companies_batch import create_companies_database
+from tests.test_helpers import create_default_mocks
+
+
+def partner_company_row(kind, position, cnpj_basico, name, document):
+    return (kind, position, cnpj_basico, name, document, "2", "49", "2020-01-01")
+
+
+class PartnerCompaniesDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_should_look_up_names_and_documents_in_one_statement(self):
+        self.database._select.return_value = iter(
+            [
+                partner_company_row("name", 1, "00000000", "FULANO DE TAL", "***1**"),
+                partner_company_row("document", 1, "11222333", "CICLANO", "***2**"),
+            ]
+        )
+        by_name, by_document = self.database.get_companies_by_partners(
+            [
+                PartnerCompaniesLookup(name=" fulano  de tal "),
+                PartnerCompaniesLookup(document="***.123.456-**"),
+            ]
+        )
+        command, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_companies_by_partners")
+        self.assertIn("UNION ALL", command)
+        self.assertEqual(data["name"], ["FULANO DE TAL"])
+        self.assertEqual(data["document"], ["***123456**"])
+        self.assertEqual(data["name_after"], [""])
+        self.assertEqual(data["limit"], 21)
+        self.assertEqual(
+            by_name.companies,
+            [PartnerCompany("00000000", "FULANO DE TAL", "***1**", "2", "49", None)],
+        )
+        self.assertEqual(by_document.companies[0].cnpj_basico, "11222333")
+        self.assertIsNone(by_name.next_cursor)
+
+    def test_full_pages_should_have_the_cursor_of_their_last_company(self):
+        self.database._select.return_value = iter(
+            [
+                partner_company_row("name", 1, "00000000", "FULANO", "***1**"),
+                partner_company_row("name", 1, "11222333", "FULANO", "***1**"),
+                partner_company_row("name", 1, "11444777", "FULANO", "***2**"),
+                partner_company_row("document", 1, "00000000", "CICLANO", "***3**"),
+                partner_company_row("document", 1, "11222333", "FULANO", "***3**"),
+                partner_company_row("document", 1, "11444777", "FULANO", "***3**"),
+            ]
+        )
+        by_name, by_document = self.database.get_companies_by_partners(
+            [
+                PartnerCompaniesLookup(name="fulano"),
+                PartnerCompaniesLookup(document="***3**"),
+            ],
+            limit=2,
+        )
+        self.assertEqual(len(by_name.companies), 2)
+        self.assertEqual(decode_cursor(by_name.next_cursor, 2), ("***1**", "11222333"))
+        self.assertEqual(
+            decode_cursor(by_document.next_cursor, 2), ("FULANO", "11222333")
+        )
+
+        self.database._select.return_value = iter([])
+        self.database.get_companies_by_partners(
+            [PartnerCompaniesLookup(name="fulano", cursor=by_name.next_cursor)]
+        )
+        _, data, _ = self.database._select.call_args.args
+        self.assertEqual(data["name_after"], ["***1**"])
+        self.assertEqual(data["name_after_cnpj_basico"], ["11222333"])
+        self.assertEqual(data["document"], [])
+
+    def test_invalid_lookups_should_get_an_error_without_a_query(self):
+        lookups = self.database.get_companies_by_partners(
+            [
+                PartnerCompaniesLookup(),
+                PartnerCompaniesLookup(name="fulano", document="***1**"),
+                PartnerCompaniesLookup(name="fulano", cursor="not a cursor"),
+                PartnerCompaniesLookup(name="fulano", cursor=encode_cursor([1, 2])),
+            ]
+        )
+        self.assertTrue(all(lookup.error for lookup in lookups))
+        self.database._select.assert_not_called()
+
+
+class PartnerCompaniesApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+
+        def get_companies_by_partners(lookups, limit):
+            for lookup in lookups:
+                if lookup.name == "invalid":
+                    lookup.error = "Either the name or the document should be given."
+                    continue
+                lookup.companies = [
+                    PartnerCompany("00000000", "FULANO", "***1**", "2", "49", None)
+                ]
+                lookup.next_cursor = "cursor"
+            return lookups
+
+        self.mocks[4].get_companies_by_partners = MagicMock(
+            side_effect=get_companies_by_partners
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_should_return_a_page_of_companies(self):
+        response = self.client.get(
+            "/company/by_partner", params={"name": "fulano", "limit": 5}
+        )
+        self.assertEqual(response.status_code, 200)
+        (lookups, limit), _ = self.mocks[4].get_companies_by_partners.call_args
+        self.assertEqual(limit, 5)
+        self.assertEqual(lookups[0].name, "fulano")
+        self.assertEqual(response.json()["next_cursor"], "cursor")
+        self.assertEqual(
+            response.json()["companies"],
+            [
+                {
+                    "cnpj_basico": "00000000",
+                    "razao_social": "FULANO",
+                    "cnpj_cpf_socio": "***1**",
+                    "identificador_socio": "2",
+                    "qualificacao_socio": "49",
+                    "data_entrada_sociedade": None,
+                }
+            ],
+        )
+
+    def test_lookup_errors_should_be_a_bad_request(self):
+        response = self.client.get("/company/by_partner", params={"name": "invalid"})
+        self.assertEqual(response.status_code, 400)
+
+    def test_batch_should_return_an_item_per_partner(self):
+        response = self.client.post(
+            "/company/by_partner/batch",
+            json={
+                "partners": [{"name": "fulano"}, {"name": "invalid"}],
+                "limit": 3,
+            },
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_companies_by_partners.assert_called_once()
+        first, second = response.json()["partners"]
+        self.assertEqual(len(first["companies"]), 1)
+        self.assertIsNone(first["error"])
+        self.assertEqual(second["companies"], [])
+        self.assertIsNotNone(second["error"])
+
+    def test_batch_should_validate_the_body(self):
+        for body in [{"partners": []}, {"partners": [{"name": "a"}], "limit": 101}]:
+            with self.subTest(body=body):
+                response = self.client.post("/company/by_partner/batch", json=body)
+                self.assertEqual(response.status_code, 422)
@@ -0,0 +1,160 @@
+"""
+Tests for the keyset pagination of the partners of a company.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from companies import CachedCompaniesAccess, InvalidCNPJException
+from database.postgresql import PostgreSQLDatabaseCompanies
+from utils.cursor import InvalidCursorException, decode_cursor, encode_cursor
+from utils.ttl_cache import TTLCache
+
+from tests.test_companies_batch import PARTNER_ROW, create_companies_database
+from tests.test_helpers import create_default_mocks
+from tests.test_records import create_partner
+
+
+def page_row(total, name, document="***123456**", id="1"):
+    return (total, name, document, "49", "2020-01-01", id) + PARTNER_ROW
+
+
+class PartnersPageDatabaseTests(TestCase):
+    def setUp(self):
+        self.database = create_companies_database()
+
+    def test_first_page_should_have_the_total_and_the_next_cursor(self):
+        self.database._select.return_value = iter(
+            [page_row(5, "ANA"), page_row(5, "BETO"), page_row(5, "CAIO")]
+        )
+        total, partners, next_cursor = self.database.get_partners_page(
+            "00.000.000/0001-91", limit=2
+        )
+        command, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_partners_page")
+        self.assertEqual(data, {"cnpj_basico": "00000000", "limit": 3})
+        self.assertIn("count(*)", command)
+        self.assertIn("""coalesce(resposta_socios."razao_social"::text, '')""", command)
+        self.assertEqual(total, 5)
+        self.assertEqual(len(partners), 2)
+        self.assertEqual(partners[0].razao_social, "FULANO DE TAL")
+        self.assertEqual(partners[0].cnpj_completo, "00.000.000/0001-91")
+        self.assertEqual(
+            decode_cursor(next_cursor, 5),
+            ("BETO", "***123456**", "49", "2020-01-01", "1"),
+        )
+
+    def test_pages_should_be_ordered_by_a_unique_key(self):
+        self.database.get_partners_page("00000000000191")
+        command, *_ = self.database._select.call_args.args
+        self.assertIn("""coalesce(resposta_socios."id"::text, '')""", command)
+
+    def test_equal_partners_should_have_distinct_cursors(self):
+        self.database._select.return_value = iter(
+            [page_row(3, "ANA", id="1"), page_row(3, "ANA", id="2")]
+        )
+        _, _, next_cursor = self.database.get_partners_page("00000000000191", limit=1)
+        self.assertEqual(decode_cursor(next_cursor, 5)[-1], "1")
+
+    def test_next_pages_should_start_after_the_cursor(self):
+        cursor = encode_cursor(["BETO", "***123456**", "49", "2020-01-01", "1"])
+        self.database._select.return_value = iter([page_row(5, "CAIO")])
+        total, partners, next_cursor = self.database.get_partners_page(
+            "00000000000191", limit=2, cursor=cursor
+        )
+        command, data, statement_name = self.database._select.call_args.args
+        self.assertEqual(statement_name, "get_partners_page_after")
+        self.assertIn("%(after_razao_social)s, %(after_cnpj_cpf_socio)s", command)
+        self.assertEqual(data["after_razao_social"], "BETO")
+        self.assertEqual(data["after_data_entrada_sociedade"], "2020-01-01")
+        self.assertEqual(data["after_id"], "1")
+        self.assertEqual((total, len(partners), next_cursor), (5, 1, None))
+
+    def test_empty_pages_should_still_have_the_total(self):
+        self.database._select.return_value = iter([(5,) + (None,) * 15])
+        self.assertEqual(
+            self.database.get_partners_page("00000000000191"), (5, [], None)
+        )
+
+    def test_invalid_values_should_fail(self):
+        with self.assertRaises(InvalidCNPJException):
+            self.database.get_partners_page("123")
+        for cursor in ["not a cursor", encode_cursor([1, 2, 3, 4, 5])]:
+            with self.subTest(cursor=cursor):
+                with self.assertRaises(InvalidCursorException):
+                    self.database.get_partners_page("00000000000191", cursor=cursor)
+        self.database._select.assert_not_called()
+
+
+class CachedPartnersPageTests(TestCase):
+    def setUp(self):
+        self.database = MagicMock(spec=PostgreSQLDatabaseCompanies)
+        self.database.get_partners_page.return_value = (1, [create_partner()], None)
+        self.companies = CachedCompaniesAccess(self.database, TTLCache("test", 10, 60))
+
+    def test_first_pages_should_be_cached_by_limit(self):
+        for _ in range(2):
+            total, partners, _ = self.companies.get_partners_page("00000000000191")
+        self.assertEqual((total, partners), (1, [create_partner()]))
+        self.database.get_partners_page.assert_called_once_with(
+            "00000000000191", 100, None
+        )
+        for limit in [10, 100, 10]:
+            self.companies.get_partners_page("00000000000191", limit=limit)
+        self.assertEqual(self.database.get_partners_page.call_count, 2)
+
+    def test_next_pages_should_not_be_cached(self):
+        for _ in range(2):
+            self.companies.get_partners_page("00000000000191", 10, "cursor")
+        self.assertEqual(self.database.get_partners_page.call_count, 2)
+
+    def test_invalidation_should_drop_the_cached_pages(self):
+        self.companies.get_partners_page("00000000000191")
+        self.companies.get_partners_page("00000000000191", limit=10)
+        self.companies.get_partners_page("11222333000181")
+        self.assertEqual(self.companies.invalidate_cache(["00000000000191"]), 2)
+        self.companies.get_partners_page("00000000000191", limit=10)
+        self.assertEqual(self.database.get_partners_page.call_count, 4)
+
+
+class PartnersPageApiTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        self.mocks[4].get_partners_page = MagicMock(
+            return_value=(3, [create_partner()], "cursor")
+        )
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_should_return_a_page_of_partners(self):
+        response = self.client.get(
+            "/company/partners/00000000000191", params={"limit": 1, "cursor": "abc"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.mocks[4].get_partners_page.assert_called_once_with(
+            "00000000000191", 1, "abc"
+        )
+        self.assertEqual(response.json()["total_partners"], 3)
+        self.assertEqual(len(response.json()["partners"]), 1)
+        self.assertEqual(response.json()["next_cursor"], "cursor")
+
+    def test_invalid_values_should_be_bad_requests(self):
+        for exception in [
+            InvalidCNPJException('CNPJ "1" is not valid.'),
+            InvalidCursorException('Cursor "abc" is not valid.'),
+        ]:
+            with self.subTest(exception=exception):
+                self.mocks[4].get_partners_page.side_effect = exception
+                response = self.client.get("/company/partners/1")
+                self.assertEqual(response.status_code, 400)
+
+    def test_limit_should_be_validated(self):
+        for limit in [0, 1001]:
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    "/company/partners/00000000000191", params={"limit": limit}
+                )
+                self.assertEqual(response.status_code, 422)
@@ -0,0 +1,108 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api.auth import is_admin_key
+from observability import ProfilingMiddleware, profiled
+from observability.profiling import SamplingProfiler
+
+
+def busy_backend_call(duration):
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        pass
+    return "done"
+
+
+def create_profiled_app(output_dir):
+    app = FastAPI()
+    app.add_middleware(
+        ProfilingMiddleware,
+        is_admin_key=lambda key: key == "admin-key",
+        output_dir=output_dir,
+        interval=0.001,
+    )
+
+    @app.get("/work")
+    async def work():
+        result = await asyncio.to_thread(profiled(busy_backend_call), 0.05)
+        return {"result": result}
+
+    return app
+
+
+class SamplingProfilerTests(TestCase):
+    def test_samples_should_be_collapsed_by_stack(self):
+        profiler = SamplingProfiler()
+        profiler.add_thread(threading.get_ident())
+        profiler.sample()
+        profiler.sample()
+        lines = profiler.collapsed().splitlines()
+        self.assertEqual(len(lines), 1)
+        stack, count = lines[0].rsplit(" ", 1)
+        self.assertEqual(count, "2")
+        self.assertIn("test_samples_should_be_collapsed_by_stack", stack)
+
+    def test_profiled_should_not_wrap_without_profiler(self):
+        self.assertIs(profiled(busy_backend_call), busy_backend_call)
+
+
+class ProfilingMiddlewareTests(TestCase):
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.client = TestClient(create_profiled_app(self.output_dir))
+
+    def test_requests_without_profile_header_should_not_be_profiled(self):
+        response = self.client.get("/work", headers={"X-API-Key": "admin-key"})
+        self.assertEqual(response.json(), {"result": "done"})
+        self.assertNotIn("x-profile-file", response.headers)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_requests_with_invalid_key_should_not_be_profiled(self):
+        response = self.client.get(
+            "/work", headers={"X-API-Key": "wrong", "X-Profile": "1"}
+        )
+        self.assertEqual(response.json(), {"result": "done"})
+        self.assertNotIn("x-profile-file", response.headers)
+        self.assertEqual(os.listdir(self.output_dir), [])
+
+    def test_profile_should_be_written_to_output_dir(self):
+        response = self.client.get(
+            "/work", headers={"X-API-Key": "admin-key", "X-Profile": "1"}
+        )
+        self.assertEqual(response.json(), {"result": "done"})
+        filename = response.headers["x-profile-file"]
+        with open(os.path.join(self.output_dir, filename)) as profile_file:
+            profile = profile_file.read()
+        self.assertIn("busy_backend_call", profile)
+
+    def test_inline_profile_should_replace_response_body(self):
+        response = self.client.get(
+            "/work", headers={"X-API-Key": "admin-key", "X-Profile": "inline"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/plain"))
+        self.assertIn("busy_backend_call", response.text)
+        for line in response.text.splitlines():
+            self.assertTrue(line.rsplit(" ", 1)[1].isdigit())
+
+
+class AdminKeyTests(TestCase):
+    @patch.dict(os.environ, {"QUERIDO_DIARIO_ADMIN_API_KEYS": "first,second"})
+    def test_configured_keys_should_be_accepted(self):
+        self.assertTrue(is_admin_key("first"))
+        self.assertTrue(is_admin_key("second"))
+        self.assertFalse(is_admin_key("third"))
+        self.assertFalse(is_admin_key(""))
+
+    @patch.dict(os.environ, {"QUERIDO_DIARIO_ADMIN_API_KEYS": ""})
+    def test_no_key_should_be_accepted_without_configuration(self):
+        self.assertFalse(is_admin_key(""))
+        self.assertFalse(is_admin_key("any"))
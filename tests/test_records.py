@@ -0,0 +1,185 @@
+"""
+Tests for the records returned by the access layers and their serialization
+by the API endpoints.
+"""
+
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi.testclient import TestClient
+
+from aggregates.aggregates_access import Aggregates
+from api import app, configure_api_app
+from cities.city_access import CitySearchResult, OpennessLevel
+from companies.companies_access import Company, Partner
+from gazettes.gazette_access import GazetteSearchResult
+from themed_excerpts.themed_excerpt_access import ThemedExcerptSearchResult
+
+from tests.test_helpers import create_default_mocks
+
+
+def create_gazette(excerpts=None):
+    return GazetteSearchResult(
+        "4205902",
+        "2024-01-02",
+        "2024-01-03T10:00:00",
+        "https://queridodiario.ok.org.br/4205902/file.pdf",
+        "checksum",
+        "Gaspar",
+        "SC",
+        excerpts if excerpts is not None else ["excerpt 1", "excerpt 2"],
+        "100",
+        False,
+        "https://queridodiario.ok.org.br/4205902/file.txt",
+    )
+
+
+def create_themed_excerpt(subthemes, entities):
+    return ThemedExcerptSearchResult(
+        "excerpt-id",
+        "4205902",
+        "2024-01-02",
+        "2024-01-03T10:00:00",
+        "https://queridodiario.ok.org.br/4205902/file.pdf",
+        "Gaspar",
+        "SC",
+        subthemes,
+        "excerpt",
+        "educacao",
+        entities=entities,
+    )
+
+
+def create_company():
+    return Company(
+        "00000000",
+        "0001",
+        "91",
+        "00.000.000/0001-91",
+        "00000000000191",
+        *([None] * 36),
+    )
+
+
+def create_partner():
+    return Partner(
+        "00000000",
+        "0001",
+        "91",
+        "00.000.000/0001-91",
+        "00000000000191",
+        "2",
+        "FULANO DE TAL",
+        "***000000**",
+        *([None] * 7),
+    )
+
+
+class RecordsTests(TestCase):
+    def test_records_should_not_have_an_attribute_dict(self):
+        records = [
+            create_gazette(),
+            create_themed_excerpt(["a"], ["b"]),
+            CitySearchResult("Gaspar", "4205902", "SC", OpennessLevel.ONE, [], ""),
+            create_company(),
+            create_partner(),
+            Aggregates("4205902", "SC", "file.zip", "2024", "", "hash", "1.0"),
+        ]
+        for record in records:
+            with self.subTest(record=type(record).__name__):
+                self.assertFalse(hasattr(record, "__dict__"))
+
+    def test_gazettes_with_the_same_excerpts_should_have_the_same_hash(self):
+        first = create_gazette(["excerpt 1", "excerpt 2"])
+        second = create_gazette(["excerpt 1", "excerpt 2"])
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+        self.assertNotEqual(first, create_gazette(["excerpt 2", "excerpt 1"]))
+
+    def test_themed_excerpts_hash_should_ignore_the_order_of_subthemes(self):
+        first = create_themed_excerpt(["a", "b"], ["x", "y"])
+        second = create_themed_excerpt(["b", "a"], ["y", "x"])
+        self.assertEqual(first, second)
+        self.assertEqual(hash(first), hash(second))
+
+
+class ApiRecordsSerializationTests(TestCase):
+    def setUp(self):
+        self.mocks = create_default_mocks()
+        configure_api_app(*self.mocks)
+        self.client = TestClient(app)
+
+    def test_gazettes_endpoint_should_serialize_records(self):
+        self.mocks[0].get_gazettes.return_value = (1, [create_gazette()])
+        response = self.client.get("/gazettes")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["gazettes"],
+            [
+                {
+                    "territory_id": "4205902",
+                    "date": "2024-01-02",
+                    "scraped_at": "2024-01-03T10:00:00",
+                    "url": "https://queridodiario.ok.org.br/4205902/file.pdf",
+                    "territory_name": "Gaspar",
+                    "state_code": "SC",
+                    "excerpts": ["excerpt 1", "excerpt 2"],
+                    "edition": "100",
+                    "is_extra_edition": False,
+                    "txt_url": "https://queridodiario.ok.org.br/4205902/file.txt",
+                }
+            ],
+        )
+
+    def test_city_endpoint_should_serialize_records(self):
+        self.mocks[2].get_city.return_value = CitySearchResult(
+            "Gaspar", "4205902", "SC", OpennessLevel.ONE, ["https://gaspar"], ""
+        )
+        response = self.client.get("/cities/4205902")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "city": {
+                    "territory_id": "4205902",
+                    "territory_name": "Gaspar",
+                    "state_code": "SC",
+                    "publication_urls": ["https://gaspar"],
+                    "level": "1",
+                    "availability_date": "",
+                }
+            },
+        )
+
+    def test_companies_endpoints_should_serialize_records(self):
+        self.mocks[4].get_company = MagicMock(return_value=create_company())
+        self.mocks[4].get_partners_page = MagicMock(
+            return_value=(1, [create_partner()], None)
+        )
+        company = self.client.get("/company/info/00000000000191").json()
+        self.assertEqual(company["cnpj_info"]["cnpj_completo"], "00.000.000/0001-91")
+        self.assertIsNone(company["cnpj_info"]["cnae"])
+        partners = self.client.get("/company/partners/00000000000191").json()
+        self.assertEqual(partners["total_partners"], 1)
+        self.assertEqual(partners["partners"][0]["razao_social"], "FULANO DE TAL")
+
+    def test_aggregates_endpoint_should_serialize_records(self):
+        self.mocks[5].get_aggregates.return_value = [
+            Aggregates("4205902", "SC", "file.zip", "2024", "2024-12-31", "hash", "1.0")
+        ]
+        response = self.client.get("/aggregates/sc", params={"territory_id": "4205902"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["aggregates"],
+            [
+                {
+                    "territory_id": "4205902",
+                    "state_code": "SC",
+                    "file_path": "file.zip",
+                    "year": "2024",
+                    "last_updated": "2024-12-31",
+                    "hash_info": "hash",
+                    "file_size_mb": "1.0",
+                }
+            ],
+        )
@@ -0,0 +1,95 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from gazettes.gazette_access import GazetteSearchEngineGateway
+from observability import ServerTimingMiddleware, current_server_timing
+from observability.metrics import track_backend_call
+from observability.server_timing import (
+    ServerTiming,
+    request_server_timing,
+    server_timing_stage,
+)
+
+
+def create_timed_app():
+    app = FastAPI()
+    app.add_middleware(ServerTimingMiddleware)
+
+    @app.get("/timed")
+    def timed():
+        with track_backend_call("opensearch", "search"):
+            pass
+        with server_timing_stage("assemble"):
+            pass
+        return {"timing": current_server_timing() is not None}
+
+    return app
+
+
+class ServerTimingTests(TestCase):
+    def test_durations_should_be_accumulated_by_stage(self):
+        timing = ServerTiming()
+        timing.add("decode", 0.001)
+        timing.add("assemble", 0.0025)
+        timing.add("decode", 0.002)
+        self.assertEqual(timing.header_value(), "decode;dur=3.0, assemble;dur=2.5")
+
+    def test_finish_should_add_total_and_serialize(self):
+        timing = ServerTiming()
+        timing.mark_backend_done()
+        timing.finish()
+        names = [entry.split(";")[0] for entry in timing.header_value().split(", ")]
+        self.assertEqual(names, ["serialize", "total"])
+
+    def test_stage_should_do_nothing_without_timing(self):
+        self.assertIsNone(current_server_timing())
+        with server_timing_stage("assemble"):
+            pass
+
+
+class ServerTimingMiddlewareTests(TestCase):
+    def test_response_should_have_server_timing_header(self):
+        client = TestClient(create_timed_app())
+        response = client.get("/timed")
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["timing"])
+        header = response.headers["server-timing"]
+        self.assertIn("opensearch_search;dur=", header)
+        self.assertIn("assemble;dur=", header)
+        self.assertIn("total;dur=", header)
+
+    def test_default_app_should_not_send_server_timing(self):
+        from api import app
+
+        client = TestClient(app)
+        response = client.get("/metrics")
+        self.assertNotIn("server-timing", response.headers)
+
+
+class GatewayServerTimingTests(TestCase):
+    def test_gateway_should_time_object_assembly(self):
+        engine = MagicMock()
+        engine.search.return_value = {
+            "hits": {"total": {"value": 0}, "hits": []},
+        }
+        gateway = GazetteSearchEngineGateway(engine, MagicMock(), "gazettes")
+        with request_server_timing() as timing:
+            gateway.get_gazettes(
+                territory_ids=[],
+                published_since=None,
+                published_until=None,
+                scraped_since=None,
+                scraped_until=None,
+                querystring="",
+                excerpt_size=500,
+                number_of_excerpts=1,
+                pre_tags=[""],
+                post_tags=[""],
+                size=10,
+                offset=0,
+                sort_by="relevance",
+            )
+        self.assertIn("assemble;dur=", timing.header_value())
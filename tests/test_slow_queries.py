@@ -0,0 +1,217 @@
+import json
+import os
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from database.postgresql import PostgreSQLDatabase
+from database.postgresql_scraper import PostgreSQLDatabaseScraper
+from index.opensearch import OpenSearch
+from observability import SlowQueryLog, configure_slow_query_log
+from observability.slow_queries import EXPLAIN_QUEUE_SIZE
+from utils.deadline import request_deadline
+
+from tests.test_helpers import create_default_mocks
+
+
+class SlowQueryLogTestCase(TestCase):
+    threshold = 0.0
+    explain_sample_rate = 1.0
+
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "slow_queries.ndjson")
+        self.log = SlowQueryLog(
+            self.path,
+            threshold=self.threshold,
+            explain_sample_rate=self.explain_sample_rate,
+        )
+        configure_slow_query_log(self.log)
+
+    def tearDown(self):
+        configure_slow_query_log(None)
+        self.log.close()
+
+    def read_entries(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as log_file:
+            return [json.loads(line) for line in log_file]
+
+
+class SlowQueryLogTests(SlowQueryLogTestCase):
+    def test_entries_should_be_written_as_ndjson(self):
+        self.log.record("opensearch", "search", 1.23456, index="gazettes")
+        self.log.record("postgresql", "select", 2, statement="SELECT 1")
+        entries = self.read_entries()
+        self.assertEqual(len(entries), 2)
+        self.assertEqual(entries[0]["backend"], "opensearch")
+        self.assertEqual(entries[0]["duration_ms"], 1234.6)
+        self.assertEqual(entries[0]["index"], "gazettes")
+        self.assertIsNone(entries[0]["route"])
+        self.assertEqual(entries[1]["statement"], "SELECT 1")
+
+    def test_threshold_should_decide_what_is_slow(self):
+        log = SlowQueryLog(os.path.join(tempfile.mkdtemp(), "log"), threshold=0.5)
+        self.assertFalse(log.is_slow(0.4))
+        self.assertTrue(log.is_slow(0.5))
+        log.close()
+
+    def test_plans_should_be_captured_in_the_background(self):
+        captured = threading.Event()
+        self.log.record_with_plan(
+            lambda timeout: captured.wait(5) and {"timeout": timeout},
+            "postgresql",
+            "select",
+            2,
+        )
+        self.assertEqual(self.read_entries(), [])
+        captured.set()
+        self.log.flush()
+        (entry,) = self.read_entries()
+        self.assertEqual(entry["plan"], {"timeout": 10.0})
+
+    def test_queries_should_be_logged_without_plan_when_the_worker_is_behind(self):
+        started, release = threading.Event(), threading.Event()
+
+        def explain(timeout):
+            started.set()
+            return release.wait(5)
+
+        self.log.record_with_plan(explain, "postgresql", "select", 2)
+        started.wait(5)
+        for _ in range(EXPLAIN_QUEUE_SIZE + 1):
+            self.log.record_with_plan(explain, "postgresql", "select", 2)
+        (entry,) = self.read_entries()
+        self.assertNotIn("plan", entry)
+        release.set()
+        self.log.flush()
+        self.assertEqual(len(self.read_entries()), EXPLAIN_QUEUE_SIZE + 2)
+
+    def test_failed_plans_should_not_lose_the_query(self):
+        def explain(timeout):
+            raise Exception("connection refused")
+
+        self.log.record_with_plan(explain, "postgresql", "select", 2)
+        self.log.flush()
+        (entry,) = self.read_entries()
+        self.assertIsNone(entry["plan"])
+
+    def test_log_file_should_be_rotated(self):
+        log = SlowQueryLog(self.path + ".rotated", max_bytes=200, backup_count=2)
+        for _ in range(10):
+            log.record("opensearch", "search", 1, query={"match_all": {}})
+        log.close()
+        self.assertTrue(os.path.exists(self.path + ".rotated.1"))
+        self.assertFalse(os.path.exists(self.path + ".rotated.3"))
+
+
+class OpenSearchSlowQueryTests(SlowQueryLogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_patcher = patch("opensearchpy.OpenSearch")
+        self.client = self.client_patcher.start().return_value
+        self.client.indices.exists.return_value = True
+        self.client.search.return_value = {
+            "took": 1500,
+            "timed_out": False,
+            "_shards": {"total": 2, "successful": 2, "failed": 0},
+            "hits": {"total": {"value": 3}, "hits": []},
+        }
+        self.engine = OpenSearch("localhost", default_index="gazettes")
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        super().tearDown()
+
+    def test_slow_search_should_be_logged_with_stats(self):
+        self.engine.search({"query": {"match_all": {}}}, index="gazettes")
+        (entry,) = self.read_entries()
+        self.assertEqual(entry["backend"], "opensearch")
+        self.assertEqual(entry["index"], "gazettes")
+        self.assertEqual(entry["query"]["query"], {"match_all": {}})
+        self.assertEqual(entry["took"], 1500)
+        self.assertEqual(entry["shards"]["total"], 2)
+        self.assertEqual(entry["hits"], {"value": 3})
+
+    def test_fast_search_should_not_be_logged(self):
+        self.log.threshold = 60
+        self.engine.search({"query": {"match_all": {}}}, index="gazettes")
+        self.assertEqual(self.read_entries(), [])
+
+    def test_route_should_be_logged_for_api_requests(self):
+        interfaces = list(create_default_mocks())
+        interfaces[0].get_gazettes = MagicMock(
+            side_effect=lambda *args: (
+                self.engine.search({"query": {"match_all": {}}}, index="gazettes"),
+                (0, []),
+            )[1]
+        )
+        configure_api_app(*interfaces)
+        response = TestClient(app).get("/gazettes")
+        self.assertEqual(response.status_code, 200)
+        (entry,) = self.read_entries()
+        self.assertEqual(entry["route"], "/gazettes")
+
+
+class PostgreSQLSlowQueryTests(SlowQueryLogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.connect_patcher = patch("psycopg2.connect")
+        self.connection = self.connect_patcher.start().return_value
+        self.cursor = self.connection.cursor.return_value.__enter__.return_value
+        self.cursor.fetchall.return_value = [("row",)]
+        self.cursor.query = b"SELECT * FROM aggregates WHERE state_code = 'BA'"
+        self.cursor.rowcount = 1
+        self.cursor.fetchone.return_value = [[{"Plan": {"Node Type": "Seq Scan"}}]]
+
+    def tearDown(self):
+        self.connect_patcher.stop()
+        super().tearDown()
+
+    def test_slow_select_should_be_logged_with_analyzed_plan(self):
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432)
+        command = "SELECT * FROM aggregates WHERE state_code = %(state_code)s"
+        with request_deadline(0.5):
+            rows = list(database._select(command, {"state_code": "BA"}))
+        self.assertEqual(rows, [("row",)])
+        self.log.flush()
+        (entry,) = self.read_entries()
+        self.assertEqual(entry["backend"], "postgresql")
+        self.assertEqual(entry["operation"], "select")
+        self.assertEqual(entry["statement"], self.cursor.query.decode())
+        self.assertEqual(entry["params"], {"state_code": "BA"})
+        self.assertEqual(entry["rows"], 1)
+        self.assertEqual(entry["plan"], [{"Plan": {"Node Type": "Seq Scan"}}])
+        timeout, explain = self.cursor.execute.call_args_list[-2:]
+        # not limited by what is left of the request deadline
+        self.assertEqual(timeout.args, ("SET statement_timeout = %s", (10000,)))
+        self.assertEqual(
+            explain.args,
+            (
+                f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {command}",
+                {"state_code": "BA"},
+            ),
+        )
+        self.connection.rollback.assert_called_once()
+
+    def test_slow_write_should_not_be_analyzed(self):
+        self.cursor.description = None
+        database = PostgreSQLDatabaseScraper("localhost", "db", "user", "pswd", 5432)
+        database._execute("DELETE FROM job_stats")
+        self.log.flush()
+        (entry,) = self.read_entries()
+        self.assertEqual(entry["operation"], "execute")
+        explain, _ = self.cursor.execute.call_args.args
+        self.assertEqual(explain, "EXPLAIN (FORMAT JSON) DELETE FROM job_stats")
+
+    def test_plan_should_only_be_captured_for_a_sample(self):
+        self.log.explain_sample_rate = 0.0
+        database = PostgreSQLDatabase("localhost", "db", "user", "pswd", 5432)
+        list(database._select("SELECT 1"))
+        (entry,) = self.read_entries()
+        self.assertNotIn("plan", entry)
+        self.connection.rollback.assert_not_called()
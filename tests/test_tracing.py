@@ -0,0 +1,202 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from api import app, configure_api_app
+from database.postgresql import PostgreSQLDatabaseAggregates
+from gazettes import (
+    create_gazettes_data_gateway,
+    create_gazettes_interface,
+    create_gazettes_query_builder,
+)
+from index.opensearch import OpenSearch
+from observability import (
+    SpanExporter,
+    Tracer,
+    configure_tracer,
+    create_span_exporter,
+    current_span,
+    start_span,
+    traced,
+)
+from observability.tracing import NOOP_SPAN, STATUS_ERROR, parse_traceparent
+
+from tests.test_helpers import create_default_mocks
+
+
+class InMemorySpanExporter(SpanExporter):
+    def __init__(self):
+        self.spans = []
+
+    def export(self, spans, service_name):
+        self.spans.extend(spans)
+
+
+class TracingTestCase(TestCase):
+    def setUp(self):
+        self.exporter = InMemorySpanExporter()
+        self.tracer = Tracer(self.exporter)
+        configure_tracer(self.tracer)
+
+    def tearDown(self):
+        configure_tracer(None)
+
+    def finished_spans(self):
+        self.tracer.flush()
+        return {span.name: span for span in self.exporter.spans}
+
+
+class SpanTests(TracingTestCase):
+    def test_nested_spans_should_share_the_trace(self):
+        with start_span("parent") as parent:
+            with start_span("child") as child:
+                self.assertIs(current_span(), child)
+        spans = self.finished_spans()
+        self.assertEqual(spans["child"].trace_id, parent.trace_id)
+        self.assertEqual(spans["child"].parent_span_id, parent.span_id)
+        self.assertEqual(spans["parent"].parent_span_id, "")
+        self.assertIsNotNone(spans["parent"].end_time)
+
+    def test_exceptions_should_be_recorded(self):
+        with self.assertRaises(ValueError):
+            with start_span("failing"):
+                raise ValueError("boom")
+        span = self.finished_spans()["failing"]
+        self.assertEqual(span.status, STATUS_ERROR)
+        self.assertEqual(span.attributes["exception.type"], "ValueError")
+
+    def test_traced_functions_should_be_named_after_them(self):
+        @traced
+        def traced_function():
+            return current_span().name
+
+        self.assertIn("traced_function", traced_function())
+
+    def test_remote_parent_should_be_continued(self):
+        parent = parse_traceparent(
+            "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+        )
+        with start_span("server", parent=parent):
+            pass
+        span = self.finished_spans()["server"]
+        self.assertEqual(span.trace_id, "0af7651916cd43dd8448eb211c80319c")
+        self.assertEqual(span.parent_span_id, "b7ad6b7169203331")
+
+    def test_invalid_traceparent_should_be_ignored(self):
+        self.assertIsNone(parse_traceparent("garbage"))
+        self.assertIsNone(parse_traceparent("00-" + "0" * 32 + "-" + "1" * 16 + "-01"))
+
+
+class DisabledTracingTests(TestCase):
+    def test_spans_should_do_nothing_without_tracer(self):
+        with start_span("ignored") as span:
+            span.set_attribute("key", "value")
+        self.assertIs(span, NOOP_SPAN)
+        self.assertIs(current_span(), NOOP_SPAN)
+        self.assertEqual(NOOP_SPAN.attributes, {})
+
+
+class ExporterTests(TestCase):
+    def test_file_exporter_should_write_otlp_json_lines(self):
+        path = os.path.join(tempfile.mkdtemp(), "traces.ndjson")
+        tracer = Tracer(create_span_exporter("file", path), service_name="api")
+        configure_tracer(tracer)
+        try:
+            with start_span("operation", attributes={"hits": 3, "index": "gazettes"}):
+                pass
+        finally:
+            configure_tracer(None)
+            tracer.shutdown()
+        with open(path) as trace_file:
+            (line,) = trace_file.readlines()
+        resource_spans = json.loads(line)["resourceSpans"][0]
+        self.assertEqual(
+            resource_spans["resource"]["attributes"],
+            [{"key": "service.name", "value": {"stringValue": "api"}}],
+        )
+        (span,) = resource_spans["scopeSpans"][0]["spans"]
+        self.assertEqual(span["name"], "operation")
+        self.assertIn({"key": "hits", "value": {"intValue": "3"}}, span["attributes"])
+
+    def test_unknown_exporter_should_fail(self):
+        with self.assertRaises(ValueError):
+            create_span_exporter("unknown")
+
+
+class GazettesTracingTests(TracingTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client_patcher = patch("opensearchpy.OpenSearch")
+        client = self.client_patcher.start().return_value
+        client.indices.exists.return_value = True
+        client.search.return_value = {
+            "took": 12,
+            "timed_out": False,
+            "_shards": {"total": 1, "failed": 0},
+            "hits": {"total": {"value": 0}, "hits": []},
+        }
+        query_builder = create_gazettes_query_builder(
+            "source_text", ".exact", "date", "scraped_at", "territory_id"
+        )
+        gateway = create_gazettes_data_gateway(
+            OpenSearch("localhost"), query_builder, "querido-diario"
+        )
+        interfaces = list(create_default_mocks())
+        interfaces[0] = create_gazettes_interface(gateway)
+        configure_api_app(*interfaces)
+
+    def tearDown(self):
+        self.client_patcher.stop()
+        super().tearDown()
+
+    def test_spans_should_cross_every_layer(self):
+        response = TestClient(app).get("/gazettes")
+        self.assertEqual(response.status_code, 200)
+        spans = self.finished_spans()
+        server = spans["GET /gazettes"]
+        access = spans["GazetteAccess.get_gazettes"]
+        gateway = spans["GazetteSearchEngineGateway.get_gazettes"]
+        search = spans["opensearch search"]
+        self.assertEqual(access.parent_span_id, server.span_id)
+        self.assertEqual(gateway.parent_span_id, access.span_id)
+        self.assertEqual(search.parent_span_id, gateway.span_id)
+        self.assertEqual(server.attributes["http.response.status_code"], 200)
+        self.assertEqual(search.kind, "client")
+        self.assertEqual(search.attributes["opensearch.index"], "querido-diario")
+        self.assertEqual(search.attributes["opensearch.took"], 12)
+        self.assertEqual(search.attributes["opensearch.hits.total"], 0)
+
+
+class PostgreSQLTracingTests(TracingTestCase):
+    @patch("psycopg2.connect")
+    def test_select_span_should_have_statement_name_and_row_count(self, connect):
+        cursor = connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = []
+        cursor.rowcount = 0
+        database = PostgreSQLDatabaseAggregates("localhost", "db", "user", "pswd", 5432)
+        self.assertEqual(database.get_aggregates(state_code="BA"), [])
+        spans = self.finished_spans()
+        select = spans["postgresql select"]
+        self.assertEqual(
+            select.parent_span_id,
+            spans["PostgreSQLDatabaseAggregates.get_aggregates"].span_id,
+        )
+        self.assertEqual(select.attributes["db.statement.name"], "get_aggregates")
+        self.assertEqual(select.attributes["db.response.returned_rows"], 0)
+        self.assertEqual(select.attributes["db.system"], "postgresql")
+
+    @patch("psycopg2.connect")
+    def test_select_span_should_end_before_the_rows_are_consumed(self, connect):
+        cursor = connect.return_value.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [("a",), ("b",)]
+        cursor.rowcount = 2
+        database = PostgreSQLDatabaseAggregates("localhost", "db", "user", "pswd", 5432)
+        rows = database._select("SELECT 1")
+        self.assertEqual(next(rows), ("a",))
+        self.assertIn("postgresql select", self.finished_spans())
+        connect.return_value.close.assert_called_once()
+        self.assertEqual(list(rows), [("b",)])
@@ -0,0 +1,127 @@
+"""
+Tests for FileUrlBuilder, the configured counterpart of build_file_url.
+"""
+
+from unittest.mock import MagicMock
+
+from database.postgresql import PostgreSQLDatabaseAggregates
+from gazettes.gazette_access import GazetteSearchEngineGateway
+from index import SearchEngineInterface
+from utils import FileUrlBuilder, build_file_url
+from tests.test_url_builder_base import BaseUrlBuilderTest
+
+
+class TestFileUrlBuilder(BaseUrlBuilderTest):
+    """
+    Tests for FileUrlBuilder rules, memo and batch building.
+    """
+
+    PATHS_AND_URLS = [
+        "3304557/2019/file.pdf",
+        "/3304557/2019/file.txt",
+        "data.queridodiario.ok.org.br/3304557/file.pdf",
+        "https://data.queridodiario.ok.org.br/3304557/file.pdf",
+        "https://querido-diario.nyc3.cdn.digitaloceanspaces.com/3304557/file.pdf",
+        "https://queridodiario.nyc3.cdn.digitaloceanspaces.com/3304557/file.pdf",
+        "s3://okbr-qd-historico/3304557/2019/file.pdf",
+        "https://doweb.rio.rj.gov.br/portal/edicoes/download/4067",
+    ]
+
+    def test_should_build_the_same_urls_as_build_file_url(self):
+        for endpoint in [
+            "",
+            "data.queridodiario.ok.org.br",
+            "http://data.queridodiario.ok.org.br/",
+            "s3://data.queridodiario.ok.org.br",
+        ]:
+            for replace_base in ["true", "false"]:
+                self.set_env(
+                    QUERIDO_DIARIO_FILES_ENDPOINT=endpoint,
+                    REPLACE_FILE_URL_BASE=replace_base,
+                )
+                builder = FileUrlBuilder(endpoint, replace_base == "true")
+                for path_or_url in self.PATHS_AND_URLS:
+                    with self.subTest(
+                        endpoint=endpoint,
+                        replace_base=replace_base,
+                        path_or_url=path_or_url,
+                    ):
+                        self.assert_url_equals(
+                            builder.build(path_or_url), build_file_url(path_or_url)
+                        )
+
+    def test_legacy_hosts_should_be_configurable(self):
+        builder = FileUrlBuilder(
+            "data.queridodiario.ok.org.br", True, ["old.storage.example.com"]
+        )
+        self.assert_url_equals(
+            builder.build("https://old.storage.example.com/3304557/file.pdf"),
+            "https://data.queridodiario.ok.org.br/3304557/file.pdf",
+        )
+        legacy_url = "s3://okbr-qd-historico/3304557/file.pdf"
+        self.assert_url_equals(builder.build(legacy_url), legacy_url)
+
+    def test_memo_should_be_bounded(self):
+        builder = FileUrlBuilder("data.queridodiario.ok.org.br", memo_size=2)
+        for number in range(5):
+            builder.build(f"3304557/{number}.pdf")
+        builder.build("3304557/4.pdf")
+        cache_info = builder.build.cache_info()
+        self.assertEqual(cache_info.currsize, 2)
+        self.assertEqual(cache_info.hits, 1)
+
+    def test_should_build_the_urls_of_every_hit(self):
+        builder = FileUrlBuilder("data.queridodiario.ok.org.br")
+        hits = [
+            {"_source": {"url": "1/a.pdf", "file_raw_txt": "1/a.txt"}},
+            {"_source": {"url": "2/b.pdf"}},
+        ]
+        self.assertEqual(
+            builder.build_hit_urls(hits, "url", "file_raw_txt"),
+            [
+                (
+                    "https://data.queridodiario.ok.org.br/1/a.pdf",
+                    "https://data.queridodiario.ok.org.br/1/a.txt",
+                ),
+                ("https://data.queridodiario.ok.org.br/2/b.pdf", None),
+            ],
+        )
+
+    def test_gateway_should_use_the_given_builder(self):
+        self.set_env(QUERIDO_DIARIO_FILES_ENDPOINT="ignored.example.com")
+        engine = MagicMock(spec=SearchEngineInterface)
+        engine.index_exists.return_value = True
+        gateway = GazetteSearchEngineGateway(
+            engine,
+            MagicMock(),
+            "test_index",
+            FileUrlBuilder("data.queridodiario.ok.org.br"),
+        )
+        hit = {
+            "_source": {
+                "territory_id": "3304557",
+                "date": "2019-01-01",
+                "scraped_at": "2019-01-02T00:00:00",
+                "url": "3304557/file.pdf",
+                "file_checksum": "abc123",
+                "territory_name": "Rio de Janeiro",
+                "state_code": "RJ",
+            }
+        }
+        (gazette,) = gateway.create_list_with_gazette_objects([hit])
+        self.assert_url_equals(
+            gazette.url, "https://data.queridodiario.ok.org.br/3304557/file.pdf"
+        )
+
+    def test_aggregates_should_use_the_given_builder(self):
+        database = PostgreSQLDatabaseAggregates(
+            "", "", "", "", "", FileUrlBuilder("http://localhost:9000/bucket/")
+        )
+        aggregates = database._format_aggregates_data(
+            (1, "2927408", "BA", "2024", "aggregates/BA/2927408_2024.zip")
+            + ("12.5", "hash", "2024-12-31")
+        )
+        self.assert_url_equals(
+            aggregates.file_path,
+            "http://localhost:9000/bucket/aggregates/BA/2927408_2024.zip",
+        )
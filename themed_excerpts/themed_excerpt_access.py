@@ -2,7 +2,7 @@ import abc
 import json
 import os
 from datetime import date, datetime
-from typing import Dict, List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from index import SearchEngineInterface
 from index.opensearch import (
@@ -18,7 +18,8 @@ from index.opensearch import (
     HighlightMixin,
     RankFeatureQueryMixin,
 )
-from utils import build_file_url
+from observability import server_timing_stage, traced
+from utils import FileUrlBuilder, parse_date
 
 
 class ThemedExcerptRequest:
@@ -64,6 +65,23 @@ class ThemedExcerptSearchResult:
     Item to represent a themed excerpt in memory inside the module
     """
 
+    __slots__ = (
+        "excerpt_id",
+        "territory_id",
+        "date",
+        "scraped_at",
+        "url",
+        "territory_name",
+        "state_code",
+        "subthemes",
+        "excerpt",
+        "theme",
+        "edition",
+        "is_extra_edition",
+        "txt_url",
+        "entities",
+    )
+
     def __init__(
         self,
         excerpt_id,
@@ -106,13 +124,13 @@ class ThemedExcerptSearchResult:
                 self.url,
                 self.territory_name,
                 self.state_code,
-                str(self.subthemes),
+                frozenset(self.subthemes),
                 self.excerpt,
                 self.theme,
                 self.edition,
                 self.is_extra_edition,
                 self.txt_url,
-                str(self.entities),
+                frozenset(self.entities),
             )
         )
 
@@ -252,6 +270,7 @@ class ThemedExcerptQueryBuilder(
         tfidf_score_field: str,
         fragment_size: int,
         number_of_fragments: int,
+        highlight_type: str = "fvh",
     ):
         self.text_content_field = text_content_field
         self.text_content_exact_field_suffix = text_content_exact_field_suffix
@@ -264,6 +283,7 @@ class ThemedExcerptQueryBuilder(
         self.tfidf_score_field = tfidf_score_field
         self.fragment_size = fragment_size
         self.number_of_fragments = number_of_fragments
+        self.highlight_type = highlight_type
 
     def build_query(
         self,
@@ -373,7 +393,7 @@ class ThemedExcerptQueryBuilder(
             number_of_fragments=self.number_of_fragments,
             pre_tags=pre_tags,
             post_tags=post_tags,
-            type="fvh",
+            type=self.highlight_type,
             matched_fields=matched_fields,
         )
         self.add_highlight(
@@ -389,10 +409,13 @@ class ThemedExcerptSearchEngineGateway(ThemedExcerptDataGateway):
         self,
         search_engine: SearchEngineInterface,
         query_builder: QueryBuilderInterface,
+        url_builder: Optional[FileUrlBuilder] = None,
     ):
         self._engine = search_engine
         self._query_builder = query_builder
+        self._url_builder = url_builder
 
+    @traced
     def get_themed_excerpts(
         self,
         theme_index: str,
@@ -428,12 +451,11 @@ class ThemedExcerptSearchEngineGateway(ThemedExcerptDataGateway):
         )
         excerpts = self._engine.search(query=query, index=theme_index)
 
-        return (
-            self.get_total_number_items(excerpts),
-            self.create_list_with_themed_excerpt_objects(
+        with server_timing_stage("assemble"):
+            excerpt_objects = self.create_list_with_themed_excerpt_objects(
                 excerpts["hits"]["hits"], theme
-            ),
-        )
+            )
+        return (self.get_total_number_items(excerpts), excerpt_objects)
 
     def get_total_number_items(self, search_response_json: Dict):
         return search_response_json["hits"]["total"]["value"]
@@ -441,12 +463,25 @@ class ThemedExcerptSearchEngineGateway(ThemedExcerptDataGateway):
     def create_list_with_themed_excerpt_objects(
         self, themed_excerpt_hits: List[Dict], theme: str
     ):
+        urls = self._file_url_builder().build_hit_urls(
+            themed_excerpt_hits, "source_url", "source_file_raw_txt"
+        )
         return [
-            self._assemble_themed_excerpt_object(excerpt, theme)
-            for excerpt in themed_excerpt_hits
+            self._assemble_themed_excerpt_object(excerpt, theme, excerpt_urls)
+            for excerpt, excerpt_urls in zip(themed_excerpt_hits, urls)
         ]
 
-    def _assemble_themed_excerpt_object(self, excerpt: Dict, theme: str):
+    def _file_url_builder(self) -> FileUrlBuilder:
+        if self._url_builder is not None:
+            return self._url_builder
+        return FileUrlBuilder.from_environment()
+
+    def _assemble_themed_excerpt_object(
+        self,
+        excerpt: Dict,
+        theme: str,
+        urls: Optional[Tuple[str, Optional[str]]] = None,
+    ):
         highlight = (
             excerpt["highlight"]["excerpt"][0]
             if "highlight" in excerpt
@@ -454,16 +489,16 @@ class ThemedExcerptSearchEngineGateway(ThemedExcerptDataGateway):
         )
 
         # Build file URL from relative path or process legacy URL
-        file_url = excerpt["_source"]["source_url"]
-        url = build_file_url(file_url)
-
-        file_raw_txt = excerpt["_source"].get("source_file_raw_txt", None)
-        txt_url = build_file_url(file_raw_txt) if file_raw_txt else None
+        if urls is None:
+            (urls,) = self._file_url_builder().build_hit_urls(
+                [excerpt], "source_url", "source_file_raw_txt"
+            )
+        url, txt_url = urls
 
         return ThemedExcerptSearchResult(
             excerpt["_source"]["excerpt_id"],
             excerpt["_source"]["source_territory_id"],
-            datetime.strptime(excerpt["_source"]["source_date"], "%Y-%m-%d").date(),
+            parse_date(excerpt["_source"]["source_date"]),
             datetime.fromisoformat(excerpt["_source"]["source_scraped_at"]),
             url,
             excerpt["_source"]["source_territory_name"],
@@ -557,6 +592,7 @@ class ThemedExcerptAccess(ThemedExcerptAccessInterface):
         self._data_gateway = data_gateway
         self._theme_database_gateway = theme_database_gateway
 
+    @traced
     def get_themed_excerpts(self, filters: ThemedExcerptRequest):
         theme_index = self._theme_database_gateway.get_theme_index(filters.theme)
         if theme_index is None:
@@ -566,7 +602,7 @@ class ThemedExcerptAccess(ThemedExcerptAccessInterface):
             theme_index=theme_index,
             **vars(filters),
         )
-        return (total_number_excerpts, [vars(excerpt) for excerpt in excerpts])
+        return (total_number_excerpts, excerpts)
 
     def get_available_themes(self):
         themes = self._theme_database_gateway.get_available_themes()
@@ -593,6 +629,7 @@ def create_themed_excerpts_query_builder(
     themed_excerpt_tfidf_score_field: str,
     themed_excerpt_fragment_size: int,
     themed_excerpt_number_of_fragments: int,
+    themed_excerpt_highlight_type: str = "fvh",
 ) -> QueryBuilderInterface:
     return ThemedExcerptQueryBuilder(
         themed_excerpt_text_content_field,
@@ -606,12 +643,14 @@ def create_themed_excerpts_query_builder(
         themed_excerpt_tfidf_score_field,
         themed_excerpt_fragment_size,
         themed_excerpt_number_of_fragments,
+        themed_excerpt_highlight_type,
     )
 
 
 def create_themed_excerpts_data_gateway(
     search_engine: SearchEngineInterface,
     query_builder: QueryBuilderInterface,
+    url_builder: Optional[FileUrlBuilder] = None,
 ) -> ThemedExcerptDataGateway:
     if not isinstance(search_engine, SearchEngineInterface):
         raise Exception(
@@ -622,7 +661,7 @@ def create_themed_excerpts_data_gateway(
             "Query builder should implement the QueryBuilderInterface interface"
         )
 
-    return ThemedExcerptSearchEngineGateway(search_engine, query_builder)
+    return ThemedExcerptSearchEngineGateway(search_engine, query_builder, url_builder)
 
 
 def create_themes_database_gateway(themes_database_file: str) -> ThemesDatabaseGateway:
@@ -1,3 +1,4 @@
-from .url_builder import build_file_url
+from .dates import parse_date
+from .url_builder import FileUrlBuilder, build_file_url
 
-__all__ = ["build_file_url"]
+__all__ = ["FileUrlBuilder", "build_file_url", "parse_date"]
@@ -0,0 +1,105 @@
+"""
+Cancellation of backend work started on behalf of a request.
+
+The API runs the backend calls of a request inside a cancellation scope.
+Backends register how to abort their in-flight operation while it runs, so
+the scope can stop it when the HTTP client goes away.
+"""
+
+import contextvars
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterator, Union
+
+from observability.metrics import CANCELLED_OPERATIONS
+
+
+class OperationCancelledException(Exception):
+    """Exception for when backend work is requested in a cancelled scope"""
+
+
+class CancellationScope:
+    """
+    Keeps the cancel callbacks of the backend operations in flight for a
+    request
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self._callbacks = {}
+        self._next_handle = 0
+        self._lock = threading.Lock()
+
+    def register(self, callback: Callable[[], None], kind: str) -> int:
+        with self._lock:
+            if self.cancelled:
+                raise OperationCancelledException(f"{kind} operation cancelled")
+            handle = self._next_handle
+            self._next_handle += 1
+            self._callbacks[handle] = (callback, kind)
+            return handle
+
+    def unregister(self, handle: int) -> None:
+        with self._lock:
+            self._callbacks.pop(handle, None)
+
+    def cancel(self) -> int:
+        """
+        Cancels every operation in flight and prevents new ones from starting.
+        Returns the number of operations cancelled.
+        """
+        # the callbacks run under the lock so an operation finishing meanwhile
+        # waits in unregister: a pooled connection must not be handed to
+        # another request before the cancel meant for this one was sent
+        with self._lock:
+            self.cancelled = True
+            callbacks = list(self._callbacks.values())
+            self._callbacks.clear()
+            for callback, kind in callbacks:
+                try:
+                    callback()
+                    CANCELLED_OPERATIONS.labels(kind).inc()
+                except Exception:
+                    logging.exception(f"Could not cancel {kind} operation")
+        return len(callbacks)
+
+
+_current_scope: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_cancellation_scope", default=None
+)
+
+
+def current_cancellation_scope() -> Union[CancellationScope, None]:
+    return _current_scope.get()
+
+
+@contextmanager
+def cancellation_scope(scope: CancellationScope) -> Iterator[CancellationScope]:
+    """
+    Makes the given scope active for the code running inside the block,
+    including worker threads started from it
+    """
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+
+
+@contextmanager
+def cancel_on(callback: Callable[[], None], kind: str) -> Iterator[None]:
+    """
+    Registers how to abort the operation running inside the block in the
+    active cancellation scope (if any)
+    """
+    scope = current_cancellation_scope()
+    if scope is None:
+        yield
+        return
+
+    handle = scope.register(callback, kind)
+    try:
+        yield
+    finally:
+        scope.unregister(handle)
@@ -0,0 +1,35 @@
+"""
+Opaque cursors of keyset pagination.
+
+A page of results ordered by some key ends with a cursor holding the key of
+its last result. The next page is requested with that cursor and starts
+right after that key, so going deep into the results costs as little as the
+first page, unlike with an offset.
+"""
+
+import base64
+import json
+from typing import Any, Sequence, Tuple
+
+
+class InvalidCursorException(ValueError):
+    """Exception for when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(key: Sequence[Any]) -> str:
+    encoded = json.dumps(list(key), separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(encoded).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> Tuple:
+    """
+    Key held by the cursor, which should have the given number of values
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        key = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError) as error:
+        raise InvalidCursorException(f'Cursor "{cursor}" is not valid.') from error
+    if not isinstance(key, list) or len(key) != size:
+        raise InvalidCursorException(f'Cursor "{cursor}" is not valid.')
+    return tuple(key)
@@ -0,0 +1,19 @@
+"""
+Parsing of the dates stored in the indexes.
+"""
+
+import functools
+from datetime import date, datetime
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_date(value: str) -> date:
+    """
+    Date of a `YYYY-MM-DD` string. The hits of a search share few publication
+    dates, so the parsed dates are memoized.
+    """
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        # strptime also accepts single digit months and days
+        return datetime.strptime(value, "%Y-%m-%d").date()
@@ -0,0 +1,97 @@
+"""
+Request deadlines shared by the API handlers and the storage backends.
+
+A handler opens a deadline with the time budget configured for its endpoint.
+Backends called while that deadline is active use the remaining time to bound
+their own work (OpenSearch server-side timeout, PostgreSQL statement_timeout)
+and record whether the results they returned are incomplete.
+"""
+
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Union
+
+
+class DeadlineExceededException(TimeoutError):
+    """Exception for when the request deadline expired before a backend call"""
+
+
+class Deadline:
+    """
+    Point in time after which the current request should stop waiting for
+    its backends.
+    """
+
+    def __init__(self, budget: float):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self.timed_out = False
+        self.partial = False
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def check(self) -> None:
+        """
+        Fails fast when no time is left, instead of sending the backend work
+        it would be given no time for
+        """
+        if self.expired():
+            self.timed_out = True
+            raise DeadlineExceededException(
+                f"Request deadline of {self.budget}s expired"
+            )
+
+    def bound(self, timeout: float) -> float:
+        """
+        Shortens the given timeout (in seconds) to what is left of the deadline
+        """
+        return min(timeout, self.remaining())
+
+    def record_search_response(self, response: Dict) -> None:
+        """
+        Flags the deadline when a search response came back incomplete, either
+        because the server-side timeout was reached or because some shards
+        failed to answer.
+        """
+        if response.get("timed_out", False):
+            self.timed_out = True
+            self.partial = True
+        if response.get("_shards", {}).get("failed", 0) > 0:
+            self.partial = True
+
+
+_current_deadline: contextvars.ContextVar = contextvars.ContextVar(
+    "querido_diario_deadline", default=None
+)
+
+
+def current_deadline() -> Union[Deadline, None]:
+    return _current_deadline.get()
+
+
+def check_deadline() -> None:
+    """
+    Raises DeadlineExceededException when the active deadline (if any) expired
+    """
+    deadline = _current_deadline.get()
+    if deadline is not None:
+        deadline.check()
+
+
+@contextmanager
+def request_deadline(budget: float) -> Iterator[Deadline]:
+    """
+    Makes a deadline with the given budget (in seconds) active for the code
+    running inside the block, including backends called from it
+    """
+    deadline = Deadline(budget)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
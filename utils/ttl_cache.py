@@ -0,0 +1,93 @@
+"""
+Bounded in-memory cache whose entries expire after a time to live.
+
+Entries are kept in least recently used order: reading an entry moves it to
+the end and storing one beyond the capacity evicts the entry read the longest
+ago. Values of None (lookups which found nothing) can have a shorter time to
+live than the other values. Every read is counted as a hit or a miss in the
+cache metrics, under the name of the cache.
+"""
+
+import collections
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional
+
+from observability.metrics import record_cache_lookup
+
+# Returned by get() for keys not in the cache (None is a value of its own)
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(
+        self,
+        name: str,
+        max_size: int,
+        ttl: float,
+        negative_ttl: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Any:
+        """
+        Value stored for the key, or MISSING when it is not in the cache or
+        has expired
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        record_cache_lookup(self.name, entry is not None)
+        return MISSING if entry is None else entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        ttl = self.negative_ttl if value is None else self.ttl
+        if self.max_size <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, keys: Optional[Iterable[Hashable]] = None) -> int:
+        """
+        Drops the given keys (all of them by default) and returns how many
+        entries were dropped
+        """
+        with self._lock:
+            if keys is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+                return dropped
+            return sum(self._entries.pop(key, None) is not None for key in set(keys))
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else None,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
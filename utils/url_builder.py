@@ -5,8 +5,20 @@ This module provides functionality to build complete file URLs from relative
 paths or transform legacy storage URLs to new endpoints.
 """
 
+import functools
 import os
 import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Hosts (or buckets) of the old storages, whose URLs are rewritten to the
+# files endpoint when the base replacement is enabled
+DEFAULT_LEGACY_FILE_HOSTS = [
+    "queridodiario.nyc3.cdn.digitaloceanspaces.com",
+    "querido-diario.nyc3.cdn.digitaloceanspaces.com",
+    "okbr-qd-historico",
+]
+
+LEGACY_URL_PATTERN = re.compile(r"^(https?://|s3://)[^/]+/(.+)$")
 
 
 def _get_protocol_or_none(path_or_url, protocols=["http", "https", "s3"]):
@@ -91,74 +103,105 @@ def build_file_url(path_or_url: str) -> str:
     Returns:
         Complete URL to access the file
     """
-    endpoint = os.environ.get("QUERIDO_DIARIO_FILES_ENDPOINT", "")
-    endpoint_protocol = _get_protocol_or_none(endpoint)
-    replace_base_enabled = (
-        os.environ.get("REPLACE_FILE_URL_BASE", "false").lower() == "true"
-    )
-
-    # Check if it's a URL (supports http://, https://, s3://)
-
-    # Scenario 1: Relative path (new data)
-    if _get_protocol_or_none(path_or_url) is None:
-        if not endpoint:
-            return path_or_url  # No endpoint configured
-
-        # Remove protocol and trailing slash
-        endpoint = endpoint.split("://", 1)[-1].rstrip("/")
-
-        path = path_or_url.lstrip("/")
-
-        # Check if the "relative" path actually contains the endpoint domain
-        # This handles cases where DB has "data.queridodiario.ok.org.br/path"
-        # without protocol
-        if path.startswith(endpoint):
-            # Path already contains the endpoint, just add protocol
-            if endpoint_protocol is None:
-                return f"https://{path}"
-            else:
-                return f"{endpoint_protocol}://{path}"
-
-        # Add protocol back (default to https if original didn't have one)
-        protocol_to_use = endpoint_protocol if endpoint_protocol else "https"
-        return f"{protocol_to_use}://{endpoint}/{path}"
-
-    # Scenario 2: Full URL with base replacement enabled
-    if replace_base_enabled and endpoint:
-        # Remove protocol and trailing slash
-        endpoint = endpoint.split("://", 1)[-1].rstrip("/")
-
-        # Check if URL already uses the correct endpoint
-        # Extract domain from path_or_url and compare with endpoint (without
-        # protocol)
-        # Example: if endpoint is "data.queridodiario.ok.org.br"
-        # and URL is "https://data.queridodiario.ok.org.br/path", preserve it
-        # Remove protocol
-        url_without_protocol = path_or_url.split("://", 1)[-1]
-
-        # If URL already starts with the correct endpoint, return as-is
-        if url_without_protocol.startswith(endpoint):
-            return path_or_url
-
-        # Check if URL should be transformed (old storage URLs)
-        should_transform = (
-            "queridodiario.nyc3.cdn.digitaloceanspaces.com" in path_or_url
-            or "querido-diario.nyc3.cdn.digitaloceanspaces.com" in path_or_url
-            or "okbr-qd-historico" in path_or_url
+    return FileUrlBuilder.from_environment().build(path_or_url)
+
+
+@functools.lru_cache(maxsize=8)
+def _environment_file_url_builder(endpoint: str, replace_base: bool):
+    return FileUrlBuilder(endpoint, replace_base)
+
+
+class FileUrlBuilder:
+    """
+    Builds file URLs with the rules of `build_file_url`, but with the endpoint
+    parsed once and the legacy hosts matched by a single precompiled pattern.
+
+    The built URLs are memoized (up to `memo_size` of them), since the same
+    gazettes come back in the results of repeated and paginated searches.
+    """
+
+    def __init__(
+        self,
+        endpoint: str = "",
+        replace_base: bool = False,
+        legacy_hosts: Iterable[str] = DEFAULT_LEGACY_FILE_HOSTS,
+        memo_size: int = 4096,
+    ):
+        self.endpoint_protocol = _get_protocol_or_none(endpoint) or "https"
+        # Without protocol and trailing slash
+        self.endpoint = endpoint.split("://", 1)[-1].rstrip("/")
+        self.replace_base = replace_base and bool(endpoint)
+        legacy_hosts = [host for host in legacy_hosts if host]
+        self._legacy_hosts = (
+            re.compile("|".join(re.escape(host) for host in legacy_hosts))
+            if legacy_hosts
+            else None
+        )
+        self._endpoint_prefix = f"{self.endpoint_protocol}://{self.endpoint}/"
+        self.build = functools.lru_cache(maxsize=memo_size)(self._build)
+
+    @classmethod
+    def from_environment(cls) -> "FileUrlBuilder":
+        """
+        Builder for the current values of the environment variables, reused
+        while they do not change
+        """
+        return _environment_file_url_builder(
+            os.environ.get("QUERIDO_DIARIO_FILES_ENDPOINT", ""),
+            os.environ.get("REPLACE_FILE_URL_BASE", "false").lower() == "true",
+        )
+
+    @classmethod
+    def from_configuration(cls, configuration) -> "FileUrlBuilder":
+        return cls(
+            configuration.files_endpoint,
+            configuration.replace_file_url_base,
+            configuration.legacy_file_hosts,
         )
 
-        if should_transform:
-            # Extract path from URL using regex
-            # Pattern: <protocol>://<domain>/<path>
-            # Supports: http://, https://, s3://
-            pattern = r"^(https?://|s3://)[^/]+/(.+)$"
-            match = re.match(pattern, path_or_url)
-
-            if match:
-                relative_path = match.group(2)
-                # Add protocol back (default to https if original didn't have one)
-                protocol_to_use = endpoint_protocol if endpoint_protocol else "https"
-                return f"{protocol_to_use}://{endpoint}/{relative_path}"
-
-    # Scenario 3: Legacy mode - return URL as-is
-    return path_or_url
+    def build_hit_urls(
+        self, hits: List[Dict], url_field: str, txt_field: str
+    ) -> List[Tuple[str, Optional[str]]]:
+        """
+        URLs of the file and of the text file of every search hit
+        """
+        build = self.build
+        urls = []
+        for hit in hits:
+            source = hit["_source"]
+            txt = source.get(txt_field)
+            urls.append((build(source[url_field]), build(txt) if txt else None))
+        return urls
+
+    def _build(self, path_or_url: str) -> str:
+        # Scenario 1: Relative path (new data)
+        if _get_protocol_or_none(path_or_url) is None:
+            if not self.endpoint:
+                return path_or_url  # No endpoint configured
+
+            path = path_or_url.lstrip("/")
+
+            # Check if the "relative" path actually contains the endpoint
+            # domain. This handles cases where DB has
+            # "data.queridodiario.ok.org.br/path" without protocol
+            if path.startswith(self.endpoint):
+                return f"{self.endpoint_protocol}://{path}"
+
+            return self._endpoint_prefix + path
+
+        # Scenario 2: Full URL with base replacement enabled
+        if self.replace_base:
+            # If URL already uses the correct endpoint, return as-is
+            if path_or_url.split("://", 1)[-1].startswith(self.endpoint):
+                return path_or_url
+
+            # Only old storage URLs are transformed
+            if self._legacy_hosts is not None and self._legacy_hosts.search(
+                path_or_url
+            ):
+                match = LEGACY_URL_PATTERN.match(path_or_url)
+                if match:
+                    return self._endpoint_prefix + match.group(2)
+
+        # Scenario 3: Legacy mode - return URL as-is
+        return path_or_url